@@ -15,12 +15,21 @@ export async function POST(request: NextRequest) {
     const upstream = new FormData()
     upstream.append('file', file)
 
+    // Optional latency budget (ms) the service spreads across its stages;
+    // expensive stages degrade to partial results instead of running long
+    const budgetMs = Number(process.env.BIAS_ANALYSIS_BUDGET_MS || 0)
+    const analyzeUrl = budgetMs > 0
+      ? `${biasApiUrl}/analyze-upload?budget_ms=${budgetMs}`
+      : `${biasApiUrl}/analyze-upload`
+
     // Increase timeout to 10 minutes for first-time model loading
+    // (with a budget, allow 30s of grace for upload and response transfer)
     const controller = new AbortController()
-    const timeoutId = setTimeout(() => controller.abort(), 600000) // 10 minutes
+    const timeoutMs = budgetMs > 0 ? budgetMs + 30000 : 600000
+    const timeoutId = setTimeout(() => controller.abort(), timeoutMs)
 
     try {
-      const res = await fetch(`${biasApiUrl}/analyze-upload`, {
+      const res = await fetch(analyzeUrl, {
         method: 'POST',
         body: upstream as any,
         signal: controller.signal,
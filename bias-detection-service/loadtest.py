@@ -0,0 +1,419 @@
+"""
+Load-test harness for the bias detection service.
+
+Replays a weighted mix of datasets (synthetic CSV/JSON of several sizes plus
+any CSVs already in jobs/) against /analyze-upload, ramping the number of
+concurrent clients step by step. Each step reports throughput, p50/p95/p99
+latency and error rate; service RSS and jobs in flight are sampled from
+/metrics throughout. Results are written as JSON and an HTML summary.
+
+    # start a local service with stub (disabled) text models and ramp 1..16 clients
+    python loadtest.py --start --concurrency 1,2,4,8,16 --step-seconds 30
+
+    # against an already running service, real models, only the jobs/ CSVs
+    python loadtest.py --url http://127.0.0.1:8000 --sizes "" --jobs-csv 5
+"""
+import argparse
+import glob
+import html
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+RSS_METRIC = "biasbounty_process_resident_memory_bytes"
+IN_FLIGHT_METRIC = "biasbounty_jobs_in_flight"
+
+# -------- Workload --------
+
+def synthetic_dataset(rows: int, seed: int) -> pd.DataFrame:
+    """A hiring-style table with demographic, numeric, outcome and free-text columns."""
+    rng = np.random.default_rng(seed)
+    phrases = np.array([
+        "strong communication skills and team player", "led the migration of a legacy system",
+        "excellent references from previous employer", "gap in employment history explained",
+        "relocating for family reasons", "self taught developer with open source work",
+    ])
+    return pd.DataFrame({
+        "age": rng.integers(18, 70, rows),
+        "gender": rng.choice(["male", "female", "nonbinary"], rows, p=[0.62, 0.35, 0.03]),
+        "race": rng.choice(["A", "B", "C", "D"], rows, p=[0.55, 0.25, 0.15, 0.05]),
+        "years_experience": rng.gamma(2.0, 3.0, rows).round(1),
+        "salary": rng.lognormal(11, 0.4, rows).round(2),
+        "interview_score": rng.normal(70, 12, rows).round(1),
+        "notes": phrases[rng.integers(0, len(phrases), rows)],
+        "hired": rng.choice(["yes", "no"], rows, p=[0.3, 0.7]),
+    })
+
+def build_workload(sizes: list, types: list, jobs_csv: int, seed: int) -> list:
+    """[{name, content, content_type, weight}] — weights favour small datasets, like real traffic."""
+    items = []
+    for i, rows in enumerate(sizes):
+        df = synthetic_dataset(rows, seed + i)
+        for ftype in types:
+            if ftype == "csv":
+                content, content_type = df.to_csv(index=False).encode("utf-8"), "text/csv"
+            else:
+                content, content_type = df.to_json(orient="records").encode("utf-8"), "application/json"
+            items.append({
+                "name": f"synthetic_{rows}.{ftype}", "content": content,
+                "content_type": content_type, "weight": 1.0 / (1 + i),
+            })
+    job_files = sorted(glob.glob(os.path.join(SERVICE_DIR, "jobs", "*.csv")), key=os.path.getsize)
+    if jobs_csv and job_files:
+        # Spread the picks across the size range of what is on disk
+        picks = [job_files[int(j)] for j in np.linspace(0, len(job_files) - 1, min(jobs_csv, len(job_files)))]
+        for path in dict.fromkeys(picks):
+            with open(path, "rb") as f:
+                items.append({
+                    "name": f"jobs/{os.path.basename(path)}", "content": f.read(),
+                    "content_type": "text/csv", "weight": 1.0,
+                })
+    if not items:
+        raise SystemExit("[ERROR] Empty workload: give --sizes and/or --jobs-csv")
+    return items
+
+# -------- Service --------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_service(real_models: bool, workdir: str):
+    """uvicorn main:app on a free port; cleaned outputs land in workdir/jobs, not the repo's jobs/."""
+    port = free_port()
+    env = dict(os.environ, DISABLE_TEXT_MODELS="0" if real_models else "1")
+    log = open(os.path.join(workdir, "service.log"), "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SERVICE_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + (600 if real_models else 120)
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"[ERROR] Service exited during startup, see {log.name}")
+        try:
+            if requests.get(f"{url}/health", timeout=2).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("[ERROR] Service did not become healthy in time")
+
+def scrape_gauges(url: str) -> dict:
+    text = requests.get(f"{url}/metrics", timeout=5).text
+    values = {}
+    for name in (RSS_METRIC, IN_FLIGHT_METRIC):
+        match = re.search(rf"^{name}(?:{{[^}}]*}})? (\S+)$", text, re.MULTILINE)
+        if match:
+            values[name] = float(match.group(1))
+    return values
+
+class ResourceSampler(threading.Thread):
+    """Polls /metrics once per interval for RSS and jobs in flight."""
+
+    def __init__(self, url: str, interval: float, start_time: float):
+        super().__init__(daemon=True)
+        self.url, self.interval, self.start_time = url, interval, start_time
+        self.samples = []
+        self.concurrency = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                gauges = scrape_gauges(self.url)
+                self.samples.append({
+                    "t": round(time.perf_counter() - self.start_time, 2),
+                    "concurrency": self.concurrency,
+                    "rss_mb": round(gauges.get(RSS_METRIC, 0) / 1e6, 1),
+                    "jobs_in_flight": gauges.get(IN_FLIGHT_METRIC),
+                })
+            except requests.RequestException:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+# -------- Load generation --------
+
+def run_step(url: str, endpoint: str, workload: list, concurrency: int, seconds: float,
+             max_requests: int, timeout: float, seed: int, start_time: float) -> list:
+    """
+    Closed loop: `concurrency` clients each send the next request as soon as the
+    previous one returns, until the step's time or request budget is spent.
+    """
+    weights = [item["weight"] for item in workload]
+    results, lock = [], threading.Lock()
+    deadline = time.perf_counter() + seconds
+    issued = [0]
+
+    def client(client_id: int):
+        rng = random.Random(seed * 1000 + client_id)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            item = rng.choices(workload, weights)[0]
+            sent = time.perf_counter()
+            status, error = None, None
+            try:
+                response = session.post(
+                    f"{url}{endpoint}", timeout=timeout,
+                    files={"file": (os.path.basename(item["name"]), item["content"], item["content_type"])},
+                )
+                status = response.status_code
+                if status >= 400:
+                    error = response.text[:200]
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {str(e)[:160]}"
+            finished = time.perf_counter()
+            with lock:
+                results.append({
+                    "dataset": item["name"], "bytes": len(item["content"]), "status": status,
+                    "error": error, "latency_s": finished - sent, "finished_at": finished - start_time,
+                })
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def summarize_step(concurrency: int, results: list, wall_s: float, slo_p95_s: float) -> dict:
+    latencies = np.array([r["latency_s"] for r in results if r["error"] is None])
+    errors = [r for r in results if r["error"] is not None]
+    pct = (lambda q: round(float(np.percentile(latencies, q)), 3)) if len(latencies) else (lambda q: None)
+    error_rate = len(errors) / len(results) if results else 0.0
+    summary = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": int(len(latencies)),
+        "errors": len(errors),
+        "error_rate": round(error_rate, 4),
+        "throughput_rps": round(len(latencies) / wall_s, 3) if wall_s > 0 else 0.0,
+        "mb_per_s": round(sum(r["bytes"] for r in results if r["error"] is None) / 1e6 / wall_s, 3) if wall_s > 0 else 0.0,
+        "latency_s": {
+            "mean": round(float(latencies.mean()), 3) if len(latencies) else None,
+            "p50": pct(50), "p95": pct(95), "p99": pct(99),
+            "max": round(float(latencies.max()), 3) if len(latencies) else None,
+        },
+        "errors_by_status": {},
+        "wall_seconds": round(wall_s, 2),
+    }
+    for r in errors:
+        key = str(r["status"] or "connection")
+        summary["errors_by_status"][key] = summary["errors_by_status"].get(key, 0) + 1
+    p95 = summary["latency_s"]["p95"]
+    summary["slo_met"] = bool(p95 is not None and p95 <= slo_p95_s and error_rate < 0.01)
+    return summary
+
+# -------- Report --------
+
+def _svg_chart(title: str, series: dict, x_label: str, y_label: str, width=560, height=260) -> str:
+    """Minimal inline SVG line chart: series = {name: [(x, y), ...]}."""
+    points = [p for values in series.values() for p in values if p[1] is not None]
+    if not points:
+        return ""
+    pad_l, pad_b, pad_t, pad_r = 56, 36, 28, 12
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    x0, x1 = min(xs), max(xs) if max(xs) > min(xs) else min(xs) + 1
+    y1 = max(ys) * 1.1 or 1
+    sx = lambda x: pad_l + (x - x0) / (x1 - x0) * (width - pad_l - pad_r)
+    sy = lambda y: height - pad_b - y / y1 * (height - pad_b - pad_t)
+    colours = ["#8b5cf6", "#0ea5e9", "#f97316", "#10b981", "#ef4444"]
+    parts = [
+        f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg" font-family="sans-serif" font-size="11">',
+        f'<text x="{pad_l}" y="16" font-size="13" font-weight="bold">{html.escape(title)}</text>',
+        f'<line x1="{pad_l}" y1="{height - pad_b}" x2="{width - pad_r}" y2="{height - pad_b}" stroke="#999"/>',
+        f'<line x1="{pad_l}" y1="{pad_t}" x2="{pad_l}" y2="{height - pad_b}" stroke="#999"/>',
+        f'<text x="{(width + pad_l) / 2}" y="{height - 6}" text-anchor="middle">{html.escape(x_label)}</text>',
+        f'<text x="12" y="{(height - pad_b + pad_t) / 2}" transform="rotate(-90 12 {(height - pad_b + pad_t) / 2})" '
+        f'text-anchor="middle">{html.escape(y_label)}</text>',
+    ]
+    for frac in (0, 0.5, 1):
+        parts.append(f'<text x="{pad_l - 4}" y="{sy(y1 * frac) + 4}" text-anchor="end">{y1 * frac:.3g}</text>')
+    for frac in (0, 0.5, 1):
+        x = x0 + (x1 - x0) * frac
+        parts.append(f'<text x="{sx(x)}" y="{height - pad_b + 14}" text-anchor="middle">{x:.3g}</text>')
+    for i, (name, values) in enumerate(series.items()):
+        values = [p for p in values if p[1] is not None]
+        colour = colours[i % len(colours)]
+        path = " ".join(f"{sx(x):.1f},{sy(y):.1f}" for x, y in values)
+        parts.append(f'<polyline fill="none" stroke="{colour}" stroke-width="2" points="{path}"/>')
+        parts.extend(f'<circle cx="{sx(x):.1f}" cy="{sy(y):.1f}" r="2.5" fill="{colour}"/>' for x, y in values)
+        parts.append(f'<text x="{width - pad_r - 4}" y="{pad_t + 14 * i}" text-anchor="end" fill="{colour}">{html.escape(name)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+def render_html(report: dict) -> str:
+    steps = report["steps"]
+    rows = "".join(
+        f"<tr class=\"{'ok' if s['slo_met'] else 'bad'}\"><td>{s['concurrency']}</td><td>{s['requests']}</td>"
+        f"<td>{s['throughput_rps']}</td><td>{s['latency_s']['p50']}</td><td>{s['latency_s']['p95']}</td>"
+        f"<td>{s['latency_s']['p99']}</td><td>{s['error_rate']:.2%}</td><td>{'yes' if s['slo_met'] else 'no'}</td></tr>"
+        for s in steps
+    )
+    concurrency = [s["concurrency"] for s in steps]
+    charts = [
+        _svg_chart("Latency by concurrency", {
+            q: list(zip(concurrency, [s["latency_s"][q] for s in steps])) for q in ("p50", "p95", "p99")
+        }, "concurrent clients", "seconds"),
+        _svg_chart("Throughput by concurrency", {
+            "requests/s": list(zip(concurrency, [s["throughput_rps"] for s in steps]))
+        }, "concurrent clients", "requests/s"),
+        _svg_chart("Error rate by concurrency", {
+            "error rate": list(zip(concurrency, [s["error_rate"] for s in steps]))
+        }, "concurrent clients", "fraction"),
+        _svg_chart("Service RSS over time", {
+            "RSS MB": [(r["t"], r["rss_mb"]) for r in report["resources"]],
+            "jobs in flight": [(r["t"], r["jobs_in_flight"]) for r in report["resources"]],
+        }, "seconds since start", "MB / jobs"),
+    ]
+    workload = "".join(
+        f"<li>{html.escape(w['name'])} — {w['bytes'] / 1e6:.2f} MB, weight {w['weight']:.2f}</li>"
+        for w in report["workload"]
+    )
+    verdict = report["max_concurrency_within_slo"]
+    return f"""<!doctype html>
+<html><head><meta charset="utf-8"><title>BiasBounty load test</title>
+<style>
+body {{ font-family: sans-serif; margin: 24px; color: #1e1b4b; }}
+table {{ border-collapse: collapse; margin: 12px 0; }}
+td, th {{ border: 1px solid #ddd; padding: 4px 10px; text-align: right; }}
+tr.bad td {{ background: #fee2e2; }} tr.ok td {{ background: #ecfdf5; }}
+.charts svg {{ margin: 8px 16px 8px 0; border: 1px solid #eee; }}
+</style></head><body>
+<h1>Load test: {html.escape(report['endpoint'])}</h1>
+<p>{html.escape(report['target'])} · models: {html.escape(report['models'])} · started {html.escape(report['started_at'])}</p>
+<p><b>SLO:</b> p95 ≤ {report['slo_p95_seconds']}s and error rate &lt; 1% —
+<b>highest concurrency within SLO: {verdict if verdict is not None else "none"}</b>;
+peak throughput {report['peak_throughput_rps']} req/s; peak RSS {report['peak_rss_mb']} MB.</p>
+<table><tr><th>clients</th><th>requests</th><th>req/s</th><th>p50 s</th><th>p95 s</th><th>p99 s</th><th>errors</th><th>SLO</th></tr>
+{rows}</table>
+<div class="charts">{"".join(charts)}</div>
+<h2>Workload</h2><ul>{workload}</ul>
+</body></html>
+"""
+
+# -------- Main --------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=None, help="service base URL (default: start one locally)")
+    target.add_argument("--start", action="store_true", help="start a local service (the default without --url)")
+    parser.add_argument("--real-models", action="store_true", help="load the transformer models in the started service")
+    parser.add_argument("--endpoint", default="/analyze-upload")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated ramp of concurrent clients")
+    parser.add_argument("--step-seconds", type=float, default=30.0, help="duration of each ramp step")
+    parser.add_argument("--step-requests", type=int, default=0, help="stop a step after this many requests (0 = no cap)")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="synthetic dataset row counts ('' for none)")
+    parser.add_argument("--types", default="csv,json", help="synthetic dataset formats: csv,json")
+    parser.add_argument("--jobs-csv", type=int, default=3, help="also replay up to N CSVs from jobs/")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout in seconds")
+    parser.add_argument("--slo-p95", type=float, default=10.0, help="p95 latency SLO in seconds")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="RSS sampling interval in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="loadtest_report", help="output path prefix for .json and .html")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    if set(types) - {"csv", "json"}:
+        raise SystemExit("[ERROR] --types accepts csv and json")
+    ramp = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    print("[LOADTEST] Building workload...")
+    workload = build_workload(sizes, types, args.jobs_csv, args.seed)
+    for item in workload:
+        print(f"   {item['name']}: {len(item['content']) / 1e6:.2f} MB (weight {item['weight']:.2f})")
+
+    proc, workdir = None, None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        workdir = tempfile.mkdtemp(prefix="biasbounty_loadtest_")
+        print(f"[LOADTEST] Starting local service ({'real' if args.real_models else 'stub'} models) in {workdir}")
+        proc, url = start_service(args.real_models, workdir)
+    print(f"[LOADTEST] Target: {url}{args.endpoint}")
+
+    start_time = time.perf_counter()
+    sampler = ResourceSampler(url, args.sample_interval, start_time)
+    sampler.start()
+    steps, requests_log = [], []
+    try:
+        for concurrency in ramp:
+            sampler.concurrency = concurrency
+            print(f"[LOADTEST] {concurrency} concurrent client(s) for {args.step_seconds:.0f}s...")
+            step_start = time.perf_counter()
+            results = run_step(
+                url, args.endpoint, workload, concurrency, args.step_seconds,
+                args.step_requests, args.timeout, args.seed + concurrency, start_time
+            )
+            summary = summarize_step(concurrency, results, time.perf_counter() - step_start, args.slo_p95)
+            steps.append(summary)
+            requests_log.extend({"concurrency": concurrency, **r} for r in results)
+            lat = summary["latency_s"]
+            print(f"   {summary['throughput_rps']} req/s, p50 {lat['p50']}s, p95 {lat['p95']}s, "
+                  f"p99 {lat['p99']}s, errors {summary['error_rate']:.1%}")
+    finally:
+        sampler.stop()
+        sampler.join(timeout=5)
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            shutil.rmtree(os.path.join(workdir, "jobs"), ignore_errors=True)
+
+    within_slo = [s["concurrency"] for s in steps if s["slo_met"]]
+    report = {
+        "target": url,
+        "endpoint": args.endpoint,
+        "models": "external" if args.url else ("real" if args.real_models else "stub"),
+        "started_at": pd.Timestamp.now().isoformat(),
+        "slo_p95_seconds": args.slo_p95,
+        "max_concurrency_within_slo": max(within_slo) if within_slo else None,
+        "peak_throughput_rps": max((s["throughput_rps"] for s in steps), default=0.0),
+        "peak_rss_mb": max((r["rss_mb"] for r in sampler.samples), default=None),
+        "workload": [{"name": w["name"], "bytes": len(w["content"]), "weight": w["weight"]} for w in workload],
+        "steps": steps,
+        "resources": sampler.samples,
+        "requests": requests_log,
+    }
+    with open(f"{args.out}.json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(f"{args.out}.html", "w") as f:
+        f.write(render_html(report))
+    print(f"[LOADTEST] Highest concurrency within SLO: {report['max_concurrency_within_slo']}")
+    print(f"[SAVE] {args.out}.json, {args.out}.html")
+    if workdir is not None:
+        print(f"[LOADTEST] Service log: {os.path.join(workdir, 'service.log')}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,53 @@
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
 
 import numpy as np
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
+import asyncio
+import base64
+import bisect
+import contextvars
+import cProfile
+import email.utils
+import gzip
+import hashlib
+import heapq
 import io
+import itertools
 import json
+import math
 import os
+import queue
+import re
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
 import uuid
+import zipfile
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from urllib.parse import urlparse
 from transformers import pipeline
 import warnings
 warnings.filterwarnings("ignore")
 
+try:
+    import resource  # Unix only; used for RSS fallback when /proc is unavailable
+except ImportError:
+    resource = None
+
 app = FastAPI(title="BiasBounty Bias Detection Service", version="1.1.0")
 
 # Enable CORS
@@ -30,6 +62,132 @@ app.add_middleware(
 JOBS_DIR = os.path.join(os.getcwd(), "jobs")
 os.makedirs(JOBS_DIR, exist_ok=True)
 
+# -------- CPU Layout --------
+# Torch's intra-op pool, the BLAS pool and the concurrent analysis slots each
+# size themselves to the whole machine (ignoring any container CPU quota), so
+# under load they oversubscribe the node and model latency turns erratic.
+# Everything is sized from the CPUs this process can actually use instead:
+# analysis slots x torch threads per slot <= usable CPUs. Model calls run on
+# the analysis threads, so with CPU_PINNING=1 each of those threads (and the
+# OpenMP threads it starts) is pinned to its own set of physical cores. Other
+# CPU-heavy work (batch items, preview scans, shard merges) also runs on the
+# analysis slots rather than on pools of its own.
+
+try:
+    from threadpoolctl import threadpool_limits  # optional: caps BLAS pools numpy has already started
+except ImportError:
+    threadpool_limits = None
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """CPUs granted by the cgroup CFS quota (v2 cpu.max, else v1), or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+def _allowed_cpus() -> list:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return list(range(os.cpu_count() or 1))
+
+def _physical_cores(cpus: list) -> list:
+    """Allowed CPUs grouped by physical core, SMT siblings together (one CPU per group without sysfs)."""
+    cores = OrderedDict()
+    for cpu in cpus:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                key = f.read().strip()
+        except OSError:
+            key = str(cpu)
+        cores.setdefault(key, []).append(cpu)
+    return list(cores.values())
+
+def plan_cpu_layout() -> dict:
+    """Slot and thread counts from affinity, cgroup quota and env overrides; core sets when pinning."""
+    cpus = _allowed_cpus()
+    cores = _physical_cores(cpus)
+    quota = _cgroup_cpu_quota()
+    usable = len(cpus) if quota is None else max(1, min(len(cpus), int(quota)))
+    usable = int(os.getenv("CPU_LIMIT", str(usable)))
+    slots = int(os.getenv("ADMISSION_SLOTS", str(max(1, min(4, usable)))))
+    per_slot = max(1, usable // slots)
+    core_sets = []
+    if os.getenv("CPU_PINNING", "0") == "1":
+        if len(cores) >= slots:
+            groups = np.array_split(np.arange(len(cores)), slots)
+            core_sets = [sorted(cpu for i in group for cpu in cores[i]) for group in groups]
+        else:
+            print(f"[CPU] Pinning skipped: {len(cores)} physical cores for {slots} analysis slots")
+    return {
+        "allowed_cpus": len(cpus),
+        "physical_cores": len(cores),
+        "cgroup_quota_cpus": quota,
+        "usable_cpus": usable,
+        "analysis_slots": slots,
+        "batch_slots": max(1, slots - 1),  # one slot stays free of batch work when there are two or more
+        "torch_intra_op_threads": int(os.getenv("TORCH_INTRA_OP_THREADS", str(per_slot))),
+        "torch_inter_op_threads": int(os.getenv("TORCH_INTER_OP_THREADS", "1")),
+        "blas_threads": int(os.getenv("BLAS_THREADS", str(per_slot))),
+        "blas_limited": False,
+        "torch_configured": False,
+        "pinning": bool(core_sets),
+        "core_sets": core_sets,
+    }
+
+def apply_blas_threads(layout: dict):
+    # OpenMP/MKL pools created from here on (torch's included) read these at start-up
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, str(layout["blas_threads"]))
+    if threadpool_limits is not None:
+        threadpool_limits(layout["blas_threads"])
+        layout["blas_limited"] = True
+
+def apply_torch_threads(layout: dict):
+    """Size torch's pools once the models have imported it; inter-op can only be set before first use."""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(layout["torch_intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(layout["torch_inter_op_threads"])
+    except RuntimeError:
+        pass
+    layout["torch_configured"] = True
+
+_pinned_threads = itertools.count()
+
+def pin_analysis_thread():
+    """ThreadPoolExecutor initializer: pin this thread to the next core set (no-op without CPU_PINNING)."""
+    core_sets = CPU_LAYOUT["core_sets"]
+    if not core_sets:
+        return
+    cpus = core_sets[next(_pinned_threads) % len(core_sets)]
+    try:
+        os.sched_setaffinity(0, cpus)  # pid 0 is the calling thread on Linux
+    except (AttributeError, OSError) as e:
+        print(f"[CPU] Could not pin {threading.current_thread().name} to {cpus}: {e}")
+
+CPU_LAYOUT = plan_cpu_layout()
+apply_blas_threads(CPU_LAYOUT)
+print(
+    f"[CPU] {CPU_LAYOUT['usable_cpus']} usable CPUs ({CPU_LAYOUT['allowed_cpus']} allowed, "
+    f"quota {CPU_LAYOUT['cgroup_quota_cpus'] or 'none'}): {CPU_LAYOUT['analysis_slots']} analysis slots x "
+    f"{CPU_LAYOUT['torch_intra_op_threads']} torch threads, BLAS {CPU_LAYOUT['blas_threads']}, "
+    f"pinning {'on' if CPU_LAYOUT['pinning'] else 'off'}"
+)
+
 # Load pre-trained models (enabled for production)
 # Set to "1" to disable heavy text models for faster startup (for testing)
 DISABLE_TEXT_MODELS = os.getenv("DISABLE_TEXT_MODELS", "0") == "1"
@@ -55,6 +213,7 @@ else:
             return_all_scores=False
         )
         print("[SUCCESS] Models loaded successfully")
+        apply_torch_threads(CPU_LAYOUT)
     except Exception as e:
         print(f"[WARNING] Could not load some models: {e}")
         sentiment_analyzer = None
@@ -64,6 +223,11 @@ class AnalysisRequest(BaseModel):
     dataset_id: str
     file_url: str
     file_type: str
+    budget_ms: Optional[int] = None
+    outcome_column: Optional[str] = None
+    prediction_column: Optional[str] = None
+    subgroup_depth: Optional[int] = None
+    version: Optional[str] = None
 
 class AnalysisResponse(BaseModel):
     bias_score: float
@@ -71,6 +235,688 @@ class AnalysisResponse(BaseModel):
     recommendations: list
     analysis_type: str
     ai_summary: Optional[str] = None
+    profile: Optional[Dict[str, Any]] = None
+    budget: Optional[Dict[str, Any]] = None
+    catalog: Optional[Dict[str, Any]] = None
+    admission: Optional[Dict[str, Any]] = None
+
+# -------- Metrics & Instrumentation --------
+# Minimal in-process Prometheus registry (text exposition format 0.0.4) so the
+# service can be scraped without running or depending on an external client.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+def _format_labels(labelnames, labelvalues, extra: str = "") -> str:
+    parts = []
+    for name, value in zip(labelnames, labelvalues):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            state["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            state["sum"] += float(value)
+            state["count"] += 1
+
+    def mean(self, **labels) -> Optional[float]:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state["count"]:
+                return None
+            return state["sum"] / state["count"]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted((k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state["counts"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+HTTP_REQUESTS = METRICS.register(Counter(
+    "biasbounty_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+HTTP_LATENCY = METRICS.register(Histogram(
+    "biasbounty_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+STAGE_LATENCY = METRICS.register(Histogram(
+    "biasbounty_stage_duration_seconds", "Duration of individual analysis pipeline stages.", ("stage",)))
+MODEL_BATCH_SIZE = METRICS.register(Histogram(
+    "biasbounty_model_inference_batch_size", "Number of texts per model inference call.", ("model",), BATCH_SIZE_BUCKETS))
+MODEL_TEXT_LATENCY = METRICS.register(Histogram(
+    "biasbounty_model_inference_seconds_per_text", "Model inference latency divided by batch size.", ("model",)))
+MODEL_ERRORS = METRICS.register(Counter(
+    "biasbounty_model_inference_errors_total", "Model inference calls that raised.", ("model",)))
+ROWS_PROCESSED = METRICS.register(Counter(
+    "biasbounty_rows_processed_total", "Dataset rows processed, by pipeline phase.", ("phase",)))
+BYTES_PROCESSED = METRICS.register(Counter(
+    "biasbounty_bytes_processed_total", "Raw dataset bytes received for analysis."))
+JOBS_IN_FLIGHT = METRICS.register(Gauge(
+    "biasbounty_jobs_in_flight", "Analysis jobs currently executing."))
+PROCESS_RSS = METRICS.register(Gauge(
+    "biasbounty_process_resident_memory_bytes", "Resident set size of the service process."))
+
+def get_rss_bytes() -> int:
+    """Current RSS from /proc; falls back to peak RSS from getrusage on non-Linux hosts."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return int(peak if os.uname().sysname == "Darwin" else peak * 1024)
+    return 0
+
+# -------- Request Profiling --------
+# Opt-in per-request profiling (?profile=1 or X-Profile: 1). stage_timer feeds
+# both the metrics above and, when a profiler is active for the current request,
+# a wall/CPU/allocation tree that is returned with the analysis response.
+# ?profile=full additionally writes cProfile and speedscope files under JOBS_DIR.
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f\-]{36}$")
+_active_profiler: contextvars.ContextVar = contextvars.ContextVar("active_profiler", default=None)
+# Open stages in the current context, root first. Per context rather than per
+# profiler, so stages a request runs on several threads at once nest correctly.
+_profile_stack: contextvars.ContextVar = contextvars.ContextVar("profile_stack", default=())
+_running_profilers: set = set()
+_tracemalloc_lock = threading.Lock()
+
+class StageRecord:
+    """One node of the profile tree. Annotations are free-form counters (e.g. rows in/out)."""
+
+    def __init__(self, name: str, started_at: float = 0.0):
+        self.name = name
+        self.started_at = started_at
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.start_traced = 0
+        self.peak_traced = 0
+        self.model_calls = 0
+        self.annotations: Dict[str, Any] = {}
+        self.children: list = []
+        self._wall0 = 0.0
+        self._cpu0 = 0.0
+        self._parent_path: tuple = ()
+
+    def annotate(self, **values):
+        self.annotations.update(values)
+
+    def to_dict(self, memory: bool = True) -> dict:
+        node = {
+            "name": self.name,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "peak_alloc_bytes": int(max(0, self.peak_traced - self.start_traced)) if memory else None,
+            "model_calls": self.model_calls,
+        }
+        node.update(self.annotations)
+        if self.children:
+            node["children"] = [child.to_dict(memory) for child in self.children]
+        return node
+
+class RequestProfiler:
+    """
+    Collects a stage tree for one request. The pipeline runs on an analysis
+    thread (ADMISSION.run), not the handler's event-loop thread, so CPU time
+    and cProfile cover the work run inside on_thread(); stage CPU is the
+    thread time of whichever thread ran the stage. tracemalloc peaks are
+    process-wide, so allocations are only reported (track_memory) for a
+    profile that never overlapped another one.
+    """
+
+    def __init__(self, label: str, full: bool = False):
+        self.label = label
+        self.full = full
+        self.root = StageRecord(label)
+        self.model_calls: Dict[str, int] = {}
+        self.track_memory = True
+        self._lock = threading.Lock()
+        self._token = None
+        self._path_token = None
+        self._cprofile = None
+        self._t0 = 0.0
+        self._cpu_ms = 0.0
+        self._result: Optional[dict] = None
+
+    @classmethod
+    def from_request(cls, request: Request, label: str) -> Optional["RequestProfiler"]:
+        mode = request.query_params.get("profile") or request.headers.get("x-profile")
+        if not mode or str(mode).lower() in ("0", "false", "no", "off"):
+            return None
+        profiler = cls(label, full=str(mode).lower() == "full")
+        profiler.start()
+        return profiler
+
+    def start(self):
+        with _tracemalloc_lock:
+            if not _running_profilers and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # Each profile's reset_peak() would clobber the other's peaks
+            for other in _running_profilers:
+                other.track_memory = False
+            self.track_memory = not _running_profilers
+            _running_profilers.add(self)
+        self._token = _active_profiler.set(self)
+        self._path_token = _profile_stack.set((self.root,))
+        self._t0 = time.perf_counter()
+        if self.track_memory:
+            self.root.start_traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self.full:
+            self._cprofile = cProfile.Profile()
+
+    @contextmanager
+    def on_thread(self):
+        """Count the current thread's CPU time (and, for full profiles, cProfile it) while the block runs."""
+        cpu0 = time.thread_time()
+        profiling = False
+        if self._cprofile is not None and self._result is None:
+            try:
+                self._cprofile.enable()
+                profiling = True
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process
+                print(f"[WARNING] cProfile busy with another request; '{self.label}' profiled without it")
+        try:
+            yield
+        finally:
+            if profiling:
+                self._cprofile.disable()
+            self._cpu_ms += (time.thread_time() - cpu0) * 1000
+
+    def _path(self) -> tuple:
+        """This request's open stages in the current context, root first."""
+        path = _profile_stack.get()
+        return path if path and path[0] is self.root else (self.root,)
+
+    def enter(self, name: str) -> StageRecord:
+        path = self._path()
+        parent = path[-1]
+        node = StageRecord(name, started_at=(time.perf_counter() - self._t0) * 1000)
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            parent.peak_traced = max(parent.peak_traced, peak)
+            tracemalloc.reset_peak()
+            node.start_traced = current
+            node.peak_traced = current
+        with self._lock:
+            parent.children.append(node)
+        node._parent_path = path
+        _profile_stack.set(path + (node,))
+        node._wall0 = time.perf_counter()
+        node._cpu0 = time.thread_time()
+        return node
+
+    def exit(self, node: StageRecord):
+        node.wall_ms = (time.perf_counter() - node._wall0) * 1000
+        node.cpu_ms = (time.thread_time() - node._cpu0) * 1000
+        if self.track_memory:
+            node.peak_traced = max(node.peak_traced, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        _profile_stack.set(node._parent_path)
+        parent = node._parent_path[-1]
+        with self._lock:
+            parent.peak_traced = max(parent.peak_traced, node.peak_traced)
+            parent.model_calls += node.model_calls
+
+    def annotate(self, **values):
+        self._path()[-1].annotate(**values)
+
+    def record_model_call(self, model_name: str):
+        node = self._path()[-1]
+        with self._lock:
+            self.model_calls[model_name] = self.model_calls.get(model_name, 0) + 1
+            node.model_calls += 1
+
+    def finish(self, profile_id: Optional[str] = None) -> dict:
+        """Stop profiling and return the profile block. Safe to call more than once."""
+        if self._result is not None:
+            return self._result
+        self.root.wall_ms = (time.perf_counter() - self._t0) * 1000
+        self.root.cpu_ms = self._cpu_ms
+        if self.track_memory:
+            self.root.peak_traced = max(self.root.peak_traced, tracemalloc.get_traced_memory()[1])
+        if self._token is not None:
+            _active_profiler.reset(self._token)
+            _profile_stack.reset(self._path_token)
+        with _tracemalloc_lock:
+            _running_profilers.discard(self)
+            if not _running_profilers:
+                tracemalloc.stop()
+
+        self._result = {
+            "label": self.label,
+            "total_wall_ms": round(self.root.wall_ms, 3),
+            "total_cpu_ms": round(self.root.cpu_ms, 3),
+            "model_calls": dict(self.model_calls),
+            "memory_tracked": self.track_memory,
+            "tree": self.root.to_dict(self.track_memory),
+        }
+        if self.full:
+            profile_id = profile_id or str(uuid.uuid4())
+            self._result["artifacts"] = self._write_artifacts(profile_id)
+        return self._result
+
+    def _write_artifacts(self, profile_id: str) -> dict:
+        artifacts = {}
+        try:
+            if self._cprofile is not None:
+                self._cprofile.dump_stats(os.path.join(JOBS_DIR, f"profile_{profile_id}.prof"))
+                artifacts["cprofile"] = f"/profile/{profile_id}?format=cprofile"
+            with open(os.path.join(JOBS_DIR, f"profile_{profile_id}.speedscope.json"), "w") as f:
+                json.dump(self._speedscope(), f)
+            artifacts["speedscope"] = f"/profile/{profile_id}?format=speedscope"
+        except Exception as e:
+            print(f"[WARNING] Could not write profile artifacts: {str(e)[:100]}")
+        return artifacts
+
+    def _speedscope(self) -> dict:
+        """Render the stage tree as a speedscope 'evented' profile (exact open/close times)."""
+        frames: list = []
+        frame_index: Dict[str, int] = {}
+        events: list = []
+
+        def walk(node: StageRecord, offset: float):
+            if node.name not in frame_index:
+                frame_index[node.name] = len(frames)
+                frames.append({"name": node.name})
+            events.append({"type": "O", "frame": frame_index[node.name], "at": node.started_at + offset})
+            for child in node.children:
+                walk(child, 0.0)
+            events.append({"type": "C", "frame": frame_index[node.name], "at": node.started_at + node.wall_ms + offset})
+
+        walk(self.root, 0.0)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "evented",
+                "name": self.label,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": self.root.wall_ms,
+                "events": events,
+            }],
+        }
+
+def annotate_stage(**values):
+    """Attach counters to the current profile node; no-op when profiling is off."""
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.annotate(**values)
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a pipeline stage into the stage latency histogram, the request profile and budget, if any."""
+    memory_checkpoint()
+    profiler = _active_profiler.get()
+    budget = _active_budget.get()
+    node = profiler.enter(stage) if profiler is not None else None
+    if budget is not None:
+        budget.begin(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        if budget is not None:
+            budget.end(stage)
+        if node is not None:
+            profiler.exit(node)
+
+def run_text_model(model_name: str, analyzer, inputs, **kwargs):
+    """Call a transformers pipeline, recording batch size and per-text latency."""
+    batch_size = len(inputs) if isinstance(inputs, list) else 1
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.record_model_call(model_name)
+    start = time.perf_counter()
+    try:
+        result = analyzer(inputs, **kwargs)
+    except Exception:
+        MODEL_ERRORS.inc(model=model_name)
+        raise
+    elapsed = time.perf_counter() - start
+    MODEL_BATCH_SIZE.observe(batch_size, model=model_name)
+    MODEL_TEXT_LATENCY.observe(elapsed / max(batch_size, 1), model=model_name)
+    return result
+
+# -------- Deadline Budget --------
+# A request-level time budget (budget_ms) spread across pipeline stages by
+# weight. Expensive stages ask how many units of work they can afford in
+# their share of the remaining time; anything cut short is reported as partial.
+
+DEFAULT_BUDGET_MS = int(os.getenv("DEFAULT_BUDGET_MS", "0"))  # 0 = unbounded
+_active_budget: contextvars.ContextVar = contextvars.ContextVar("active_budget", default=None)
+
+# Relative share of the budget each stage may claim. Stages not listed are
+# cheap and run to completion; their time is simply taken off the remainder.
+BUDGET_STAGE_WEIGHTS = {
+    "load": 0.05,
+    "clean.toxicity": 0.15,
+    "detect.text": 0.30,
+    "chart.correlations": 0.05,
+    "chart.text_stats": 0.20,
+}
+# Which response field each budgeted stage feeds, for the partial_results report
+BUDGET_STAGE_RESULTS = {
+    "clean.toxicity": "cleaning.toxic_filter",
+    "detect.text": "text_bias",
+    "chart.correlations": "chart_data.correlation_edges",
+    "chart.text_stats": "chart_data.text_stats",
+}
+# Priors used until real observations exist (seconds per unit of work)
+DEFAULT_SECONDS_PER_TEXT = 0.05
+CORRELATION_SECONDS_PER_CELL = 1e-9  # per row x column-pair (BLAS matmul)
+
+class AnalysisBudget:
+    def __init__(self, budget_ms: int):
+        self.budget_s = budget_ms / 1000.0
+        self.started = time.perf_counter()
+        self.completed: set = set()
+        self.stage_started: Dict[str, float] = {}
+        self.stage_used: Dict[str, float] = {}
+        self.coverage: Dict[str, dict] = {}
+        self._token = None
+
+    @classmethod
+    def from_request(cls, request: Request, budget_ms: Optional[int] = None) -> Optional["AnalysisBudget"]:
+        if budget_ms is None:
+            raw = request.query_params.get("budget_ms") or request.headers.get("x-budget-ms")
+            try:
+                budget_ms = int(raw) if raw else DEFAULT_BUDGET_MS
+            except ValueError:
+                raise HTTPException(status_code=400, detail="budget_ms must be an integer number of milliseconds")
+        if not budget_ms or budget_ms <= 0:
+            return None
+        budget = cls(budget_ms)
+        budget._token = _active_budget.set(budget)
+        return budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget_s - (time.perf_counter() - self.started))
+
+    def allotment(self, stage: str) -> float:
+        """Seconds this stage may spend: its weighted share of what is left."""
+        weight = BUDGET_STAGE_WEIGHTS.get(stage)
+        if weight is None:
+            return self.remaining()
+        pending = sum(w for s, w in BUDGET_STAGE_WEIGHTS.items() if s not in self.completed)
+        share = weight / pending if pending > 0 else 1.0
+        return self.remaining() * share
+
+    def begin(self, stage: str):
+        if stage in BUDGET_STAGE_WEIGHTS:
+            self.stage_started[stage] = time.perf_counter()
+            self.stage_used.setdefault(stage, 0.0)
+
+    def end(self, stage: str):
+        started = self.stage_started.pop(stage, None)
+        if started is not None:
+            self.stage_used[stage] = self.stage_used.get(stage, 0.0) + time.perf_counter() - started
+            self.completed.add(stage)
+
+    def affordable(self, stage: str, unit_cost_s: float, parts: int = 1) -> int:
+        """How many units of work at unit_cost_s fit in the stage's allotment, per part."""
+        if unit_cost_s <= 0:
+            return 1 << 30
+        return int(self.allotment(stage) / unit_cost_s / max(parts, 1))
+
+    def expired(self, stage: str) -> bool:
+        """True once a running stage has overrun its allotment (with 50% slack) or the deadline passed."""
+        if self.remaining() <= 0:
+            return True
+        started = self.stage_started.get(stage)
+        if started is None or stage not in BUDGET_STAGE_WEIGHTS:
+            return False
+        return time.perf_counter() - started > self.allotment(stage) * 1.5 + 0.05
+
+    def record(self, stage: str, sampled: int, wanted: int, reason: Optional[str] = None):
+        """Accumulate how much of a stage's intended work was actually done."""
+        entry = self.coverage.setdefault(stage, {
+            "stage": stage,
+            "result": BUDGET_STAGE_RESULTS.get(stage, stage),
+            "sampled": 0,
+            "wanted": 0,
+            "reason": None,
+        })
+        entry["sampled"] += int(sampled)
+        entry["wanted"] += int(wanted)
+        # A hard deadline stop is more informative than a planned down-sample
+        if reason == "deadline" or (reason and entry["reason"] is None):
+            entry["reason"] = reason
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        partial_results = []
+        for entry in self.coverage.values():
+            if entry["sampled"] >= entry["wanted"]:
+                continue
+            entry = dict(entry)
+            entry["coverage"] = round(entry["sampled"] / entry["wanted"], 4)
+            partial_results.append(entry)
+        return {
+            "budget_ms": int(self.budget_s * 1000),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "deadline_met": elapsed <= self.budget_s,
+            "partial": bool(partial_results),
+            "partial_results": partial_results,
+            "stage_ms": {s: round(t * 1000, 1) for s, t in self.stage_used.items()},
+        }
+
+    def close(self):
+        if self._token is not None:
+            _active_budget.reset(self._token)
+            self._token = None
+
+def budget_sample_size(stage: str, available: int, default_cap: int, unit_cost_s: float, parts: int = 1) -> int:
+    """
+    Number of items a budgeted stage should process: the hard-coded cap when
+    no budget is active, otherwise whatever fits in the stage's time share.
+    """
+    wanted = min(available, default_cap)
+    budget = _active_budget.get()
+    if budget is None:
+        return wanted
+    n = max(0, min(wanted, budget.affordable(stage, unit_cost_s, parts)))
+    budget.record(stage, sampled=n, wanted=wanted, reason="budget" if n < wanted else None)
+    return n
+
+def budget_expired(stage: str) -> bool:
+    budget = _active_budget.get()
+    return budget is not None and budget.expired(stage)
+
+def budget_cut_short(stage: str, skipped: int):
+    """Record that a loop stopped early, leaving `skipped` planned items unprocessed."""
+    budget = _active_budget.get()
+    if budget is not None and skipped > 0:
+        budget.record(stage, sampled=-skipped, wanted=0, reason="deadline")
+
+def seconds_per_text(model_name: str) -> float:
+    """Observed mean inference latency per text, falling back to a CPU prior."""
+    observed = MODEL_TEXT_LATENCY.mean(model=model_name)
+    return observed if observed is not None else DEFAULT_SECONDS_PER_TEXT
+
+# -------- Batched Inference --------
+# Model calls go through classify_texts in chunks rather than one text at a
+# time. Inside a batch job, an InferenceBatcher per model additionally pools
+# chunks submitted concurrently by different datasets into shared batches.
+
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "16"))
+_active_batchers: contextvars.ContextVar = contextvars.ContextVar("active_batchers", default=None)
+
+def _call_model_batch(model_name: str, analyzer, texts: list) -> list:
+    """One pipeline call over a list; on failure retry per text so one bad input only loses itself."""
+    try:
+        results = run_text_model(model_name, analyzer, texts, max_length=128, truncation=True, batch_size=len(texts))
+        if isinstance(results, list) and len(results) == len(texts):
+            return [r[0] if isinstance(r, list) and r else r for r in results]
+    except Exception as e:
+        print(f"Warning: Batched {model_name} inference failed, retrying per text: {str(e)[:100]}")
+    out = []
+    for text in texts:
+        try:
+            res = run_text_model(model_name, analyzer, text, max_length=128, truncation=True)
+            out.append(res[0] if isinstance(res, list) and res else None)
+        except Exception:
+            out.append(None)
+    return out
+
+class InferenceBatcher:
+    """Collects texts from many threads and runs them through one model in shared batches."""
+
+    def __init__(self, model_name: str, analyzer, max_batch: int = 64, max_wait_s: float = 0.01):
+        self.model_name = model_name
+        self.analyzer = analyzer
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{model_name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list) -> list:
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            deadline = time.perf_counter() + self.max_wait_s
+            while len(pending) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._closed = True
+                    break
+                pending.append(nxt)
+            # Identical texts (common in templated data) are scored once per batch
+            unique = list(dict.fromkeys(text for text, _ in pending))
+            try:
+                scored = dict(zip(unique, _call_model_batch(self.model_name, self.analyzer, unique)))
+            except Exception:
+                scored = {}
+            for text, future in pending:
+                future.set_result(scored.get(text))
+            if self._closed and self._queue.empty():
+                return
+
+def classify_texts(model_name: str, analyzer, texts: list) -> list:
+    """Score texts with a text-classification pipeline; returns one {label, score} dict (or None) per text."""
+    if not texts:
+        return []
+    batchers = _active_batchers.get()
+    if batchers and model_name in batchers:
+        return batchers[model_name].submit(texts)
+    results = []
+    for start in range(0, len(texts), INFERENCE_BATCH_SIZE):
+        results.extend(_call_model_batch(model_name, analyzer, texts[start:start + INFERENCE_BATCH_SIZE]))
+    return results
 
 def download_file(url: str) -> bytes:
     try:
@@ -88,21 +934,27 @@ def load_dataset(file_content: bytes, file_type: str) -> pd.DataFrame:
     try:
         # CSV files - try multiple encodings and delimiters
         if file_type == 'text/csv' or file_type.endswith('csv'):
+            attempts = 0
             for encoding in ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']:
+                attempts += 1
                 try:
                     df = pd.read_csv(io.BytesIO(file_content), encoding=encoding, on_bad_lines='skip')
                     if not df.empty:
+                        annotate_stage(parse_attempts=attempts, encoding=encoding, rows_out=len(df))
                         return df
                 except Exception:
                     continue
             # Try with different delimiters if comma fails
             for delimiter in [',', ';', '\t', '|']:
+                attempts += 1
                 try:
                     df = pd.read_csv(io.BytesIO(file_content), delimiter=delimiter, encoding='utf-8', on_bad_lines='skip')
                     if not df.empty and len(df.columns) > 1:
+                        annotate_stage(parse_attempts=attempts, delimiter=delimiter, rows_out=len(df))
                         return df
                 except Exception:
                     continue
+            annotate_stage(parse_attempts=attempts)
             raise ValueError("Could not parse CSV file with any known encoding or delimiter")
         
         # JSON files - handle arrays and objects
@@ -174,745 +1026,5011 @@ def load_dataset(file_content: bytes, file_type: str) -> pd.DataFrame:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to parse file: {str(e)}. Please check file format and encoding.")
 
-# -------- Bias Detection & Helpers --------
+# -------- Toxicity Cascade --------
+# Most texts that reach toxic-bert are obviously benign short strings. A cheap
+# first stage screens them: an Aho-Corasick matcher over a toxicity lexicon,
+# then (when one was trained offline with train_prefilter.py) a logistic model
+# over hashed word unigrams and bigrams, scored for all texts at once. Texts it
+# clears are answered as non-toxic without a model call; lexicon hits and
+# anything it is not confident about are escalated to the transformer, which
+# still makes every toxic call. Without a trained model nothing is cleared (a
+# 40-term lexicon is no screen for short slurs it does not list) unless
+# TOXICITY_SHORT_TEXT_WORDS opts into clearing texts of at most that many words
+# with no lexicon hit.
+
+TOXICITY_CASCADE_ENABLED = os.getenv("TOXICITY_CASCADE", "1") == "1"
+TOXICITY_PREFILTER_PATH = os.getenv("TOXICITY_PREFILTER_PATH", "")
+TOXICITY_SHORT_TEXT_WORDS = int(os.getenv("TOXICITY_SHORT_TEXT_WORDS", "0"))  # untrained screen only; 0 = clear nothing
+PREFILTER_HASH_DIM = 2 ** 18
+CASCADE_DECISIONS = ("benign", "lexicon", "uncertain", "suspicious")
+CASCADE_MIN_OBSERVED_TEXTS = 200  # screened texts before the observed escalation rate is trusted for planning
+# Whole-word terms (inflections listed explicitly); a trained pre-filter file carries its own lexicon
+DEFAULT_TOXICITY_LEXICON = (
+    "idiot", "idiots", "idiotic", "stupid", "moron", "morons", "dumb", "dumbass", "loser", "losers",
+    "hate", "hateful", "kill", "killed", "die", "shut up", "go to hell", "trash", "garbage", "pathetic",
+    "disgusting", "ugly", "worthless", "scum", "suck", "sucks", "screw you", "crap", "damn",
+    "fuck", "fucking", "fucked", "f*ck", "fck", "shit", "shitty", "sh*t", "bullshit",
+    "bitch", "bastard", "asshole",
+)
+
+TOXICITY_CASCADE_TEXTS = METRICS.register(Counter(
+    "biasbounty_toxicity_cascade_texts_total",
+    "Distinct texts screened by the toxicity pre-filter, by decision (all but benign go to the transformer).",
+    ("decision",)))
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over a text finds every lexicon term in it."""
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(p.lower() for p in patterns if p))
+        self._goto = [{}]
+        self._out = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+        # Failure links, breadth-first: the longest proper suffix that is also a trie path
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
 
-def detect_demographic_bias(df: pd.DataFrame) -> dict:
+    def find(self, text: str) -> list:
+        """Lexicon terms occurring in text as whole words (case-insensitive)."""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                start = end - len(self.patterns[index]) + 1
+                if ((start == 0 or not text[start - 1].isalnum())
+                        and (end + 1 == len(text) or not text[end + 1].isalnum())):
+                    found.append(self.patterns[index])
+        return found
+
+def hashed_text_features(texts: list, dim: int = PREFILTER_HASH_DIM):
     """
-    Enhanced demographic bias detection with multiple metrics.
-    Checks for imbalance in demographic columns and outcome correlations.
-    Returns detailed analysis with scores and specific findings.
+    Hashed word unigram and bigram features for a batch of texts as
+    (text index, feature bucket) arrays, plus the word count of each text.
     """
-    # Expanded list of demographic indicators
-    demographic_keywords = [
-        "gender", "sex", "race", "ethnicity", "age", "religion", 
-        "nationality", "disability", "orientation", "marital", 
-        "veteran", "color", "national_origin", "ancestry"
-    ]
-    
-    demographic_columns = []
-    for col in df.columns:
-        col_lower = str(col).lower()
-        if any(keyword in col_lower for keyword in demographic_keywords):
-            demographic_columns.append(str(col))
-    
-    if not demographic_columns:
-        return {
-            "score": 0.0,
-            "imbalanced_columns": [],
-            "demographic_columns_found": [],
-            "details": "No demographic columns detected in dataset"
-        }
-    
-    imbalance_data = []
-    total_bias_score = 0
-    
-    for col in demographic_columns:
-        try:
-            # Skip if column has too many unique values (likely not categorical)
-            if df[col].nunique() > 20:
-                continue
-            
-            value_counts = df[col].value_counts(normalize=True, dropna=True)
-            
-            if value_counts.empty:
-                continue
-            
-            # Calculate imbalance metrics
-            max_proportion = value_counts.max()
-            min_proportion = value_counts.min()
-            imbalance_ratio = max_proportion / min_proportion if min_proportion > 0 else float('inf')
-            
-            # Check for severe imbalance (>70% in one category)
-            if max_proportion > 0.70:
-                imbalance_severity = min(100, (max_proportion - 0.5) * 200)  # Scale to 0-100
-                imbalance_data.append({
-                    "column": str(col),
-                    "max_proportion": float(max_proportion),
-                    "imbalance_ratio": float(imbalance_ratio),
-                    "severity": float(imbalance_severity),
-                    "distribution": {str(k): float(v) for k, v in value_counts.head(5).items()}
-                })
-                total_bias_score += imbalance_severity
-        
-        except Exception as e:
-            print(f"Warning: Could not analyze column {col}: {e}")
-            continue
-    
-    # Calculate overall score (average of detected biases, capped at 100)
-    if imbalance_data:
-        avg_score = total_bias_score / len(imbalance_data)
-        overall_score = min(100, avg_score)
-    else:
-        overall_score = 0.0
-    
-    # Sort by severity
-    imbalance_data.sort(key=lambda x: x['severity'], reverse=True)
-    
-    return {
-        "score": float(overall_score),
-        "imbalanced_columns": [item["column"] for item in imbalance_data],
-        "demographic_columns_found": demographic_columns,
-        "imbalance_details": imbalance_data[:10],  # Top 10 most imbalanced
-        "details": f"Found {len(demographic_columns)} demographic columns, {len(imbalance_data)} show significant imbalance"
-    }
+    words = pd.Series(list(texts), dtype=object).astype(str).str.lower().str.findall(_WORD_PATTERN.pattern)
+    words = words.explode().dropna()
+    owner = words.index.to_numpy(dtype=np.int64)
+    hashed = pd.util.hash_array(words.to_numpy(dtype=object))
+    with np.errstate(over="ignore"):
+        bigram = hashed[:-1] * _SHINGLE_PRIME + hashed[1:]
+    same_text = owner[:-1] == owner[1:]
+    owners = np.concatenate([owner, owner[:-1][same_text]])
+    features = np.concatenate([hashed, bigram[same_text]]) % np.uint64(dim)
+    return owners, features.astype(np.int64), np.bincount(owner, minlength=len(texts))
 
-def detect_text_bias(df: pd.DataFrame) -> dict:
+class ToxicityPrefilter:
     """
-    Enhanced text bias detection with performance optimization.
-    Analyzes text for toxicity and sentiment using AI models.
-    Limits processing to prevent hangs on large datasets.
+    First stage of the toxicity cascade. screen() sorts texts into benign
+    (answered without the transformer), lexicon (a lexicon term matched),
+    suspicious (model probability >= suspicious_above) and uncertain; all but
+    benign are escalated. Decision counts are kept for /health and planning.
     """
-    text_columns = [col for col in df.columns if df[col].dtype == object or pd.api.types.is_string_dtype(df[col])]
-    
-    if not text_columns:
-        return {
-            "score": 0.0,
-            "toxic_texts": [],
-            "text_columns_found": [],
-            "details": "No text columns found for analysis"
-        }
-    
-    toxic_texts = []
-    toxic_count = 0
-    total_texts_analyzed = 0
-    
-    # CRITICAL FIX: Only analyze if models are loaded
-    if toxicity_analyzer is None:
-        print("[WARNING] Toxicity analyzer not loaded, skipping text bias detection")
+
+    def __init__(self, lexicon, weights: Optional[np.ndarray] = None, bias: float = 0.0,
+                 benign_below: float = 0.0, suspicious_above: float = 0.5, info: Optional[dict] = None):
+        self.lexicon_size = len(lexicon)
+        self.matcher = AhoCorasick(lexicon)
+        self.weights = weights
+        self.bias = float(bias)
+        self.benign_below = float(os.getenv("TOXICITY_BENIGN_BELOW", str(benign_below)))
+        self.suspicious_above = float(os.getenv("TOXICITY_SUSPICIOUS_ABOVE", str(suspicious_above)))
+        self.info = info or {}
+        self._lock = threading.Lock()
+        self._decisions = {decision: 0 for decision in CASCADE_DECISIONS}
+
+    @classmethod
+    def load(cls, path: str) -> "ToxicityPrefilter":
+        """Pre-filter from a train_prefilter.py file; lexicon-only when path is empty or unreadable."""
+        if not path:
+            return cls(DEFAULT_TOXICITY_LEXICON)
+        try:
+            with np.load(path, allow_pickle=False) as model:
+                prefilter = cls(
+                    model["lexicon"].tolist(), weights=model["weights"].astype(np.float32),
+                    bias=float(model["bias"]), benign_below=float(model["benign_below"]),
+                    suspicious_above=float(model["suspicious_above"]), info=json.loads(str(model["info"])),
+                )
+            print(f"[CASCADE] Loaded toxicity pre-filter {path} (benign below p={prefilter.benign_below:.3f})")
+            return prefilter
+        except Exception as e:
+            print(f"[WARNING] Could not load toxicity pre-filter {path}: {e}; using the lexicon only")
+            return cls(DEFAULT_TOXICITY_LEXICON)
+
+    def predict(self, texts: list) -> np.ndarray:
+        """Model probability that each text is toxic."""
+        owners, features, _ = hashed_text_features(texts, len(self.weights))
+        logits = self.bias + np.bincount(owners, weights=self.weights[features], minlength=len(texts))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def screen(self, texts: list):
+        """(decision per text, model probability per text or None without a trained model)."""
+        if self.weights is not None:
+            proba = self.predict(texts)
+            decisions = np.where(
+                proba < self.benign_below, "benign", np.where(proba >= self.suspicious_above, "suspicious", "uncertain")
+            ).astype(object)
+        elif TOXICITY_SHORT_TEXT_WORDS > 0:
+            proba = None
+            _, _, word_counts = hashed_text_features(texts)
+            decisions = np.where(word_counts <= TOXICITY_SHORT_TEXT_WORDS, "benign", "uncertain").astype(object)
+        else:
+            proba = None
+            decisions = np.full(len(texts), "uncertain", dtype=object)
+        decisions[[bool(self.matcher.find(text)) for text in texts]] = "lexicon"
+        return decisions, proba
+
+    def record(self, decisions, tally: Optional[dict] = None):
+        counts = pd.Series(decisions, dtype=object).value_counts()
+        with self._lock:
+            for decision, count in counts.items():
+                self._decisions[decision] += int(count)
+        for decision, count in counts.items():
+            TOXICITY_CASCADE_TEXTS.inc(int(count), decision=decision)
+            if tally is not None:
+                tally[decision] = tally.get(decision, 0) + int(count)
+
+    def thresholds(self) -> dict:
+        if self.weights is None:
+            return {"short_text_words": TOXICITY_SHORT_TEXT_WORDS}
+        return {"benign_below": self.benign_below, "suspicious_above": self.suspicious_above}
+
+    def escalation_rate(self) -> float:
+        """Observed share of screened texts sent to the transformer; 1.0 until enough have been seen."""
+        with self._lock:
+            screened = sum(self._decisions.values())
+            escalated = screened - self._decisions["benign"]
+        if not TOXICITY_CASCADE_ENABLED or screened < CASCADE_MIN_OBSERVED_TEXTS:
+            return 1.0
+        return escalated / screened
+
+    def status(self) -> dict:
+        with self._lock:
+            decisions = dict(self._decisions)
+        screened = sum(decisions.values())
         return {
-            "score": 0.0,
-            "toxic_texts": [],
-            "text_columns_found": list(map(str, text_columns)),
-            "details": "AI models not loaded - text bias detection skipped"
+            "enabled": TOXICITY_CASCADE_ENABLED,
+            "model": "hashed-linear" if self.weights is not None else "lexicon-only",
+            "lexicon_terms": self.lexicon_size, "thresholds": self.thresholds(), "training": self.info,
+            "texts_screened": screened, "decisions": decisions,
+            "escalation_rate": round((screened - decisions["benign"]) / screened, 4) if screened else None,
         }
-    
-    try:
-        for col in text_columns:
-            try:
-                texts = df[col].dropna().astype(str).tolist()
-                
-                # CRITICAL FIX: Limit to first 100 texts per column (was 1000)
-                # This prevents hanging on large datasets
-                texts_to_analyze = texts[:100]
-                total_texts_analyzed += len(texts_to_analyze)
-                
-                print(f"Analyzing {len(texts_to_analyze)} texts from column '{col}'...")
-                
-                for idx, text in enumerate(texts_to_analyze):
-                    # Skip very long texts (>500 chars) to prevent model timeout
-                    if len(text) > 500:
-                        text = text[:500]
-                    
-                    # Skip empty or very short texts
-                    if len(text.strip()) < 3:
-                        continue
-                    
-                    try:
-                        # CRITICAL FIX: Add timeout protection
-                        result = toxicity_analyzer(text, max_length=128, truncation=True)
-                        
-                        if isinstance(result, list) and result:
-                            label = result[0].get('label', '').lower()
-                            score = result[0].get('score', 0)
-                            
-                            if label == 'toxic' and score > 0.5:
-                                # Limit stored examples to prevent memory issues
-                                if len(toxic_texts) < 50:  # Max 50 examples
-                                    toxic_texts.append({
-                                        "column": col, 
-                                        "text": text[:200],  # Truncate for display
-                                        "confidence": float(score)
-                                    })
-                                toxic_count += 1
-                    
-                    except Exception as e:
-                        # Skip individual text errors silently
-                        if idx % 20 == 0:  # Log every 20th error
-                            print(f"Warning: Error analyzing text in '{col}': {str(e)[:100]}")
-                        continue
-                
-                print(f"Column '{col}': Found {toxic_count} toxic texts out of {len(texts_to_analyze)}")
-            
-            except Exception as e:
-                print(f"Warning: Could not analyze column '{col}': {str(e)}")
+
+TOXICITY_PREFILTER = ToxicityPrefilter.load(TOXICITY_PREFILTER_PATH)
+
+def classify_toxicity(texts: list, tally: Optional[dict] = None) -> list:
+    """
+    classify_texts("toxicity", ...) through the cascade. Texts the pre-filter
+    clears come back as {"label": "non-toxic", "score", "cascade": "prefilter"}
+    without a transformer call; identical texts are screened and scored once.
+    tally, if given, accumulates the decision counts (see cascade_report).
+    """
+    if not texts or not TOXICITY_CASCADE_ENABLED:
+        return classify_texts("toxicity", toxicity_analyzer, texts)
+    unique = list(dict.fromkeys(texts))
+    decisions, proba = TOXICITY_PREFILTER.screen(unique)
+    TOXICITY_PREFILTER.record(decisions, tally)
+    escalated = [text for text, decision in zip(unique, decisions) if decision != "benign"]
+    scored = dict(zip(escalated, classify_texts("toxicity", toxicity_analyzer, escalated)))
+    for i, (text, decision) in enumerate(zip(unique, decisions)):
+        if decision == "benign":
+            score = 1.0 - float(proba[i]) if proba is not None else 1.0
+            scored[text] = {"label": "non-toxic", "score": score, "cascade": "prefilter"}
+    return [scored[text] for text in texts]
+
+def cascade_report(tally: dict) -> dict:
+    """Per-call summary of a tally filled by classify_toxicity."""
+    screened = sum(tally.values())
+    escalated = screened - tally.get("benign", 0)
+    return {
+        "enabled": TOXICITY_CASCADE_ENABLED, "thresholds": TOXICITY_PREFILTER.thresholds(),
+        "texts_screened": screened, "escalated": escalated,
+        "escalation_rate": round(escalated / screened, 4) if screened else None,
+        "decisions": {decision: tally.get(decision, 0) for decision in CASCADE_DECISIONS},
+    }
+
+def toxicity_seconds_per_text() -> float:
+    """Expected transformer seconds per text sent into the cascade, for budgets and cost estimates."""
+    return seconds_per_text("toxicity") * TOXICITY_PREFILTER.escalation_rate()
+
+# -------- Compute Backends --------
+# The aggregations behind the detectors and charts (missing counts, quartiles,
+# moments, value counts, histograms) sit behind one interface. PandasBackend
+# works on an in-memory DataFrame. DuckDBBackend runs the same aggregations
+# as SQL directly over an uploaded file, multithreaded and spilling to disk,
+# so uploads too large for pandas can still be profiled.
+
+try:
+    import duckdb  # optional: enables out-of-core analysis of large uploads
+except ImportError:
+    duckdb = None
+
+COMPUTE_BACKEND = os.getenv("COMPUTE_BACKEND", "auto").lower()  # auto | duckdb | pandas
+MAX_IN_MEMORY_MB = 50
+MAX_OUT_OF_CORE_MB = int(os.getenv("MAX_OUT_OF_CORE_MB", "20480"))
+OUT_OF_CORE_SAMPLE_ROWS = int(os.getenv("OUT_OF_CORE_SAMPLE_ROWS", "100000"))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "")  # e.g. "4GB"; empty = DuckDB default
+DIGEST_QUANTILES = 200  # quantile points behind a DuckDB column's digest (profile catalog)
+
+class ComputeBackend:
+    """Aggregations over one dataset. Subclasses provide the engine; columns lists column names."""
+    name = "base"
+    columns: list = []
+
+    def row_count(self) -> int:
+        raise NotImplementedError
+
+    def numeric_columns(self) -> list:
+        raise NotImplementedError
+
+    def categorical_columns(self) -> list:
+        raise NotImplementedError
+
+    def missing_counts(self) -> dict:
+        raise NotImplementedError
+
+    def nunique(self, col: str) -> int:
+        raise NotImplementedError
+
+    def value_counts(self, col: str, normalize: bool = False, top_n: Optional[int] = None,
+                     as_text: bool = False) -> pd.Series:
+        """Counts per value, most frequent first. as_text counts missing values as 'nan'."""
+        raise NotImplementedError
+
+    def numeric_summary(self, cols: list) -> dict:
+        """{col: {count, mean, median, std, skew, kurtosis, q1, q3, min, max}} over non-missing values."""
+        raise NotImplementedError
+
+    def outlier_counts(self, summary: dict) -> dict:
+        """Values outside 1.5 IQR of the quartiles in summary, for every column with data."""
+        raise NotImplementedError
+
+    def histograms(self, summary: dict, bins: int = 10) -> dict:
+        raise NotImplementedError
+
+    def quantile_digest(self, col: str) -> "TDigest":
+        """Quantile sketch of a numeric column's non-missing values."""
+        raise NotImplementedError
+
+    def sample(self, n: int) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def _iqr_bounds(stats: dict):
+    iqr = stats["q3"] - stats["q1"]
+    if stats["count"] == 0 or pd.isna(iqr) or iqr == 0:
+        return None
+    return stats["q1"] - 1.5 * iqr, stats["q3"] + 1.5 * iqr
+
+def _histogram_edges(stats: dict, bins: int) -> np.ndarray:
+    """Same edges np.histogram picks for the data's range."""
+    low, high = stats["min"], stats["max"]
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+class PandasBackend(ComputeBackend):
+    name = "pandas"
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.columns = [str(c) for c in df.columns]
+        self._by_name = {str(c): c for c in df.columns}
+
+    def _series(self, col: str) -> pd.Series:
+        return self.df[self._by_name[col]]
+
+    def row_count(self) -> int:
+        return len(self.df)
+
+    def numeric_columns(self) -> list:
+        return [str(c) for c in self.df.select_dtypes(include=[np.number]).columns]
+
+    def categorical_columns(self) -> list:
+        return [str(c) for c in self.df.columns if self.df[c].dtype == object or pd.api.types.is_string_dtype(self.df[c])]
+
+    def missing_counts(self) -> dict:
+        return {str(k): int(v) for k, v in self.df.isna().sum().to_dict().items()}
+
+    def nunique(self, col: str) -> int:
+        return int(self._series(col).nunique())
+
+    def value_counts(self, col, normalize=False, top_n=None, as_text=False) -> pd.Series:
+        series = self._series(col)
+        if as_text:
+            series = series.astype(str)
+        counts = series.value_counts(normalize=normalize, dropna=True)
+        return counts.head(top_n) if top_n is not None else counts
+
+    def numeric_summary(self, cols: list) -> dict:
+        summary = {}
+        for col in cols:
+            series = self._series(col).dropna().astype(float)
+            if len(series) == 0:
+                summary[col] = {"count": 0}
                 continue
-        
-        # Calculate score based on proportion of toxic content
-        if total_texts_analyzed > 0:
-            toxicity_rate = (toxic_count / total_texts_analyzed) * 100
-            score = min(100, toxicity_rate * 2)  # Scale up for visibility
+            q1, q3 = series.quantile([0.25, 0.75])
+            summary[col] = {
+                "count": len(series), "mean": series.mean(), "median": series.median(),
+                "std": series.std(), "skew": series.skew(), "kurtosis": series.kurtosis(),
+                "q1": q1, "q3": q3, "min": series.min(), "max": series.max(),
+            }
+        return summary
+
+    def outlier_counts(self, summary: dict) -> dict:
+        counts = {}
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            bounds = _iqr_bounds(stats)
+            if bounds is None:
+                counts[col] = 0
+                continue
+            series = self._series(col).dropna().astype(float)
+            counts[col] = int(((series < bounds[0]) | (series > bounds[1])).sum())
+        return counts
+
+    def histograms(self, summary: dict, bins: int = 10) -> dict:
+        result = {}
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            counts, bin_edges = np.histogram(self._series(col).dropna().astype(float), bins=bins)
+            result[col] = {
+                "bin_edges": list(map(float, bin_edges.tolist())),
+                "counts": list(map(int, counts.tolist()))
+            }
+        return result
+
+    def quantile_digest(self, col: str) -> "TDigest":
+        digest = TDigest()
+        digest.update(self._series(col).dropna().to_numpy(dtype=float))
+        return digest
+
+    def sample(self, n: int) -> pd.DataFrame:
+        return self.df if len(self.df) <= n else self.df.sample(n=n, random_state=42)
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+class DuckDBBackend(ComputeBackend):
+    """
+    SQL over a CSV/JSON file via DuckDB. The file is parsed once into a
+    columnar table in a scratch database under JOBS_DIR (paged to disk when it
+    outgrows memory); each aggregate family is then one multithreaded scan
+    for all columns. Quartiles use DuckDB's approx_quantile (t-digest), since
+    exact quantiles would hold every value.
+    """
+    name = "duckdb"
+    NUMERIC_TYPES = (
+        "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+        "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "REAL", "DECIMAL"
+    )
+
+    def __init__(self, path: str, file_type: str):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed")
+        self.db_path = os.path.join(JOBS_DIR, f"scan_{uuid.uuid4()}.duckdb")
+        self.con = duckdb.connect(self.db_path)
+        self._summaries: Dict[tuple, dict] = {}
+        spill_dir = os.path.join(JOBS_DIR, "duckdb_tmp")
+        os.makedirs(spill_dir, exist_ok=True)
+        self.con.execute(f"SET temp_directory = '{spill_dir}'")
+        if DUCKDB_MEMORY_LIMIT:
+            self.con.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+        source = path.replace("'", "''")
+        if "json" in file_type:
+            reader = f"read_json_auto('{source}')"
         else:
-            score = 0.0
-        
+            # No BOOLEAN candidate: pandas keeps Yes/No style columns as text, and so do we
+            reader = (
+                f"read_csv_auto('{source}', sample_size = 100000, "
+                "auto_type_candidates = ['BIGINT', 'DOUBLE', 'DATE', 'TIMESTAMP', 'VARCHAR'])"
+            )
+        try:
+            self.con.execute(f"CREATE TABLE data AS SELECT * FROM {reader}")
+            described = self.con.execute("DESCRIBE data").fetchall()
+        except Exception as e:
+            self.close()
+            raise HTTPException(status_code=400, detail=f"Could not parse file: {str(e)[:200]}")
+        self.types = {str(row[0]): str(row[1]).upper() for row in described}
+        self.columns = list(self.types)
+
+    def _one(self, sql: str):
+        return self.con.execute(sql).fetchone()
+
+    def row_count(self) -> int:
+        return int(self._one("SELECT count(*) FROM data")[0])
+
+    def numeric_columns(self) -> list:
+        return [c for c, t in self.types.items() if t.split("(")[0] in self.NUMERIC_TYPES]
+
+    def categorical_columns(self) -> list:
+        return [c for c, t in self.types.items() if t == "VARCHAR" or t.startswith(("DATE", "TIME"))]
+
+    def missing_counts(self) -> dict:
+        if not self.columns:
+            return {}
+        row = self._one("SELECT " + ", ".join(f"count(*) - count({_quote_ident(c)})" for c in self.columns) + " FROM data")
+        return {c: int(v) for c, v in zip(self.columns, row)}
+
+    def nunique(self, col: str) -> int:
+        return int(self._one(f"SELECT count(DISTINCT {_quote_ident(col)}) FROM data")[0])
+
+    def value_counts(self, col, normalize=False, top_n=None, as_text=False) -> pd.Series:
+        q = _quote_ident(col)
+        if as_text:
+            value, where = f"coalesce(CAST({q} AS VARCHAR), 'nan')", ""
+        else:
+            value, where = q, f"WHERE {q} IS NOT NULL"
+        limit = f"LIMIT {int(top_n)}" if top_n is not None else ""
+        rows = self.con.execute(
+            f"SELECT {value} AS v, count(*) AS n FROM data {where} GROUP BY 1 ORDER BY n DESC, v {limit}"
+        ).fetchall()
+        counts = pd.Series([r[1] for r in rows], index=[r[0] for r in rows], dtype=float if normalize else int)
+        if normalize and len(counts):
+            total = self._one(f"SELECT count({q}) FROM data")[0]
+            counts = counts / max(total, 1)
+        return counts
+
+    def numeric_summary(self, cols: list) -> dict:
+        if not cols:
+            return {}
+        if tuple(cols) in self._summaries:
+            return self._summaries[tuple(cols)]
+        fields = ["count", "mean", "std", "skew", "kurtosis", "min", "max", "quartiles"]
+        parts = []
+        for col in cols:
+            x = f"CAST({_quote_ident(col)} AS DOUBLE)"
+            parts += [
+                f"count({x})", f"avg({x})", f"stddev_samp({x})", f"skewness({x})", f"kurtosis({x})",
+                f"min({x})", f"max({x})", f"approx_quantile({x}, [0.25, 0.5, 0.75])"
+            ]
+        row = self._one("SELECT " + ", ".join(parts) + " FROM data")
+        summary = {}
+        for i, col in enumerate(cols):
+            values = dict(zip(fields, row[i * len(fields):(i + 1) * len(fields)]))
+            quartiles = values.pop("quartiles") or [None] * 3
+            values.update(q1=quartiles[0], median=quartiles[1], q3=quartiles[2])
+            stats = {f: (float(v) if v is not None else float("nan")) for f, v in values.items()}
+            stats["count"] = int(values["count"])
+            summary[col] = stats
+        self._summaries[tuple(cols)] = summary
+        return summary
+
+    def outlier_counts(self, summary: dict) -> dict:
+        counts, parts = {}, []
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            bounds = _iqr_bounds(stats)
+            if bounds is None:
+                counts[col] = 0
+                continue
+            x = f"CAST({_quote_ident(col)} AS DOUBLE)"
+            parts.append((col, f"count_if({x} < {float(bounds[0])!r} OR {x} > {float(bounds[1])!r})"))
+        if parts:
+            row = self._one("SELECT " + ", ".join(sql for _, sql in parts) + " FROM data")
+            counts.update({col: int(v) for (col, _), v in zip(parts, row)})
+        return counts
+
+    def histograms(self, summary: dict, bins: int = 10) -> dict:
+        edges, parts = {}, []
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            edges[col] = _histogram_edges(stats, bins)
+            low, width = float(edges[col][0]), float(edges[col][-1] - edges[col][0]) / bins
+            x = f"CAST({_quote_ident(col)} AS DOUBLE)"
+            # least() skips NULLs, so without the filter missing values land in the last bin
+            parts.append(
+                f"histogram(least(floor(({x} - {low!r}) / {width!r}), {bins - 1})::INTEGER) FILTER (WHERE {x} IS NOT NULL)"
+            )
+        if not parts:
+            return {}
+        row = self._one("SELECT " + ", ".join(parts) + " FROM data")
+        result = {}
+        for (col, col_edges), buckets in zip(edges.items(), row):
+            counts = np.zeros(bins, dtype=np.int64)
+            for bucket, count in (buckets or {}).items():
+                if bucket is not None:
+                    counts[int(bucket)] += count
+            result[col] = {
+                "bin_edges": list(map(float, col_edges.tolist())),
+                "counts": list(map(int, counts.tolist()))
+            }
+        return result
+
+    def quantile_digest(self, col: str) -> "TDigest":
+        """A digest of DIGEST_QUANTILES equal-weight quantile points (one approx_quantile pass)."""
+        x = f"CAST({_quote_ident(col)} AS DOUBLE)"
+        grid = ", ".join(repr((i + 0.5) / DIGEST_QUANTILES) for i in range(DIGEST_QUANTILES))
+        count, low, high, points = self._one(f"SELECT count({x}), min({x}), max({x}), approx_quantile({x}, [{grid}]) FROM data")
+        digest = TDigest()
+        if count:
+            digest.means = np.asarray(points, dtype=float)
+            digest.weights = np.full(len(points), count / len(points))
+            digest.min, digest.max = float(low), float(high)
+        return digest
+
+    def sample(self, n: int) -> pd.DataFrame:
+        return self.con.execute(f"SELECT * FROM data USING SAMPLE reservoir({int(n)} ROWS) REPEATABLE (42)").df()
+
+    def close(self):
+        self.con.close()
+        for path in (self.db_path, self.db_path + ".wal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def as_compute_backend(data) -> ComputeBackend:
+    """Detectors accept either a DataFrame or an already-open backend."""
+    return data if isinstance(data, ComputeBackend) else PandasBackend(data)
+
+def out_of_core_available(file_type: str) -> bool:
+    return (
+        COMPUTE_BACKEND in ("auto", "duckdb") and duckdb is not None
+        and ("csv" in file_type or "json" in file_type)
+    )
+
+# -------- Streaming Sketches --------
+# Fixed-size summaries updated chunk by chunk, so /preview can refine its
+# approximate results while the file is still being scanned: HyperLogLog for
+# distinct counts, a merging t-digest for quantiles, Space-Saving for top-k
+# categories, and mergeable central moments for mean/std/skew/kurtosis.
+# Each one also merges with a sketch of other rows and round-trips through a
+# JSON state, which is how /partial results from several instances combine.
+
+class HyperLogLog:
+    """Distinct-count estimate from 2^p max-rank registers (p=12: ~1.6% standard error)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+        width = 64 - self.p
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # frexp's exponent is the bit length (exact: rest has at most 52 bits)
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, width + 1, width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_state(self) -> dict:
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "HyperLogLog":
+        sketch = cls(state["p"])
+        sketch.registers = np.frombuffer(base64.b64decode(state["registers"]), dtype=np.uint8).copy()
+        return sketch
+
+    def count(self) -> float:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-self.registers.astype(float)))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return float(estimate)
+
+class TDigest:
+    """
+    Merging t-digest. Centroids are re-clustered so none spans more than one
+    unit of the arcsine scale function, which keeps them small in the tails
+    and bounds the digest to about compression/2 centroids.
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        self._absorb(values, np.ones(len(values)), float(values.min()), float(values.max()))
+
+    def merge(self, other: "TDigest"):
+        if other.count:
+            self._absorb(other.means, other.weights, other.min, other.max)
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray, lo: float, hi: float):
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        totals = np.bincount(cluster, weights=weights)
+        keep = totals > 0
+        self.means = (np.bincount(cluster, weights=weights * means)[keep] / totals[keep])
+        self.weights = totals[keep]
+
+    def to_state(self) -> dict:
+        empty = self.count == 0
         return {
-            "score": float(score),
-            "toxic_texts": toxic_texts[:20],  # Return max 20 examples
-            "text_columns_found": list(map(str, text_columns)),
-            "texts_analyzed": total_texts_analyzed,
-            "toxic_count": toxic_count,
-            "details": f"Analyzed {total_texts_analyzed} texts across {len(text_columns)} columns, found {toxic_count} toxic instances"
+            "compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+            "min": None if empty else self.min, "max": None if empty else self.max,
         }
-    
-    except Exception as e:
-        print(f"Error in text bias detection: {str(e)}")
+
+    @classmethod
+    def from_state(cls, state: dict) -> "TDigest":
+        sketch = cls(state["compression"])
+        sketch.means = np.asarray(state["means"], dtype=float)
+        sketch.weights = np.asarray(state["weights"], dtype=float)
+        if state["min"] is not None:
+            sketch.min, sketch.max = float(state["min"]), float(state["max"])
+        return sketch
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def _positions(self):
+        cumulative = np.cumsum(self.weights)
+        return (
+            np.concatenate([[self.min], self.means, [self.max]]),
+            np.concatenate([[0.0], cumulative - self.weights / 2, [cumulative[-1]]]),
+        )
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        means, ranks = self._positions()
+        return float(np.interp(q * self.count, ranks, means))
+
+    def cdf(self, x) -> np.ndarray:
+        if self.count == 0:
+            return np.zeros_like(np.asarray(x, dtype=float))
+        means, ranks = self._positions()
+        return np.interp(x, means, ranks) / self.count
+
+class SpaceSaving:
+    """
+    Top-k frequent values. Each chunk's exact counts are merged as a
+    Space-Saving summary: a value missing from one side is charged that
+    side's smallest tracked count, so counts are upper bounds.
+    """
+
+    def __init__(self, k: int = 64):
+        self.k = k
+        self.counts: Dict[Any, int] = {}
+
+    def _floor(self) -> int:
+        return min(self.counts.values()) if len(self.counts) >= self.k else 0
+
+    def update(self, values: pd.Series):
+        chunk = values.value_counts()
+        chunk_floor = int(chunk.iloc[self.k]) if len(chunk) > self.k else 0
+        self._combine({key: int(count) for key, count in chunk.head(self.k).items()}, chunk_floor)
+
+    def merge(self, other: "SpaceSaving"):
+        self._combine(other.counts, other._floor())
+
+    def _combine(self, counts: dict, floor: int):
+        own_floor = self._floor()
+        merged = {
+            key: self.counts.get(key, own_floor) + counts.get(key, floor)
+            for key in set(self.counts) | set(counts)
+        }
+        self.counts = dict(heapq.nlargest(self.k, merged.items(), key=lambda item: item[1]))
+
+    def to_state(self) -> dict:
+        return {"k": self.k, "counts": [[key, count] for key, count in self.counts.items()]}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SpaceSaving":
+        sketch = cls(state["k"])
+        sketch.counts = {key: int(count) for key, count in state["counts"]}
+        return sketch
+
+    def top(self, n: Optional[int] = None) -> list:
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])
+        return ranked[:n] if n is not None else ranked
+
+class RunningMoments:
+    """Count, mean and central moments M2..M4, merged per chunk (Pébay's pairwise update)."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = self.m2 = self.m3 = self.m4 = 0.0
+
+    def update(self, values: np.ndarray):
+        nb = len(values)
+        if nb == 0:
+            return
+        mean_b = float(values.mean())
+        d = values - mean_b
+        self._combine(nb, mean_b, float((d ** 2).sum()), float((d ** 3).sum()), float((d ** 4).sum()))
+
+    def merge(self, other: "RunningMoments"):
+        if other.n:
+            self._combine(other.n, other.mean, other.m2, other.m3, other.m4)
+
+    def _combine(self, nb: int, mean_b: float, m2b: float, m3b: float, m4b: float):
+        na, n = self.n, self.n + nb
+        delta = mean_b - self.mean
+        m2, m3 = self.m2, self.m3
+        self.m4 += m4b + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / n ** 3 \
+            + 6 * delta ** 2 * (na * na * m2b + nb * nb * m2) / n ** 2 + 4 * delta * (na * m3b - nb * m3) / n
+        self.m3 += m3b + delta ** 3 * na * nb * (na - nb) / n ** 2 + 3 * delta * (na * m2b - nb * m2) / n
+        self.m2 += m2b + delta ** 2 * na * nb / n
+        self.mean += delta * nb / n
+        self.n = n
+
+    def to_state(self) -> dict:
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "m3": self.m3, "m4": self.m4}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "RunningMoments":
+        sketch = cls()
+        sketch.n = int(state["n"])
+        sketch.mean, sketch.m2, sketch.m3, sketch.m4 = (float(state[k]) for k in ("mean", "m2", "m3", "m4"))
+        return sketch
+
+    def stats(self) -> dict:
+        """std, and skew/kurtosis with the same bias corrections pandas applies."""
+        n = self.n
+        std = np.sqrt(self.m2 / (n - 1)) if n > 1 else float("nan")
+        skew = kurtosis = float("nan")
+        if n > 2 and self.m2 > 0:
+            g1 = (self.m3 / n) / (self.m2 / n) ** 1.5
+            skew = g1 * np.sqrt(n * (n - 1)) / (n - 2)
+        if n > 3 and self.m2 > 0:
+            g2 = (self.m4 / n) / (self.m2 / n) ** 2 - 3
+            kurtosis = ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+        return {"mean": self.mean, "std": float(std), "skew": float(skew), "kurtosis": float(kurtosis)}
+
+class SketchBackend(ComputeBackend):
+    """
+    ComputeBackend answered from sketches fed chunk by chunk, so the regular
+    detectors produce approximate results over the rows scanned so far.
+    Column kinds are fixed from the row sample's dtypes, or from `schema`
+    (see schema()) so that sketches of different shards line up for merge().
+    """
+    name = "sketch"
+
+    def __init__(self, sample: pd.DataFrame, schema: Optional[dict] = None):
+        self.sample_df = sample
+        if schema is not None:
+            self.columns, self._numeric, self._categorical = (
+                list(schema["columns"]), list(schema["numeric"]), list(schema["categorical"])
+            )
+        else:
+            self.columns = [str(c) for c in sample.columns]
+            self._numeric = [str(c) for c in sample.select_dtypes(include=[np.number]).columns]
+            self._categorical = [
+                str(c) for c in sample.columns if sample[c].dtype == object or pd.api.types.is_string_dtype(sample[c])
+            ]
+        self.rows = 0
+        self.missing = {c: 0 for c in self.columns}
+        self.distinct = {c: HyperLogLog() for c in self.columns}
+        self.digests = {c: TDigest() for c in self._numeric}
+        self.moments = {c: RunningMoments() for c in self._numeric}
+        # Numeric protected attributes (age, coded groups) also need group counts for the demographic detector
+        numeric_groups = find_demographic_columns(pd.DataFrame(columns=self._numeric))
+        self.top_values = {c: SpaceSaving() for c in self._categorical + numeric_groups}
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = chunk.rename(columns=str)
+        self.rows += len(chunk)
+        for col in self.columns:
+            if col not in chunk.columns:
+                self.missing[col] += len(chunk)
+                continue
+            if col in self.digests:
+                values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+                values = values[~np.isnan(values)]
+                self.missing[col] += len(chunk) - len(values)
+                self.distinct[col].update(pd.util.hash_array(values))
+                self.digests[col].update(values)
+                self.moments[col].update(values)
+                if col in self.top_values:
+                    self.top_values[col].update(pd.Series(values))
+            else:
+                present = chunk[col].dropna().astype(str)
+                self.missing[col] += len(chunk) - len(present)
+                self.distinct[col].update(pd.util.hash_array(present.to_numpy(dtype=object)))
+                if col in self.top_values:
+                    self.top_values[col].update(present)
+
+    def schema(self) -> dict:
+        return {"columns": self.columns, "numeric": self._numeric, "categorical": self._categorical}
+
+    def merge(self, other: "SketchBackend"):
+        """Fold in the sketches of other rows with the same schema (the row sample is left alone)."""
+        if other.schema() != self.schema():
+            raise ValueError("Cannot merge sketches with different column schemas")
+        self.rows += other.rows
+        for col in self.columns:
+            self.missing[col] += other.missing[col]
+            self.distinct[col].merge(other.distinct[col])
+        for col in self._numeric:
+            self.digests[col].merge(other.digests[col])
+            self.moments[col].merge(other.moments[col])
+        for col, top in self.top_values.items():
+            top.merge(other.top_values[col])
+
+    def to_state(self) -> dict:
+        """JSON-serialisable sketches, without the row sample."""
         return {
-            "score": 0.0,
-            "toxic_texts": [],
-            "text_columns_found": list(map(str, text_columns)),
-            "details": f"Text analysis failed: {str(e)}"
+            "schema": self.schema(), "rows": self.rows, "missing": self.missing,
+            "distinct": {c: s.to_state() for c, s in self.distinct.items()},
+            "digests": {c: s.to_state() for c, s in self.digests.items()},
+            "moments": {c: s.to_state() for c, s in self.moments.items()},
+            "top_values": {c: s.to_state() for c, s in self.top_values.items()},
         }
 
-# (keeping your same detect_statistical_bias,
-# calculate_overall_bias_score, generate_recommendations functions here unchanged)
+    @classmethod
+    def from_state(cls, state: dict, sample: Optional[pd.DataFrame] = None) -> "SketchBackend":
+        schema = state["schema"]
+        backend = cls(sample if sample is not None else pd.DataFrame(columns=schema["columns"]), schema)
+        backend.rows = int(state["rows"])
+        backend.missing = {c: int(v) for c, v in state["missing"].items()}
+        backend.distinct = {c: HyperLogLog.from_state(v) for c, v in state["distinct"].items()}
+        backend.digests = {c: TDigest.from_state(v) for c, v in state["digests"].items()}
+        backend.moments = {c: RunningMoments.from_state(v) for c, v in state["moments"].items()}
+        backend.top_values = {c: SpaceSaving.from_state(v) for c, v in state["top_values"].items()}
+        return backend
+
+    def row_count(self) -> int:
+        return self.rows
+
+    def numeric_columns(self) -> list:
+        return list(self._numeric)
+
+    def categorical_columns(self) -> list:
+        return list(self._categorical)
+
+    def missing_counts(self) -> dict:
+        return dict(self.missing)
+
+    def nunique(self, col: str) -> int:
+        return int(round(self.distinct[col].count()))
+
+    def value_counts(self, col, normalize=False, top_n=None, as_text=False) -> pd.Series:
+        top = self.top_values[col].top(top_n) if col in self.top_values else []
+        counts = pd.Series([c for _, c in top], index=[v for v, _ in top], dtype=float if normalize else int)
+        if normalize and len(counts):
+            counts = counts / max(self.rows - self.missing[col], 1)
+        return counts
 
-def clean_dataset(df: pd.DataFrame, event_callback=None) -> pd.DataFrame:
+    def numeric_summary(self, cols: list) -> dict:
+        summary = {}
+        for col in cols:
+            digest = self.digests[col]
+            if digest.count == 0:
+                summary[col] = {"count": 0}
+                continue
+            summary[col] = {
+                "count": int(digest.count), **self.moments[col].stats(),
+                "median": digest.quantile(0.5), "q1": digest.quantile(0.25), "q3": digest.quantile(0.75),
+                "min": digest.min, "max": digest.max,
+            }
+        return summary
+
+    def outlier_counts(self, summary: dict) -> dict:
+        counts = {}
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            bounds = _iqr_bounds(stats)
+            if bounds is None:
+                counts[col] = 0
+                continue
+            below, above = self.digests[col].cdf([bounds[0], bounds[1]])
+            counts[col] = int(round((below + 1 - above) * stats["count"]))
+        return counts
+
+    def histograms(self, summary: dict, bins: int = 10) -> dict:
+        result = {}
+        for col, stats in summary.items():
+            if stats["count"] == 0:
+                continue
+            edges = _histogram_edges(stats, bins)
+            cdf = self.digests[col].cdf(edges)
+            cdf[0], cdf[-1] = 0.0, 1.0
+            result[col] = {
+                "bin_edges": list(map(float, edges.tolist())),
+                "counts": [int(round(c)) for c in np.diff(cdf) * stats["count"]]
+            }
+        return result
+
+    def quantile_digest(self, col: str) -> "TDigest":
+        return self.digests[col]
+
+    def sample(self, n: int) -> pd.DataFrame:
+        return self.sample_df.head(n)
+
+# -------- Bias Detection & Helpers --------
+
+# Column-name indicators of protected attributes
+DEMOGRAPHIC_KEYWORDS = [
+    "gender", "sex", "race", "ethnicity", "age", "religion", 
+    "nationality", "disability", "orientation", "marital", 
+    "veteran", "color", "national_origin", "ancestry"
+]
+
+def find_demographic_columns(df) -> list:
+    """Names of columns whose name suggests a protected attribute."""
+    return [str(col) for col in df.columns if any(keyword in str(col).lower() for keyword in DEMOGRAPHIC_KEYWORDS)]
+
+def detect_demographic_bias(df) -> dict:
     """
-    ADVANCED BIAS REDUCTION ALGORITHM
-    State-of-the-art dataset improvement with multi-stage processing:
+    Enhanced demographic bias detection with multiple metrics.
+    Checks for imbalance in demographic columns and outcome correlations.
+    Returns detailed analysis with scores and specific findings.
+    Accepts a DataFrame or a ComputeBackend.
+    """
+    backend = as_compute_backend(df)
+    demographic_columns = find_demographic_columns(backend)
     
-    Stage 1: Smart Missing Value Imputation
-    Stage 2: Aggressive Demographic Balancing (50-70% reduction)
-    Stage 3: Toxic Content Filtering (AI-powered)
-    Stage 4: Statistical Normalization & Outlier Removal
-    Stage 5: Cross-correlation Bias Mitigation
+    if not demographic_columns:
+        return {
+            "score": 0.0,
+            "imbalanced_columns": [],
+            "demographic_columns_found": [],
+            "details": "No demographic columns detected in dataset"
+        }
     
-    Expected Bias Reduction: 50-70% from original score
+    imbalance_data = []
+    total_bias_score = 0
+    
+    for col in demographic_columns:
+        try:
+            # Skip if column has too many unique values (likely not categorical)
+            if backend.nunique(col) > 20:
+                continue
+            
+            value_counts = backend.value_counts(col, normalize=True)
+            
+            if value_counts.empty:
+                continue
+            
+            # Calculate imbalance metrics
+            max_proportion = value_counts.max()
+            min_proportion = value_counts.min()
+            imbalance_ratio = max_proportion / min_proportion if min_proportion > 0 else float('inf')
+            
+            # Check for severe imbalance (>70% in one category)
+            if max_proportion > 0.70:
+                imbalance_severity = min(100, (max_proportion - 0.5) * 200)  # Scale to 0-100
+                imbalance_data.append({
+                    "column": str(col),
+                    "max_proportion": float(max_proportion),
+                    "imbalance_ratio": float(imbalance_ratio),
+                    "severity": float(imbalance_severity),
+                    "distribution": {str(k): float(v) for k, v in value_counts.head(5).items()}
+                })
+                total_bias_score += imbalance_severity
+        
+        except Exception as e:
+            print(f"Warning: Could not analyze column {col}: {e}")
+            continue
+    
+    # Calculate overall score (average of detected biases, capped at 100)
+    if imbalance_data:
+        avg_score = total_bias_score / len(imbalance_data)
+        overall_score = min(100, avg_score)
+    else:
+        overall_score = 0.0
+    
+    # Sort by severity
+    imbalance_data.sort(key=lambda x: x['severity'], reverse=True)
+    
+    return {
+        "score": float(overall_score),
+        "imbalanced_columns": [item["column"] for item in imbalance_data],
+        "demographic_columns_found": demographic_columns,
+        "imbalance_details": imbalance_data[:10],  # Top 10 most imbalanced
+        "details": f"Found {len(demographic_columns)} demographic columns, {len(imbalance_data)} show significant imbalance"
+    }
+
+def detect_text_bias(df: pd.DataFrame) -> dict:
     """
-    print("[INFO] Starting advanced bias reduction pipeline...")
-    cleaned = df.dropna(how='all').copy()
-    original_rows = len(cleaned)
+    Enhanced text bias detection with performance optimization.
+    Analyzes text for toxicity and sentiment using AI models.
+    Limits processing to prevent hangs on large datasets.
+    """
+    text_columns = [col for col in df.columns if df[col].dtype == object or pd.api.types.is_string_dtype(df[col])]
+    
+    if not text_columns:
+        return {
+            "score": 0.0,
+            "toxic_texts": [],
+            "text_columns_found": [],
+            "details": "No text columns found for analysis"
+        }
+    
+    toxic_texts = []
+    toxic_count = 0
+    total_texts_analyzed = 0
+    cascade = {}
+    
+    # CRITICAL FIX: Only analyze if models are loaded
+    if toxicity_analyzer is None:
+        print("[WARNING] Toxicity analyzer not loaded, skipping text bias detection")
+        return {
+            "score": 0.0,
+            "toxic_texts": [],
+            "text_columns_found": list(map(str, text_columns)),
+            "details": "AI models not loaded - text bias detection skipped"
+        }
+    
+    try:
+        for col_idx, col in enumerate(text_columns):
+            try:
+                texts = df[col].dropna().astype(str).tolist()
+                
+                # CRITICAL FIX: Limit to first 100 texts per column (was 1000)
+                # This prevents hanging on large datasets. Under a request budget
+                # the remaining columns share whatever the stage can afford.
+                sample_size = budget_sample_size(
+                    "detect.text", len(texts), 100, toxicity_seconds_per_text(),
+                    parts=len(text_columns) - col_idx
+                )
+                texts_to_analyze = texts[:sample_size]
+                total_texts_analyzed += len(texts_to_analyze)
+                
+                print(f"Analyzing {len(texts_to_analyze)} texts from column '{col}'...")
+                
+                # Skip very long texts (>500 chars) to prevent model timeout,
+                # and skip empty or very short texts
+                candidates = [text[:500] for text in texts_to_analyze if len(text[:500].strip()) >= 3]
+                
+                for start in range(0, len(candidates), INFERENCE_BATCH_SIZE):
+                    if budget_expired("detect.text"):
+                        skipped = len(candidates) - start
+                        budget_cut_short("detect.text", skipped)
+                        total_texts_analyzed -= skipped
+                        break
+                    
+                    chunk = candidates[start:start + INFERENCE_BATCH_SIZE]
+                    for text, result in zip(chunk, classify_toxicity(chunk, cascade)):
+                        # Individual failures come back as None and are skipped
+                        if not result:
+                            continue
+                        label = result.get('label', '').lower()
+                        score = result.get('score', 0)
+                        
+                        if label == 'toxic' and score > 0.5:
+                            # Limit stored examples to prevent memory issues
+                            if len(toxic_texts) < 50:  # Max 50 examples
+                                toxic_texts.append({
+                                    "column": col, 
+                                    "text": text[:200],  # Truncate for display
+                                    "confidence": float(score)
+                                })
+                            toxic_count += 1
+                
+                print(f"Column '{col}': Found {toxic_count} toxic texts out of {len(texts_to_analyze)}")
+            
+            except Exception as e:
+                print(f"Warning: Could not analyze column '{col}': {str(e)}")
+                continue
+        
+        # Calculate score based on proportion of toxic content
+        if total_texts_analyzed > 0:
+            toxicity_rate = (toxic_count / total_texts_analyzed) * 100
+            score = min(100, toxicity_rate * 2)  # Scale up for visibility
+        else:
+            score = 0.0
+        
+        return {
+            "score": float(score),
+            "toxic_texts": toxic_texts[:20],  # Return max 20 examples
+            "text_columns_found": list(map(str, text_columns)),
+            "texts_analyzed": total_texts_analyzed,
+            "toxic_count": toxic_count,
+            "cascade": cascade_report(cascade),
+            "details": f"Analyzed {total_texts_analyzed} texts across {len(text_columns)} columns, found {toxic_count} toxic instances"
+        }
+    
+    except Exception as e:
+        print(f"Error in text bias detection: {str(e)}")
+        return {
+            "score": 0.0,
+            "toxic_texts": [],
+            "text_columns_found": list(map(str, text_columns)),
+            "details": f"Text analysis failed: {str(e)}"
+        }
+
+# -------- Near-duplicate Detection --------
+# Rows are reduced to sets of hashed tokens (word 3-gram shingles from text
+# columns, column=value tokens from the rest), summarised as MinHash
+# signatures, and bucketed with LSH banding so only rows sharing a band are
+# compared. Clusters are the connected components of verified pairs.
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+NEAR_DUPLICATE_NUM_PERM = 64
+NEAR_DUPLICATE_BANDS = 16
+NEAR_DUPLICATE_COLLAPSE = os.getenv("NEAR_DUPLICATE_COLLAPSE", "0") == "1"
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_SHINGLE_PRIME = np.uint64(0x100000001B3)
+# Odd multipliers and offsets for the multiply-shift hash family, fixed so clusters are reproducible
+_MINHASH_PARAMS = np.random.default_rng(2024).integers(
+    1, 2 ** 63, size=(2, NEAR_DUPLICATE_NUM_PERM), dtype=np.uint64
+) | np.uint64(1)
+
+def _shingle_hashes(series: pd.Series, seed: np.uint64):
+    """
+    Word 3-gram shingle hashes for a text column as (row ids, hashes). Each
+    distinct text is shingled once, so templated/repeated rows cost nothing
+    extra; texts under three words contribute their words instead.
+    """
+    codes, uniques = pd.factorize(series)
+    words = pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.lower().str.findall(_WORD_PATTERN.pattern)
+    words = words.explode().dropna()
+    owner = words.index.to_numpy()
+    hashed = pd.util.hash_array(words.to_numpy(dtype=object)) ^ seed
+    with np.errstate(over="ignore"):
+        trigram = hashed[:-2] * _SHINGLE_PRIME * _SHINGLE_PRIME + hashed[1:-1] * _SHINGLE_PRIME + hashed[2:]
+    same_text = owner[:-2] == owner[2:]
+    short = np.bincount(owner, minlength=len(uniques))[owner] < 3
+    owners = np.concatenate([owner[:-2][same_text], owner[short]])
+    shingles = np.concatenate([trigram[same_text], hashed[short]])[np.argsort(owners, kind="stable")]
+    per_text = np.bincount(owners, minlength=len(uniques))
+    text_offsets = np.cumsum(per_text) - per_text
+
+    # Expand each row to its text's range of shingles
+    rows = np.flatnonzero(codes >= 0)
+    per_row = per_text[codes[rows]]
+    row_ids = np.repeat(rows, per_row)
+    starts = np.repeat(text_offsets[codes[rows]] - (np.cumsum(per_row) - per_row), per_row)
+    return row_ids, shingles[np.arange(len(row_ids)) + starts]
+
+def _row_token_hashes(df: pd.DataFrame, rows: Optional[np.ndarray] = None):
+    """
+    Flattened token hashes for every row: (tokens uint64, row offsets, text columns, value columns).
+    Identifier-like columns (nearly all values distinct) are left out so they
+    cannot make otherwise identical rows look different.
+    rows restricts the scan to those positions, taken one column at a time.
+    """
+    column = (lambda c: df[c]) if rows is None else (lambda c: df[c].iloc[rows])
+    n = len(df) if rows is None else len(rows)
+    text_columns, value_columns = [], []
+    for col in df.columns:
+        series = column(col)
+        is_string = series.dtype == object or pd.api.types.is_string_dtype(series)
+        if is_string and series.dropna().head(1000).astype(str).str.split().str.len().mean() >= 4:
+            text_columns.append(col)
+        elif n < 20 or series.nunique() < 0.95 * n:
+            value_columns.append(col)
+
+    row_ids, tokens = [], []
+    for col in value_columns:
+        seed = np.uint64(zlib.crc32(str(col).encode("utf-8")))
+        tokens.append(pd.util.hash_array(column(col).astype(str).to_numpy()) ^ seed)
+        row_ids.append(np.arange(n))
+    for col in text_columns:
+        text_rows, shingles = _shingle_hashes(column(col), np.uint64(zlib.crc32(str(col).encode("utf-8"))))
+        tokens.append(shingles)
+        row_ids.append(text_rows)
+    # Every row gets one shared token so empty rows still have a signature
+    tokens.append(np.zeros(n, dtype=np.uint64))
+    row_ids.append(np.arange(n))
+
+    row_ids = np.concatenate(row_ids)
+    order = np.argsort(row_ids, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(row_ids, minlength=n))[:-1]])
+    return np.concatenate(tokens)[order], offsets, text_columns, value_columns
+
+def minhash_signatures(tokens: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """One multiply-shift hash per permutation, minimised per row with reduceat."""
+    signatures = np.empty((len(offsets), NEAR_DUPLICATE_NUM_PERM), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for i in range(NEAR_DUPLICATE_NUM_PERM):
+            hashed = (tokens * _MINHASH_PARAMS[0, i] + _MINHASH_PARAMS[1, i]) >> np.uint64(32)
+            signatures[:, i] = np.minimum.reduceat(hashed, offsets)
+    return signatures
+
+def _connected_components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Smallest row index of each row's component, by min-label propagation with pointer jumping."""
+    labels = np.arange(n)
+    while True:
+        a, b = labels[left], labels[right]
+        differ = a != b
+        if not differ.any():
+            return labels
+        # Hook the larger root under the smaller, then flatten every chain
+        np.minimum.at(labels, np.maximum(a[differ], b[differ]), np.minimum(a[differ], b[differ]))
+        while True:
+            flattened = labels[labels]
+            if np.array_equal(flattened, labels):
+                break
+            labels = flattened
+
+def find_near_duplicates(df: pd.DataFrame, threshold: float = NEAR_DUPLICATE_THRESHOLD, top_n: int = 10,
+                         rows: Optional[np.ndarray] = None):
+    """
+    Cluster rows whose token sets have estimated Jaccard similarity >= threshold.
+    Returns (component label per row, report dict). With rows, only those
+    positions are scanned and labels index into rows.
+    """
+    tokens, offsets, text_columns, value_columns = _row_token_hashes(df, rows)
+    if rows is None:
+        rows = np.arange(len(df))
+    n = len(rows)
+    signatures = minhash_signatures(tokens, offsets)
+
+    rows_per_band = NEAR_DUPLICATE_NUM_PERM // NEAR_DUPLICATE_BANDS
+    left, right = [], []
+    index = np.arange(n)
+    with np.errstate(over="ignore"):
+        for band in range(NEAR_DUPLICATE_BANDS):
+            block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+            key = block[:, 0]
+            for j in range(1, rows_per_band):
+                key = (key * np.uint64(0x100000001B3)) ^ block[:, j]
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+            # Each row is checked against the first row of its bucket only
+            anchor = first[inverse]
+            candidate = anchor != index
+            a, b = index[candidate], anchor[candidate]
+            agree = (signatures[a] == signatures[b]).mean(axis=1) >= threshold
+            left.append(a[agree])
+            right.append(b[agree])
+    left = np.concatenate(left) if left else np.array([], dtype=np.int64)
+    right = np.concatenate(right) if right else np.array([], dtype=np.int64)
+    labels = _connected_components(n, left, right)
+
+    roots, sizes = np.unique(labels, return_counts=True)
+    clustered = roots[sizes > 1]
+    cluster_sizes = sizes[sizes > 1]
+    demographic_columns = find_demographic_columns(df)
+    preview_columns = text_columns or value_columns
+    largest = []
+    for root, size in sorted(zip(clustered, cluster_sizes), key=lambda item: -item[1])[:top_n]:
+        members = df.iloc[rows[np.flatnonzero(labels == root)]]
+        largest.append({
+            "size": int(size),
+            "example": {str(c): str(members.iloc[0][c])[:120] for c in preview_columns[:5]},
+            "demographic_mix": {
+                str(c): {str(k): int(v) for k, v in members[c].value_counts().head(5).items()}
+                for c in demographic_columns
+            }
+        })
+    report = {
+        "threshold": threshold,
+        "rows_scanned": n,
+        "clusters": int(len(clustered)),
+        "rows_in_clusters": int(cluster_sizes.sum()),
+        "redundant_rows": int(cluster_sizes.sum() - len(clustered)),
+        "text_columns": [str(c) for c in text_columns],
+        "largest_clusters": largest,
+    }
+    return labels, report
+
+# (keeping your same detect_statistical_bias,
+# calculate_overall_bias_score, generate_recommendations functions here unchanged)
+
+# -------- Cleaning Pipeline --------
+# clean_dataset runs a declared list of stages, each with explicit parameters.
+# A stage's output is cached under hash(upstream key, stage name, its params),
+# where the first upstream key is a fingerprint of the input frame. Keys chain,
+# so re-running with a different outlier threshold hits the cache for
+# imputation, rebalancing and toxicity and recomputes only from outliers on.
+# Stages must not mutate their input: it is a cached upstream output.
+
+CLEANING_DEFAULTS = {
+    "imbalance_ratio": 1.5,          # rebalance demographic columns more skewed than this
+    "toxicity_threshold": 0.6,       # drop rows the toxicity model scores above this
+    "max_toxic_fraction": 0.4,       # ...unless that would remove this share of rows or more
+    "outlier_iqr_multiplier": 2.5,   # outliers fall outside q1/q3 -/+ this many IQRs
+    "max_outlier_fraction": 0.15,    # skip a column whose outliers are this share of rows or more
+    "min_keep_fraction": 0.6,        # near-duplicate collapsing must keep this share of input rows
+    "collapse_near_duplicates": NEAR_DUPLICATE_COLLAPSE,
+    "near_duplicate_threshold": NEAR_DUPLICATE_THRESHOLD,
+}
+CLEAN_CACHE_MB = float(os.getenv("CLEAN_CACHE_MB", "512"))
+CLEAN_JOBS_MAX = 256
+
+class CleaningParams(BaseModel):
+    imbalance_ratio: Optional[float] = None
+    toxicity_threshold: Optional[float] = None
+    max_toxic_fraction: Optional[float] = None
+    outlier_iqr_multiplier: Optional[float] = None
+    max_outlier_fraction: Optional[float] = None
+    min_keep_fraction: Optional[float] = None
+    collapse_near_duplicates: Optional[bool] = None
+    near_duplicate_threshold: Optional[float] = None
+
+def resolve_cleaning_params(overrides: Optional[Dict[str, Any]] = None) -> dict:
+    """Defaults merged with caller overrides (None values ignored); 400 on unknown or out-of-range values."""
+    params = dict(CLEANING_DEFAULTS)
+    for key, value in (overrides or {}).items():
+        if value is None:
+            continue
+        if key not in params:
+            raise HTTPException(status_code=400, detail=f"Unknown cleaning parameter '{key}'")
+        params[key] = bool(value) if key == "collapse_near_duplicates" else float(value)
+    checks = [
+        ("imbalance_ratio", params["imbalance_ratio"] >= 1),
+        ("toxicity_threshold", 0 <= params["toxicity_threshold"] <= 1),
+        ("max_toxic_fraction", 0 < params["max_toxic_fraction"] <= 1),
+        ("outlier_iqr_multiplier", params["outlier_iqr_multiplier"] > 0),
+        ("max_outlier_fraction", 0 < params["max_outlier_fraction"] <= 1),
+        ("min_keep_fraction", 0 <= params["min_keep_fraction"] <= 1),
+        ("near_duplicate_threshold", 0 < params["near_duplicate_threshold"] <= 1),
+    ]
+    for key, ok in checks:
+        if not ok:
+            raise HTTPException(status_code=400, detail=f"Cleaning parameter '{key}' is out of range: {params[key]}")
+    return params
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a frame: column names, dtypes, index and every cell."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Unhashable cells (lists/dicts from nested JSON)
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+class StageCache:
+    """
+    Thread-safe LRU of stage outputs (frames or keep-masks with their removal
+    positions), bounded by their shallow memory size.
+    """
+
+    def __init__(self, max_mb: float):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key: str, value, report: dict):
+        if isinstance(value, pd.DataFrame):
+            size = int(value.memory_usage(index=True, deep=False).sum())
+        else:
+            size = value.nbytes + sum(positions.nbytes for positions, _ in report.get("removals", []))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (value, report, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+CLEAN_STAGE_CACHE = StageCache(CLEAN_CACHE_MB)
+CLEAN_CACHE_LOOKUPS = METRICS.register(Counter(
+    "biasbounty_clean_cache_lookups_total", "Cleaning stage cache lookups by stage and result.", ("stage", "result")))
+
+# job_id -> what /reclean needs to re-run that job; the input frame itself lives
+# in CLEAN_STAGE_CACHE under its fingerprint, so it ages out with the stages
+_clean_jobs = OrderedDict()
+_clean_jobs_lock = threading.Lock()
+
+def remember_clean_job(job_id: str, df: pd.DataFrame, input_key: str, record: dict):
+    CLEAN_STAGE_CACHE.put(input_key, df, {})
+    with _clean_jobs_lock:
+        _clean_jobs[job_id] = {"input_key": input_key, **record}
+        while len(_clean_jobs) > CLEAN_JOBS_MAX:
+            _clean_jobs.popitem(last=False)
+
+def recall_clean_job(job_id: str):
+    """(job record, input frame) for a job; 404 if unknown, 410 once its input has been evicted."""
+    with _clean_jobs_lock:
+        record = _clean_jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown job (re-cleaning is only available for recent uploads)")
+    cached = CLEAN_STAGE_CACHE.get(record["input_key"])
+    if cached is None:
+        raise HTTPException(status_code=410, detail="Job input is no longer cached; upload the file again")
+    return record, cached[0]
+
+def _stage_impute(cleaned: pd.DataFrame, params: dict, context: dict):
+    print("   Stage 1/5: Smart missing value imputation...")
+    cleaned = cleaned.copy()
+    for col in cleaned.columns:
+        if cleaned[col].dtype in [np.float64, np.int64]:
+            # Use median for numeric (more robust than mean)
+            cleaned[col] = cleaned[col].fillna(cleaned[col].median())
+        else:
+            # For categorical, use mode if available, else "Unknown"
+            mode_val = cleaned[col].mode()
+            if len(mode_val) > 0:
+                cleaned[col] = cleaned[col].fillna(mode_val[0])
+            else:
+                cleaned[col] = cleaned[col].fillna("Unknown")
+    return cleaned, {}
+
+def _stage_rebalance(cleaned: pd.DataFrame, params: dict, context: dict):
+    print("   Stage 2/5: Aggressive demographic balancing...")
+    balanced_columns = []
+    for col in cleaned.columns:
+        col_lower = str(col).lower()
+        if any(keyword in col_lower for keyword in DEMOGRAPHIC_KEYWORDS):
+            try:
+                # Check if this is a categorical demographic column
+                unique_values = cleaned[col].nunique()
+                if 2 <= unique_values <= 15:  # Process columns with 2-15 unique values
+                    value_counts = cleaned[col].value_counts()
+                    max_count = value_counts.max()
+                    min_count = value_counts.min()
+
+                    # Calculate imbalance ratio
+                    imbalance_ratio = max_count / min_count if min_count > 0 else float('inf')
+
+                    if imbalance_ratio > params["imbalance_ratio"]:
+                        # Calculate target count (between min and average)
+                        avg_count = int(value_counts.mean())
+                        target_count = int((min_count + avg_count) / 2)
+                        target_count = max(target_count, min_count + 5)  # Ensure some increase
+
+                        balanced_dfs = []
+                        for value in value_counts.index:
+                            subset = cleaned[cleaned[col] == value]
+                            current_count = len(subset)
+
+                            if current_count > target_count:
+                                # Undersample majority class
+                                subset = subset.sample(n=target_count, random_state=42)
+                            elif current_count < target_count and current_count > 0:
+                                # Oversample minority class (with replacement if needed)
+                                n_samples = min(target_count, current_count * 3)  # Max 3x oversampling
+                                subset = subset.sample(n=n_samples, replace=(n_samples > current_count), random_state=42)
+
+                            balanced_dfs.append(subset)
+
+                        # Row labels are kept so the removal audit can name source rows
+                        cleaned = pd.concat(balanced_dfs).sample(frac=1, random_state=42)
+                        balanced_columns.append(str(col))
+                        print(f"      [SUCCESS] Balanced '{col}': {imbalance_ratio:.2f}x imbalance (target: {target_count} per group)")
+            except Exception as e:
+                print(f"      [WARNING] Could not balance '{col}': {str(e)[:50]}")
+                pass
+
+    if balanced_columns:
+        print(f"      -> Balanced {len(balanced_columns)} demographic column(s)")
+    return cleaned, {"balanced_columns": balanced_columns}
+
+def _stage_toxicity(base: pd.DataFrame, keep: np.ndarray, params: dict, context: dict):
+    print("   Stage 3/5: AI-powered toxic content filtering...")
+    removals = []
+    partial = False
+    cascade = {}
+
+    if toxicity_analyzer is not None:
+        text_cols = [c for c in base.columns if base[c].dtype == object or pd.api.types.is_string_dtype(base[c])]
+        # The output is cached under the stage key, so a miss must draw the sample a hit would return
+        rng = np.random.default_rng(int(context["stage_key"][:8], 16))
+
+        filter_cols = text_cols[:5]  # Process first 5 text columns
+        for col_idx, col in enumerate(filter_cols):
+            try:
+                kept = np.flatnonzero(keep)
+                values = base[col]
+                if values.notna().to_numpy()[kept].sum() > 50:
+                    # Sample intelligently - check more rows for better coverage
+                    sample_size = budget_sample_size(
+                        "clean.toxicity", len(kept), 150, toxicity_seconds_per_text(),
+                        parts=len(filter_cols) - col_idx
+                    )
+                    partial = partial or sample_size < min(len(kept), 150)
+                    sample_positions = rng.choice(kept, sample_size, replace=False)
+                    toxic_positions = []
+
+                    candidates = []
+                    for pos in sample_positions:
+                        text = str(values.iat[pos])
+                        if 10 < len(text) < 1000:  # Process reasonable length texts
+                            candidates.append((pos, text[:500]))
+
+                    for start in range(0, len(candidates), INFERENCE_BATCH_SIZE):
+                        if budget_expired("clean.toxicity"):
+                            budget_cut_short("clean.toxicity", len(candidates) - start)
+                            partial = True
+                            break
+                        chunk = candidates[start:start + INFERENCE_BATCH_SIZE]
+                        results = classify_toxicity([text for _, text in chunk], cascade)
+                        for (pos, _), result in zip(chunk, results):
+                            if (result and result.get('label', '').lower() == 'toxic'
+                                    and result.get('score', 0) > params["toxicity_threshold"]):
+                                toxic_positions.append(pos)
+
+                    # Remove toxic rows (up to max_toxic_fraction of the dataset)
+                    if 0 < len(toxic_positions) < len(kept) * params["max_toxic_fraction"]:
+                        toxic_positions = np.array(toxic_positions, dtype=np.int64)
+                        keep[toxic_positions] = False
+                        removals.append((toxic_positions, f"toxicity:{col}"))
+                        print(f"      [SUCCESS] Removed {len(toxic_positions)} toxic rows from '{col}'")
+            except Exception as e:
+                pass
+
+    removed_toxic = sum(len(pos) for pos, _ in removals)
+    if removed_toxic > 0:
+        print(f"      -> Total toxic content removed: {removed_toxic} rows")
+    # A budget-truncated scan is not the stage's real output: clean_dataset caches
+    # neither it nor anything downstream of it
+    report = {"rows_removed": removed_toxic, "partial": partial, "removals": removals}
+    if cascade:
+        report["cascade"] = cascade_report(cascade)
+    return keep, report
+
+def _stage_outliers(base: pd.DataFrame, keep: np.ndarray, params: dict, context: dict):
+    print("   Stage 4/5: Statistical normalization & outlier removal...")
+    removals = []
+    kept_count = int(keep.sum())
+
+    # One float column at a time; bounds use the rows still kept after earlier columns
+    numeric_cols = base.select_dtypes(include=[np.number]).columns
+    for col in numeric_cols:
+        try:
+            values = base[col].to_numpy(dtype=float, na_value=np.nan)
+            series = values[keep]
+            series = series[~np.isnan(series)]
+            if len(series) > 20:
+                # Calculate IQR for robust outlier detection
+                q1, q3 = np.quantile(series, [0.25, 0.75])
+                iqr = q3 - q1
+
+                if iqr > 0:
+                    lower_bound = q1 - params["outlier_iqr_multiplier"] * iqr
+                    upper_bound = q3 + params["outlier_iqr_multiplier"] * iqr
+
+                    outlier_mask = keep & ((values < lower_bound) | (values > upper_bound))
+                    outlier_count = int(outlier_mask.sum())
+
+                    # Remove outliers (up to max_outlier_fraction per column)
+                    if 0 < outlier_count < kept_count * params["max_outlier_fraction"]:
+                        keep &= ~outlier_mask
+                        kept_count -= outlier_count
+                        removals.append((np.flatnonzero(outlier_mask), f"outlier:{col}"))
+                        print(f"      [SUCCESS] Removed {outlier_count} outliers from '{col}'")
+        except Exception as e:
+            pass
+
+    outliers_removed = sum(len(pos) for pos, _ in removals)
+    if outliers_removed > 0:
+        print(f"      -> Total outliers removed: {outliers_removed} rows")
+    return keep, {"rows_removed": outliers_removed, "removals": removals}
+
+def _row_identity_codes(df: pd.DataFrame, rows: np.ndarray) -> np.ndarray:
+    """An int64 per row in rows, equal exactly when all cells are equal (NaN equals NaN)."""
+    combined = np.zeros(len(rows), dtype=np.int64)
+    for col in df.columns:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        # Re-factorize after each column so the mixed-radix code cannot overflow
+        combined = pd.factorize(combined * len(uniques) + codes[rows])[0]
+    return combined
+
+def _stage_dedupe(base: pd.DataFrame, keep: np.ndarray, params: dict, context: dict):
+    print("   Stage 5/5: Cross-correlation bias mitigation...")
+    kept = np.flatnonzero(keep)
+    if len(kept) < context["min_required_rows"]:
+        print(f"      [WARNING] Too much data removed ({len(kept)}/{context['original_rows']}). Keeping more samples...")
+        # This is a safety check - in practice, previous stages should handle this
+
+    # Remove duplicate rows (can indicate biased sampling), keeping the first of each
+    removals = []
+    _, first = np.unique(_row_identity_codes(base, kept), return_index=True)
+    duplicate = np.ones(len(kept), dtype=bool)
+    duplicate[first] = False
+    if duplicate.any():
+        keep[kept[duplicate]] = False
+        removals.append((kept[duplicate], "duplicate"))
+        print(f"      [SUCCESS] Removed {int(duplicate.sum())} duplicate rows")
+    return keep, {"rows_removed": int(duplicate.sum()), "removals": removals}
+
+def _stage_near_dedupe(base: pd.DataFrame, keep: np.ndarray, params: dict, context: dict):
+    kept = np.flatnonzero(keep)
+    removals = []
+    labels, report = find_near_duplicates(base, params["near_duplicate_threshold"], rows=kept)
+    print(f"      -> {report['clusters']} near-duplicate clusters ({report['redundant_rows']} redundant rows)")
+    if params["collapse_near_duplicates"] and report["redundant_rows"] > 0:
+        redundant = labels != np.arange(len(kept))
+        if len(kept) - redundant.sum() >= context["min_required_rows"]:
+            keep[kept[redundant]] = False
+            removals.append((kept[redundant], "near_duplicate"))
+            print(f"      [SUCCESS] Collapsed near-duplicate clusters, removed {int(redundant.sum())} rows")
+        else:
+            print(f"      [WARNING] Collapsing near-duplicates would keep fewer than "
+                  f"{params['min_keep_fraction']:.0%} of rows, skipped")
+    near_duplicates_removed = sum(len(pos) for pos, _ in removals)
+    report["collapsed"] = near_duplicates_removed > 0
+    report["rows_removed"] = near_duplicates_removed
+    return keep, {"rows_removed": near_duplicates_removed, "near_duplicates": report, "removals": removals}
+
+# (stage name, function, parameters its output depends on, kind), in execution order.
+# "frame" stages return a new DataFrame; "mask" stages (which must come after
+# every frame stage) only clear entries of a keep-mask over the last frame, so
+# removals never copy the data and the cleaned frame is materialized once.
+CLEANING_PIPELINE = [
+    ("impute", _stage_impute, (), "frame"),
+    ("rebalance", _stage_rebalance, ("imbalance_ratio",), "frame"),
+    ("toxicity", _stage_toxicity, ("toxicity_threshold", "max_toxic_fraction"), "mask"),
+    ("outliers", _stage_outliers, ("outlier_iqr_multiplier", "max_outlier_fraction"), "mask"),
+    ("dedupe", _stage_dedupe, (), "mask"),
+    ("near_dedupe", _stage_near_dedupe, ("near_duplicate_threshold", "collapse_near_duplicates", "min_keep_fraction"), "mask"),
+]
+
+def _stage_key(upstream_key: str, stage: str, stage_params: dict) -> str:
+    payload = json.dumps([upstream_key, stage, stage_params], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+def clean_dataset(df: pd.DataFrame, event_callback=None, collapse_near_duplicates: Optional[bool] = None,
+                  params: Optional[dict] = None, input_key: Optional[str] = None) -> pd.DataFrame:
+    """
+    ADVANCED BIAS REDUCTION ALGORITHM
+    State-of-the-art dataset improvement with multi-stage processing:
+    
+    Stage 1: Smart Missing Value Imputation
+    Stage 2: Aggressive Demographic Balancing (50-70% reduction)
+    Stage 3: Toxic Content Filtering (AI-powered)
+    Stage 4: Statistical Normalization & Outlier Removal
+    Stage 5: Cross-correlation Bias Mitigation (exact and near-duplicate rows)
+    
+    Expected Bias Reduction: 50-70% from original score
+    params are resolve_cleaning_params() output (defaults when None); collapse_near_duplicates,
+    if given, overrides the matching param. input_key skips fingerprinting df when the caller has it.
+    event_callback, if given, receives the near-duplicate report and a "pipeline" summary
+    (params, per-stage rows, cache hits, and a removal audit frame: source_row, stage, reason).
+    """
+    params = dict(params) if params is not None else resolve_cleaning_params()
+    if collapse_near_duplicates is not None:
+        params["collapse_near_duplicates"] = bool(collapse_near_duplicates)
+    print("[INFO] Starting advanced bias reduction pipeline...")
+    if input_key is None:
+        with stage_timer("clean.fingerprint"):
+            input_key = dataframe_fingerprint(df)
+    base = df.dropna(how='all')
+    original_rows = len(base)
+    # Ensure we keep at least min_keep_fraction (60%) of original data
+    context = {"original_rows": original_rows, "min_required_rows": int(original_rows * params["min_keep_fraction"])}
+
+    key = input_key
+    keep = None
+    # Set once a stage reports a partial (budget-truncated) result. Downstream keys
+    # still chain from the full run's, so from then on the cache is neither read
+    # nor written: a hit would discard this run's work, a put would serve it later.
+    partial_upstream = False
+    stage_reports, audit = [], []
+    for name, stage_fn, param_names, kind in CLEANING_PIPELINE:
+        stage_params = {p: params[p] for p in param_names}
+        key = _stage_key(key, name, stage_params)
+        context["stage_key"] = key
+        with stage_timer(f"clean.{name}"):
+            rows_in = len(base) if keep is None else int(keep.sum())
+            annotate_stage(rows_in=rows_in)
+            hit = None
+            if not partial_upstream:
+                hit = CLEAN_STAGE_CACHE.get(key)
+                CLEAN_CACHE_LOOKUPS.inc(stage=name, result="hit" if hit is not None else "miss")
+            if hit is not None:
+                print(f"   Stage '{name}': reused cached output")
+            if kind == "frame":
+                base, report = hit if hit is not None else stage_fn(base, stage_params, context)
+                output = base
+            else:
+                if keep is None:
+                    keep = np.ones(len(base), dtype=bool)
+                # Cached masks are never mutated: each stage works on its own copy
+                keep, report = hit if hit is not None else stage_fn(base, keep.copy(), stage_params, context)
+                output = keep
+            partial_upstream = partial_upstream or bool(report.get("partial"))
+            if hit is None and not partial_upstream:
+                CLEAN_STAGE_CACHE.put(key, output, report)
+            rows_out = len(base) if keep is None else int(keep.sum())
+            annotate_stage(rows_out=rows_out, cached=hit is not None)
+        removals = report.get("removals", [])
+        audit.extend((positions, name, reason) for positions, reason in removals)
+        stage_reports.append({
+            "stage": name, "params": stage_params, "cached": hit is not None,
+            "rows_in": rows_in, "rows_out": rows_out,
+            **{k: v for k, v in report.items() if k not in ("near_duplicates", "removals")},
+            **({"removed_by_reason": {reason: len(positions) for positions, reason in removals}} if removals else {}),
+        })
+        if "near_duplicates" in report and event_callback is not None:
+            event_callback({"stage": "near_duplicates", **report["near_duplicates"]})
+
+    # Materialize once: kept rows in a shuffled order (same order as sample(frac=1, random_state=42))
+    kept = np.flatnonzero(keep) if keep is not None else np.arange(len(base))
+    order = kept[np.random.RandomState(42).permutation(len(kept))]
+    with stage_timer("clean.materialize"):
+        cleaned = base.take(order).reset_index(drop=True)
+    if event_callback is not None:
+        # Removed rows are reported by their row label in the uploaded data
+        source_rows = base.index.to_numpy()
+        audit_frame = pd.DataFrame({
+            "source_row": np.concatenate([source_rows[p] for p, _, _ in audit]) if audit else [],
+            "stage": np.concatenate([np.repeat(s, len(p)) for p, s, _ in audit]) if audit else [],
+            "reason": np.concatenate([np.repeat(r, len(p)) for p, _, r in audit]) if audit else [],
+        })
+        event_callback({
+            "stage": "pipeline", "input_key": input_key, "params": params,
+            "stages": stage_reports, "audit": audit_frame
+        })
+    
+    # ==================== SUMMARY ====================
+    removed = {r["stage"]: r.get("rows_removed", 0) for r in stage_reports}
+    rows_removed = original_rows - len(cleaned)
+    removal_pct = (rows_removed / original_rows) * 100 if original_rows else 0.0
+    
+    print(f"\n   [SUCCESS] Bias reduction complete!")
+    print(f"      Original: {original_rows} rows")
+    print(f"      Improved: {len(cleaned)} rows ({removal_pct:.1f}% removed)")
+    print(f"      Quality improvements:")
+    print(f"         - Demographic groups balanced")
+    print(f"         - {removed['toxicity']} toxic texts removed")
+    print(f"         - {removed['outliers']} statistical outliers removed")
+    print(f"         - {removed['dedupe']} duplicates removed")
+    print(f"         - {removed['near_dedupe']} near-duplicates collapsed")
+    print(f"         - {sum(r['cached'] for r in stage_reports)}/{len(stage_reports)} stages reused from cache")
+    print(f"      Expected bias reduction: 50-70%")
+    
+    return cleaned
+
+
+def generate_recommendations(bias_score, demographic_bias, text_bias, statistical_bias,
+                             group_fairness=None, intersectional_bias=None):
+    """
+    Generate actionable, specific recommendations based on detected biases.
+    Provides prioritized, detailed guidance for bias mitigation.
+    """
+    recs = []
+    
+    # Overall assessment
+    if bias_score > 70:
+        recs.append("[CRITICAL] Dataset shows high bias levels (>70%). Immediate action required before deployment.")
+        recs.append("-> Recommendation: Collect additional diverse data to balance underrepresented groups.")
+    elif bias_score > 40:
+        recs.append("[MODERATE] Significant bias detected (40-70%). Review data collection practices.")
+        recs.append("-> Recommendation: Implement stratified sampling to ensure fair representation.")
+    else:
+        recs.append("[LOW] Bias levels are acceptable (<40%). Continue monitoring for changes.")
+    
+    # Demographic bias recommendations
+    if demographic_bias.get("imbalanced_columns"):
+        imbalanced_cols = demographic_bias['imbalanced_columns'][:5]  # Top 5
+        recs.append(f"[DEMOGRAPHIC] Demographic Imbalance: {len(demographic_bias['imbalanced_columns'])} columns affected")
+        recs.append(f"   Columns: {', '.join(imbalanced_cols)}")
+        
+        if demographic_bias.get("imbalance_details"):
+            top_issue = demographic_bias["imbalance_details"][0]
+            recs.append(f"   Worst case: '{top_issue['column']}' has {top_issue['max_proportion']*100:.1f}% in one category")
+            recs.append(f"-> Action: Apply resampling techniques (SMOTE, oversampling) to balance these groups.")
+    
+    # Text bias recommendations
+    if text_bias.get("toxic_texts") and len(text_bias["toxic_texts"]) > 0:
+        toxic_count = len(text_bias["toxic_texts"])
+        recs.append(f"[TEXT] Text Bias: {toxic_count} potentially toxic/biased text entries detected")
+        recs.append(f"-> Action: Review and filter toxic content. Consider implementing content moderation.")
+        
+        if toxic_count > 50:
+            recs.append(f"   ALERT: High volume of toxic content ({toxic_count} instances). Data quality issue likely.")
+    
+    # Statistical bias recommendations
+    if statistical_bias.get("skewed_columns"):
+        skewed_cols = statistical_bias['skewed_columns'][:5]
+        recs.append(f"[STATISTICAL] Statistical Skew: {len(statistical_bias['skewed_columns'])} columns with high skewness")
+        recs.append(f"   Columns: {', '.join(skewed_cols)}")
+        recs.append(f"-> Action: Apply log transformation, Box-Cox, or robust scaling to normalize distributions.")
+    
+    if statistical_bias.get("statistical_details"):
+        high_outliers = [d for d in statistical_bias["statistical_details"] if d.get("outlier_percentage", 0) > 10]
+        if high_outliers:
+            recs.append(f"[OUTLIERS] Outliers: {len(high_outliers)} columns have >10% outliers")
+            recs.append(f"-> Action: Investigate outliers - may indicate data entry errors or legitimate edge cases.")
+    
+    # Outcome fairness recommendations
+    attributes = (group_fairness or {}).get("protected_attributes", {})
+    for col in (group_fairness or {}).get("flagged_attributes", [])[:3]:
+        metrics = attributes[col]
+        recs.append(
+            f"[FAIRNESS] '{group_fairness['outcome_column']}' disparate impact on '{col}': "
+            f"{metrics['disparate_impact_ratio']:.2f} (below the 0.80 four-fifths threshold)"
+        )
+        recs.append(
+            f"   '{metrics['unprivileged_group']}' vs '{metrics['privileged_group']}', "
+            f"demographic parity difference {metrics['demographic_parity_difference']:.2f}"
+        )
+        if metrics.get("equalized_odds_difference"):
+            recs.append(f"   Equalized odds difference: {metrics['equalized_odds_difference']:.2f}")
+        recs.append("-> Action: Review decision criteria for this attribute; consider reweighing or threshold adjustment per group.")
+    
+    # Intersectional recommendations: only when an intersection is worse than its worst single attribute
+    worst_single = max(
+        (m.get("demographic_parity_difference") or 0 for m in attributes.values()), default=0.0
+    )
+    for subgroup in (intersectional_bias or {}).get("subgroups", [])[:1]:
+        gap = subgroup.get("outcome_rate_gap")
+        if subgroup["depth"] < 2 or gap is None or abs(gap) < 0.1 or abs(gap) <= worst_single:
+            continue
+        members = " & ".join(f"{col}={value}" for col, value in subgroup["attributes"].items())
+        recs.append(
+            f"[INTERSECTIONAL] Subgroup {members} ({subgroup['count']} rows) has an outcome rate "
+            f"{gap * 100:+.1f} points vs everyone else"
+        )
+        recs.append("-> Action: Audit this intersection directly; single-attribute balancing will not correct it.")
+    
+    # General best practices
+    if bias_score > 20:
+        recs.append("")
+        recs.append("[BEST PRACTICES]")
+        if not attributes:
+            recs.append("   - Provide an outcome column to measure demographic parity and equalized odds")
+        recs.append("   - Use adversarial debiasing during model training")
+        recs.append("   - Conduct regular bias audits on production data")
+        recs.append("   - Document data collection methodology and known limitations")
+    
+    if not recs:
+        recs.append("[LOW] No significant bias detected. Dataset appears well-balanced.")
+        recs.append("-> Continue monitoring: Run periodic bias checks as new data is added.")
+    
+    return recs
+
+def detect_statistical_bias(df) -> dict:
+    """
+    Enhanced statistical bias detection analyzing numeric distributions.
+    Detects skewness, outliers, and potential outcome disparities.
+    Accepts a DataFrame or a ComputeBackend.
+    """
+    backend = as_compute_backend(df)
+    numeric_cols = backend.numeric_columns()
+    
+    if len(numeric_cols) == 0:
+        return {
+            "score": 0.0,
+            "skewed_columns": [],
+            "numeric_columns_found": [],
+            "details": "No numeric columns found for statistical analysis"
+        }
+    
+    analysis_results = []
+    total_bias_score = 0
+    # Need minimum data points
+    summary = {col: stats for col, stats in backend.numeric_summary(numeric_cols).items() if stats["count"] >= 10}
+    outlier_counts = backend.outlier_counts(summary)
+    
+    for col, stats in summary.items():
+        try:
+            # Calculate statistical measures
+            # Constant columns have no defined skew/kurtosis in SQL engines
+            skewness = 0.0 if pd.isna(stats["skew"]) else stats["skew"]
+            kurtosis = 0.0 if pd.isna(stats["kurtosis"]) else stats["kurtosis"]
+            
+            # Check for outliers using IQR method
+            outlier_percentage = (outlier_counts.get(col, 0) / stats["count"]) * 100
+            
+            # Calculate bias score for this column
+            skew_score = min(50, abs(skewness) * 10)  # High skewness = potential bias
+            outlier_score = min(50, outlier_percentage * 2)  # High outliers = potential bias
+            column_bias = (skew_score + outlier_score) / 2
+            
+            if column_bias > 20:  # Only report significant biases
+                analysis_results.append({
+                    "column": str(col),
+                    "skewness": float(skewness),
+                    "kurtosis": float(kurtosis),
+                    "outlier_percentage": float(outlier_percentage),
+                    "bias_score": float(column_bias),
+                    "mean": float(stats["mean"]),
+                    "median": float(stats["median"]),
+                    "std": float(stats["std"])
+                })
+                total_bias_score += column_bias
+        
+        except Exception as e:
+            print(f"Warning: Could not analyze numeric column {col}: {e}")
+            continue
+    
+    # Calculate overall score
+    if analysis_results:
+        overall_score = min(100, total_bias_score / len(analysis_results))
+    else:
+        overall_score = 0.0
+    
+    # Sort by bias score
+    analysis_results.sort(key=lambda x: x['bias_score'], reverse=True)
+    
+    return {
+        "score": float(overall_score),
+        "skewed_columns": [item["column"] for item in analysis_results if abs(item["skewness"]) > 1],
+        "numeric_columns_found": list(numeric_cols),
+        "statistical_details": analysis_results[:10],  # Top 10 most biased
+        "details": f"Analyzed {len(numeric_cols)} numeric columns, {len(analysis_results)} show statistical irregularities"
+    }
+
+# Column-name indicators of a binary outcome / model prediction, in priority order
+OUTCOME_KEYWORDS = [
+    "outcome", "approved", "hired", "admitted", "accepted", "granted", "selected",
+    "promoted", "decision", "readmission", "bail", "default", "label", "target"
+]
+PREDICTION_KEYWORDS = ["prediction", "predicted", "pred_", "model_score", "risk_score", "probability"]
+POSITIVE_LABELS = {
+    "1", "1.0", "yes", "y", "true", "t", "approved", "accepted", "hired", "granted",
+    "selected", "admitted", "positive", "pos", "pass", "promoted"
+}
+NEGATIVE_LABELS = {
+    "0", "0.0", "no", "n", "false", "f", "denied", "rejected", "declined", "negative",
+    "neg", "fail", "not hired"
+}
+# Groups smaller than this are reported but excluded from the gap metrics
+FAIRNESS_MIN_GROUP_SIZE = 5
+FAIRNESS_MAX_GROUPS = 50
+# Numeric protected attributes (e.g. age) with more levels than this are cut into quantile bands
+FAIRNESS_NUMERIC_BANDS = 4
+
+def binarize_outcome(series: pd.Series):
+    """
+    Map a two-valued column to int8 codes (1 positive, 0 negative, -1 missing).
+    Returns (codes, positive_label) or (None, None) if the column is not binary.
+    """
+    # Cheap rejection of wide columns before hashing every row
+    if len(series.head(1000).dropna().unique()) > 2:
+        return None, None
+    values = series.dropna().unique()
+    if len(values) == 0 or len(values) > 2:
+        return None, None
+    labels = [str(v).strip().lower() for v in values]
+    positive = None
+    for value, label in zip(values, labels):
+        if label in POSITIVE_LABELS:
+            positive = value
+    if positive is None:
+        negatives = [value for value, label in zip(values, labels) if label in NEGATIVE_LABELS]
+        if len(values) == 2 and len(negatives) == 1:
+            positive = values[0] if values[1] == negatives[0] else values[1]
+        else:
+            return None, None
+    codes = np.where(series.isna().to_numpy(), -1, (series == positive).to_numpy()).astype(np.int8)
+    return codes, str(positive)
+
+def find_outcome_column(df: pd.DataFrame, exclude=()) -> Optional[str]:
+    """First binary column whose name suggests an outcome/decision, or None."""
+    for keyword in OUTCOME_KEYWORDS:
+        for col in df.columns:
+            if str(col) in exclude or keyword not in str(col).lower():
+                continue
+            if binarize_outcome(df[col])[0] is not None:
+                return str(col)
+    return None
+
+def find_prediction_column(df: pd.DataFrame, exclude=()) -> Optional[str]:
+    """First binary or [0, 1]-scored column whose name suggests a model prediction, or None."""
+    for col in df.columns:
+        name = str(col).lower()
+        if str(col) in exclude or not any(keyword in name for keyword in PREDICTION_KEYWORDS):
+            continue
+        if _prediction_arrays(df[col]) is not None:
+            return str(col)
+    return None
+
+def _prediction_arrays(series: pd.Series):
+    """(hard 0/1/-1 predictions, float scores or None) for a binary or probability column."""
+    codes, _ = binarize_outcome(series)
+    if codes is not None:
+        return codes, None
+    if not pd.api.types.is_numeric_dtype(series):
+        return None
+    scores = series.to_numpy(dtype=float, na_value=np.nan)
+    finite = scores[~np.isnan(scores)]
+    if len(finite) == 0 or finite.min() < 0 or finite.max() > 1:
+        return None
+    hard = np.where(np.isnan(scores), -1, scores >= 0.5).astype(np.int8)
+    return hard, scores
+
+def _protected_group_codes(series: pd.Series):
+    """Integer group codes (-1 missing) and labels; wide numeric columns become quantile bands."""
+    if pd.api.types.is_numeric_dtype(series) and series.nunique() > 20:
+        banded = pd.qcut(series, FAIRNESS_NUMERIC_BANDS, duplicates="drop")
+        codes = banded.cat.codes.to_numpy()
+        labels = [str(interval) for interval in banded.cat.categories]
+    else:
+        codes, uniques = pd.factorize(series, sort=True)
+        labels = [str(u) for u in uniques]
+    return codes.astype(np.int64), labels
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+def _gap(values: np.ndarray, eligible: np.ndarray) -> Optional[float]:
+    values = values[eligible & ~np.isnan(values)]
+    if len(values) < 2:
+        return None
+    return float(values.max() - values.min())
+
+def _fairness_for_attribute(codes, labels, outcome, hard_pred, scores) -> dict:
+    """All per-group counts for one protected attribute in a single bincount pass."""
+    k = len(labels)
+    valid = (codes >= 0) & (outcome >= 0)
+    if hard_pred is not None:
+        valid &= hard_pred >= 0
+    g = codes[valid]
+    y = outcome[valid].astype(float)
+    n = np.bincount(g, minlength=k).astype(float)
+    positives = np.bincount(g, weights=y, minlength=k)
+    base_rate = _ratio(positives, n)
+    eligible = n >= FAIRNESS_MIN_GROUP_SIZE
+
+    if hard_pred is not None:
+        p = hard_pred[valid].astype(float)
+        selected = np.bincount(g, weights=p, minlength=k)
+        tp = np.bincount(g, weights=y * p, minlength=k)
+        fp = selected - tp
+        selection_rate = _ratio(selected, n)
+        tpr = _ratio(tp, positives)
+        fpr = _ratio(fp, n - positives)
+        ppv = _ratio(tp, selected)
+    else:
+        selection_rate = base_rate
+        tpr = fpr = ppv = None
+
+    mean_score = None
+    if scores is not None:
+        s = scores[valid]
+        mean_score = _ratio(np.bincount(g, weights=s, minlength=k), n)
+
+    groups = []
+    for i, label in enumerate(labels):
+        if n[i] == 0:
+            continue
+        group = {
+            "group": label,
+            "count": int(n[i]),
+            "base_rate": float(base_rate[i]),
+            "selection_rate": float(selection_rate[i]),
+        }
+        if tpr is not None:
+            group["tpr"] = None if np.isnan(tpr[i]) else float(tpr[i])
+            group["fpr"] = None if np.isnan(fpr[i]) else float(fpr[i])
+            group["ppv"] = None if np.isnan(ppv[i]) else float(ppv[i])
+        if mean_score is not None:
+            group["mean_score"] = float(mean_score[i])
+            group["calibration_gap"] = float(mean_score[i] - base_rate[i])
+        groups.append(group)
+
+    rates = np.where(eligible, selection_rate, np.nan)
+    result = {
+        "groups": groups,
+        "demographic_parity_difference": _gap(selection_rate, eligible),
+        "disparate_impact_ratio": None,
+        "privileged_group": None,
+        "unprivileged_group": None,
+    }
+    if eligible.sum() >= 2 and not np.all(np.isnan(rates)):
+        hi, lo = int(np.nanargmax(rates)), int(np.nanargmin(rates))
+        result["privileged_group"] = labels[hi]
+        result["unprivileged_group"] = labels[lo]
+        if rates[hi] > 0:
+            result["disparate_impact_ratio"] = float(rates[lo] / rates[hi])
+    if tpr is not None:
+        result["tpr_gap"] = _gap(tpr, eligible)
+        result["fpr_gap"] = _gap(fpr, eligible)
+        gaps = [x for x in (result["tpr_gap"], result["fpr_gap"]) if x is not None]
+        result["equalized_odds_difference"] = max(gaps) if gaps else None
+        result["ppv_gap"] = _gap(ppv, eligible)
+    if mean_score is not None:
+        calibration = np.abs(mean_score - base_rate)
+        calibration = calibration[eligible & ~np.isnan(calibration)]
+        result["max_calibration_gap"] = float(calibration.max()) if len(calibration) else None
+    return result
+
+def compute_group_fairness(df: pd.DataFrame, outcome_column: Optional[str] = None,
+                           prediction_column: Optional[str] = None) -> dict:
+    """
+    Group fairness metrics for each protected attribute against a binary outcome:
+    selection rates, demographic parity difference and disparate impact ratio, plus
+    TPR/FPR gaps and calibration per group when a prediction column is present.
+    Outcome/prediction columns are auto-detected by name when not given.
+    """
+    for name in (outcome_column, prediction_column):
+        if name is not None and name not in df.columns:
+            raise HTTPException(status_code=400, detail=f"Column '{name}' not found in dataset")
+
+    outcome_column = outcome_column or find_outcome_column(df, exclude=(prediction_column,))
+    if outcome_column is None:
+        return {
+            "score": 0.0,
+            "outcome_column": None,
+            "prediction_column": None,
+            "protected_attributes": {},
+            "details": "No binary outcome column detected; pass outcome_column to compute fairness metrics"
+        }
+    outcome, positive_label = binarize_outcome(df[outcome_column])
+    if outcome is None:
+        raise HTTPException(status_code=400, detail=f"Outcome column '{outcome_column}' is not binary")
+
+    hard_pred = scores = None
+    prediction_column = prediction_column or find_prediction_column(df, exclude=(outcome_column,))
+    if prediction_column is not None:
+        arrays = _prediction_arrays(df[prediction_column])
+        if arrays is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Prediction column '{prediction_column}' must be binary or a probability in [0, 1]"
+            )
+        hard_pred, scores = arrays
+
+    protected = [c for c in find_demographic_columns(df) if c not in (outcome_column, prediction_column)]
+    attributes = {}
+    severities = []
+    for col in protected:
+        try:
+            codes, labels = _protected_group_codes(df[col])
+            if len(labels) < 2 or len(labels) > FAIRNESS_MAX_GROUPS:
+                continue
+            metrics = _fairness_for_attribute(codes, labels, outcome, hard_pred, scores)
+        except Exception as e:
+            print(f"Warning: Could not compute fairness metrics for {col}: {e}")
+            continue
+        gaps = [metrics.get(key) for key in ("demographic_parity_difference", "equalized_odds_difference")]
+        severity = min(100.0, max((g for g in gaps if g is not None), default=0.0) * 200)
+        metrics["severity"] = float(severity)
+        metrics["four_fifths_rule_violated"] = (
+            metrics["disparate_impact_ratio"] is not None and metrics["disparate_impact_ratio"] < 0.8
+        )
+        attributes[col] = metrics
+        severities.append(severity)
+
+    flagged = sorted(
+        (col for col, m in attributes.items() if m["four_fifths_rule_violated"]),
+        key=lambda col: attributes[col]["disparate_impact_ratio"]
+    )
+    return {
+        "score": float(np.mean(severities)) if severities else 0.0,
+        "outcome_column": outcome_column,
+        "positive_label": positive_label,
+        "prediction_column": prediction_column,
+        "protected_attributes": attributes,
+        "flagged_attributes": flagged,
+        "details": (
+            f"Outcome '{outcome_column}' compared across {len(attributes)} protected attributes, "
+            f"{len(flagged)} below the four-fifths disparate impact threshold"
+        )
+    }
+
+# Intersectional subgroup scan: lattice depth, minimum subgroup share of rows,
+# and a cap on how many column combinations are scanned
+SUBGROUP_MAX_DEPTH = int(os.getenv("SUBGROUP_MAX_DEPTH", "3"))
+SUBGROUP_MIN_SUPPORT = float(os.getenv("SUBGROUP_MIN_SUPPORT", "0.01"))
+SUBGROUP_MAX_COMBINATIONS = 2000
+# Combinations with at most this many (cell, outcome) buckets are counted densely
+SUBGROUP_DENSE_CELLS = 1 << 22
+
+def _subgroup_counts(prefix: Optional[np.ndarray], codes: np.ndarray, size: int,
+                     outcome_code: np.ndarray, cells: int):
+    """
+    Count rows per cell of one column combination in a single bincount. The
+    cell code is the prefix combination's code extended by one column (mixed
+    radix), and each row lands in bucket cell * 3 + outcome_code (0 negative,
+    1 positive, 2 unlabelled), so counts and positives come out of one pass.
+    Returns (cell ids, per-cell [neg, pos, unlabelled] counts).
+    """
+    cell = codes if prefix is None else prefix * size + codes
+    buckets = cell * 3 + outcome_code
+    if cells * 3 <= SUBGROUP_DENSE_CELLS:
+        table = np.bincount(buckets, minlength=cells * 3).reshape(cells, 3)
+        return np.arange(cells), table
+    # Sparse fallback for very wide combinations: only observed cells get a slot
+    observed, counts = np.unique(buckets, return_counts=True)
+    ids, inverse = np.unique(observed // 3, return_inverse=True)
+    table = np.zeros((len(ids), 3), dtype=np.int64)
+    np.add.at(table, (inverse, observed % 3), counts)
+    return ids, table
+
+def compute_intersectional_subgroups(df: pd.DataFrame, outcome_column: Optional[str] = None,
+                                     max_depth: Optional[int] = None, top_k: int = 10) -> dict:
+    """
+    Scan intersections of protected attributes (e.g. gender x age band x race) up
+    to max_depth, keeping only subgroups with at least SUBGROUP_MIN_SUPPORT of the
+    rows. Each subgroup gets a representation ratio (observed share vs the share
+    expected if its attributes were independent) and, when a binary outcome is
+    available, its outcome rate gap against everyone outside the subgroup.
+    """
+    max_depth = SUBGROUP_MAX_DEPTH if max_depth is None else max_depth
+    if max_depth < 1 or max_depth > 6:
+        raise HTTPException(status_code=400, detail="subgroup_depth must be between 1 and 6")
+
+    columns, codes, labels = [], [], []
+    for col in find_demographic_columns(df):
+        if col == outcome_column:
+            continue
+        try:
+            col_codes, col_labels = _protected_group_codes(df[col])
+        except Exception as e:
+            print(f"Warning: Could not encode protected column {col}: {e}")
+            continue
+        if 2 <= len(col_labels) <= FAIRNESS_MAX_GROUPS:
+            # Missing values become one extra level, so no per-combination masks are needed
+            columns.append(col)
+            codes.append(np.where(col_codes < 0, len(col_labels), col_codes).astype(np.int32))
+            labels.append(col_labels)
+
+    n = len(df)
+    if not columns or n == 0:
+        return {
+            "score": 0.0,
+            "protected_columns": [],
+            "subgroups": [],
+            "details": "No protected attributes available for an intersectional scan"
+        }
+
+    outcome = None
+    if outcome_column is not None:
+        outcome, _ = binarize_outcome(df[outcome_column])
+    if outcome is not None:
+        outcome_code = np.where(outcome >= 0, outcome, 2).astype(np.int8)
+        labelled_total = int((outcome >= 0).sum())
+        positives_total = int((outcome == 1).sum())
+        overall_rate = positives_total / labelled_total if labelled_total else 0.0
+    else:
+        outcome_code = np.zeros(n, dtype=np.int8)
+
+    sizes = [len(l) + 1 for l in labels]
+    min_count = max(FAIRNESS_MIN_GROUP_SIZE, int(np.ceil(SUBGROUP_MIN_SUPPORT * n)))
+    marginal_share = [np.bincount(c, minlength=k) / n for c, k in zip(codes, sizes)]
+
+    candidates = []  # (severity, count, tiebreak, subgroup)
+    combinations_scanned = 0
+    subgroups_scanned = 0
+    level = [(j,) for j in range(len(columns))]
+    depth = 1
+    while level and combinations_scanned < SUBGROUP_MAX_COMBINATIONS:
+        frequent_combos = set()
+        prefix, prefix_cell = None, None
+        for combo in level:
+            if combinations_scanned >= SUBGROUP_MAX_COMBINATIONS:
+                break
+            combinations_scanned += 1
+            cells = int(np.prod([sizes[j] for j in combo]))
+            dtype = np.int32 if cells * 3 < 2 ** 31 else np.int64
+            # Consecutive combinations share a prefix; its cell codes are built once
+            if len(combo) > 1 and (combo[:-1] != prefix or prefix_cell.dtype != dtype):
+                prefix = combo[:-1]
+                prefix_cell = codes[prefix[0]].astype(dtype)
+                for j in prefix[1:]:
+                    prefix_cell = prefix_cell * sizes[j] + codes[j]
+            ids, table = _subgroup_counts(
+                prefix_cell if len(combo) > 1 else None, codes[combo[-1]], sizes[combo[-1]], outcome_code, cells
+            )
+            key = np.unravel_index(ids, [sizes[j] for j in combo])
+            counts = table.sum(axis=1)
+            # Cells on a column's "missing" level are not reported as subgroups
+            reportable = counts >= min_count
+            for position, j in enumerate(combo):
+                reportable &= key[position] < sizes[j] - 1
+            frequent = np.flatnonzero(reportable)
+            if len(frequent) == 0:
+                continue
+            frequent_combos.add(combo)
+            subgroups_scanned += len(frequent)
+            ids, table, counts = ids[frequent], table[frequent].astype(float), counts[frequent].astype(float)
+            key = tuple(k[frequent] for k in key)
+
+            support = counts / n
+            expected = np.ones(len(ids))
+            for position, j in enumerate(combo):
+                expected *= marginal_share[j][key[position]]
+            representation = support / np.maximum(expected, 1e-12)
+
+            if outcome is not None:
+                labelled = table[:, 0] + table[:, 1]
+                positives = table[:, 1]
+                rest_labelled = labelled_total - labelled
+                rate = _ratio(positives, labelled)
+                gap = rate - _ratio(positives_total - positives, rest_labelled)
+                pooled = overall_rate * (1 - overall_rate)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    z = gap / np.sqrt(pooled * (1 / labelled + 1 / rest_labelled))
+                severity = np.nan_to_num(np.abs(gap))
+            else:
+                severity = np.abs(np.log(np.maximum(representation, 1e-12)))
+
+            # Only this combination's own top_k can reach the overall top_k
+            for i in np.argsort(-severity, kind="stable")[:top_k]:
+                subgroup = {
+                    "attributes": {columns[j]: labels[j][key[p][i]] for p, j in enumerate(combo)},
+                    "depth": len(combo),
+                    "count": int(counts[i]),
+                    "support": float(support[i]),
+                    "expected_support": float(expected[i]),
+                    "representation_ratio": float(representation[i]),
+                }
+                if outcome is not None:
+                    subgroup["outcome_rate"] = None if np.isnan(rate[i]) else float(rate[i])
+                    subgroup["outcome_rate_gap"] = None if np.isnan(gap[i]) else float(gap[i])
+                    subgroup["z_score"] = None if not np.isfinite(z[i]) else float(z[i])
+                candidates.append((float(severity[i]), int(counts[i]), next(_heap_tiebreak), subgroup))
+
+        if depth >= max_depth:
+            break
+        depth += 1
+        # Apriori: a column set is only scanned if every subset one column
+        # smaller had at least one subgroup above min support
+        level = [
+            combo + (j,)
+            for combo in sorted(frequent_combos)
+            for j in range(combo[-1] + 1, len(columns))
+            if all((combo + (j,))[:p] + (combo + (j,))[p + 1:] in frequent_combos for p in range(depth))
+        ]
+
+    worst = [item[3] for item in heapq.nlargest(top_k, candidates, key=lambda item: item[:3])]
+    if outcome is not None:
+        gaps = [abs(s["outcome_rate_gap"]) for s in worst if s["outcome_rate_gap"] is not None]
+        score = min(100.0, max(gaps, default=0.0) * 200)
+        ranking = "absolute outcome rate gap vs the rest of the dataset"
+    else:
+        score = 0.0
+        ranking = "deviation of representation from the independence expectation"
+    return {
+        "score": float(score),
+        "protected_columns": columns,
+        "outcome_column": outcome_column if outcome is not None else None,
+        "overall_outcome_rate": float(overall_rate) if outcome is not None else None,
+        "max_depth": max_depth,
+        "min_count": min_count,
+        "combinations_scanned": combinations_scanned,
+        "subgroups_scanned": subgroups_scanned,
+        "truncated": combinations_scanned >= SUBGROUP_MAX_COMBINATIONS,
+        "ranked_by": ranking,
+        "subgroups": worst,
+        "details": (
+            f"Scanned {subgroups_scanned} subgroups over {len(columns)} protected attributes "
+            f"(depth <= {max_depth}, >= {min_count} rows each)"
+        )
+    }
+
+def calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias):
+    """
+    Simple example: average the bias scores from each component if present, else return 0.
+    Assumes each bias dict has a 'score' key with a value between 0 and 100.
+    """
+    scores = []
+    for bias in [demographic_bias, text_bias, statistical_bias]:
+        if isinstance(bias, dict) and 'score' in bias:
+            scores.append(bias['score'])
+    if scores:
+        return float(np.mean(scores))
+    return 0.0
+
+def compute_numeric_histograms(df, bins: int = 10) -> dict:
+    """Return histogram bins and counts for numeric columns (DataFrame or ComputeBackend)."""
+    backend = as_compute_backend(df)
+    summary = backend.numeric_summary(backend.numeric_columns())
+    return backend.histograms(summary, bins=bins)
+
+
+def compute_categorical_distributions(df, top_n: int = 20) -> dict:
+    """
+    Return top N value counts for categorical/text columns (DataFrame or ComputeBackend).
+    FIXED: Limited to first 20 categorical columns to prevent processing too many columns.
+    """
+    result: Dict[str, Any] = {}
+    backend = as_compute_backend(df)
+    cat_cols = backend.categorical_columns()
+    
+    # Limit to first 20 categorical columns
+    if len(cat_cols) > 20:
+        print(f"   [WARNING] Dataset has {len(cat_cols)} categorical columns, limiting to 20")
+        cat_cols = cat_cols[:20]
+    
+    for col in cat_cols:
+        vc = backend.value_counts(col, top_n=top_n, as_text=True)
+        result[str(col)] = [{"label": str(k), "count": int(v)} for k, v in vc.items()]
+    return result
+
+
+# Correlation engine limits: columns are correlated in blocks of this many,
+# and pairs need at least CORRELATION_MIN_PERIODS shared non-missing rows
+CORRELATION_BLOCK_SIZE = 256
+CORRELATION_MIN_PERIODS = 3
+CORRELATION_MAX_COLUMNS = int(os.getenv("CORRELATION_MAX_COLUMNS", "2000"))
+# Above this many categorical columns, only pairs involving a protected attribute are scored
+ASSOCIATION_FULL_SCAN_COLUMNS = 60
+_heap_tiebreak = itertools.count()
+
+def _standardize_numeric(numeric_df: pd.DataFrame, min_periods: int = CORRELATION_MIN_PERIODS):
+    """
+    Center and scale numeric columns once. Missing values become 0 with a
+    validity mask alongside. Constant or near-empty columns are dropped.
+    Returns (names, Z, mask, has_missing).
+    """
+    values = numeric_df.to_numpy(dtype=np.float64, copy=True)
+    mask = np.isfinite(values)
+    counts = mask.sum(axis=0)
+    values[~mask] = 0.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = values.sum(axis=0) / counts
+        values -= means
+        values[~mask] = 0.0
+        stds = np.sqrt((values * values).sum(axis=0) / counts)
+    keep = (counts >= min_periods) & np.isfinite(stds) & (stds > 0)
+    names = [str(c) for c, k in zip(numeric_df.columns, keep) if k]
+    values = values[:, keep] / stds[keep]
+    mask = mask[:, keep]
+    # Halve memory for very large tables; standardized data keeps ~1e-6 precision in float32
+    if values.size > 20_000_000:
+        values = values.astype(np.float32)
+    return names, values, mask, not mask.all()
+
+def _block_correlations(za, zb, ma, mb, has_missing: bool, n_rows: int, min_periods: int) -> np.ndarray:
+    """Pearson r for every column pair between two standardized blocks, pairwise-complete when masked."""
+    if not has_missing:
+        return np.clip((za.T @ zb) / n_rows, -1.0, 1.0)
+    fa, fb = ma.astype(za.dtype), mb.astype(zb.dtype)
+    n = fa.T @ fb
+    sum_a, sum_b = za.T @ fb, fa.T @ zb
+    sq_a, sq_b = (za * za).T @ fb, fa.T @ (zb * zb)
+    cross = za.T @ zb
+    with np.errstate(invalid="ignore", divide="ignore"):
+        num = n * cross - sum_a * sum_b
+        den = np.sqrt((n * sq_a - sum_a ** 2) * (n * sq_b - sum_b ** 2))
+        r = num / den
+    r[(n < min_periods) | ~np.isfinite(r)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+def _push_top_k(heap: list, top_k: int, strength: np.ndarray, make_edge):
+    """Offer the strongest entries of a block to a bounded min-heap keyed on strength."""
+    flat = np.where(np.isfinite(strength), strength, -1.0).ravel()
+    if flat.size > top_k:
+        candidates = np.argpartition(-flat, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(flat.size)
+    for idx in candidates:
+        value = flat[idx]
+        if value < 0 or (len(heap) >= top_k and value <= heap[0][0]):
+            continue
+        item = (float(value), next(_heap_tiebreak), make_edge(int(idx)))
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+def compute_correlation_edges(df: pd.DataFrame, top_k: int = 20) -> list:
+    """
+    Return top-K strongest absolute correlations as edges for graph visualizations.
+    Columns are standardized once and correlated in blocked matrix multiplies
+    (pairwise-complete via masks when values are missing), keeping only the
+    top-K edges in a heap, so wide tables no longer need a 50-column cap.
+    """
+    numeric_df = df.select_dtypes(include=[np.number])
+    
+    # Cap columns only to stay inside a request budget (each column adds ~cols/2 pairs of work)
+    wanted_cols = min(numeric_df.shape[1], CORRELATION_MAX_COLUMNS)
+    max_cols = budget_sample_size(
+        "chart.correlations", numeric_df.shape[1], CORRELATION_MAX_COLUMNS,
+        len(numeric_df) * wanted_cols / 2 * CORRELATION_SECONDS_PER_CELL
+    )
+    if numeric_df.shape[1] > max_cols:
+        print(f"   [WARNING] Dataset has {numeric_df.shape[1]} numeric columns, limiting to {max_cols} for correlation")
+        numeric_df = numeric_df.iloc[:, :max_cols]
+    
+    if numeric_df.shape[1] < 2:
+        return []
+    
+    names, z, mask, has_missing = _standardize_numeric(numeric_df)
+    n_cols = len(names)
+    complete = mask.all(axis=0)
+    if has_missing:
+        # Complete columns first, so most blocks can skip the masked formulas
+        order = np.argsort(~complete, kind="stable")
+        names = [names[i] for i in order]
+        z, mask, complete = z[:, order], mask[:, order], complete[order]
+    heap: list = []
+    block = CORRELATION_BLOCK_SIZE
+    for a in range(0, n_cols, block):
+        for b in range(a, n_cols, block):
+            block_missing = not (complete[a:a + block].all() and complete[b:b + block].all())
+            r = _block_correlations(
+                z[:, a:a + block], z[:, b:b + block],
+                mask[:, a:a + block], mask[:, b:b + block],
+                block_missing, len(z), CORRELATION_MIN_PERIODS
+            )
+            strength = np.abs(r)
+            if a == b:
+                # Diagonal block: keep the strict upper triangle only
+                strength[np.tril_indices_from(strength)] = np.nan
+            width = r.shape[1]
+            _push_top_k(heap, top_k, strength, lambda idx, a=a, b=b, r=r, width=width: {
+                "source": names[a + idx // width],
+                "target": names[b + idx % width],
+                "weight": float(r[idx // width, idx % width]),
+                "method": "pearson",
+            })
+    
+    return [edge for _, _, edge in sorted(heap, key=lambda item: item[0], reverse=True)]
+
+def _cramers_v(codes_a: np.ndarray, k_a: int, codes_b: np.ndarray, k_b: int) -> float:
+    """Bias-corrected Cramér's V (Bergsma 2013) from a contingency table built with bincount."""
+    valid = (codes_a >= 0) & (codes_b >= 0)
+    n = int(valid.sum())
+    if n < CORRELATION_MIN_PERIODS:
+        return float("nan")
+    table = np.bincount(codes_a[valid] * k_b + codes_b[valid], minlength=k_a * k_b).reshape(k_a, k_b).astype(np.float64)
+    # Drop levels that only occur alongside a missing value in the other column
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    rows, cols = table.sum(axis=1), table.sum(axis=0)
+    r, k = len(rows), len(cols)
+    if r < 2 or k < 2:
+        return float("nan")
+    expected = np.outer(rows, cols) / n
+    phi2 = float(((table - expected) ** 2 / expected).sum()) / n
+    phi2_corr = max(0.0, phi2 - (k - 1) * (r - 1) / (n - 1))
+    r_corr = r - (r - 1) ** 2 / (n - 1)
+    k_corr = k - (k - 1) ** 2 / (n - 1)
+    denom = min(k_corr - 1, r_corr - 1)
+    return float(np.sqrt(phi2_corr / denom)) if denom > 0 else float("nan")
+
+def _correlation_ratios(codes: np.ndarray, z: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Correlation ratio (eta) of one categorical column against every numeric column at once."""
+    valid = codes >= 0
+    codes, z, mask = codes[valid], z[valid], mask[valid]
+    if len(codes) < CORRELATION_MIN_PERIODS:
+        return np.full(z.shape[1], np.nan)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    zs, ms = z[order].astype(np.float64), mask[order].astype(np.float64)
+    sums = np.add.reduceat(zs, starts, axis=0)
+    counts = np.add.reduceat(ms, starts, axis=0)
+    total_n = counts.sum(axis=0)
+    total_sum = sums.sum(axis=0)
+    total_sq = (zs * zs).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grand = total_sum ** 2 / total_n
+        between = np.where(counts > 0, sums ** 2 / counts, 0.0).sum(axis=0) - grand
+        within_total = total_sq - grand
+        eta = np.sqrt(np.clip(between / within_total, 0.0, 1.0))
+    eta[(total_n < CORRELATION_MIN_PERIODS) | ~np.isfinite(eta)] = np.nan
+    return eta
+
+def compute_association_edges(df: pd.DataFrame, top_k: int = 20, max_levels: int = 50) -> list:
+    """
+    Categorical associations for proxy detection: bias-corrected Cramér's V
+    between categorical columns, and the correlation ratio (eta) between
+    categorical and numeric columns. Both are computed on integer category codes.
+    Wide tables only score pairs that involve a demographic column. The top-K
+    edges overall are returned, plus the top-K edges that touch a protected attribute.
+    """
+    protected = set(find_demographic_columns(df))
+    categorical = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and str(col) not in protected:
+            continue
+        codes, uniques = pd.factorize(series, sort=False)
+        if 2 <= len(uniques) <= max_levels:
+            categorical.append((str(col), codes.astype(np.int64), len(uniques)))
+    if not categorical:
+        return []
+    
+    # Wide tables: only score pairs that involve a protected attribute
+    restrict = len(categorical) > ASSOCIATION_FULL_SCAN_COLUMNS
+    overall: list = []
+    proxies: list = []
+    
+    def offer(value: float, edge: dict):
+        if not np.isfinite(value):
+            return
+        edge["weight"] = float(value)
+        edge["protected"] = edge["source"] in protected or edge["target"] in protected
+        _push_top_k(overall, top_k, np.array([value]), lambda _: edge)
+        if edge["protected"]:
+            _push_top_k(proxies, top_k, np.array([value]), lambda _: edge)
+    
+    for i, (name_a, codes_a, k_a) in enumerate(categorical):
+        for name_b, codes_b, k_b in categorical[i + 1:]:
+            if restrict and name_a not in protected and name_b not in protected:
+                continue
+            offer(_cramers_v(codes_a, k_a, codes_b, k_b),
+                  {"source": name_a, "target": name_b, "method": "cramers_v"})
+    
+    numeric_df = df.select_dtypes(include=[np.number])
+    if numeric_df.shape[1] > 0:
+        names, z, mask, _ = _standardize_numeric(numeric_df)
+        if names:
+            for name_a, codes_a, _ in categorical:
+                if restrict and name_a not in protected:
+                    continue
+                for name_b, eta in zip(names, _correlation_ratios(codes_a, z, mask)):
+                    if name_b == name_a:
+                        continue
+                    offer(eta, {"source": name_a, "target": name_b, "method": "correlation_ratio"})
+    
+    edges = {}
+    for _, _, edge in overall + proxies:
+        edges[(edge["source"], edge["target"], edge["method"])] = edge
+    return sorted(edges.values(), key=lambda e: e["weight"], reverse=True)
+
+
+def compute_text_stats(df: pd.DataFrame, max_per_col: int = 50) -> dict:
+    """
+    Text column stats: length histograms, toxicity counts, and sentiment distribution if models are enabled.
+    FIXED: Reduced max_per_col from 1000 to 50 to prevent hangs on large datasets.
+    """
+    text_cols = [c for c in df.columns if df[c].dtype == object or pd.api.types.is_string_dtype(df[c])]
+    
+    # Limit to first 10 text columns to prevent processing too much data
+    text_cols = text_cols[:10]
+    
+    length_histograms: Dict[str, Any] = {}
+    toxicity_by_column: Dict[str, int] = {}
+    sentiment_distribution: Dict[str, int] = {}
+    cascade: Dict[str, int] = {}
+
+    # Under a request budget the toxicity pass leaves room for the sentiment pass
+    model_passes = int(toxicity_analyzer is not None) + int(sentiment_analyzer is not None)
+
+    for col_idx, col in enumerate(text_cols):
+        texts = df[col].dropna().astype(str).tolist()
+        
+        # Length histogram (fast, no model inference)
+        lengths = [len(t) for t in texts]
+        if lengths:
+            counts, bins = np.histogram(lengths, bins=10)
+            length_histograms[str(col)] = {
+                "bin_edges": list(map(float, bins.tolist())),
+                "counts": list(map(int, counts.tolist()))
+            }
+        
+        # Toxicity counts (SLOW - uses AI model, limit to 50 samples)
+        toxic_count = 0
+        if toxicity_analyzer is not None:
+            # Only analyze first 50 texts per column
+            n = budget_sample_size(
+                "chart.text_stats", len(texts), max_per_col, toxicity_seconds_per_text(),
+                parts=model_passes * (len(text_cols) - col_idx)
+            )
+            # Skip very short or empty texts; truncate long texts to prevent model slowdown
+            candidates = [t[:500] for t in texts[:n] if len(t) >= 3]
+            for start in range(0, len(candidates), INFERENCE_BATCH_SIZE):
+                if budget_expired("chart.text_stats"):
+                    budget_cut_short("chart.text_stats", len(candidates) - start)
+                    break
+                chunk = candidates[start:start + INFERENCE_BATCH_SIZE]
+                for res in classify_toxicity(chunk, cascade):
+                    if res and res.get("label", "").lower() == "toxic" and res.get("score", 0) > 0.5:
+                        toxic_count += 1
+        toxicity_by_column[str(col)] = int(toxic_count)
+
+    # Sentiment distribution across all text columns (SLOW - uses AI model)
+    if sentiment_analyzer is not None and text_cols:
+        pos = neg = neu = 0
+        for col_idx, col in enumerate(text_cols):
+            texts = df[col].dropna().astype(str).tolist()
+            # Only analyze first 50 texts per column
+            n = budget_sample_size(
+                "chart.text_stats", len(texts), max_per_col, seconds_per_text("sentiment"),
+                parts=len(text_cols) - col_idx
+            )
+            # Skip very short or empty texts; truncate long texts
+            candidates = [t[:500] for t in texts[:n] if len(t) >= 3]
+            for start in range(0, len(candidates), INFERENCE_BATCH_SIZE):
+                if budget_expired("chart.text_stats"):
+                    budget_cut_short("chart.text_stats", len(candidates) - start)
+                    break
+                chunk = candidates[start:start + INFERENCE_BATCH_SIZE]
+                for res in classify_texts("sentiment", sentiment_analyzer, chunk):
+                    if not res:
+                        continue
+                    label = str(res.get("label", "")).lower()
+                    if "pos" in label or "positive" in label:
+                        pos += 1
+                    elif "neg" in label or "negative" in label:
+                        neg += 1
+                    else:
+                        neu += 1
+        sentiment_distribution = {"positive": pos, "negative": neg, "neutral": neu}
+
+    return {
+        "text_columns": list(map(str, text_cols)),
+        "length_histograms": length_histograms,
+        "toxicity_by_column": toxicity_by_column,
+        "toxicity_cascade": cascade_report(cascade) if cascade else None,
+        "sentiment_distribution": sentiment_distribution
+    }
+
+
+def build_chart_data(df: pd.DataFrame, backend: Optional[ComputeBackend] = None) -> dict:
+    """
+    Collect chart-ready data for interactive visualizations.
+    FIXED: Added error handling to prevent hangs.
+    When backend is given (out-of-core runs, where df is a sample), histograms,
+    distributions and missing counts come from the full dataset through it.
+    """
+    chart_data = {}
+    full = backend or PandasBackend(df)
+    
+    try:
+        print("   [CHART] Building numeric histograms...")
+        with stage_timer("chart.histograms"):
+            chart_data["numeric_histograms"] = compute_numeric_histograms(full)
+    except Exception as e:
+        print(f"   [WARNING] Error building histograms: {str(e)[:100]}")
+        chart_data["numeric_histograms"] = {}
+    
+    try:
+        print("   [CHART] Building categorical distributions...")
+        with stage_timer("chart.categorical"):
+            chart_data["categorical_distributions"] = compute_categorical_distributions(full)
+    except Exception as e:
+        print(f"   [WARNING] Error building distributions: {str(e)[:100]}")
+        chart_data["categorical_distributions"] = {}
+    
+    try:
+        print("   [CHART] Computing correlations...")
+        with stage_timer("chart.correlations"):
+            chart_data["correlation_edges"] = compute_correlation_edges(df)
+    except Exception as e:
+        print(f"   [WARNING] Error computing correlations: {str(e)[:100]}")
+        chart_data["correlation_edges"] = []
+    
+    try:
+        print("   [CHART] Computing categorical associations...")
+        with stage_timer("chart.associations"):
+            chart_data["association_edges"] = compute_association_edges(df)
+    except Exception as e:
+        print(f"   [WARNING] Error computing associations: {str(e)[:100]}")
+        chart_data["association_edges"] = []
+    
+    try:
+        print("   [CHART] Computing text statistics...")
+        with stage_timer("chart.text_stats"):
+            chart_data["text_stats"] = compute_text_stats(df)
+    except Exception as e:
+        print(f"   [WARNING] Error computing text stats: {str(e)[:100]}")
+        chart_data["text_stats"] = {}
+    
+    try:
+        chart_data["missing_values"] = full.missing_counts()
+    except Exception as e:
+        print(f"   [WARNING] Error computing missing values: {str(e)[:100]}")
+        chart_data["missing_values"] = {}
+    
+    return chart_data
+
+# -------- Profile Catalog --------
+# Each analysis stores a compact profile of the uploaded data in a SQLite
+# catalog under JOBS_DIR, keyed by dataset name and version: t-digests and
+# histograms for numeric columns, top-value counts for the rest, missing and
+# distinct counts, and the detector scores. /compare measures drift between two
+# stored versions (PSI, KS on the digests, representation shifts per
+# demographic group) from the profiles alone, without touching raw data.
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(JOBS_DIR, "catalog.sqlite3"))  # empty disables the catalog
+PROFILE_FORMAT = 1
+PROFILE_TOP_VALUES = int(os.getenv("PROFILE_TOP_VALUES", "100"))
+PROFILE_HISTOGRAM_BINS = 20
+PSI_BINS = 10
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.2
+PSI_SHARE_FLOOR = 1e-4  # empty bins would make PSI infinite
+PROFILE_SCORES = ("demographic_bias", "text_bias", "statistical_bias")
+
+CATALOG_PROFILES = METRICS.register(Counter(
+    "biasbounty_catalog_profiles_total", "Dataset profiles written to the catalog, by result.", ("result",)))
+
+def _finite(value) -> Optional[float]:
+    """float(value), or None for missing/NaN/inf (JSON responses reject NaN)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def build_dataset_profile(backend: ComputeBackend, result: dict) -> dict:
+    """Profile of the analysed (uploaded, pre-cleaning) data plus the result's detector scores."""
+    rows = backend.row_count()
+    missing = backend.missing_counts()
+    numeric = backend.numeric_columns()
+    summary = backend.numeric_summary(numeric)
+    histograms = backend.histograms(summary, bins=PROFILE_HISTOGRAM_BINS)
+    columns = {}
+    for col in backend.columns:
+        absent = int(missing.get(col, 0))
+        if col in summary:
+            stats = summary[col]
+            entry = {"kind": "numeric", "count": int(stats["count"]), "missing": absent}
+            if stats["count"]:
+                entry.update(
+                    stats={k: _finite(stats[k]) for k in ("mean", "std", "min", "median", "max")},
+                    digest=backend.quantile_digest(col).to_state(), histogram=histograms.get(col),
+                )
+        else:
+            top = backend.value_counts(col, top_n=PROFILE_TOP_VALUES)
+            count = rows - absent
+            entry = {
+                "kind": "categorical", "count": count, "missing": absent, "distinct": backend.nunique(col),
+                "top": [[str(value), int(n)] for value, n in top.items()], "other": max(0, count - int(top.sum())),
+            }
+        columns[col] = entry
+    metrics = result["fairness_metrics"]
+    return {
+        "format": PROFILE_FORMAT, "rows": int(rows), "columns": columns,
+        "demographic_columns": find_demographic_columns(backend),
+        "scores": {
+            "bias_score": _finite(result["bias_score"]),
+            **{name: _finite((metrics.get(name) or {}).get("score")) for name in PROFILE_SCORES},
+        },
+    }
+
+class ProfileCatalog:
+    """
+    SQLite store of dataset profiles: one row per (dataset, version) holding
+    the profile as zlib-compressed JSON. Versions default to a per-dataset
+    sequence number; re-recording a version replaces it and makes it latest.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset TEXT NOT NULL,
+            version TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            created REAL NOT NULL,
+            job_id TEXT,
+            filename TEXT,
+            analysis_type TEXT,
+            rows INTEGER,
+            bias_score REAL,
+            profile BLOB NOT NULL,
+            UNIQUE (dataset, version)
+        );
+        CREATE INDEX IF NOT EXISTS profiles_by_dataset ON profiles (dataset, seq);
+    """
+    META_COLUMNS = ("id", "dataset", "version", "seq", "created", "job_id", "filename", "analysis_type",
+                    "rows", "bias_score")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._con = None
+        if path:
+            self._con = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.executescript(self.SCHEMA)
+
+    @property
+    def enabled(self) -> bool:
+        return self._con is not None
+
+    def _require(self):
+        if self._con is None:
+            raise HTTPException(status_code=503, detail="The profile catalog is disabled (CATALOG_PATH is empty)")
+
+    def _meta(self, row) -> dict:
+        meta = dict(zip(self.META_COLUMNS, row))
+        meta["created"] = pd.Timestamp(int(meta["created"] * 1000), unit="ms", tz="UTC").isoformat()
+        return meta
+
+    def record(self, dataset: str, version: Optional[str], profile: dict, meta: dict) -> dict:
+        self._require()
+        blob = zlib.compress(json.dumps(profile).encode("utf-8"))
+        with self._lock, self._con:
+            seq = self._con.execute(
+                "SELECT coalesce(max(seq), 0) + 1 FROM profiles WHERE dataset = ?", (dataset,)
+            ).fetchone()[0]
+            version = str(version) if version else str(seq)
+            self._con.execute(
+                """INSERT INTO profiles (dataset, version, seq, created, job_id, filename, analysis_type, rows,
+                                         bias_score, profile)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (dataset, version) DO UPDATE SET
+                       seq = excluded.seq, created = excluded.created, job_id = excluded.job_id,
+                       filename = excluded.filename, analysis_type = excluded.analysis_type,
+                       rows = excluded.rows, bias_score = excluded.bias_score, profile = excluded.profile""",
+                (dataset, version, seq, time.time(), meta.get("job_id"), meta.get("filename"),
+                 meta.get("analysis_type"), profile["rows"], profile["scores"]["bias_score"], blob),
+            )
+            profile_id = self._con.execute(
+                "SELECT id FROM profiles WHERE dataset = ? AND version = ?", (dataset, version)
+            ).fetchone()[0]
+        return {"dataset": dataset, "version": version, "profile_id": profile_id, "profile_bytes": len(blob)}
+
+    def versions(self, dataset: Optional[str] = None, limit: int = 100) -> list:
+        self._require()
+        where, args = ("WHERE dataset = ?", (dataset,)) if dataset is not None else ("", ())
+        with self._lock:
+            rows = self._con.execute(
+                f"SELECT {', '.join(self.META_COLUMNS)} FROM profiles {where} ORDER BY dataset, seq DESC LIMIT ?",
+                (*args, int(limit)),
+            ).fetchall()
+        return [self._meta(row) for row in rows]
+
+    def load(self, dataset: str, version: Optional[str] = None, before_seq: Optional[int] = None):
+        """(meta, profile) for a version; the latest one (before before_seq, if given) when version is None."""
+        self._require()
+        columns = ", ".join(self.META_COLUMNS)
+        if version is not None:
+            sql, args = f"SELECT {columns}, profile FROM profiles WHERE dataset = ? AND version = ?", (dataset, version)
+        else:
+            sql = f"SELECT {columns}, profile FROM profiles WHERE dataset = ? AND seq < ? ORDER BY seq DESC LIMIT 1"
+            args = (dataset, before_seq if before_seq is not None else 2 ** 62)
+        with self._lock:
+            row = self._con.execute(sql, args).fetchone()
+        if row is None:
+            return None
+        return self._meta(row[:-1]), json.loads(zlib.decompress(row[-1]))
+
+    def status(self) -> dict:
+        if self._con is None:
+            return {"enabled": False}
+        with self._lock:
+            profiles, datasets = self._con.execute("SELECT count(*), count(DISTINCT dataset) FROM profiles").fetchone()
+        return {"enabled": True, "path": self.path, "profiles": profiles, "datasets": datasets}
+
+CATALOG = ProfileCatalog(CATALOG_PATH)
+
+def record_profile(catalog_key, backend: ComputeBackend, result: dict, filename: str) -> Optional[dict]:
+    """
+    Store the profile of an analysed dataset under catalog_key = (dataset,
+    version or None). A catalog failure is logged and never fails the analysis.
+    """
+    if catalog_key is None or not CATALOG.enabled:
+        return None
+    dataset, version = catalog_key
+    try:
+        with stage_timer("catalog.profile"):
+            profile = build_dataset_profile(backend, result)
+            entry = CATALOG.record(dataset, version, profile, {
+                "job_id": result.get("job_id"), "filename": filename, "analysis_type": result.get("analysis_type"),
+            })
+    except Exception as e:
+        CATALOG_PROFILES.inc(result="error")
+        print(f"[WARNING] Could not store the profile of {dataset}: {str(e)[:200]}")
+        return None
+    CATALOG_PROFILES.inc(result="ok")
+    print(f"[CATALOG] Stored profile {dataset} version {entry['version']} ({entry['profile_bytes']} bytes)")
+    return entry
+
+def population_stability_index(base_shares: np.ndarray, target_shares: np.ndarray) -> float:
+    base = np.maximum(base_shares, PSI_SHARE_FLOOR)
+    target = np.maximum(target_shares, PSI_SHARE_FLOOR)
+    return float(np.sum((target - base) * np.log(target / base)))
+
+def _kolmogorov_pvalue(statistic: float, n: float) -> float:
+    """Asymptotic two-sample KS p-value for effective sample size n."""
+    if n <= 0:
+        return 1.0
+    lam = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * statistic
+    if lam < 0.3:  # the series converges poorly here and p > 0.9999
+        return 1.0
+    k = np.arange(1, 101)
+    return float(np.clip(2 * np.sum((-1.0) ** (k - 1) * np.exp(-2 * k * k * lam * lam)), 0.0, 1.0))
+
+def ks_from_digests(base: TDigest, target: TDigest) -> tuple:
+    """KS statistic (max CDF gap over both digests' centroids) and its asymptotic p-value."""
+    grid = np.unique(np.concatenate([base.means, target.means, [base.min, base.max, target.min, target.max]]))
+    statistic = float(np.max(np.abs(base.cdf(grid) - target.cdf(grid))))
+    n = base.count * target.count / (base.count + target.count)
+    return statistic, _kolmogorov_pvalue(statistic, n)
+
+def _digest_bins(base: TDigest):
+    """Inner edges at the base digest's deciles, with the share of each digest per bin."""
+    edges = np.unique([base.quantile(i / PSI_BINS) for i in range(1, PSI_BINS)])
+    return edges, lambda digest: np.diff(np.concatenate([[0.0], digest.cdf(edges), [1.0]]))
+
+def _category_shares(base: dict, target: dict):
+    """Aligned (values, base shares, target shares); the last bucket is each side's untracked mass."""
+    values = list(dict.fromkeys([v for v, _ in base["top"]] + [v for v, _ in target["top"]]))
+    shares = []
+    for entry in (base, target):
+        counts = dict(entry["top"])
+        tracked = np.array([counts.get(v, 0) for v in values], dtype=float) / max(entry["count"], 1)
+        shares.append(np.concatenate([tracked, [max(0.0, 1.0 - tracked.sum())]]))
+    return values, shares[0], shares[1]
+
+def _severity(psi: Optional[float]) -> str:
+    if psi is None:
+        return "unknown"
+    return "major" if psi >= PSI_MAJOR else "moderate" if psi >= PSI_MODERATE else "stable"
+
+def _rate(entry: dict, rows: int) -> Optional[float]:
+    return round(entry["missing"] / rows, 6) if rows else None
+
+def compare_column(base: dict, target: dict, base_rows: int, target_rows: int) -> dict:
+    report = {"kind": target["kind"], "missing_rate": {"base": _rate(base, base_rows), "target": _rate(target, target_rows)}}
+    if base["kind"] != target["kind"]:
+        return {**report, "kind": "changed", "base_kind": base["kind"], "severity": "major"}
+    if base["kind"] == "numeric":
+        if "digest" not in base or "digest" not in target:
+            return {**report, "psi": None, "severity": "unknown"}
+        base_digest, target_digest = TDigest.from_state(base["digest"]), TDigest.from_state(target["digest"])
+        _, shares = _digest_bins(base_digest)
+        psi = population_stability_index(shares(base_digest), shares(target_digest))
+        ks, pvalue = ks_from_digests(base_digest, target_digest)
+        report.update(
+            psi=round(psi, 6), ks=round(ks, 6), ks_pvalue=pvalue,
+            mean={"base": base["stats"]["mean"], "target": target["stats"]["mean"]},
+            median={"base": base["stats"]["median"], "target": target["stats"]["median"]},
+        )
+    else:
+        values, base_shares, target_shares = _category_shares(base, target)
+        psi = population_stability_index(base_shares, target_shares)
+        base_values, target_values = {v for v, _ in base["top"]}, {v for v, _ in target["top"]}
+        report.update(
+            psi=round(psi, 6), distinct={"base": base["distinct"], "target": target["distinct"]},
+            # Only certain when the other side's top list is complete
+            new_values=sorted(target_values - base_values)[:20] if not base["other"] else None,
+            vanished_values=sorted(base_values - target_values)[:20] if not target["other"] else None,
+        )
+    report["severity"] = _severity(report["psi"])
+    return report
+
+def representation_shift(base: dict, target: dict) -> list:
+    """Share of each group (category, or base-decile range for numeric columns) in both versions."""
+    if base["kind"] != target["kind"]:
+        return []
+    if base["kind"] == "numeric":
+        if "digest" not in base or "digest" not in target:
+            return []
+        base_digest, target_digest = TDigest.from_state(base["digest"]), TDigest.from_state(target["digest"])
+        edges, shares = _digest_bins(base_digest)
+        bounds = [None, *edges.tolist(), None]
+        groups = [
+            f"< {hi:g}" if lo is None else f">= {lo:g}" if hi is None else f"[{lo:g}, {hi:g})"
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+        base_shares, target_shares = shares(base_digest), shares(target_digest)
+    else:
+        groups, base_all, target_all = _category_shares(base, target)
+        base_shares, target_shares = base_all[:-1], target_all[:-1]
+    rows = [
+        {
+            "group": group, "base_share": round(float(b), 6), "target_share": round(float(t), 6),
+            "shift_pp": round(float(t - b) * 100, 3), "ratio": round(float(t / b), 4) if b > 0 else None,
+        }
+        for group, b, t in zip(groups, base_shares, target_shares)
+    ]
+    return sorted(rows, key=lambda row: -abs(row["shift_pp"]))
+
+def compare_profiles(base_meta: dict, base: dict, target_meta: dict, target: dict) -> dict:
+    """Drift report between two stored profiles (base -> target)."""
+    shared = [col for col in target["columns"] if col in base["columns"]]
+    columns = {
+        col: compare_column(base["columns"][col], target["columns"][col], base["rows"], target["rows"])
+        for col in shared
+    }
+    demographic = [col for col in target["demographic_columns"] if col in base["columns"]]
+    drifted = sorted(
+        (col for col, report in columns.items() if report["severity"] in ("moderate", "major")),
+        key=lambda col: -(columns[col].get("psi") or float("inf")),
+    )
+    scores = {
+        name: {
+            "base": base["scores"].get(name), "target": target["scores"].get(name),
+            "delta": (target["scores"][name] - base["scores"][name])
+            if base["scores"].get(name) is not None and target["scores"].get(name) is not None else None,
+        }
+        for name in target["scores"]
+    }
+    return {
+        "base": base_meta, "target": target_meta,
+        "rows": {"base": base["rows"], "target": target["rows"]},
+        "scores": scores,
+        "thresholds": {"psi_moderate": PSI_MODERATE, "psi_major": PSI_MAJOR, "psi_bins": PSI_BINS},
+        "drifted_columns": drifted,
+        "added_columns": [col for col in target["columns"] if col not in base["columns"]],
+        "removed_columns": [col for col in base["columns"] if col not in target["columns"]],
+        "columns": columns,
+        "representation": {
+            col: representation_shift(base["columns"][col], target["columns"][col]) for col in demographic
+        },
+    }
+
+# -------- Analysis Pipeline --------
+
+def detect_file_type(filename: str, content_type: Optional[str] = None) -> str:
+    """Map an upload's filename (or, failing that, its content type) to a load_dataset file type."""
+    # Better file type detection
+    if filename.endswith(".csv"):
+        return "text/csv"
+    elif filename.endswith(".json"):
+        return "application/json"
+    elif filename.endswith(".xlsx"):
+        return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    elif filename.endswith(".xls"):
+        return "application/vnd.ms-excel"
+    elif filename.endswith(".txt"):
+        return "text/plain"
+    # Fallback to content type or CSV
+    ftype = content_type or "text/csv"
+    print(f"Warning: Unknown file extension for {filename}, using type: {ftype}")
+    return ftype
+
+def validate_dataset(df: pd.DataFrame):
+    """Reject frames too small for a meaningful analysis (400)."""
+    if df.empty:
+        raise HTTPException(status_code=400, detail="Dataset is empty or could not be parsed")
     
-    # ==================== STAGE 1: SMART MISSING VALUE IMPUTATION ====================
-    print("   Stage 1/5: Smart missing value imputation...")
-    for col in cleaned.columns:
-        if cleaned[col].dtype in [np.float64, np.int64]:
-            # Use median for numeric (more robust than mean)
-            cleaned[col] = cleaned[col].fillna(cleaned[col].median())
-        else:
-            # For categorical, use mode if available, else "Unknown"
-            mode_val = cleaned[col].mode()
-            if len(mode_val) > 0:
-                cleaned[col] = cleaned[col].fillna(mode_val[0])
-            else:
-                cleaned[col] = cleaned[col].fillna("Unknown")
+    if len(df) < 5:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Dataset too small ({len(df)} rows). Need at least 5 rows for meaningful analysis."
+        )
     
-    # ==================== STAGE 2: AGGRESSIVE DEMOGRAPHIC BALANCING ====================
-    print("   Stage 2/5: Aggressive demographic balancing...")
-    demographic_keywords = [
-        "gender", "sex", "race", "ethnicity", "age", "religion", 
-        "nationality", "disability", "orientation", "marital",
-        "veteran", "color", "national_origin", "ancestry"
-    ]
+    if len(df.columns) < 2:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Dataset has only {len(df.columns)} column(s). Need at least 2 columns for bias analysis."
+        )
+
+def analyze_content(content: bytes, filename: str, content_type: Optional[str] = None,
+                    outcome_column: Optional[str] = None, prediction_column: Optional[str] = None,
+                    subgroup_depth: Optional[int] = None,
+                    collapse_near_duplicates: Optional[bool] = None,
+                    cleaning_params: Optional[Dict[str, Any]] = None, catalog_key: Optional[tuple] = None) -> dict:
+    """
+    Full upload analysis: load, clean, detect, save the cleaned CSV and build charts.
+    Shared by /analyze-upload and /analyze-batch. Raises HTTPException on invalid input,
+    and 507 when the job cannot fit in memory even as a row sample. catalog_key,
+    (dataset, version or None), stores the uploaded data's profile in CATALOG.
+    """
+    start_time = time.time()
+    print(f"\n{'='*60}")
+    print(f"[ANALYSIS] NEW ANALYSIS REQUEST")
+    print(f"{'='*60}")
     
-    balanced_count = 0
-    for col in cleaned.columns:
-        col_lower = str(col).lower()
-        if any(keyword in col_lower for keyword in demographic_keywords):
-            try:
-                # Check if this is a categorical demographic column
-                unique_values = cleaned[col].nunique()
-                if 2 <= unique_values <= 15:  # Process columns with 2-15 unique values
-                    value_counts = cleaned[col].value_counts()
-                    max_count = value_counts.max()
-                    min_count = value_counts.min()
-                    
-                    # Calculate imbalance ratio
-                    imbalance_ratio = max_count / min_count if min_count > 0 else float('inf')
-                    
-                    # AGGRESSIVE BALANCING: If imbalance ratio > 1.5 (was 60%)
-                    if imbalance_ratio > 1.5:
-                        # Calculate target count (between min and average)
-                        avg_count = int(value_counts.mean())
-                        target_count = int((min_count + avg_count) / 2)
-                        target_count = max(target_count, min_count + 5)  # Ensure some increase
-                        
-                        balanced_dfs = []
-                        for value in value_counts.index:
-                            subset = cleaned[cleaned[col] == value]
-                            current_count = len(subset)
-                            
-                            if current_count > target_count:
-                                # Undersample majority class
-                                subset = subset.sample(n=target_count, random_state=42)
-                            elif current_count < target_count and current_count > 0:
-                                # Oversample minority class (with replacement if needed)
-                                n_samples = min(target_count, current_count * 3)  # Max 3x oversampling
-                                subset = subset.sample(n=n_samples, replace=(n_samples > current_count), random_state=42)
-                            
-                            balanced_dfs.append(subset)
-                        
-                        cleaned = pd.concat(balanced_dfs, ignore_index=True).sample(frac=1, random_state=42)
-                        balanced_count += 1
-                        print(f"      [SUCCESS] Balanced '{col}': {imbalance_ratio:.2f}x imbalance -> ~1.5x (target: {target_count} per group)")
-            except Exception as e:
-                print(f"      [WARNING] Could not balance '{col}': {str(e)[:50]}")
-                pass
+    # Validate file size (max 50MB)
+    file_size_mb = len(content) / (1024 * 1024)
+    BYTES_PROCESSED.inc(len(content))
     
-    if balanced_count > 0:
-        print(f"      -> Balanced {balanced_count} demographic column(s)")
+    print(f"[FILE] File size: {file_size_mb:.2f}MB")
     
-    # ==================== STAGE 3: TOXIC CONTENT FILTERING ====================
-    print("   Stage 3/5: AI-powered toxic content filtering...")
-    removed_toxic = 0
+    if file_size_mb > MAX_IN_MEMORY_MB:
+        raise HTTPException(
+            status_code=413, 
+            detail=f"File too large ({file_size_mb:.1f}MB). Maximum size is {MAX_IN_MEMORY_MB}MB "
+                   f"(larger CSV/JSON uploads need the optional duckdb package)."
+        )
     
-    if toxicity_analyzer is not None:
-        text_cols = [c for c in cleaned.columns if cleaned[c].dtype == object or pd.api.types.is_string_dtype(cleaned[c])]
-        
-        for col in text_cols[:5]:  # Process first 5 text columns
-            try:
-                texts = cleaned[col].dropna().astype(str).tolist()
-                if len(texts) > 50:
-                    # Sample intelligently - check more rows for better coverage
-                    sample_size = min(150, len(cleaned))
-                    sample_indices = np.random.choice(len(cleaned), sample_size, replace=False)
-                    toxic_indices = []
-                    
-                    for idx in sample_indices:
-                        text = str(cleaned.loc[idx, col])
-                        if 10 < len(text) < 1000:  # Process reasonable length texts
-                            try:
-                                result = toxicity_analyzer(text[:500], max_length=128, truncation=True)
-                                if isinstance(result, list) and result:
-                                    # AGGRESSIVE: Remove if toxicity > 0.6 (was 0.7)
-                                    if result[0].get('label', '').lower() == 'toxic' and result[0].get('score', 0) > 0.6:
-                                        toxic_indices.append(idx)
-                            except:
-                                pass
-                    
-                    # Remove toxic rows (up to 40% of dataset)
-                    if len(toxic_indices) > 0 and len(toxic_indices) < len(cleaned) * 0.4:
-                        before = len(cleaned)
-                        cleaned = cleaned.drop(toxic_indices).reset_index(drop=True)
-                        removed = before - len(cleaned)
-                        removed_toxic += removed
-                        print(f"      [SUCCESS] Removed {removed} toxic rows from '{col}'")
-            except Exception as e:
-                pass
+    if file_size_mb == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
     
-    if removed_toxic > 0:
-        print(f"      -> Total toxic content removed: {removed_toxic} rows")
+    # Determine file type
+    print(f"[FILE] Filename: {filename}")
+    ftype = detect_file_type(filename, content_type)
     
-    # ==================== STAGE 4: STATISTICAL NORMALIZATION & OUTLIER REMOVAL ====================
-    print("   Stage 4/5: Statistical normalization & outlier removal...")
-    outliers_removed = 0
+    # Reserve the projected peak before parsing; too big -> row sample (CSV) or 507
+    memory = estimate_upload_memory(content[:ADMISSION_SNIFF_BYTES], len(content), ftype)
+    with MEMORY.reserve(memory, can_sample="csv" in ftype) as reservation:
+        # Load and validate dataset
+        print(f"Processing file: {filename} ({file_size_mb:.2f}MB, type: {ftype})")
+        with stage_timer("load"):
+            if reservation.mode == "sampled":
+                df = load_csv_sample(content, reservation.fraction)
+            else:
+                df = load_dataset(content, ftype)
+
+        validate_dataset(df)
+        print(f"Loaded dataset: {len(df)} rows × {len(df.columns)} columns")
+        ROWS_PROCESSED.inc(len(df), phase="loaded")
+
+        if collapse_near_duplicates is not None:
+            cleaning_params = {**(cleaning_params or {}), "collapse_near_duplicates": collapse_near_duplicates}
+        result = analyze_dataframe(
+            df, filename, outcome_column=outcome_column, prediction_column=prediction_column,
+            subgroup_depth=subgroup_depth, cleaning_params=cleaning_params, start_time=start_time
+        )
+        if reservation.mode == "sampled":
+            result["analysis_type"] = "sampled"
+        catalog = record_profile(catalog_key, PandasBackend(df), result, filename)
+        if catalog is not None:
+            result["catalog"] = catalog
+        # The reservation covers the frame: release it before the reservation closes
+        del df
+    result["memory"] = {**reservation.report(), "estimated_rows": memory["rows"]}
+    return result
+
+
+def analyze_dataframe(df: pd.DataFrame, filename: str, outcome_column: Optional[str] = None,
+                      prediction_column: Optional[str] = None, subgroup_depth: Optional[int] = None,
+                      cleaning_params: Optional[Dict[str, Any]] = None, pre_clean: Optional[dict] = None,
+                      start_time: Optional[float] = None, cleaned_format: str = "csv") -> dict:
+    """
+    Everything after loading: pre-clean metrics, the cleaning pipeline, detection,
+    the cleaned CSV and charts. Group fairness is measured on the uploaded rows,
+    before cleaning resamples them. pre_clean, from an earlier run on the same
+    frame, skips recomputing those metrics (/reclean). The job is remembered so
+    it can be re-cleaned with other parameters. cleaned_format="arrow" saves the
+    cleaned frame as an Arrow IPC file for Flight clients instead of a CSV.
+    """
+    start_time = start_time if start_time is not None else time.time()
+    params = resolve_cleaning_params(cleaning_params)
+    with stage_timer("clean.fingerprint"):
+        input_key = dataframe_fingerprint(df)
+
+    if pre_clean is None:
+        # Calculate pre-cleaning metrics
+        backend = PandasBackend(df)
+        print("[STEP 1/6] Calculating missing values...")
+        with stage_timer("missing_values"):
+            missing_by_column = backend.missing_counts()
+
+        print("[STEP 2/6] Detecting outliers...")
+        with stage_timer("outliers"):
+            outliers_by_column = backend.outlier_counts(backend.numeric_summary(backend.numeric_columns()))
+
+        with stage_timer("detect.fairness"):
+            group_fairness = compute_group_fairness(df, outcome_column, prediction_column)
+        with stage_timer("detect.subgroups"):
+            intersectional_bias = compute_intersectional_subgroups(df, group_fairness["outcome_column"], subgroup_depth)
+        pre_clean = {
+            "missing_values": missing_by_column, "outliers": outliers_by_column,
+            "group_fairness": group_fairness, "intersectional_bias": intersectional_bias,
+        }
+    missing_by_column = pre_clean["missing_values"]
+    outliers_by_column = pre_clean["outliers"]
+    group_fairness = pre_clean["group_fairness"]
+    intersectional_bias = pre_clean["intersectional_bias"]
     
-    numeric_cols = cleaned.select_dtypes(include=[np.number]).columns
-    for col in numeric_cols:
-        try:
-            series = cleaned[col].dropna()
-            if len(series) > 20:
-                # Calculate IQR for robust outlier detection
-                q1 = series.quantile(0.25)
-                q3 = series.quantile(0.75)
-                iqr = q3 - q1
-                
-                if iqr > 0:
-                    # AGGRESSIVE: Use 2.5 IQR (was 3 std dev) for tighter bounds
-                    lower_bound = q1 - 2.5 * iqr
-                    upper_bound = q3 + 2.5 * iqr
-                    
-                    outlier_mask = (cleaned[col] < lower_bound) | (cleaned[col] > upper_bound)
-                    outlier_count = outlier_mask.sum()
-                    
-                    # Remove outliers (up to 15% per column)
-                    if 0 < outlier_count < len(cleaned) * 0.15:
-                        before = len(cleaned)
-                        cleaned = cleaned[~outlier_mask].reset_index(drop=True)
-                        removed = before - len(cleaned)
-                        outliers_removed += removed
-                        if removed > 0:
-                            print(f"      [SUCCESS] Removed {removed} outliers from '{col}'")
-        except Exception as e:
-            pass
+    # Clean dataset
+    print("[STEP 3/6] Cleaning dataset...")
+    cleaning_events = []
+    with stage_timer("clean"):
+        cleaned = clean_dataset(df, cleaning_events.append, params=params, input_key=input_key)
+    near_duplicates = next((ev for ev in cleaning_events if ev.get("stage") == "near_duplicates"), None)
+    cleaning = next(ev for ev in cleaning_events if ev.get("stage") == "pipeline")
+    ROWS_PROCESSED.inc(len(cleaned), phase="cleaned")
     
-    if outliers_removed > 0:
-        print(f"      -> Total outliers removed: {outliers_removed} rows")
+    # Run bias detection with progress tracking
+    print("[STEP 4/6] Running demographic bias detection...")
+    with stage_timer("detect.demographic"):
+        demographic_bias = detect_demographic_bias(cleaned)
+    print(f"   [SUCCESS] Demographic bias score: {demographic_bias.get('score', 0):.1f}")
     
-    # ==================== STAGE 5: CROSS-CORRELATION BIAS MITIGATION ====================
-    print("   Stage 5/5: Cross-correlation bias mitigation...")
+    print("[STEP 5/6] Running text bias detection (this may take a moment)...")
+    with stage_timer("detect.text"):
+        text_bias = detect_text_bias(cleaned)
+    print(f"   [SUCCESS] Text bias score: {text_bias.get('score', 0):.1f}")
     
-    # Ensure we keep at least 60% of original data
-    min_required_rows = int(original_rows * 0.6)
-    if len(cleaned) < min_required_rows:
-        print(f"      [WARNING] Too much data removed ({len(cleaned)}/{original_rows}). Keeping more samples...")
-        # This is a safety check - in practice, previous stages should handle this
+    print("[STEP 6/6] Running statistical bias detection...")
+    with stage_timer("detect.statistical"):
+        statistical_bias = detect_statistical_bias(cleaned)
+    print(f"   [SUCCESS] Statistical bias score: {statistical_bias.get('score', 0):.1f}")
     
-    # Remove duplicate rows (can indicate biased sampling)
-    duplicates_before = cleaned.duplicated().sum()
-    if duplicates_before > 0:
-        cleaned = cleaned.drop_duplicates().reset_index(drop=True)
-        print(f"      [SUCCESS] Removed {duplicates_before} duplicate rows")
+    # Calculate overall bias score
+    bias_score = calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias)
+    print(f"\n[RESULT] Overall bias score: {bias_score:.2f}/100")
     
-    # Final shuffle to remove any ordering bias
-    cleaned = cleaned.sample(frac=1, random_state=42).reset_index(drop=True)
+    # Generate recommendations
+    print("[INFO] Generating recommendations...")
+    recommendations = generate_recommendations(
+        bias_score, demographic_bias, text_bias, statistical_bias, group_fairness, intersectional_bias
+    )
     
-    # ==================== SUMMARY ====================
-    rows_removed = original_rows - len(cleaned)
-    removal_pct = (rows_removed / original_rows) * 100
+    # Save cleaned dataset
+    job_id = str(uuid.uuid4())
+    output_name = f"{job_id}.arrow" if cleaned_format == "arrow" else f"{job_id}.csv"
+    with stage_timer(f"write_{cleaned_format}"):
+        if cleaned_format == "arrow":
+            write_arrow_file(cleaned, os.path.join(JOBS_DIR, output_name))
+        else:
+            cleaned.to_csv(os.path.join(JOBS_DIR, output_name), index=False)
+        cleaning["audit"].to_csv(os.path.join(JOBS_DIR, f"{job_id}_removed.csv"), index=False)
+    print(f"[SAVE] Saved cleaned dataset: {output_name}")
+    remember_clean_job(job_id, df, input_key, {
+        "filename": filename, "params": params, "pre_clean": pre_clean, "outcome_column": outcome_column,
+        "prediction_column": prediction_column, "subgroup_depth": subgroup_depth,
+    })
     
-    print(f"\n   [SUCCESS] Bias reduction complete!")
-    print(f"      Original: {original_rows} rows")
-    print(f"      Improved: {len(cleaned)} rows ({removal_pct:.1f}% removed)")
-    print(f"      Quality improvements:")
-    print(f"         - Demographic groups balanced")
-    print(f"         - {removed_toxic} toxic texts removed")
-    print(f"         - {outliers_removed} statistical outliers removed")
-    print(f"         - {duplicates_before} duplicates removed")
-    print(f"      Expected bias reduction: 50-70%")
+    # Build chart data for visualizations
+    print("\n[STEP 7/7] Building chart data for visualizations...")
+    with stage_timer("build_chart_data"):
+        chart_data = build_chart_data(cleaned)
+    print(f"   [SUCCESS] Charts built successfully")
     
-    return cleaned
+    elapsed_time = time.time() - start_time
+    print(f"\n[COMPLETE] Analysis completed in {elapsed_time:.1f} seconds")
+
+    # Build fairness metrics response
+    fairness_metrics = {
+        "dataset_info": {
+            "rows": len(cleaned),
+            "columns": len(cleaned.columns),
+            "column_names": cleaned.columns.tolist(),
+            "filename": filename
+        },
+        "missing_values": missing_by_column,
+        "outliers": outliers_by_column,
+        "demographic_bias": demographic_bias,
+        "text_bias": text_bias,
+        "statistical_bias": statistical_bias,
+        "group_fairness": group_fairness,
+        "intersectional_bias": intersectional_bias,
+        "near_duplicates": near_duplicates,
+        "cleaning": {
+            "params": cleaning["params"],
+            "stages": cleaning["stages"],
+            "rows_removed": len(cleaning["audit"]),
+            "removed_rows_url": f"/download/{job_id}/removed",
+        },
+        "chart_data": chart_data,
+        "analysis_timestamp": pd.Timestamp.now().isoformat()
+    }
+
+    ai_summary = (
+        f"Analyzed {len(df)} records across {len(df.columns)} columns. "
+        f"Bias score: {bias_score}/100. "
+        f"Missing values: {sum(missing_by_column.values())}. "
+        f"Outliers detected: {sum(outliers_by_column.values())}. "
+        f"Demographics: {demographic_bias.get('demographic_columns_found', [])}. "
+        f"Text columns: {text_bias.get('text_columns_found', [])}. "
+        f"Recommendations: " + "; ".join(recommendations[:3]) +
+        ("..." if len(recommendations) > 3 else "")
+    )
+
+    return {
+        "bias_score": bias_score,
+        "fairness_metrics": fairness_metrics,
+        "recommendations": recommendations,
+        "analysis_type": "comprehensive",
+        "ai_summary": ai_summary,
+        "job_id": job_id,
+        "download_url": f"/download/{job_id}" if cleaned_format == "csv" else None
+    }
+
+
+def analyze_large_file(path: str, filename: str, file_type: str, outcome_column: Optional[str] = None,
+                       prediction_column: Optional[str] = None, subgroup_depth: Optional[int] = None,
+                       catalog_key: Optional[tuple] = None) -> dict:
+    """
+    Out-of-core analysis for uploads too large for pandas. Missing values,
+    outliers, demographic/statistical bias, histograms and distributions run
+    on the whole file through a DuckDBBackend; text, fairness, subgroup and
+    correlation analysis run on a reservoir sample. No cleaned dataset is
+    produced, so the result has no job_id/download_url.
+    """
+    start_time = time.time()
+    print(f"\n{'='*60}")
+    print(f"[ANALYSIS] NEW OUT-OF-CORE ANALYSIS REQUEST ({filename})")
+    print(f"{'='*60}")
+    with stage_timer("load"):
+        backend = DuckDBBackend(path, file_type)
+    try:
+        rows = backend.row_count()
+        if rows < 5:
+            raise HTTPException(status_code=400, detail=f"Dataset too small ({rows} rows). Need at least 5 rows for meaningful analysis.")
+        if len(backend.columns) < 2:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dataset has only {len(backend.columns)} column(s). Need at least 2 columns for bias analysis."
+            )
+        print(f"Scanning dataset: {rows} rows × {len(backend.columns)} columns ({backend.name})")
+        ROWS_PROCESSED.inc(rows, phase="loaded")
+
+        with stage_timer("sample"):
+            sample = backend.sample(OUT_OF_CORE_SAMPLE_ROWS)
+        print(f"[SAMPLE] {len(sample)} of {rows} rows sampled for text, fairness and correlation analysis")
+        result = analyze_backend(
+            backend, sample, filename, outcome_column=outcome_column,
+            prediction_column=prediction_column, subgroup_depth=subgroup_depth, catalog_key=catalog_key
+        )
+    finally:
+        backend.close()
+    print(f"\n[COMPLETE] Out-of-core analysis completed in {time.time() - start_time:.1f} seconds")
+    return result
+
+
+def analyze_backend(backend: ComputeBackend, sample: pd.DataFrame, filename: str,
+                    outcome_column: Optional[str] = None, prediction_column: Optional[str] = None,
+                    subgroup_depth: Optional[int] = None, scope: str = "out-of-core",
+                    analysis_type: str = "out_of_core", catalog_key: Optional[tuple] = None) -> dict:
+    """
+    The analysis payload for a dataset that is never loaded whole: aggregates
+    over every row from `backend`, and text, fairness, subgroup and
+    correlation sections from the row `sample`. Used by analyze_large_file
+    and the sharded coordinator. catalog_key stores the profile (see analyze_content).
+    """
+    rows = backend.row_count()
+    with stage_timer("missing_values"):
+        missing_by_column = backend.missing_counts()
+    with stage_timer("outliers"):
+        outliers_by_column = backend.outlier_counts(backend.numeric_summary(backend.numeric_columns()))
+    with stage_timer("detect.demographic"):
+        demographic_bias = detect_demographic_bias(backend)
+    with stage_timer("detect.statistical"):
+        statistical_bias = detect_statistical_bias(backend)
+    with stage_timer("detect.text"):
+        text_bias = detect_text_bias(sample)
+    with stage_timer("detect.fairness"):
+        group_fairness = compute_group_fairness(sample, outcome_column, prediction_column)
+    with stage_timer("detect.subgroups"):
+        intersectional_bias = compute_intersectional_subgroups(sample, group_fairness["outcome_column"], subgroup_depth)
+    with stage_timer("build_chart_data"):
+        chart_data = build_chart_data(sample, backend)
+
+    bias_score = calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias)
+    recommendations = generate_recommendations(
+        bias_score, demographic_bias, text_bias, statistical_bias, group_fairness, intersectional_bias
+    )
+
+    fairness_metrics = {
+        "dataset_info": {
+            "rows": rows,
+            "columns": len(backend.columns),
+            "column_names": backend.columns,
+            "filename": filename,
+            "compute_backend": backend.name,
+            "sample_rows": len(sample),
+            "sampled_sections": ["text_bias", "group_fairness", "intersectional_bias", "correlation_edges",
+                                 "association_edges", "text_stats"]
+        },
+        "missing_values": missing_by_column,
+        "outliers": outliers_by_column,
+        "demographic_bias": demographic_bias,
+        "text_bias": text_bias,
+        "statistical_bias": statistical_bias,
+        "group_fairness": group_fairness,
+        "intersectional_bias": intersectional_bias,
+        "near_duplicates": None,
+        "chart_data": chart_data,
+        "analysis_timestamp": pd.Timestamp.now().isoformat()
+    }
+    ai_summary = (
+        f"Analyzed {rows} records across {len(backend.columns)} columns {scope} "
+        f"({len(sample)}-row sample for text and fairness checks). "
+        f"Bias score: {bias_score}/100. "
+        f"Missing values: {sum(missing_by_column.values())}. "
+        f"Outliers detected: {sum(outliers_by_column.values())}. "
+        f"Recommendations: " + "; ".join(recommendations[:3]) +
+        ("..." if len(recommendations) > 3 else "")
+    )
+    result = {
+        "bias_score": bias_score,
+        "fairness_metrics": fairness_metrics,
+        "recommendations": recommendations,
+        "analysis_type": analysis_type,
+        "ai_summary": ai_summary,
+        "job_id": None,
+        "download_url": None
+    }
+    catalog = record_profile(catalog_key, backend, result, filename)
+    if catalog is not None:
+        result["catalog"] = catalog
+    return result
+
+
+def analyze_fetched_dataset(request: AnalysisRequest, file_content: bytes) -> dict:
+    """The /analyze pipeline over downloaded bytes; returns the AnalysisResponse fields it computes."""
+    with MEMORY.reserve(
+        estimate_upload_memory(file_content[:ADMISSION_SNIFF_BYTES], len(file_content), request.file_type)
+    ):
+        with stage_timer("load"):
+            df = load_dataset(file_content, request.file_type)
+        if df.empty:
+            raise HTTPException(status_code=400, detail="Dataset is empty")
+        ROWS_PROCESSED.inc(len(df), phase="loaded")
+
+        with stage_timer("detect.demographic"):
+            demographic_bias = detect_demographic_bias(df)
+        with stage_timer("detect.text"):
+            text_bias = detect_text_bias(df)
+        with stage_timer("detect.statistical"):
+            statistical_bias = detect_statistical_bias(df)
+        with stage_timer("detect.fairness"):
+            group_fairness = compute_group_fairness(df, request.outcome_column, request.prediction_column)
+        with stage_timer("detect.subgroups"):
+            intersectional_bias = compute_intersectional_subgroups(
+                df, group_fairness["outcome_column"], request.subgroup_depth
+            )
+        with stage_timer("build_chart_data"):
+            chart_data = build_chart_data(df)
+        bias_score = calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias)
+        recommendations = generate_recommendations(
+            bias_score, demographic_bias, text_bias, statistical_bias, group_fairness, intersectional_bias
+        )
+
+        ai_summary = (
+            f"I analyzed {len(df)} records across {len(df.columns)} columns. "
+            f"Overall bias score is {bias_score}/100. "
+            f"Detected demographics: {demographic_bias.get('demographic_columns_found', [])}. "
+            f"Text columns analyzed: {text_bias.get('text_columns_found', [])}. "
+            f"Recommendations: " + "; ".join(recommendations[:3]) +
+            ("..." if len(recommendations) > 3 else "")
+        )
+
+        fairness_metrics = {
+            "dataset_info": {
+                "rows": len(df),
+                "columns": len(df.columns),
+                "column_names": df.columns.tolist()
+            },
+            "demographic_bias": demographic_bias,
+            "text_bias": text_bias,
+            "statistical_bias": statistical_bias,
+            "group_fairness": group_fairness,
+            "intersectional_bias": intersectional_bias,
+            "chart_data": chart_data,
+            "analysis_timestamp": pd.Timestamp.now().isoformat()
+        }
+        catalog = record_profile(
+            (request.dataset_id, request.version), PandasBackend(df),
+            {"bias_score": bias_score, "fairness_metrics": fairness_metrics, "analysis_type": "comprehensive"},
+            os.path.basename(urlparse(request.file_url).path)
+        )
+        del df
+
+    return {
+        "bias_score": bias_score,
+        "fairness_metrics": fairness_metrics,
+        "recommendations": recommendations,
+        "analysis_type": "comprehensive",
+        "ai_summary": ai_summary,
+        "catalog": catalog,
+    }
+
+# -------- Preview --------
+# /preview answers within a second from a byte-sampled slice of the file,
+# then streams sketch-refined results while the whole file is scanned, and
+# finishes with the regular full analysis. One NDJSON line per phase.
+
+PREVIEW_SAMPLE_BYTES = 2 * 1024 * 1024
+PREVIEW_SAMPLE_BLOCKS = 64
+PREVIEW_CHUNK_ROWS = 50_000
+PREVIEW_REFRESH_S = 1.0
+
+def sample_csv_bytes(content: bytes) -> bytes:
+    """Header plus whole lines from evenly spaced blocks across the file."""
+    if len(content) <= PREVIEW_SAMPLE_BYTES:
+        return content
+    header_end = content.find(b"\n") + 1
+    block = PREVIEW_SAMPLE_BYTES // PREVIEW_SAMPLE_BLOCKS
+    parts = [content[:header_end]]
+    for start in np.linspace(header_end, len(content) - block, PREVIEW_SAMPLE_BLOCKS).astype(int):
+        piece = content[start:start + block]
+        first, last = piece.find(b"\n") + 1, piece.rfind(b"\n") + 1
+        if 0 < first < last:
+            parts.append(piece[first:last])
+    return b"".join(parts)
+
+def iter_csv_chunks(content: bytes, header: bytes, dtype=str, chunksize: int = PREVIEW_CHUNK_ROWS):
+    """Parse the whole CSV in row chunks with the delimiter/encoding the header suggests."""
+    delimiter = max([",", ";", "\t", "|"], key=lambda d: header.count(d.encode()))
+    try:
+        header.decode("utf-8")
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+    return pd.read_csv(
+        io.BytesIO(content), sep=delimiter, encoding=encoding, encoding_errors="replace",
+        on_bad_lines="skip", chunksize=chunksize, dtype=dtype
+    )
+
+def approximate_results(backend: ComputeBackend) -> dict:
+    """The detector and chart sections that can be answered from any ComputeBackend."""
+    return {
+        "demographic_bias": detect_demographic_bias(backend),
+        "statistical_bias": detect_statistical_bias(backend),
+        "chart_data": {
+            "numeric_histograms": compute_numeric_histograms(backend),
+            "categorical_distributions": compute_categorical_distributions(backend),
+            "missing_values": backend.missing_counts(),
+        },
+    }
+
+def _preview_line(phase: str, start: float, **fields) -> str:
+    payload = {"phase": phase, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1), **fields}
+    return json.dumps(jsonable_encoder(payload), default=str) + "\n"
+
+async def stream_preview(content: bytes, filename: str, content_type: Optional[str], analysis_kwargs: dict):
+    """
+    Yield NDJSON lines: "sample" (row sample, <1s), "sketch" refinements over
+    the rows scanned so far (CSV only), then "final" with the full analysis.
+    Each phase (the sample, every PREVIEW_REFRESH_S window of the sketch scan,
+    the full analysis) is admitted on its own and runs on an analysis slot;
+    its line is sent after the slot is released, so a slow reader never holds one.
+    """
+    start = time.perf_counter()
+    ftype = detect_file_type(filename, content_type)
+    is_csv = "csv" in ftype
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # Sample and sketch phases are priced as their share of an out-of-core scan of the upload;
+        # a refusal ends the stream with a 429 line
+        scan_cost = estimate_upload_cost(
+            content[:ADMISSION_SNIFF_BYTES], len(content), ftype, out_of_core=True
+        )["cost_seconds"]
+        sample_bytes = sample_csv_bytes(content) if is_csv else content
+
+        def run_sample():
+            with stage_timer("preview.sample"):
+                with MEMORY.reserve(estimate_upload_memory(sample_bytes[:ADMISSION_SNIFF_BYTES], len(sample_bytes), ftype)):
+                    sample = load_dataset(sample_bytes, ftype)
+                return sample, approximate_results(PandasBackend(sample))
+
+        async with ADMISSION.admit(scan_cost * len(sample_bytes) / max(len(content), 1)):
+            sample, sample_results = await ADMISSION.run(run_sample)
+        estimated_rows = int(len(sample) * len(content) / max(len(sample_bytes), 1))
+        yield _preview_line(
+            "sample", start, approximate=True, rows_sampled=len(sample),
+            estimated_rows=estimated_rows, **sample_results
+        )
+
+        if is_csv and len(sample_bytes) < len(content):
+            sketches = SketchBackend(sample)
+            chunks = iter_csv_chunks(content, content[:content.find(b"\n") + 1])
+
+            def scan_window():
+                """Sketch chunks for about PREVIEW_REFRESH_S; (results so far, whether the scan finished)."""
+                deadline = time.perf_counter() + PREVIEW_REFRESH_S
+                with stage_timer("preview.sketch"):
+                    while True:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            return approximate_results(sketches), True
+                        sketches.update(chunk)
+                        if time.perf_counter() >= deadline:
+                            return approximate_results(sketches), False
+
+            finished = False
+            while not finished:
+                remaining = max(0.0, 1.0 - sketches.rows / max(estimated_rows, 1))
+                async with ADMISSION.admit(min(PREVIEW_REFRESH_S, scan_cost * remaining)):
+                    results, finished = await ADMISSION.run(scan_window)
+                progress = 1.0 if finished else round(min(1.0, sketches.rows / max(estimated_rows, 1)), 3)
+                yield _preview_line("sketch", start, approximate=True, rows_scanned=sketches.rows, progress=progress, **results)
+
+        estimate = estimate_upload_cost(content[:ADMISSION_SNIFF_BYTES], len(content), ftype)
+        async with ADMISSION.admit(estimate["cost_seconds"]) as admission:
+            result = await ADMISSION.run(lambda: analyze_content(content, filename, content_type, **analysis_kwargs))
+        yield _preview_line("final", start, approximate=False, admission={**admission, "estimate": estimate}, **result)
+    except HTTPException as e:
+        retry = {"retry_after": int(e.headers["Retry-After"])} if e.headers and "Retry-After" in e.headers else {}
+        yield _preview_line("error", start, status_code=e.status_code, error=e.detail, **retry)
+    except Exception as e:
+        yield _preview_line("error", start, status_code=500, error=f"Analysis failed: {str(e)}")
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+
+# -------- Sharded Analysis --------
+# The whole-dataset aggregates behind demographic_bias, statistical_bias and
+# chart_data are mergeable sketches, so a coordinator can split a CSV into
+# row shards, have other instances of this service sketch them (/partial) and
+# merge the states into one SketchBackend. Each shard also returns a bottom-k
+# row sample (its rows with the smallest random keys, about its share of the
+# total); keeping every row whose key is below the smallest cut-off of any
+# truncated shard gives a uniform sample of the whole file, which feeds the
+# sample-based sections exactly as in out-of-core analysis.
+
+SHARD_WORKERS = [url.strip().rstrip("/") for url in os.getenv("SHARD_WORKERS", "").split(",") if url.strip()]
+SHARD_TIMEOUT_S = float(os.getenv("SHARD_TIMEOUT_S", "600"))
+SHARD_MAX_COUNT = 256
+SHARD_SAMPLE_OVERSAMPLING = 1.25  # per-shard sample headroom over its byte share
+PARTIAL_STATE_VERSION = 2
+PARTIAL_SAMPLE_ROWS = int(os.getenv("PARTIAL_SAMPLE_ROWS", str(OUT_OF_CORE_SAMPLE_ROWS)))
+
+def sketch_partial(content: bytes, file_type: str, schema: Optional[dict] = None,
+                   sample_rows: int = PARTIAL_SAMPLE_ROWS) -> dict:
+    """Mergeable state for one shard: sketches over every row plus a keyed bottom-k row sample."""
+    rng = np.random.default_rng()
+    is_csv = "csv" in file_type
+    if is_csv and schema is None:
+        schema = SketchBackend(load_dataset(sample_csv_bytes(content), file_type)).schema()
+    # CSV is streamed in chunks; other formats are loaded whole, under a memory reservation
+    guard = nullcontext() if is_csv else MEMORY.reserve(
+        estimate_upload_memory(content[:ADMISSION_SNIFF_BYTES], len(content), file_type)
+    )
+    backend = None
+    reservoir, keys = pd.DataFrame(), np.empty(0)
+    with guard:
+        chunks = iter_csv_chunks(content, content[:content.find(b"\n") + 1]) if is_csv \
+            else [load_dataset(content, file_type)]
+        for chunk in chunks:
+            chunk = chunk.rename(columns=str)
+            if backend is None:
+                backend = SketchBackend(chunk, schema)
+            with stage_timer("partial.sketch"):
+                backend.update(chunk)
+            candidates = pd.concat([reservoir, chunk], ignore_index=True)
+            candidate_keys = np.concatenate([keys, rng.random(len(chunk))])
+            keep = np.argsort(candidate_keys, kind="stable")[:sample_rows]
+            reservoir, keys = candidates.iloc[keep].reset_index(drop=True), candidate_keys[keep]
+    if backend is None:
+        raise HTTPException(status_code=400, detail="Shard is empty or could not be parsed")
+    ROWS_PROCESSED.inc(backend.rows, phase="loaded")
+    sample = reservoir.reindex(columns=backend.columns)
+    return {
+        "version": PARTIAL_STATE_VERSION,
+        "rows": backend.rows,
+        "state": backend.to_state(),
+        # CSV text: far cheaper to encode than JSON records for string columns
+        "sample": {"csv": sample.to_csv(index=False), "keys": keys.tolist()},
+    }
+
+def merge_partials(partials: list, sample_rows: int = PARTIAL_SAMPLE_ROWS) -> SketchBackend:
+    """One SketchBackend over all shards; its sample_df is the k smallest-keyed rows across shard samples."""
+    for partial in partials:
+        if partial.get("version") != PARTIAL_STATE_VERSION:
+            raise ValueError(f"Unsupported partial state version {partial.get('version')!r}")
+    merged = SketchBackend.from_state(partials[0]["state"])
+    for partial in partials[1:]:
+        merged.merge(SketchBackend.from_state(partial["state"]))
+    pool = pd.concat(
+        [pd.read_csv(io.StringIO(p["sample"]["csv"]), dtype=str) for p in partials], ignore_index=True
+    ).reindex(columns=merged.columns)
+    shard_keys = [np.asarray(p["sample"]["keys"], dtype=float) for p in partials]
+    keys = np.concatenate(shard_keys)
+    # A shard that sent fewer rows than it has only vouches for keys up to its largest one
+    cutoff = min(
+        (k.max() for k, p in zip(shard_keys, partials) if len(k) and len(k) < p["rows"]), default=np.inf
+    )
+    order = np.argsort(keys, kind="stable")
+    order = order[keys[order] <= cutoff][:sample_rows]
+    sample = pool.iloc[order].reset_index(drop=True)
+    for col in merged.numeric_columns():
+        sample[col] = pd.to_numeric(sample[col], errors="coerce")
+    merged.sample_df = sample
+    return merged
+
+def split_csv_ranges(fileobj, size: int, shards: int):
+    """The header line and (start, end) byte ranges of whole lines, one per shard (quoted newlines unsupported)."""
+    fileobj.seek(0)
+    header = fileobj.readline()
+    bounds = [fileobj.tell()]
+    for i in range(1, shards):
+        target = bounds[0] + (size - bounds[0]) * i // shards
+        if target <= bounds[-1]:
+            continue
+        fileobj.seek(target)
+        fileobj.readline()
+        bounds.append(fileobj.tell())
+    bounds.append(size)
+    return header, [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def request_partial(worker: str, filename: str, payload: bytes, schema: dict, sample_rows: int) -> dict:
+    response = requests.post(
+        f"{worker}/partial", files={"file": (filename, payload, "text/csv")},
+        data={"schema": json.dumps(schema), "sample_rows": str(sample_rows)}, timeout=SHARD_TIMEOUT_S
+    )
+    response.raise_for_status()
+    return response.json()
+
+def run_shards(fileobj, size: int, filename: str, workers: list, shards: int, schema: dict) -> list:
+    """POST each shard to a worker (round-robin, retried on the next worker on failure); partials in shard order."""
+    header, ranges = split_csv_ranges(fileobj, size, shards)
+    read_lock = threading.Lock()
+
+    def run(index: int, span):
+        with read_lock:
+            fileobj.seek(span[0])
+            payload = header + fileobj.read(span[1] - span[0])
+        share = (span[1] - span[0]) / max(size - ranges[0][0], 1)
+        sample_rows = min(PARTIAL_SAMPLE_ROWS, int(PARTIAL_SAMPLE_ROWS * share * SHARD_SAMPLE_OVERSAMPLING) + 100)
+        errors = []
+        for attempt in range(len(workers)):
+            worker = workers[(index + attempt) % len(workers)]
+            started = time.perf_counter()
+            try:
+                partial = request_partial(worker, f"shard{index}_{filename}", payload, schema, sample_rows)
+            except Exception as e:
+                print(f"[SHARD] Shard {index} failed on {worker}: {str(e)[:200]}")
+                errors.append(f"{worker}: {str(e)[:200]}")
+                continue
+            partial["shard"] = {
+                "index": index, "worker": worker, "bytes": len(payload), "rows": partial["rows"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            return partial
+        raise HTTPException(status_code=502, detail=f"Shard {index} failed on every worker: {'; '.join(errors)}")
+
+    with ThreadPoolExecutor(max_workers=len(workers), thread_name_prefix="shard") as pool:
+        return list(pool.map(lambda item: run(*item), enumerate(ranges)))
+
+def gather_partials(fileobj, size: int, filename: str, workers: list, shards: int):
+    """
+    Coordinator, first half: fix the column schema from the head of the file
+    and sketch row shards on the workers. Mostly waiting on them. Returns
+    (head rows, partials).
+    """
+    print(f"\n{'='*60}")
+    print(f"[ANALYSIS] NEW SHARDED ANALYSIS REQUEST ({filename}, {shards} shards on {len(workers)} workers)")
+    print(f"{'='*60}")
+    with stage_timer("shard.schema"):
+        fileobj.seek(0)
+        head = fileobj.read(PREVIEW_SAMPLE_BYTES)
+        head = head[:head.rfind(b"\n") + 1] or head
+        head_rows = load_dataset(head, "text/csv")
+        schema = SketchBackend(head_rows).schema()
+    if len(schema["columns"]) < 2:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Dataset has only {len(schema['columns'])} column(s). Need at least 2 columns for bias analysis."
+        )
+    with stage_timer("shard.partials"):
+        partials = run_shards(fileobj, size, filename, workers, shards, schema)
+    return head_rows, partials
+
+def analyze_sharded(partials: list, filename: str, outcome_column: Optional[str] = None,
+                    prediction_column: Optional[str] = None, subgroup_depth: Optional[int] = None,
+                    catalog_key: Optional[tuple] = None) -> dict:
+    """
+    Coordinator, second half: merge the partials and build the out-of-core
+    payload from the merged sketches and sample.
+    """
+    start_time = time.time()
+    with stage_timer("shard.merge"):
+        backend = merge_partials(partials)
+    if backend.rows < 5:
+        raise HTTPException(status_code=400, detail=f"Dataset too small ({backend.rows} rows). Need at least 5 rows for meaningful analysis.")
+    print(f"[SHARD] Merged {len(partials)} partials: {backend.rows} rows, {len(backend.sample_df)}-row sample")
+    result = analyze_backend(
+        backend, backend.sample_df, filename, outcome_column=outcome_column,
+        prediction_column=prediction_column, subgroup_depth=subgroup_depth,
+        scope=f"across {len(partials)} shards", analysis_type="sharded", catalog_key=catalog_key
+    )
+    result["fairness_metrics"]["dataset_info"]["shards"] = [p["shard"] for p in partials]
+    print(f"\n[COMPLETE] Sharded analysis merged and analysed in {time.time() - start_time:.1f} seconds")
+    return result
+
+
+# -------- Batch Analysis --------
+# /analyze-batch runs many small datasets per request: each dataset is priced
+# and admitted into the batch lane, so detectors for different datasets run
+# concurrently on the analysis slots (never the one kept for interactive work)
+# while their model calls are pooled into shared batches, and each result is
+# streamed back as one NDJSON line.
+
+# Datasets of one batch request loaded and queued at a time (twice this many);
+# they run on the batch lane's slots, so more only adds memory
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(CPU_LAYOUT["batch_slots"])))
+CPU_LAYOUT["batch_workers"] = BATCH_WORKERS
+BATCH_MAX_DATASETS = int(os.getenv("BATCH_MAX_DATASETS", "1000"))
+SUPPORTED_EXTENSIONS = (".csv", ".json", ".xlsx", ".xls", ".txt")
+
+class BatchRequest(BaseModel):
+    urls: List[str]
+
+def _is_dataset_member(name: str) -> bool:
+    base = os.path.basename(name)
+    return (
+        bool(base)
+        and not base.startswith(".")
+        and "__MACOSX" not in name
+        and base.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+def open_archive_sources(archive_path: str, filename: str):
+    """
+    Open a zip or tar archive and return (sources, close). sources yields
+    (dataset name, loader) pairs for every supported member; loaders read
+    lazily from worker threads under a lock, since archive handles are not
+    thread-safe, so the archive stays open until close() is called.
+    """
+    lock = threading.Lock()
+    max_bytes = 50 * 1024 * 1024
+
+    def check_size(size: int):
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large ({size / (1024 * 1024):.1f}MB). Maximum size is 50MB.")
+
+    if zipfile.is_zipfile(archive_path):
+        zf = zipfile.ZipFile(archive_path)
+
+        def zip_sources():
+            for info in zf.infolist():
+                if info.is_dir() or not _is_dataset_member(info.filename):
+                    continue
+                def load(info=info):
+                    check_size(info.file_size)
+                    with lock:
+                        return zf.read(info)
+                yield info.filename, load
+        return zip_sources(), zf.close
+
+    if tarfile.is_tarfile(archive_path):
+        tf = tarfile.open(archive_path, mode="r:*")
+
+        def tar_sources():
+            for member in tf.getmembers():
+                if not member.isfile() or not _is_dataset_member(member.name):
+                    continue
+                def load(member=member):
+                    check_size(member.size)
+                    with lock:
+                        return tf.extractfile(member).read()
+                yield member.name, load
+        return tar_sources(), tf.close
+
+    raise HTTPException(status_code=400, detail=f"{filename} is not a zip or tar archive")
+
+def iter_url_sources(urls: list):
+    for url in urls:
+        name = os.path.basename(urlparse(url).path) or "dataset.csv"
+        yield name, (lambda url=url: download_file(url))
+
+def _analyze_batch_item(name: str, content: bytes, batchers: dict) -> dict:
+    token = _active_batchers.set(batchers)
+    JOBS_IN_FLIGHT.inc()
+    try:
+        return analyze_content(content, name, catalog_key=(name, None))
+    finally:
+        JOBS_IN_FLIGHT.dec()
+        _active_batchers.reset(token)
+
+async def run_batch_item(name: str, load, batchers: dict) -> dict:
+    """Load one dataset, then analyze it in the batch lane; failures become an error line."""
+    try:
+        content = await asyncio.get_running_loop().run_in_executor(None, load)
+        estimate = estimate_upload_cost(content[:ADMISSION_SNIFF_BYTES], len(content), detect_file_type(name))
+        # The client asked for the whole batch, so items queue behind each other rather than get a 429
+        async with ADMISSION.admit(estimate["cost_seconds"], "batch", max_wait_s=math.inf) as admission:
+            result = await ADMISSION.run(lambda: _analyze_batch_item(name, content, batchers))
+        return {"dataset": name, "status": "ok", **result, "admission": {**admission, "estimate": estimate}}
+    except HTTPException as e:
+        return {"dataset": name, "status": "error", "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        return {"dataset": name, "status": "error", "status_code": 500, "error": f"Analysis failed: {str(e)}"}
+
+async def stream_batch_results(sources, cleanup=None):
+    """Run datasets concurrently (bounded in-flight) and yield NDJSON lines as each one finishes."""
+    batchers = {}
+    if toxicity_analyzer is not None:
+        batchers["toxicity"] = InferenceBatcher("toxicity", toxicity_analyzer)
+    if sentiment_analyzer is not None:
+        batchers["sentiment"] = InferenceBatcher("sentiment", sentiment_analyzer)
+
+    start = time.perf_counter()
+    summary = {"datasets": 0, "succeeded": 0, "failed": 0, "truncated": False}
+    pending: set = set()
+    sources = iter(sources)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < BATCH_WORKERS * 2:
+                try:
+                    name, load = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if summary["datasets"] >= BATCH_MAX_DATASETS:
+                    summary["truncated"] = True
+                    exhausted = True
+                    break
+                summary["datasets"] += 1
+                pending.add(asyncio.ensure_future(run_batch_item(name, load, batchers)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                item = future.result()
+                summary["succeeded" if item["status"] == "ok" else "failed"] += 1
+                yield json.dumps(jsonable_encoder(item), default=str) + "\n"
+        summary["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        yield json.dumps({"summary": summary}) + "\n"
+    finally:
+        # Queued items leave the admission queue; running ones finish on their slot
+        for future in pending:
+            future.cancel()
+        for batcher in batchers.values():
+            batcher.close()
+        if cleanup is not None:
+            cleanup()
 
-def generate_recommendations(bias_score, demographic_bias, text_bias, statistical_bias):
-    """
-    Generate actionable, specific recommendations based on detected biases.
-    Provides prioritized, detailed guidance for bias mitigation.
-    """
-    recs = []
-    
-    # Overall assessment
-    if bias_score > 70:
-        recs.append("[CRITICAL] Dataset shows high bias levels (>70%). Immediate action required before deployment.")
-        recs.append("-> Recommendation: Collect additional diverse data to balance underrepresented groups.")
-    elif bias_score > 40:
-        recs.append("[MODERATE] Significant bias detected (40-70%). Review data collection practices.")
-        recs.append("-> Recommendation: Implement stratified sampling to ensure fair representation.")
+# -------- Arrow Flight --------
+# Columnar transport for programmatic clients: record batches go straight into
+# analyze_dataframe and the cleaned frame comes back as Arrow, with no CSV in
+# either direction. Enabled by setting FLIGHT_PORT (needs the optional pyarrow).
+#   do_put      batches in, analysis result JSON back as put metadata
+#   do_get      ticket = job_id from a result, cleaned data streamed back
+#   do_exchange batches in, result JSON (metadata) then cleaned batches back
+# The command of the FlightDescriptor may carry JSON options: filename,
+# outcome_column, prediction_column, subgroup_depth, cleaning_params, and
+# priority ("batch" opts into the batch lane, like X-Priority over HTTP).
+# Analyses are admitted like uploads; a refusal is FlightUnavailableError.
+
+try:
+    import pyarrow as pa  # optional: Arrow Flight endpoint
+    import pyarrow.flight as flight
+except ImportError:
+    pa = None
+    flight = None
+
+FLIGHT_HOST = os.getenv("FLIGHT_HOST", "127.0.0.1")
+FLIGHT_PORT = int(os.getenv("FLIGHT_PORT", "0"))  # 0 = disabled
+FLIGHT_OPTIONS = {"filename", "outcome_column", "prediction_column", "subgroup_depth", "cleaning_params", "priority"}
+
+def dataframe_to_arrow(df: pd.DataFrame):
+    """Arrow table for a frame; object columns Arrow cannot type (mixed values) are sent as strings."""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = {
+            col: df[col].map(lambda v: v if pd.isna(v) else str(v))
+            for col in df.columns if df[col].dtype == object
+        }
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+def write_arrow_file(df: pd.DataFrame, path: str):
+    table = dataframe_to_arrow(df)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_arrow_job(job_id: str):
+    """Memory-mapped cleaned table of a Flight job; ArrowKeyError when unknown."""
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        raise pa.ArrowKeyError(f"Invalid ticket '{job_id[:64]}'")
+    path = os.path.join(JOBS_DIR, f"{job_id}.arrow")
+    if not os.path.exists(path):
+        raise pa.ArrowKeyError(f"Unknown job '{job_id}'")
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def _analyze_arrow_job(table, options: dict) -> dict:
+    JOBS_IN_FLIGHT.inc()
+    try:
+        BYTES_PROCESSED.inc(table.nbytes)
+        memory = {
+            "rows": table.num_rows, "raw_bytes": table.nbytes, "parse_bytes": table.nbytes,
+            "working_bytes": estimate_frame_memory(table.num_rows, table.slice(0, 1000).to_pandas()),
+        }
+        memory["peak_bytes"] = MEMORY_BASE_BYTES + table.nbytes + max(table.nbytes, memory["working_bytes"])
+        with MEMORY.reserve(memory) as reservation:
+            with stage_timer("load"):
+                df = table.to_pandas()
+            validate_dataset(df)
+            ROWS_PROCESSED.inc(len(df), phase="loaded")
+            result = analyze_dataframe(
+                df, options.get("filename") or "flight", outcome_column=options.get("outcome_column"),
+                prediction_column=options.get("prediction_column"), subgroup_depth=options.get("subgroup_depth"),
+                cleaning_params=options.get("cleaning_params"), cleaned_format="arrow"
+            )
+            del df
+        result["memory"] = reservation.report()
+        return result
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+def analyze_arrow_table(table, options: dict) -> dict:
+    """analyze_content for an Arrow table, admitted like an upload; validation errors surface as ArrowInvalid."""
+    unknown = set(options) - FLIGHT_OPTIONS
+    if unknown:
+        raise pa.ArrowInvalid(f"Unknown options: {sorted(unknown)}")
+    estimate = estimate_frame_cost(table.num_rows, table.slice(0, 500).to_pandas())
+    try:
+        result, admission = ADMISSION.run_from_thread(
+            lambda: _analyze_arrow_job(table, options), estimate["cost_seconds"], options.get("priority")
+        )
+    except HTTPException as e:
+        if e.status_code == 429:
+            raise flight.FlightUnavailableError(str(e.detail))
+        if e.status_code < 500:
+            raise pa.ArrowInvalid(str(e.detail))
+        raise flight.FlightInternalError(str(e.detail))
+    result["admission"] = {**admission, "estimate": estimate}
+    return result
+
+def _flight_result_buffer(result: dict):
+    return pa.py_buffer(json.dumps(jsonable_encoder(result), default=str).encode("utf-8"))
+
+if flight is not None:
+    class BiasFlightServer(flight.FlightServerBase):
+        def _options(self, descriptor) -> dict:
+            if descriptor.descriptor_type == flight.DescriptorType.CMD and descriptor.command:
+                try:
+                    options = json.loads(descriptor.command)
+                except ValueError:
+                    raise pa.ArrowInvalid("Descriptor command must be a JSON object of options")
+                if not isinstance(options, dict):
+                    raise pa.ArrowInvalid("Descriptor command must be a JSON object of options")
+                return options
+            if descriptor.descriptor_type == flight.DescriptorType.PATH and descriptor.path:
+                return {"filename": "/".join(p.decode("utf-8") for p in descriptor.path)}
+            return {}
+
+        def do_put(self, context, descriptor, reader, writer):
+            options = self._options(descriptor)
+            result = analyze_arrow_table(reader.read_all(), options)
+            writer.write(_flight_result_buffer(result))
+
+        def do_get(self, context, ticket):
+            return flight.RecordBatchStream(read_arrow_job(ticket.ticket.decode("utf-8")))
+
+        def do_exchange(self, context, descriptor, reader, writer):
+            options = self._options(descriptor)
+            result = analyze_arrow_table(reader.read_all(), options)
+            cleaned = read_arrow_job(result["job_id"])
+            writer.begin(cleaned.schema)
+            writer.write_metadata(_flight_result_buffer(result))
+            writer.write_table(cleaned)
+
+_flight_server = None
+
+def start_flight_server():
+    """Serve Flight on a background thread when FLIGHT_PORT is set and pyarrow is installed."""
+    global _flight_server
+    if FLIGHT_PORT <= 0 or _flight_server is not None:
+        return
+    if flight is None:
+        print("[WARNING] FLIGHT_PORT is set but pyarrow is not installed; Arrow Flight endpoint disabled")
+        return
+    _flight_server = BiasFlightServer(f"grpc://{FLIGHT_HOST}:{FLIGHT_PORT}")
+    threading.Thread(target=_flight_server.serve, name="flight", daemon=True).start()
+    print(f"[SUCCESS] Arrow Flight endpoint listening on grpc://{FLIGHT_HOST}:{_flight_server.port}")
+
+def flight_location() -> Optional[str]:
+    return f"grpc://{FLIGHT_HOST}:{_flight_server.port}" if _flight_server is not None else None
+
+# -------- Admission Control --------
+# Upload size is a poor proxy for cost: a few MB of free text can need more
+# model calls than a large numeric file. Requests are priced from a sniffed
+# schema (rows x column kinds + sampled texts x observed per-text latency),
+# corrected online by the ratio of actual to estimated run time, then queued
+# into priority lanes served by weighted fair queuing over ADMISSION_SLOTS
+# analysis threads, one of which is kept free of batch work (when there are
+# two or more) so small jobs never wait behind big ones. A request whose expected queue wait exceeds
+# ADMISSION_MAX_WAIT_S, or what is left of its budget_ms, is refused with 429 and Retry-After.
+
+ADMISSION_SLOTS = CPU_LAYOUT["analysis_slots"]  # ADMISSION_SLOTS env, else sized in plan_cpu_layout
+ADMISSION_MAX_WAIT_S = float(os.getenv("ADMISSION_MAX_WAIT_S", "60"))
+ADMISSION_INTERACTIVE_MAX_S = float(os.getenv("ADMISSION_INTERACTIVE_MAX_S", "5"))
+ADMISSION_LANE_WEIGHTS = {"interactive": 4.0, "batch": 1.0}
+ADMISSION_SNIFF_BYTES = 64 * 1024
+# Rough single-core priors in seconds per cell; the controller rescales them from observed runs
+COST_BASE_S = 0.05
+COST_PER_CELL_S = 1.5e-6
+COST_PER_NUMERIC_CELL_S = 1.0e-6
+COST_PER_DEMOGRAPHIC_CELL_S = 3.0e-6
+COST_PER_STRING_CELL_S = 2.0e-6
+COST_OUT_OF_CORE_S_PER_MB = 0.08
+TEXTS_PER_STRING_COLUMN = 100 + 150  # detect_text_bias + cleaning toxicity sample
+
+ADMISSION_DECISIONS = METRICS.register(Counter(
+    "biasbounty_admission_decisions_total", "Admission decisions by lane.", ("lane", "decision")))
+ADMISSION_QUEUE_WAIT = METRICS.register(Histogram(
+    "biasbounty_admission_queue_wait_seconds", "Time admitted requests spent queued, by lane.", ("lane",)))
+ADMISSION_BACKLOG = METRICS.register(Gauge(
+    "biasbounty_admission_backlog_seconds", "Estimated seconds of queued and running work per slot."))
+
+def _sniff_sample(head: bytes, file_type: str) -> Optional[pd.DataFrame]:
+    """Parse the first rows of an upload from its leading bytes; None when the format cannot be sniffed."""
+    try:
+        if "csv" in file_type:
+            complete = head[:head.rfind(b"\n") + 1] or head
+            return pd.read_csv(io.BytesIO(complete), sep=None, engine="python", nrows=500, on_bad_lines="skip")
+        if "json" in file_type:
+            text = head.decode("utf-8", errors="ignore").lstrip()
+            if text.startswith("["):
+                cut = text.rfind("}")
+                records = json.loads(text[:cut + 1] + "]") if cut > 0 else []
+                return pd.DataFrame(records[:500]) if records else None
+    except Exception:
+        return None
+    return None
+
+def estimate_frame_cost(rows: int, sample: pd.DataFrame) -> dict:
+    """Estimated single-slot seconds for analyze_dataframe on `rows` rows shaped like `sample`."""
+    numeric = [c for c in sample.columns if pd.api.types.is_numeric_dtype(sample[c])]
+    strings = [c for c in sample.columns if sample[c].dtype == object or pd.api.types.is_string_dtype(sample[c])]
+    demographic = find_demographic_columns(sample)
+    text_model_s = 0.0
+    if toxicity_analyzer is not None and strings:
+        text_model_s = min(rows, TEXTS_PER_STRING_COLUMN) * len(strings) * toxicity_seconds_per_text()
+    cost = (
+        COST_BASE_S
+        + rows * len(sample.columns) * COST_PER_CELL_S
+        + rows * len(numeric) * COST_PER_NUMERIC_CELL_S
+        + rows * len(demographic) * COST_PER_DEMOGRAPHIC_CELL_S
+        + rows * len(strings) * COST_PER_STRING_CELL_S
+        + text_model_s
+    )
+    return {
+        "rows": int(rows), "columns": len(sample.columns), "numeric_columns": len(numeric),
+        "string_columns": len(strings), "demographic_columns": len(demographic),
+        "text_model_seconds": round(text_model_s, 3), "cost_seconds": round(cost, 3),
+    }
+
+def sniff_upload(head: bytes, size_bytes: int, file_type: str):
+    """(estimated rows, sample frame) for an upload; unsniffable formats get a text-heavy stand-in."""
+    sample = _sniff_sample(head, file_type)
+    if sample is None or sample.empty:
+        rows = max(1, size_bytes // 100)
+        sample = pd.DataFrame({"gender": ["x"], "text": ["x"], "value": [0.0], "other": [0.0]})
+    elif "csv" in file_type:
+        # Lines in the complete part of the head, scaled by the file's size
+        complete = head[:head.rfind(b"\n") + 1] or head
+        lines = max(1, complete.count(b"\n") - 1)
+        rows = lines if len(head) >= size_bytes else int(lines * size_bytes / len(complete))
     else:
-        recs.append("[LOW] Bias levels are acceptable (<40%). Continue monitoring for changes.")
-    
-    # Demographic bias recommendations
-    if demographic_bias.get("imbalanced_columns"):
-        imbalanced_cols = demographic_bias['imbalanced_columns'][:5]  # Top 5
-        recs.append(f"[DEMOGRAPHIC] Demographic Imbalance: {len(demographic_bias['imbalanced_columns'])} columns affected")
-        recs.append(f"   Columns: {', '.join(imbalanced_cols)}")
-        
-        if demographic_bias.get("imbalance_details"):
-            top_issue = demographic_bias["imbalance_details"][0]
-            recs.append(f"   Worst case: '{top_issue['column']}' has {top_issue['max_proportion']*100:.1f}% in one category")
-            recs.append(f"-> Action: Apply resampling techniques (SMOTE, oversampling) to balance these groups.")
-    
-    # Text bias recommendations
-    if text_bias.get("toxic_texts") and len(text_bias["toxic_texts"]) > 0:
-        toxic_count = len(text_bias["toxic_texts"])
-        recs.append(f"[TEXT] Text Bias: {toxic_count} potentially toxic/biased text entries detected")
-        recs.append(f"-> Action: Review and filter toxic content. Consider implementing content moderation.")
-        
-        if toxic_count > 50:
-            recs.append(f"   ALERT: High volume of toxic content ({toxic_count} instances). Data quality issue likely.")
-    
-    # Statistical bias recommendations
-    if statistical_bias.get("skewed_columns"):
-        skewed_cols = statistical_bias['skewed_columns'][:5]
-        recs.append(f"[STATISTICAL] Statistical Skew: {len(statistical_bias['skewed_columns'])} columns with high skewness")
-        recs.append(f"   Columns: {', '.join(skewed_cols)}")
-        recs.append(f"-> Action: Apply log transformation, Box-Cox, or robust scaling to normalize distributions.")
-    
-    if statistical_bias.get("statistical_details"):
-        high_outliers = [d for d in statistical_bias["statistical_details"] if d.get("outlier_percentage", 0) > 10]
-        if high_outliers:
-            recs.append(f"[OUTLIERS] Outliers: {len(high_outliers)} columns have >10% outliers")
-            recs.append(f"-> Action: Investigate outliers - may indicate data entry errors or legitimate edge cases.")
-    
-    # General best practices
-    if bias_score > 20:
-        recs.append("")
-        recs.append("[BEST PRACTICES]")
-        recs.append("   - Implement fairness metrics (demographic parity, equalized odds)")
-        recs.append("   - Use adversarial debiasing during model training")
-        recs.append("   - Conduct regular bias audits on production data")
-        recs.append("   - Document data collection methodology and known limitations")
-    
-    if not recs:
-        recs.append("[LOW] No significant bias detected. Dataset appears well-balanced.")
-        recs.append("-> Continue monitoring: Run periodic bias checks as new data is added.")
-    
-    return recs
+        sniffed = len(json.dumps(sample.to_dict("records"), default=str))
+        rows = max(len(sample), int(len(sample) * size_bytes / max(sniffed, 1)))
+    return rows, sample
 
-def detect_statistical_bias(df: pd.DataFrame) -> dict:
+def estimate_upload_cost(head: bytes, size_bytes: int, file_type: str, out_of_core: bool = False) -> dict:
+    """Price an upload from its first ADMISSION_SNIFF_BYTES; unsniffable formats are priced as text-heavy."""
+    if out_of_core:
+        return {"rows": None, "cost_seconds": round(COST_BASE_S + size_bytes / 1e6 * COST_OUT_OF_CORE_S_PER_MB, 3)}
+    return estimate_frame_cost(*sniff_upload(head, size_bytes, file_type))
+
+class AdmissionController:
     """
-    Enhanced statistical bias detection analyzing numeric distributions.
-    Detects skewness, outliers, and potential outcome disparities.
+    Weighted fair queuing over analysis slots. Each lane's requests get
+    virtual finish tags (start + cost / weight); a freed slot goes to the
+    smallest tag, so a lane with weight 4 gets ~4x the service of a weight-1
+    lane when both are backlogged. Batch work may hold at most slots - 1
+    slots, so interactive jobs are never stuck behind long batch jobs.
+    Runs on the event loop; no locking needed.
     """
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    
-    if len(numeric_cols) == 0:
+
+    def __init__(self, slots: int, lane_weights: dict, max_wait_s: float):
+        self.slots = max(1, slots)
+        self.batch_slots = max(1, self.slots - 1)  # as CPU_LAYOUT["batch_slots"]
+        self.lane_weights = lane_weights
+        self.max_wait_s = max_wait_s
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.slots, thread_name_prefix="analysis", initializer=pin_analysis_thread
+        )
+        self.running = {}        # ticket -> (cost, started, lane)
+        self.queue = []          # heap of (finish tag, ticket)
+        self.queued = {}         # ticket -> (cost, future, start tag, finish tag, lane)
+        self.lane_finish = {lane: 0.0 for lane in lane_weights}
+        self.virtual_time = 0.0
+        self.scale = 1.0         # EWMA of actual / estimated seconds
+        self.loop = None         # the event loop the controller runs on, set at startup
+        self._seq = itertools.count()
+
+    def lane_for(self, cost_s: float, requested: Optional[str] = None) -> str:
+        """Lane by calibrated cost; callers may demote themselves to "batch" but not promote."""
+        if requested == "batch":
+            return "batch"
+        return "interactive" if cost_s <= ADMISSION_INTERACTIVE_MAX_S else "batch"
+
+    def _remaining(self, lane: Optional[str] = None) -> list:
+        now = time.perf_counter()
+        return [
+            max(cost - (now - started), 0.0)
+            for cost, started, running_lane in self.running.values() if lane is None or running_lane == lane
+        ]
+
+    def backlog_seconds(self) -> float:
+        return (sum(self._remaining()) + sum(q[0] for q in self.queued.values())) / self.slots
+
+    def expected_wait(self, cost: float, lane: str) -> float:
+        """Seconds until a new request would start: running work plus queued work tagged ahead of it."""
+        finish = max(self.virtual_time, self.lane_finish[lane]) + cost / self.lane_weights[lane]
+        ahead = sum(entry[0] for entry in self.queued.values() if entry[3] <= finish)
+        if lane == "batch":
+            busy = self._remaining("batch")
+            if len(busy) < self.batch_slots and len(self.running) < self.slots and not ahead:
+                return 0.0
+            return (sum(busy) + ahead) / self.batch_slots
+        remaining = self._remaining()
+        if len(remaining) < self.slots and not ahead:
+            return 0.0
+        # The first slot to free up, then a share of the queued work ahead
+        return min(remaining, default=0.0) + ahead / self.slots
+
+    def _dispatch(self):
+        deferred = []
+        while len(self.running) < self.slots and self.queue:
+            item = heapq.heappop(self.queue)
+            entry = self.queued.get(item[1])
+            if entry is None:
+                continue  # cancelled while queued
+            cost, future, start_tag, _, lane = entry
+            if lane == "batch" and len(self._remaining("batch")) >= self.batch_slots:
+                deferred.append(item)
+                continue
+            del self.queued[item[1]]
+            self.virtual_time = max(self.virtual_time, start_tag)
+            self.running[item[1]] = (cost, time.perf_counter(), lane)
+            future.set_result(None)
+        for item in deferred:
+            heapq.heappush(self.queue, item)
+        ADMISSION_BACKLOG.set(self.backlog_seconds())
+
+    @asynccontextmanager
+    async def admit(self, estimated_cost_s: float, requested_lane: Optional[str] = None,
+                    budget: Optional[AnalysisBudget] = None, max_wait_s: Optional[float] = None):
+        """
+        Wait for a slot in the request's lane, or raise 429 when the expected
+        wait is too long: over max_wait_s (default: the controller's), or over
+        what is left of the request's budget (which is already running, so
+        queueing counts against it). Yields admission info.
+        """
+        cost = estimated_cost_s * self.scale
+        lane = self.lane_for(cost, requested_lane)
+        wait = self.expected_wait(cost, lane)
+        limit, limited_by = self.max_wait_s if max_wait_s is None else max_wait_s, "the queue limit"
+        if budget is not None and budget.remaining() < limit:
+            limit, limited_by = budget.remaining(), "the remaining budget"
+        if wait > limit:
+            ADMISSION_DECISIONS.inc(lane=lane, decision="rejected")
+            retry_after = max(1, int(math.ceil(wait - limit)))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server busy: estimated queue wait {wait:.1f}s exceeds {limited_by} ({limit:.1f}s) "
+                       f"for this {lane} request (estimated cost {cost:.1f}s)",
+                headers={"Retry-After": str(retry_after)},
+            )
+        ADMISSION_DECISIONS.inc(lane=lane, decision="admitted")
+        ticket = next(self._seq)
+        start_tag = max(self.virtual_time, self.lane_finish[lane])
+        finish_tag = start_tag + cost / self.lane_weights[lane]
+        self.lane_finish[lane] = finish_tag
+        future = asyncio.get_running_loop().create_future()
+        self.queued[ticket] = (cost, future, start_tag, finish_tag, lane)
+        heapq.heappush(self.queue, (finish_tag, ticket))
+        queued_at = time.perf_counter()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Client went away while queued (or was dispatched in the same tick)
+            self.queued.pop(ticket, None)
+            if ticket in self.running:
+                self.running.pop(ticket)
+                self._dispatch()
+            raise
+        queue_wait = time.perf_counter() - queued_at
+        ADMISSION_QUEUE_WAIT.observe(queue_wait, lane=lane)
+        try:
+            yield {
+                "lane": lane, "estimated_cost_seconds": round(cost, 3),
+                "expected_wait_seconds": round(wait, 3), "queued_ms": round(queue_wait * 1000, 1),
+            }
+        finally:
+            _, started, _ = self.running.pop(ticket)
+            actual = time.perf_counter() - started
+            if estimated_cost_s > 0:
+                ratio = min(max(actual / estimated_cost_s, 0.1), 10.0)
+                self.scale = 0.9 * self.scale + 0.1 * ratio
+            self._dispatch()
+
+    async def run(self, fn):
+        """Run blocking analysis work on an analysis thread, keeping the request's profiler/budget context."""
+        def profiled():
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return fn()
+            with profiler.on_thread():
+                return fn()
+
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, profiled)
+
+    def run_from_thread(self, fn, estimated_cost_s: float, requested_lane: Optional[str] = None):
+        """
+        admit + run for callers on other threads (the Flight server): the
+        queue lives on the event loop, this thread blocks until the work is
+        done. Returns (result, admission info).
+        """
+        async def admitted():
+            async with self.admit(estimated_cost_s, requested_lane) as admission:
+                return await self.run(fn), admission
+        return asyncio.run_coroutine_threadsafe(admitted(), self.loop).result()
+
+    def status(self) -> dict:
         return {
-            "score": 0.0,
-            "skewed_columns": [],
-            "numeric_columns_found": [],
-            "details": "No numeric columns found for statistical analysis"
+            "slots": self.slots, "batch_slots": self.batch_slots, "running": len(self.running), "queued": len(self.queued),
+            "backlog_seconds": round(self.backlog_seconds(), 2), "cost_scale": round(self.scale, 3),
+            "lane_weights": self.lane_weights,
         }
-    
-    analysis_results = []
-    total_bias_score = 0
-    
-    for col in numeric_cols:
+
+ADMISSION = AdmissionController(ADMISSION_SLOTS, ADMISSION_LANE_WEIGHTS, ADMISSION_MAX_WAIT_S)
+
+# -------- Memory Guard --------
+# load_dataset and the cleaning pipeline hold several copies of a frame, so one
+# pathological upload (wide JSON, a big spreadsheet) could OOM-kill the process
+# and every request in it. Each job reserves its projected peak - raw bytes,
+# parse overhead, frame copies and per-row working set, from the sniffed
+# schema - against MEMORY_LIMIT_MB before parsing. A job that does not fit is
+# scanned out-of-core (duckdb), analysed on a chunked row sample (CSV), or
+# refused with 507. While jobs run, RSS is checked at every stage boundary;
+# past the limit the largest job is aborted with 507 and the rest carry on.
+
+def _default_memory_limit_bytes() -> int:
+    """The cgroup memory limit when containerised, else physical RAM."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
         try:
-            series = df[col].dropna()
-            if len(series) < 10:  # Need minimum data points
-                continue
-            
-            # Calculate statistical measures
-            skewness = series.skew()
-            kurtosis = series.kurtosis()
-            
-            # Check for outliers using IQR method
-            q1, q3 = series.quantile([0.25, 0.75])
-            iqr = q3 - q1
-            if iqr > 0:
-                lower_bound = q1 - 1.5 * iqr
-                upper_bound = q3 + 1.5 * iqr
-                outlier_count = ((series < lower_bound) | (series > upper_bound)).sum()
-                outlier_percentage = (outlier_count / len(series)) * 100
-            else:
-                outlier_percentage = 0
-            
-            # Calculate bias score for this column
-            skew_score = min(50, abs(skewness) * 10)  # High skewness = potential bias
-            outlier_score = min(50, outlier_percentage * 2)  # High outliers = potential bias
-            column_bias = (skew_score + outlier_score) / 2
-            
-            if column_bias > 20:  # Only report significant biases
-                analysis_results.append({
-                    "column": str(col),
-                    "skewness": float(skewness),
-                    "kurtosis": float(kurtosis),
-                    "outlier_percentage": float(outlier_percentage),
-                    "bias_score": float(column_bias),
-                    "mean": float(series.mean()),
-                    "median": float(series.median()),
-                    "std": float(series.std())
-                })
-                total_bias_score += column_bias
-        
-        except Exception as e:
-            print(f"Warning: Could not analyze numeric column {col}: {e}")
+            with open(path) as f:
+                value = f.read().strip()
+            if value != "max" and int(value) < 1 << 60:
+                return int(value)
+        except (OSError, ValueError):
             continue
-    
-    # Calculate overall score
-    if analysis_results:
-        overall_score = min(100, total_bias_score / len(analysis_results))
-    else:
-        overall_score = 0.0
-    
-    # Sort by bias score
-    analysis_results.sort(key=lambda x: x['bias_score'], reverse=True)
-    
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 8 << 30
+
+MEMORY_LIMIT_MB = float(os.getenv("MEMORY_LIMIT_MB", str(int(0.8 * _default_memory_limit_bytes() / 2**20))))
+MEMORY_JOB_MAX_MB = float(os.getenv("MEMORY_JOB_MAX_MB", str(MEMORY_LIMIT_MB / 2)))
+MEMORY_MIN_SAMPLE_FRACTION = float(os.getenv("MEMORY_MIN_SAMPLE_FRACTION", "0.05"))
+MEMORY_SAMPLE_CHUNK_ROWS = 50_000
+# Peak-memory priors, measured on the in-memory pipeline
+MEMORY_BASE_BYTES = 32 << 20
+MEMORY_FRAME_COPIES = 4.0    # uploaded frame, cleaning base, cleaned frame, temporaries
+MEMORY_PER_ROW_BYTES = 800   # near-duplicate MinHash signatures and row hashes
+MEMORY_PARSE_FACTORS = {"csv": 1.0, "json": 5.0, "excel": 20.0, "text": 2.0}  # transient, x raw bytes
+
+MEMORY_DECISIONS = METRICS.register(Counter(
+    "biasbounty_memory_decisions_total", "Memory guard decisions (full/sampled/out_of_core/rejected/aborted).",
+    ("mode",)))
+MEMORY_RESERVED = METRICS.register(Gauge(
+    "biasbounty_memory_reserved_bytes", "Projected peak memory reserved by running jobs."))
+
+_active_reservation = contextvars.ContextVar("active_reservation", default=None)
+
+def _memory_format(file_type: str) -> str:
+    if "csv" in file_type:
+        return "csv"
+    if "json" in file_type:
+        return "json"
+    if "excel" in file_type or "spreadsheet" in file_type or file_type.endswith((".xlsx", ".xls")):
+        return "excel"
+    return "text"
+
+def estimate_frame_memory(rows: int, sample: pd.DataFrame) -> int:
+    """Projected working set of analyze_dataframe on `rows` rows shaped like `sample`."""
+    per_row = sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+    return int(rows * (per_row * MEMORY_FRAME_COPIES + MEMORY_PER_ROW_BYTES))
+
+def estimate_upload_memory(head: bytes, size_bytes: int, file_type: str) -> dict:
+    """Projected peak bytes for analyze_content on an upload, from its first ADMISSION_SNIFF_BYTES."""
+    rows, sample = sniff_upload(head, size_bytes, file_type)
+    parse = int(size_bytes * MEMORY_PARSE_FACTORS[_memory_format(file_type)])
+    working = estimate_frame_memory(rows, sample)
     return {
-        "score": float(overall_score),
-        "skewed_columns": [item["column"] for item in analysis_results if abs(item["skewness"]) > 1],
-        "numeric_columns_found": list(map(str, numeric_cols)),
-        "statistical_details": analysis_results[:10],  # Top 10 most biased
-        "details": f"Analyzed {len(numeric_cols)} numeric columns, {len(analysis_results)} show statistical irregularities"
+        "rows": int(rows), "raw_bytes": size_bytes, "parse_bytes": parse, "working_bytes": working,
+        "peak_bytes": MEMORY_BASE_BYTES + size_bytes + max(parse, working),
     }
 
-def calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias):
-    """
-    Simple example: average the bias scores from each component if present, else return 0.
-    Assumes each bias dict has a 'score' key with a value between 0 and 100.
-    """
-    scores = []
-    for bias in [demographic_bias, text_bias, statistical_bias]:
-        if isinstance(bias, dict) and 'score' in bias:
-            scores.append(bias['score'])
-    if scores:
-        return float(np.mean(scores))
-    return 0.0
+def estimate_dataframe_memory(df: pd.DataFrame) -> dict:
+    """Projected peak bytes for analyze_dataframe on a frame that is already loaded."""
+    working = estimate_frame_memory(len(df), df.head(1000))
+    return {
+        "rows": len(df), "raw_bytes": 0, "parse_bytes": 0, "working_bytes": working,
+        "peak_bytes": MEMORY_BASE_BYTES + working,
+    }
 
-def compute_numeric_histograms(df: pd.DataFrame, bins: int = 10) -> dict:
-    """Return histogram bins and counts for numeric columns."""
-    result: Dict[str, Any] = {}
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    for col in numeric_cols:
-        series = df[col].dropna().astype(float)
-        if len(series) == 0:
-            continue
-        counts, bin_edges = np.histogram(series, bins=bins)
-        result[str(col)] = {
-            "bin_edges": list(map(float, bin_edges.tolist())),
-            "counts": list(map(int, counts.tolist()))
-        }
-    return result
+def load_csv_sample(content: bytes, fraction: float) -> pd.DataFrame:
+    """Uniform row sample of a CSV, parsed in chunks so the whole frame is never materialised."""
+    rng = np.random.default_rng(42)
+    chunks = iter_csv_chunks(content, content[:content.find(b"\n") + 1], dtype=None,
+                             chunksize=MEMORY_SAMPLE_CHUNK_ROWS)
+    kept = []
+    for chunk in chunks:
+        kept.append(chunk[rng.random(len(chunk)) < fraction])
+        memory_checkpoint()
+    if not kept:
+        raise HTTPException(status_code=400, detail="Dataset is empty or could not be parsed")
+    df = pd.concat(kept, ignore_index=True)
+    annotate_stage(sample_fraction=round(fraction, 4), rows_out=len(df))
+    return df
+
+def _mb(value: float) -> float:
+    return round(value / 2**20, 1)
+
+class MemoryReservation:
+    """One job's claim on the memory budget; a context manager that makes it the active reservation."""
+
+    def __init__(self, governor, estimate: dict, projected: int, mode: str, fraction: float = 1.0):
+        self.governor = governor
+        self.projected = projected
+        self.mode = mode
+        self.fraction = fraction
+        self.peak_rss = get_rss_bytes()
+        self.aborted = False
+        self._token = None
+
+    def activate(self):
+        self._token = _active_reservation.set(self)
+        return self
 
+    def close(self):
+        if self._token is not None:
+            _active_reservation.reset(self._token)
+            self._token = None
+        self.governor._release(self)
 
-def compute_categorical_distributions(df: pd.DataFrame, top_n: int = 20) -> dict:
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if exc_type is MemoryError:
+            MEMORY_DECISIONS.inc(mode="aborted")
+            raise HTTPException(status_code=507, detail="Insufficient memory: the job ran out of memory and was aborted")
+        return False
+
+    def report(self) -> dict:
+        return {
+            "mode": self.mode, "sample_fraction": round(self.fraction, 4),
+            "projected_mb": _mb(self.projected), "peak_rss_mb": _mb(self.peak_rss),
+        }
+
+class MemoryGovernor:
     """
-    Return top N value counts for categorical/text columns.
-    FIXED: Limited to first 20 categorical columns to prevent processing too many columns.
+    Reservations against a process memory limit. Headroom is the limit minus
+    the larger of current RSS and idle RSS plus outstanding reservations, so a
+    job admitted next to a still-growing one does not count on memory that
+    job is about to use. Thread-safe; analysis runs on executor threads.
     """
-    result: Dict[str, Any] = {}
-    cat_cols = [c for c in df.columns if df[c].dtype == object or pd.api.types.is_string_dtype(df[c])]
-    
-    # Limit to first 20 categorical columns
-    if len(cat_cols) > 20:
-        print(f"   [WARNING] Dataset has {len(cat_cols)} categorical columns, limiting to 20")
-        cat_cols = cat_cols[:20]
-    
-    for col in cat_cols:
-        vc = df[col].astype(str).value_counts().head(top_n)
-        result[str(col)] = [{"label": str(k), "count": int(v)} for k, v in vc.items()]
-    return result
 
+    def __init__(self, limit_bytes: int, job_max_bytes: int):
+        self.limit = int(limit_bytes)
+        self.job_max = int(min(job_max_bytes, limit_bytes))
+        self.active = {}
+        self.idle_rss = get_rss_bytes()
+        self._lock = threading.Lock()
 
-def compute_correlation_edges(df: pd.DataFrame, top_k: int = 20) -> list:
+    def _available(self) -> int:
+        rss = get_rss_bytes()
+        if not self.active:
+            self.idle_rss = rss
+        committed = sum(r.projected for r in self.active.values())
+        return int(min(self.limit - max(rss, self.idle_rss + committed), self.job_max))
+
+    def fits(self, peak_bytes: int) -> bool:
+        with self._lock:
+            return peak_bytes <= self._available()
+
+    def reserve(self, estimate: dict, can_sample: bool = False) -> MemoryReservation:
+        """Claim memory for a job: full, on a row sample if allowed, or raise 507."""
+        with self._lock:
+            available = self._available()
+            fixed = MEMORY_BASE_BYTES + estimate["raw_bytes"]
+            fraction = (available - fixed) / max(estimate["working_bytes"], 1)
+            if estimate["peak_bytes"] <= available:
+                reservation = MemoryReservation(self, estimate, estimate["peak_bytes"], "full")
+            elif can_sample and fraction >= MEMORY_MIN_SAMPLE_FRACTION:
+                # Chunked parsing keeps the parse transient small; only the sampled frame scales
+                projected = fixed + int(estimate["working_bytes"] * fraction)
+                reservation = MemoryReservation(self, estimate, projected, "sampled", fraction)
+            else:
+                busy = bool(self.active)
+                reservation = None
+            if reservation is not None:
+                self.active[id(reservation)] = reservation
+                MEMORY_RESERVED.set(sum(r.projected for r in self.active.values()))
+        if reservation is None:
+            MEMORY_DECISIONS.inc(mode="rejected")
+            headers = None
+            if busy and estimate["peak_bytes"] <= self.job_max:
+                # Would fit once running jobs finish
+                headers = {"Retry-After": str(max(1, int(math.ceil(ADMISSION.backlog_seconds()))))}
+            raise HTTPException(
+                status_code=507,
+                detail=f"Insufficient memory: this job needs about {_mb(estimate['peak_bytes']):.0f}MB, "
+                       f"{max(_mb(available), 0):.0f}MB is available (limit {_mb(self.limit):.0f}MB)",
+                headers=headers,
+            )
+        MEMORY_DECISIONS.inc(mode=reservation.mode)
+        if reservation.mode == "sampled":
+            print(f"[MEMORY] Projected {_mb(estimate['peak_bytes'])}MB exceeds {_mb(available)}MB available; "
+                  f"analysing a {reservation.fraction:.1%} row sample")
+        return reservation
+
+    def _release(self, reservation: MemoryReservation):
+        with self._lock:
+            if self.active.pop(id(reservation), None) is not None:
+                MEMORY_RESERVED.set(sum(r.projected for r in self.active.values()))
+
+    def check(self, reservation: MemoryReservation):
+        """Abort the largest running job (507) once RSS passes the limit."""
+        rss = get_rss_bytes()
+        reservation.peak_rss = max(reservation.peak_rss, rss)
+        if rss > self.limit:
+            with self._lock:
+                if self.active and not any(r.aborted for r in self.active.values()):
+                    victim = max(self.active.values(), key=lambda r: r.projected)
+                    victim.aborted = True
+                    print(f"[MEMORY] RSS {_mb(rss)}MB over the {_mb(self.limit)}MB limit; "
+                          f"aborting the job projected at {_mb(victim.projected)}MB")
+        if reservation.aborted:
+            MEMORY_DECISIONS.inc(mode="aborted")
+            raise HTTPException(
+                status_code=507,
+                detail=f"Insufficient memory: process memory reached {_mb(rss):.0f}MB of the "
+                       f"{_mb(self.limit):.0f}MB limit; this job was aborted",
+            )
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "limit_mb": _mb(self.limit), "job_max_mb": _mb(self.job_max), "rss_mb": _mb(get_rss_bytes()),
+                "reserved_mb": _mb(sum(r.projected for r in self.active.values())), "jobs": len(self.active),
+            }
+
+MEMORY = MemoryGovernor(MEMORY_LIMIT_MB * 2**20, MEMORY_JOB_MAX_MB * 2**20)
+
+def memory_checkpoint():
+    """Stage-boundary RSS check for the active job; no-op outside a reservation."""
+    reservation = _active_reservation.get()
+    if reservation is not None:
+        reservation.governor.check(reservation)
+
+# -------- Uploads --------
+# Large datasets arrive compressed and over slow links. gzip, zstd and
+# single-dataset zip uploads are decompressed as a stream into a spool file
+# under JOBS_DIR, never into one in-memory buffer, and then take the normal
+# path (in memory, or out-of-core from the spool). Resumable uploads follow
+# tus 1.0 (core + creation, termination, expiration): the client creates an
+# upload, PATCHes bytes at the current Upload-Offset, resumes after a dropped
+# connection from HEAD's offset, and finally analyses the completed upload.
+
+UPLOADS_DIR = os.path.join(JOBS_DIR, "uploads")
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", str(MAX_OUT_OF_CORE_MB)))
+UPLOAD_TTL_HOURS = float(os.getenv("UPLOAD_TTL_HOURS", "24"))
+UPLOAD_COPY_BLOCK = 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination,expiration"
+COMPRESSION_SUFFIXES = {"gzip": (".gz", ".gzip"), "zstd": (".zst", ".zstd"), "zip": (".zip",)}
+
+try:
+    import zstandard  # optional: zstd-compressed uploads
+except ImportError:
+    zstandard = None
+
+UPLOAD_BYTES = METRICS.register(Counter(
+    "biasbounty_upload_bytes_total", "Upload bytes received, and produced by decompression, by codec.",
+    ("codec", "stage")))
+
+def detect_compression(head: bytes, filename: str) -> Optional[str]:
+    """Codec from the magic bytes; zip only when the name is not a spreadsheet (xlsx is a zip too)."""
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if head.startswith(b"\x28\xb5\x2f\xfd"):
+        return "zstd"
+    if head.startswith(b"PK\x03\x04") and not filename.lower().endswith((".xlsx", ".xls")):
+        return "zip"
+    return None
+
+def _strip_suffix(filename: str, suffixes: tuple) -> str:
+    lower = filename.lower()
+    for suffix in suffixes:
+        if lower.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def decompress_to_spool(fileobj, filename: str, codec: str):
+    """Stream-decompress an upload into a spool file under JOBS_DIR. Returns (path, inner dataset name)."""
+    fileobj.seek(0)
+    if codec == "zip":
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Could not decompress {filename}: {str(e)}")
+        members = [m for m in archive.infolist() if not m.is_dir() and _is_dataset_member(m.filename)]
+        if len(members) != 1:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{filename} holds {len(members)} datasets; upload a single dataset or use /analyze-batch"
+            )
+        inner = os.path.basename(members[0].filename)
+        stream = archive.open(members[0])
+    elif codec == "gzip":
+        inner = _strip_suffix(filename, COMPRESSION_SUFFIXES["gzip"])
+        stream = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    else:
+        if zstandard is None:
+            raise HTTPException(status_code=415, detail="zstd uploads need the optional zstandard package")
+        inner = _strip_suffix(filename, COMPRESSION_SUFFIXES["zstd"])
+        stream = zstandard.ZstdDecompressor().stream_reader(fileobj)
+    path = os.path.join(JOBS_DIR, f"upload_{uuid.uuid4()}{os.path.splitext(inner)[1]}")
+    limit = MAX_OUT_OF_CORE_MB * 1024 * 1024
+    written = 0
+    try:
+        with stream, open(path, "wb") as out:
+            while True:
+                block = stream.read(UPLOAD_COPY_BLOCK)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    raise HTTPException(
+                        status_code=413, detail=f"Decompressed upload exceeds the {MAX_OUT_OF_CORE_MB}MB maximum"
+                    )
+                out.write(block)
+    except HTTPException:
+        os.remove(path)
+        raise
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Could not decompress {filename}: {str(e)[:200]}")
+    UPLOAD_BYTES.inc(written, codec=codec, stage="decompressed")
+    print(f"[UPLOAD] {filename}: {codec} -> {written / 2**20:.1f}MB {inner}")
+    return path, inner
+
+async def analyze_upload_file(request: Request, fileobj, filename: str, content_type: Optional[str],
+                              analysis_kwargs: dict, spool_path: Optional[str] = None) -> dict:
     """
-    Return top-K strongest absolute correlations as edges for graph visualizations.
-    FIXED: Added column limit to prevent hangs on datasets with 100+ columns.
+    The /analyze-upload pipeline over a seekable binary file: decompress if
+    needed, then admission, memory planning and in-memory or out-of-core
+    analysis. spool_path names fileobj's file on disk, so the out-of-core
+    scan can read it without another copy. analysis_kwargs may carry the
+    catalog "dataset" (default: the file name) and "version".
     """
-    numeric_df = df.select_dtypes(include=[np.number])
-    
-    # Limit to first 50 numeric columns to prevent O(n²) explosion
-    if numeric_df.shape[1] > 50:
-        print(f"   [WARNING] Dataset has {numeric_df.shape[1]} numeric columns, limiting to 50 for correlation")
-        numeric_df = numeric_df.iloc[:, :50]
-    
-    if numeric_df.shape[1] < 2:
-        return []
-    
+    fileobj.seek(0)
+    codec = detect_compression(fileobj.read(8), filename)
+    if codec is not None:
+        fileobj.seek(0, os.SEEK_END)
+        compressed_bytes = fileobj.tell()
+        UPLOAD_BYTES.inc(compressed_bytes, codec=codec, stage="received")
+        path, inner = await asyncio.get_running_loop().run_in_executor(
+            None, decompress_to_spool, fileobj, filename, codec
+        )
+        decompressed_bytes = os.path.getsize(path)
+        try:
+            with open(path, "rb") as decompressed:
+                result = await analyze_upload_file(request, decompressed, inner, None, analysis_kwargs, spool_path=path)
+        finally:
+            os.remove(path)
+        result["upload"] = {
+            "compression": codec, "compressed_bytes": compressed_bytes, "decompressed_bytes": decompressed_bytes,
+        }
+        return result
+
+    fileobj.seek(0, os.SEEK_END)
+    size_bytes = fileobj.tell()
+    size_mb = size_bytes / (1024 * 1024)
+    fileobj.seek(0)
+    head = fileobj.read(ADMISSION_SNIFF_BYTES)
+    fileobj.seek(0)
+    ftype = detect_file_type(filename, content_type)
+    out_of_core = size_mb > MAX_IN_MEMORY_MB and out_of_core_available(ftype)
+    memory = None
+    if not out_of_core and out_of_core_available(ftype):
+        memory = estimate_upload_memory(head, size_bytes, ftype)
+        if not MEMORY.fits(memory["peak_bytes"]):
+            # Would not fit in memory as a whole: scan it from disk instead of sampling
+            print(f"[MEMORY] Projected {memory['peak_bytes'] / 2**20:.0f}MB does not fit; analysing {filename} out-of-core")
+            MEMORY_DECISIONS.inc(mode="out_of_core")
+            out_of_core = True
+    estimate = estimate_upload_cost(head, size_bytes, ftype, out_of_core)
+    analysis_kwargs = dict(analysis_kwargs)
+    catalog_key = (analysis_kwargs.pop("dataset", None) or filename, analysis_kwargs.pop("version", None))
+    outcome_column = analysis_kwargs.get("outcome_column")
+    prediction_column = analysis_kwargs.get("prediction_column")
+    subgroup_depth = analysis_kwargs.get("subgroup_depth")
+    budget = AnalysisBudget.from_request(request)
     try:
-        corr = numeric_df.corr(numeric_only=True)
-    except TypeError:
-        # For older pandas versions
-        corr = numeric_df.corr()
-    
-    edges = []
-    cols = list(corr.columns)
-    for i in range(len(cols)):
-        for j in range(i + 1, len(cols)):
-            val = corr.iloc[i, j]
-            if not pd.isna(val):
-                edges.append({
-                    "source": str(cols[i]),
-                    "target": str(cols[j]),
-                    "weight": float(val)
-                })
-    edges.sort(key=lambda e: abs(e["weight"]), reverse=True)
-    return edges[:top_k]
+        async with ADMISSION.admit(estimate["cost_seconds"], request.headers.get("x-priority"), budget) as admission:
+            JOBS_IN_FLIGHT.inc()
+            profiler = RequestProfiler.from_request(request, "analyze-upload")
+            try:
+                if out_of_core:
+                    # Too big for pandas: aggregate over the file on disk
+                    if size_mb > MAX_OUT_OF_CORE_MB:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File too large ({size_mb:.1f}MB). Maximum size is {MAX_OUT_OF_CORE_MB}MB."
+                        )
+                    BYTES_PROCESSED.inc(size_bytes)
 
+                    def run_out_of_core():
+                        if spool_path is not None:
+                            return analyze_large_file(
+                                spool_path, filename, ftype, outcome_column=outcome_column,
+                                prediction_column=prediction_column, subgroup_depth=subgroup_depth,
+                                catalog_key=catalog_key
+                            )
+                        path = os.path.join(JOBS_DIR, f"upload_{uuid.uuid4()}{os.path.splitext(filename)[1]}")
+                        try:
+                            with open(path, "wb") as out:
+                                shutil.copyfileobj(fileobj, out, UPLOAD_COPY_BLOCK)
+                            return analyze_large_file(
+                                path, filename, ftype, outcome_column=outcome_column,
+                                prediction_column=prediction_column, subgroup_depth=subgroup_depth,
+                                catalog_key=catalog_key
+                            )
+                        finally:
+                            if os.path.exists(path):
+                                os.remove(path)
 
-def compute_text_stats(df: pd.DataFrame, max_per_col: int = 50) -> dict:
+                    result = await ADMISSION.run(run_out_of_core)
+                    if memory is not None:
+                        result["memory"] = {"mode": "out_of_core", "projected_mb": _mb(memory["peak_bytes"])}
+                else:
+                    result = await ADMISSION.run(lambda: analyze_content(
+                        fileobj.read(), filename, content_type, catalog_key=catalog_key, **analysis_kwargs
+                    ))
+                result["admission"] = {**admission, "estimate": estimate}
+                if budget is not None:
+                    result["budget"] = budget.report()
+                if profiler is not None:
+                    result["profile"] = profiler.finish(result["job_id"])
+                return result
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+            finally:
+                if profiler is not None:
+                    profiler.finish()
+                JOBS_IN_FLIGHT.dec()
+    finally:
+        if budget is not None:
+            budget.close()
+
+def parse_tus_metadata(header: Optional[str]) -> dict:
+    """Upload-Metadata: comma-separated "key base64value" pairs (value optional)."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode("utf-8") if len(parts) > 1 else ""
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid Upload-Metadata value for {parts[0]!r}")
+    return metadata
+
+class ResumableUploads:
     """
-    Text column stats: length histograms, toxicity counts, and sentiment distribution if models are enabled.
-    FIXED: Reduced max_per_col from 1000 to 50 to prevent hangs on large datasets.
+    tus upload state as spool files in UPLOADS_DIR: <id>.part holds the bytes
+    received so far (its size is the offset) and <id>.json the declared length
+    and metadata, so uploads survive a restart. PATCHes to one upload are
+    serialised; uploads expire UPLOAD_TTL_HOURS after creation.
     """
-    text_cols = [c for c in df.columns if df[c].dtype == object or pd.api.types.is_string_dtype(df[c])]
-    
-    # Limit to first 10 text columns to prevent processing too much data
-    text_cols = text_cols[:10]
-    
-    length_histograms: Dict[str, Any] = {}
-    toxicity_by_column: Dict[str, int] = {}
-    sentiment_distribution: Dict[str, int] = {}
 
-    for col in text_cols:
-        texts = df[col].dropna().astype(str).tolist()
-        
-        # Length histogram (fast, no model inference)
-        lengths = [len(t) for t in texts]
-        if lengths:
-            counts, bins = np.histogram(lengths, bins=10)
-            length_histograms[str(col)] = {
-                "bin_edges": list(map(float, bins.tolist())),
-                "counts": list(map(int, counts.tolist()))
-            }
-        
-        # Toxicity counts (SLOW - uses AI model, limit to 50 samples)
-        toxic_count = 0
-        if toxicity_analyzer is not None:
-            # Only analyze first 50 texts per column
-            for t in texts[:max_per_col]:
-                # Skip very short or empty texts
-                if len(t) < 3:
-                    continue
-                # Truncate long texts to prevent model slowdown
-                if len(t) > 500:
-                    t = t[:500]
-                try:
-                    res = toxicity_analyzer(t, max_length=128, truncation=True)
-                    if isinstance(res, list) and res and res[0].get("label", "").lower() == "toxic" and res[0].get("score", 0) > 0.5:
-                        toxic_count += 1
-                except Exception:
-                    continue
-        toxicity_by_column[str(col)] = int(toxic_count)
+    def __init__(self, root: str, max_bytes: int, ttl_s: float):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = ttl_s
+        self._locks: Dict[str, asyncio.Lock] = {}
+        os.makedirs(root, exist_ok=True)
 
-    # Sentiment distribution across all text columns (SLOW - uses AI model)
-    if sentiment_analyzer is not None and text_cols:
-        pos = neg = neu = 0
-        for col in text_cols:
-            texts = df[col].dropna().astype(str).tolist()
-            # Only analyze first 50 texts per column
-            for t in texts[:max_per_col]:
-                # Skip very short or empty texts
-                if len(t) < 3:
-                    continue
-                # Truncate long texts
-                if len(t) > 500:
-                    t = t[:500]
-                try:
-                    res = sentiment_analyzer(t, max_length=128, truncation=True)
-                    if isinstance(res, list) and res:
-                        label = str(res[0].get("label", "")).lower()
-                        if "pos" in label or "positive" in label:
-                            pos += 1
-                        elif "neg" in label or "negative" in label:
-                            neg += 1
-                        else:
-                            neu += 1
-                except Exception:
-                    continue
-        sentiment_distribution = {"positive": pos, "negative": neg, "neutral": neu}
+    def data_path(self, upload_id: str) -> str:
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return os.path.join(self.root, f"{upload_id}.part")
 
-    return {
-        "text_columns": list(map(str, text_cols)),
-        "length_histograms": length_histograms,
-        "toxicity_by_column": toxicity_by_column,
-        "sentiment_distribution": sentiment_distribution
-    }
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.json")
 
+    def create(self, length: int, metadata: dict) -> dict:
+        if length < 0:
+            raise HTTPException(status_code=400, detail="Upload-Length must be a non-negative integer")
+        if length > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload-Length exceeds the {self.max_bytes // 2**20}MB maximum")
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        info = {"id": upload_id, "length": length, "metadata": metadata, "created": time.time()}
+        open(self.data_path(upload_id), "wb").close()
+        with open(self._meta_path(upload_id), "w") as f:
+            json.dump(info, f)
+        return {**info, "offset": 0}
 
-def build_chart_data(df: pd.DataFrame) -> dict:
-    """
-    Collect chart-ready data for interactive visualizations.
-    FIXED: Added error handling to prevent hangs.
-    """
-    chart_data = {}
-    
-    try:
-        print("   [CHART] Building numeric histograms...")
-        chart_data["numeric_histograms"] = compute_numeric_histograms(df)
-    except Exception as e:
-        print(f"   [WARNING] Error building histograms: {str(e)[:100]}")
-        chart_data["numeric_histograms"] = {}
-    
-    try:
-        print("   [CHART] Building categorical distributions...")
-        chart_data["categorical_distributions"] = compute_categorical_distributions(df)
-    except Exception as e:
-        print(f"   [WARNING] Error building distributions: {str(e)[:100]}")
-        chart_data["categorical_distributions"] = {}
-    
-    try:
-        print("   [CHART] Computing correlations...")
-        chart_data["correlation_edges"] = compute_correlation_edges(df)
-    except Exception as e:
-        print(f"   [WARNING] Error computing correlations: {str(e)[:100]}")
-        chart_data["correlation_edges"] = []
-    
-    try:
-        print("   [CHART] Computing text statistics...")
-        chart_data["text_stats"] = compute_text_stats(df)
-    except Exception as e:
-        print(f"   [WARNING] Error computing text stats: {str(e)[:100]}")
-        chart_data["text_stats"] = {}
-    
-    try:
-        chart_data["missing_values"] = {str(k): int(v) for k, v in df.isna().sum().to_dict().items()}
-    except Exception as e:
-        print(f"   [WARNING] Error computing missing values: {str(e)[:100]}")
-        chart_data["missing_values"] = {}
-    
-    return chart_data
+    def info(self, upload_id: str) -> dict:
+        data_path = self.data_path(upload_id)
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                info = json.load(f)
+            info["offset"] = os.path.getsize(data_path)
+        except (OSError, ValueError):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if time.time() - info["created"] > self.ttl_s:
+            self.delete(upload_id)
+            raise HTTPException(status_code=410, detail="Upload expired")
+        return info
+
+    def headers(self, info: dict) -> dict:
+        return {
+            "Tus-Resumable": TUS_VERSION, "Upload-Offset": str(info["offset"]),
+            "Upload-Length": str(info["length"]), "Cache-Control": "no-store",
+            "Upload-Expires": email.utils.formatdate(info["created"] + self.ttl_s, usegmt=True),
+        }
+
+    async def append(self, upload_id: str, offset: int, chunks) -> dict:
+        """Append a PATCH body at `offset`; bytes already written stay if the client disconnects."""
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            info = self.info(upload_id)
+            if offset != info["offset"]:
+                raise HTTPException(
+                    status_code=409, detail=f"Upload-Offset {offset} does not match the current offset {info['offset']}",
+                    headers=self.headers(info),
+                )
+            received = 0
+            with open(self.data_path(upload_id), "ab") as out:
+                async for chunk in chunks:
+                    if info["offset"] + len(chunk) > info["length"]:
+                        raise HTTPException(status_code=413, detail="PATCH body runs past Upload-Length")
+                    out.write(chunk)
+                    info["offset"] += len(chunk)
+                    received += len(chunk)
+            UPLOAD_BYTES.inc(received, codec="none", stage="resumable")
+            return info
+
+    def delete(self, upload_id: str):
+        for path in (self.data_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        self._locks.pop(upload_id, None)
+
+    def expire(self):
+        for name in os.listdir(self.root):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json" or not UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    created = json.load(f)["created"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if time.time() - created > self.ttl_s:
+                self.delete(upload_id)
+
+UPLOADS = ResumableUploads(UPLOADS_DIR, UPLOAD_MAX_MB * 1024 * 1024, UPLOAD_TTL_HOURS * 3600)
 
 # ---------- ROUTES ----------
+@app.on_event("startup")
+async def on_startup():
+    ADMISSION.loop = asyncio.get_running_loop()
+    start_flight_server()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /download/{job_id}) to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, route=route_path, status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, route=route_path)
+
+@app.get("/metrics")
+async def metrics():
+    PROCESS_RSS.set(get_rss_bytes())
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {
@@ -929,56 +6047,90 @@ async def health_check():
         "models": {
             "sentiment_analyzer": sentiment_analyzer is not None,
             "toxicity_analyzer": toxicity_analyzer is not None
-        }
+        },
+        "toxicity_cascade": TOXICITY_PREFILTER.status(),
+        "out_of_core_backend": "duckdb" if out_of_core_available("text/csv") else None,
+        "arrow_flight": flight_location(),
+        "admission": ADMISSION.status(),
+        "memory": MEMORY.status(),
+        "cpu": CPU_LAYOUT,
+        "catalog": CATALOG.status(),
+        "clean_stage_cache": CLEAN_STAGE_CACHE.stats()
     }
 
 @app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_bias(request: AnalysisRequest):
+async def analyze_bias(request: AnalysisRequest, http_request: Request):
+    budget = AnalysisBudget.from_request(http_request, request.budget_ms)
     try:
-        file_content = download_file(request.file_url)
-        df = load_dataset(file_content, request.file_type)
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Dataset is empty")
-
-        demographic_bias = detect_demographic_bias(df)
-        text_bias = detect_text_bias(df)
-        statistical_bias = detect_statistical_bias(df)
-        bias_score = calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias)
-        recommendations = generate_recommendations(bias_score, demographic_bias, text_bias, statistical_bias)
+        file_content = await asyncio.get_running_loop().run_in_executor(None, download_file, request.file_url)
+        BYTES_PROCESSED.inc(len(file_content))
+        estimate = estimate_upload_cost(file_content[:ADMISSION_SNIFF_BYTES], len(file_content), request.file_type)
+        async with ADMISSION.admit(estimate["cost_seconds"], http_request.headers.get("x-priority"), budget) as admission:
+            JOBS_IN_FLIGHT.inc()
+            profiler = RequestProfiler.from_request(http_request, "analyze")
+            try:
+                result = await ADMISSION.run(lambda: analyze_fetched_dataset(request, file_content))
+                return AnalysisResponse(
+                    **result,
+                    profile=profiler.finish() if profiler is not None else None,
+                    budget=budget.report() if budget is not None else None,
+                    admission={**admission, "estimate": estimate},
+                )
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+            finally:
+                if profiler is not None:
+                    profiler.finish()
+                JOBS_IN_FLIGHT.dec()
+    finally:
+        if budget is not None:
+            budget.close()
 
-        ai_summary = (
-            f"I analyzed {len(df)} records across {len(df.columns)} columns. "
-            f"Overall bias score is {bias_score}/100. "
-            f"Detected demographics: {demographic_bias.get('demographic_columns_found', [])}. "
-            f"Text columns analyzed: {text_bias.get('text_columns_found', [])}. "
-            f"Recommendations: " + "; ".join(recommendations[:3]) +
-            ("..." if len(recommendations) > 3 else "")
-        )
+@app.get("/catalog")
+async def list_profiles(dataset: Optional[str] = None, limit: int = 100):
+    """Stored profiles (metadata only), newest version first per dataset."""
+    return {"profiles": CATALOG.versions(dataset, limit)}
 
-        fairness_metrics = {
-            "dataset_info": {
-                "rows": len(df),
-                "columns": len(df.columns),
-                "column_names": df.columns.tolist()
-            },
-            "demographic_bias": demographic_bias,
-            "text_bias": text_bias,
-            "statistical_bias": statistical_bias,
-            "chart_data": build_chart_data(df),
-            "analysis_timestamp": pd.Timestamp.now().isoformat()
-        }
+@app.get("/catalog/profile")
+async def get_profile(dataset: str, version: Optional[str] = None):
+    """One stored profile; the latest version when ?version= is omitted."""
+    found = CATALOG.load(dataset, version)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {dataset}" + (f" version {version}" if version else ""))
+    meta, profile = found
+    return {**meta, "profile": profile}
 
-        return AnalysisResponse(
-            bias_score=bias_score,
-            fairness_metrics=fairness_metrics,
-            recommendations=recommendations,
-            analysis_type="comprehensive",
-            ai_summary=ai_summary
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+@app.get("/compare")
+async def compare_versions(dataset: str, target: Optional[str] = None, base: Optional[str] = None,
+                           base_dataset: Optional[str] = None):
+    """
+    Drift from a base profile to a target profile, computed from the catalog
+    alone. target defaults to the latest version of ?dataset=; base to the
+    version before it, or to ?base= of ?base_dataset= (default: the same dataset).
+    """
+    start = time.perf_counter()
+    found = CATALOG.load(dataset, target)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {dataset}" + (f" version {target}" if target else ""))
+    target_meta, target_profile = found
+    if base is None and base_dataset is None:
+        found = CATALOG.load(dataset, before_seq=target_meta["seq"])
+        if found is None:
+            raise HTTPException(
+                status_code=400, detail=f"{dataset} has no version before {target_meta['version']} to compare against"
+            )
+    else:
+        found = CATALOG.load(base_dataset or dataset, base)
+        if found is None:
+            raise HTTPException(
+                status_code=404, detail=f"No profile for {base_dataset or dataset}" + (f" version {base}" if base else "")
+            )
+    base_meta, base_profile = found
+    report = compare_profiles(base_meta, base_profile, target_meta, target_profile)
+    report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return report
 
 @app.get("/download/{job_id}")
 async def download_improved(job_id: str):
@@ -987,176 +6139,321 @@ async def download_improved(job_id: str):
         raise HTTPException(status_code=404, detail="Not found")
     return FileResponse(file_path, media_type="text/csv", filename=f"improved_{job_id}.csv")
 
+@app.get("/download/{job_id}/removed")
+async def download_removed_rows(job_id: str):
+    """Removal audit for a job's cleaning run: one row per removed row (source_row, stage, reason)."""
+    file_path = os.path.join(JOBS_DIR, f"{job_id}_removed.csv")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(file_path, media_type="text/csv", filename=f"removed_{job_id}.csv")
+
+@app.get("/profile/{profile_id}")
+async def download_profile(profile_id: str, format: str = "speedscope"):
+    """Fetch profile artifacts written by ?profile=full (cProfile stats or speedscope JSON)."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    if format == "cprofile":
+        file_path = os.path.join(JOBS_DIR, f"profile_{profile_id}.prof")
+        media_type, filename = "application/octet-stream", f"profile_{profile_id}.prof"
+    elif format == "speedscope":
+        file_path = os.path.join(JOBS_DIR, f"profile_{profile_id}.speedscope.json")
+        media_type, filename = "application/json", f"profile_{profile_id}.speedscope.json"
+    else:
+        raise HTTPException(status_code=400, detail="format must be 'cprofile' or 'speedscope'")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(file_path, media_type=media_type, filename=filename)
+
 @app.post("/analyze-upload")
-async def analyze_upload(request: Request, file: UploadFile = File(...)):
+async def analyze_upload(request: Request, file: UploadFile = File(...),
+                         outcome_column: Optional[str] = None, prediction_column: Optional[str] = None,
+                         subgroup_depth: Optional[int] = None,
+                         collapse_near_duplicates: Optional[bool] = None,
+                         dataset: Optional[str] = None, version: Optional[str] = None):
     """
     Enhanced file upload and analysis endpoint with robust error handling.
     Supports CSV, JSON, Excel (.xlsx/.xls), and TXT files.
     FIXED: Added timeouts and progress logging to prevent hangs.
+    Optional ?outcome_column= / ?prediction_column= select the columns for group fairness metrics;
+    ?subgroup_depth= sets how many attributes the intersectional scan combines;
+    ?collapse_near_duplicates=true keeps one row per near-duplicate cluster in the cleaned CSV.
+    Requests are priced from the sniffed schema and admitted through ADMISSION
+    (429 + Retry-After when the queue is too long); send X-Priority: batch to
+    yield to interactive work. Uploads projected not to fit in memory are
+    scanned out-of-core or sampled, or refused with 507 (see MEMORY).
+    gzip/zstd/zip-compressed uploads are decompressed as a stream first.
+    The upload's profile is stored in the catalog as ?dataset= (default: the
+    file name) at ?version= (default: the next number) for /compare.
     """
-    import time
-    start_time = time.time()
-    
+    analysis_kwargs = {
+        "outcome_column": outcome_column, "prediction_column": prediction_column,
+        "subgroup_depth": subgroup_depth, "collapse_near_duplicates": collapse_near_duplicates,
+        "dataset": dataset, "version": version,
+    }
+    return await analyze_upload_file(
+        request, file.file, file.filename or "uploaded.csv", file.content_type, analysis_kwargs
+    )
+
+@app.options("/uploads")
+async def tus_options():
+    return Response(status_code=204, headers={
+        "Tus-Resumable": TUS_VERSION, "Tus-Version": TUS_VERSION, "Tus-Extension": TUS_EXTENSIONS,
+        "Tus-Max-Size": str(UPLOADS.max_bytes),
+    })
+
+@app.post("/uploads")
+async def tus_create(request: Request):
+    """tus creation: declare Upload-Length (and Upload-Metadata with a filename); returns Location."""
     try:
-        print(f"\n{'='*60}")
-        print(f"[ANALYSIS] NEW ANALYSIS REQUEST")
-        print(f"{'='*60}")
-        
-        # Validate file size (max 50MB)
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
-        
-        print(f"[FILE] File size: {file_size_mb:.2f}MB")
-        
-        if file_size_mb > 50:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File too large ({file_size_mb:.1f}MB). Maximum size is 50MB."
-            )
-        
-        if file_size_mb == 0:
-            raise HTTPException(status_code=400, detail="File is empty")
-        
-        # Determine file type
-        filename = file.filename or "uploaded.csv"
-        print(f"[FILE] Filename: {filename}")
-        
-        # Better file type detection
-        if filename.endswith(".csv"):
-            ftype = "text/csv"
-        elif filename.endswith(".json"):
-            ftype = "application/json"
-        elif filename.endswith(".xlsx"):
-            ftype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        elif filename.endswith(".xls"):
-            ftype = "application/vnd.ms-excel"
-        elif filename.endswith(".txt"):
-            ftype = "text/plain"
-        else:
-            # Fallback to content type or CSV
-            ftype = file.content_type or "text/csv"
-            print(f"Warning: Unknown file extension for {filename}, using type: {ftype}")
-        
-        # Load and validate dataset
-        print(f"Processing file: {filename} ({file_size_mb:.2f}MB, type: {ftype})")
-        df = load_dataset(content, ftype)
-        
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Dataset is empty or could not be parsed")
-        
-        if len(df) < 5:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Dataset too small ({len(df)} rows). Need at least 5 rows for meaningful analysis."
-            )
-        
-        if len(df.columns) < 2:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Dataset has only {len(df.columns)} column(s). Need at least 2 columns for bias analysis."
-            )
-        
-        print(f"Loaded dataset: {len(df)} rows × {len(df.columns)} columns")
-        
-        # Calculate pre-cleaning metrics
-        print("[STEP 1/6] Calculating missing values...")
-        missing_by_column = {str(k): int(v) for k, v in df.isna().sum().to_dict().items()}
-        
-        print("[STEP 2/6] Detecting outliers...")
-        outliers_by_column = {}
-        num_cols = df.select_dtypes(include=[np.number]).columns
-        
-        for col in num_cols:
-            series = df[col].dropna().astype(float)
-            if len(series) == 0:
-                continue
-            q1, q3 = series.quantile(0.25), series.quantile(0.75)
-            iqr = q3 - q1
-            if pd.isna(iqr) or iqr == 0:
-                outliers_by_column[str(col)] = 0
-            else:
-                lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-                outliers_by_column[str(col)] = int(((series < lower) | (series > upper)).sum())
-        
-        # Clean dataset
-        print("[STEP 3/6] Cleaning dataset...")
-        cleaned = clean_dataset(df, lambda ev: None)
-        
-        # Run bias detection with progress tracking
-        print("[STEP 4/6] Running demographic bias detection...")
-        demographic_bias = detect_demographic_bias(cleaned)
-        print(f"   [SUCCESS] Demographic bias score: {demographic_bias.get('score', 0):.1f}")
-        
-        print("[STEP 5/6] Running text bias detection (this may take a moment)...")
-        text_bias = detect_text_bias(cleaned)
-        print(f"   [SUCCESS] Text bias score: {text_bias.get('score', 0):.1f}")
-        
-        print("[STEP 6/6] Running statistical bias detection...")
-        statistical_bias = detect_statistical_bias(cleaned)
-        print(f"   [SUCCESS] Statistical bias score: {statistical_bias.get('score', 0):.1f}")
-        
-        # Calculate overall bias score
-        bias_score = calculate_overall_bias_score(demographic_bias, text_bias, statistical_bias)
-        print(f"\n[RESULT] Overall bias score: {bias_score:.2f}/100")
-        
-        # Generate recommendations
-        print("[INFO] Generating recommendations...")
-        recommendations = generate_recommendations(bias_score, demographic_bias, text_bias, statistical_bias)
-        
-        # Save cleaned dataset
-        job_id = str(uuid.uuid4())
-        output_path = os.path.join(JOBS_DIR, f"{job_id}.csv")
-        cleaned.to_csv(output_path, index=False)
-        print(f"[SAVE] Saved cleaned dataset: {job_id}.csv")
-        
-        # Build chart data for visualizations
-        print("\n[STEP 7/7] Building chart data for visualizations...")
-        chart_data = build_chart_data(cleaned)
-        print(f"   [SUCCESS] Charts built successfully")
-        
-        elapsed_time = time.time() - start_time
-        print(f"\n[COMPLETE] Analysis completed in {elapsed_time:.1f} seconds")
+        length = int(request.headers["upload-length"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Length header is required")
+    metadata = parse_tus_metadata(request.headers.get("upload-metadata"))
+    info = UPLOADS.create(length, metadata)
+    return Response(status_code=201, headers={**UPLOADS.headers(info), "Location": f"/uploads/{info['id']}"})
 
-        # Build fairness metrics response
-        fairness_metrics = {
-            "dataset_info": {
-                "rows": len(cleaned),
-                "columns": len(cleaned.columns),
-                "column_names": cleaned.columns.tolist(),
-                "filename": filename
-            },
-            "missing_values": missing_by_column,
-            "outliers": outliers_by_column,
-            "demographic_bias": demographic_bias,
-            "text_bias": text_bias,
-            "statistical_bias": statistical_bias,
-            "chart_data": chart_data,
-            "analysis_timestamp": pd.Timestamp.now().isoformat()
-        }
+@app.head("/uploads/{upload_id}")
+async def tus_offset(upload_id: str):
+    return Response(status_code=200, headers=UPLOADS.headers(UPLOADS.info(upload_id)))
 
-        ai_summary = (
-            f"Analyzed {len(df)} records across {len(df.columns)} columns. "
-            f"Bias score: {bias_score}/100. "
-            f"Missing values: {sum(missing_by_column.values())}. "
-            f"Outliers detected: {sum(outliers_by_column.values())}. "
-            f"Demographics: {demographic_bias.get('demographic_columns_found', [])}. "
-            f"Text columns: {text_bias.get('text_columns_found', [])}. "
-            f"Recommendations: " + "; ".join(recommendations[:3]) +
-            ("..." if len(recommendations) > 3 else "")
+@app.patch("/uploads/{upload_id}")
+async def tus_append(upload_id: str, request: Request):
+    """Append the body at Upload-Offset (Content-Type: application/offset+octet-stream)."""
+    if request.headers.get("content-type") != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    info = await UPLOADS.append(upload_id, offset, request.stream())
+    return Response(status_code=204, headers=UPLOADS.headers(info))
+
+@app.delete("/uploads/{upload_id}")
+async def tus_terminate(upload_id: str):
+    UPLOADS.info(upload_id)
+    UPLOADS.delete(upload_id)
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+
+@app.post("/uploads/{upload_id}/analyze")
+async def analyze_resumable_upload(upload_id: str, request: Request,
+                                   outcome_column: Optional[str] = None, prediction_column: Optional[str] = None,
+                                   subgroup_depth: Optional[int] = None,
+                                   collapse_near_duplicates: Optional[bool] = None,
+                                   dataset: Optional[str] = None, version: Optional[str] = None):
+    """Run /analyze-upload on a completed resumable upload; the upload stays until DELETE or expiry."""
+    info = UPLOADS.info(upload_id)
+    if info["offset"] < info["length"]:
+        raise HTTPException(
+            status_code=409, detail=f"Upload incomplete ({info['offset']} of {info['length']} bytes)",
+            headers=UPLOADS.headers(info),
+        )
+    filename = info["metadata"].get("filename") or "uploaded.csv"
+    analysis_kwargs = {
+        "outcome_column": outcome_column, "prediction_column": prediction_column,
+        "subgroup_depth": subgroup_depth, "collapse_near_duplicates": collapse_near_duplicates,
+        "dataset": dataset, "version": version,
+    }
+    data_path = UPLOADS.data_path(upload_id)
+    with open(data_path, "rb") as spool:
+        return await analyze_upload_file(
+            request, spool, filename, info["metadata"].get("filetype"), analysis_kwargs, spool_path=data_path
         )
 
-        return {
-            "bias_score": bias_score,
-            "fairness_metrics": fairness_metrics,
-            "recommendations": recommendations,
-            "analysis_type": "comprehensive",
-            "ai_summary": ai_summary,
-            "download_url": f"/download/{job_id}"
-        }
+@app.post("/reclean/{job_id}")
+async def reclean_job(job_id: str, request: Request, params: CleaningParams):
+    """
+    Re-run an earlier upload's cleaning with different parameters, without
+    re-uploading. Unchanged parameters are inherited from that job; stages
+    upstream of the first changed parameter come from the stage cache.
+    Returns the /analyze-upload payload for a new job_id.
+    """
+    record, df = recall_clean_job(job_id)
+    overrides = {**record["params"], **{k: v for k, v in params if v is not None}}
+    estimate = estimate_frame_cost(len(df), df.head(500))
+    budget = AnalysisBudget.from_request(request)
+    try:
+        async with ADMISSION.admit(estimate["cost_seconds"], request.headers.get("x-priority"), budget) as admission:
+            JOBS_IN_FLIGHT.inc()
+            profiler = RequestProfiler.from_request(request, "reclean")
+            try:
+                def run_reclean():
+                    with MEMORY.reserve(estimate_dataframe_memory(df)) as reservation:
+                        result = analyze_dataframe(
+                            df, record["filename"], outcome_column=record["outcome_column"],
+                            prediction_column=record["prediction_column"], subgroup_depth=record["subgroup_depth"],
+                            cleaning_params=overrides, pre_clean=record["pre_clean"]
+                        )
+                    result["memory"] = reservation.report()
+                    return result
+
+                result = await ADMISSION.run(run_reclean)
+                result["parent_job_id"] = job_id
+                result["admission"] = {**admission, "estimate": estimate}
+                if budget is not None:
+                    result["budget"] = budget.report()
+                if profiler is not None:
+                    result["profile"] = profiler.finish(result["job_id"])
+                return result
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+            finally:
+                if profiler is not None:
+                    profiler.finish()
+                JOBS_IN_FLIGHT.dec()
+    finally:
+        if budget is not None:
+            budget.close()
+
+@app.post("/preview")
+async def preview_upload(file: UploadFile = File(...), outcome_column: Optional[str] = None,
+                         prediction_column: Optional[str] = None, subgroup_depth: Optional[int] = None):
+    """
+    Progressive analysis of one upload as an NDJSON stream: an approximate
+    result from a row sample within about a second, sketch-refined results
+    while the file is scanned, and finally the same payload /analyze-upload returns.
+    """
+    content = await file.read()
+    if len(content) == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if len(content) > MAX_IN_MEMORY_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_IN_MEMORY_MB}MB.")
+    analysis_kwargs = {
+        "outcome_column": outcome_column, "prediction_column": prediction_column, "subgroup_depth": subgroup_depth
+    }
+    return StreamingResponse(
+        stream_preview(content, file.filename or "uploaded.csv", file.content_type, analysis_kwargs),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/partial")
+async def partial_state(request: Request, file: UploadFile = File(...), schema: Optional[str] = Form(None),
+                        sample_rows: Optional[int] = Form(None)):
+    """
+    Mergeable sketch state for one row shard, for a coordinator's
+    /analyze-sharded: missing counts, moments, t-digests, HyperLogLogs,
+    top-k summaries and a keyed row sample. The optional `schema` form field
+    ({"columns", "numeric", "categorical"}) pins column kinds across shards;
+    `sample_rows` (at most PARTIAL_SAMPLE_ROWS) sizes the row sample.
+    """
+    content = await file.read()
+    if len(content) == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    try:
+        parsed_schema = json.loads(schema) if schema else None
+        if parsed_schema is not None and not all(k in parsed_schema for k in ("columns", "numeric", "categorical")):
+            raise ValueError("schema needs columns, numeric and categorical")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schema: {str(e)}")
+    if sample_rows is not None and sample_rows < 1:
+        raise HTTPException(status_code=400, detail="sample_rows must be positive")
+    ftype = detect_file_type(file.filename or "shard.csv", file.content_type)
+    BYTES_PROCESSED.inc(len(content))
+    estimate = estimate_upload_cost(content[:ADMISSION_SNIFF_BYTES], len(content), ftype, out_of_core=True)
+    async with ADMISSION.admit(estimate["cost_seconds"], request.headers.get("x-priority")):
+        JOBS_IN_FLIGHT.inc()
+        try:
+            return await ADMISSION.run(lambda: sketch_partial(
+                content, ftype, parsed_schema, min(sample_rows or PARTIAL_SAMPLE_ROWS, PARTIAL_SAMPLE_ROWS)
+            ))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Partial analysis failed: {str(e)}")
+        finally:
+            JOBS_IN_FLIGHT.dec()
+
+@app.post("/analyze-sharded")
+async def analyze_sharded_upload(request: Request, file: UploadFile = File(...), shards: Optional[int] = None,
+                                 outcome_column: Optional[str] = None, prediction_column: Optional[str] = None,
+                                 subgroup_depth: Optional[int] = None,
+                                 dataset: Optional[str] = None, version: Optional[str] = None):
+    """
+    Coordinator mode: split a CSV upload into row shards (?shards=, default
+    one per worker), sketch them on the SHARD_WORKERS instances via /partial
+    and merge the results into the /analyze-upload payload shape.
+    """
+    if not SHARD_WORKERS:
+        raise HTTPException(
+            status_code=400,
+            detail="Sharded analysis needs SHARD_WORKERS (comma-separated base URLs of instances serving /partial)"
+        )
+    filename = file.filename or "uploaded.csv"
+    if "csv" not in detect_file_type(filename, file.content_type):
+        raise HTTPException(status_code=400, detail="Sharded analysis supports CSV uploads only")
+    shard_count = shards or len(SHARD_WORKERS)
+    if not 1 <= shard_count <= SHARD_MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"shards must be between 1 and {SHARD_MAX_COUNT}")
+    file.file.seek(0, os.SEEK_END)
+    size_bytes = file.file.tell()
+    if size_bytes == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if size_bytes > MAX_OUT_OF_CORE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large ({size_bytes / (1024 * 1024):.1f}MB). Maximum size is {MAX_OUT_OF_CORE_MB}MB."
+        )
+    BYTES_PROCESSED.inc(size_bytes)
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # Waiting on the workers takes no analysis slot; merging and analysing the result does
+        head_rows, partials = await asyncio.get_running_loop().run_in_executor(
+            None, gather_partials, file.file, size_bytes, filename, SHARD_WORKERS, shard_count
+        )
+        estimate = estimate_frame_cost(sum(len(p["sample"]["keys"]) for p in partials), head_rows)
+        async with ADMISSION.admit(estimate["cost_seconds"], request.headers.get("x-priority")) as admission:
+            result = await ADMISSION.run(lambda: analyze_sharded(
+                partials, filename, outcome_column=outcome_column, prediction_column=prediction_column,
+                subgroup_depth=subgroup_depth, catalog_key=(dataset or filename, version)
+            ))
+        result["admission"] = {**admission, "estimate": estimate}
+        return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+@app.post("/analyze-batch")
+async def analyze_batch(request: Request):
+    """
+    Analyze many datasets in one request. Send either a multipart upload of a
+    zip/tar archive (field "file") or a JSON body {"urls": [...]}. Streams one
+    NDJSON line per dataset (same shape as /analyze-upload plus "dataset" and
+    "status"), then a final {"summary": ...} line.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "file"):
+            raise HTTPException(status_code=400, detail="Expected an archive in the 'file' field")
+        # Spool to disk: the archive is read lazily after this handler returns
+        archive_name = upload.filename or "batch.zip"
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(archive_name)[1]) as tmp:
+            shutil.copyfileobj(upload.file, tmp)
+            archive_path = tmp.name
+        try:
+            sources, close_archive = open_archive_sources(archive_path, archive_name)
+        except Exception:
+            os.remove(archive_path)
+            raise
+
+        def cleanup():
+            close_archive()
+            os.remove(archive_path)
+    else:
+        try:
+            batch = BatchRequest(**(await request.json()))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Expected a zip/tar upload or a JSON body with 'urls': {str(e)[:200]}")
+        if not batch.urls:
+            raise HTTPException(status_code=400, detail="No URLs provided")
+        sources = iter_url_sources(batch.urls)
+        cleanup = None
+    return StreamingResponse(stream_batch_results(sources, cleanup), media_type="application/x-ndjson")
 
 import uvicorn
 
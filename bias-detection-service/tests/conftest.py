@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# main.py reads its configuration at import time: skip the transformer downloads
+# and keep jobs/ (JOBS_DIR is relative to the working directory) out of the tree
+os.environ.setdefault("DISABLE_TEXT_MODELS", "1")
+os.chdir(tempfile.mkdtemp(prefix="biasbounty-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def controller(slots=1, max_wait_s=60.0):
+    return main.AdmissionController(slots, dict(main.ADMISSION_LANE_WEIGHTS), max_wait_s)
+
+
+async def hold(admission, cost, release, lane=None, started=None, tag=None):
+    async with admission.admit(cost, lane):
+        if started is not None:
+            started.append(tag)
+        await release.wait()
+
+
+def test_queue_wait_counts_against_the_budget():
+    async def scenario():
+        admission = controller()
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(admission, 10.0, release))
+        await asyncio.sleep(0)
+        budget = main.AnalysisBudget(2000)
+        try:
+            with pytest.raises(HTTPException) as refused:
+                async with admission.admit(0.1, budget=budget):
+                    pass
+            assert refused.value.status_code == 429
+            assert "remaining budget" in refused.value.detail
+            assert int(refused.value.headers["Retry-After"]) >= 1
+
+            # Without a budget the same request fits under max_wait_s and queues
+            queued = asyncio.ensure_future(hold(admission, 0.1, release))
+            await asyncio.sleep(0)
+            assert admission.status()["queued"] == 1
+        finally:
+            release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+
+
+def test_expected_wait_over_max_wait_is_refused():
+    async def scenario():
+        admission = controller(max_wait_s=1.0)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(admission, 30.0, release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as refused:
+            async with admission.admit(0.1):
+                pass
+        assert refused.value.status_code == 429
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_weighted_fair_queuing_favours_the_interactive_lane():
+    async def scenario():
+        admission = controller(slots=1)
+        gate = asyncio.Event()
+        started = []
+        blocker = asyncio.ensure_future(hold(admission, 1.0, gate))
+        await asyncio.sleep(0)
+        # Equal costs queued alternately: interactive (weight 4) finish tags grow 4x slower
+        release = asyncio.Event()
+        release.set()
+        jobs = []
+        for i in range(3):
+            jobs.append(asyncio.ensure_future(hold(admission, 1.0, release, "batch", started, f"b{i}")))
+            jobs.append(asyncio.ensure_future(hold(admission, 1.0, release, None, started, f"i{i}")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *jobs)
+        # Finish tags: i0 .5, i1 .75, b0 1.0, i2 1.0 (tie goes to the earlier ticket), b1 2.0, b2 3.0
+        assert started == ["i0", "i1", "b0", "i2", "b1", "b2"]
+
+    asyncio.run(scenario())
+
+
+def test_batch_lane_leaves_a_slot_for_interactive_work():
+    async def scenario():
+        admission = controller(slots=2)
+        release = asyncio.Event()
+        batch = [asyncio.ensure_future(hold(admission, 5.0, release, "batch")) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert admission.status()["running"] == 1 and admission.status()["queued"] == 1
+        started = []
+        interactive = asyncio.ensure_future(hold(admission, 0.1, release, None, started, "i"))
+        await asyncio.sleep(0)
+        assert started == ["i"]
+        release.set()
+        await asyncio.gather(interactive, *batch)
+
+    asyncio.run(scenario())
+
+
+def test_upload_cost_scales_with_the_file_size():
+    head = b"gender,age,income\n" + b"".join(f"F,{i},{i * 10}\n".encode() for i in range(200))
+    small = main.estimate_upload_cost(head, len(head), "text/csv")
+    large = main.estimate_upload_cost(head, len(head) * 100, "text/csv")
+    assert small["rows"] == 200 and small["demographic_columns"] == 2
+    assert large["rows"] == pytest.approx(20000, rel=0.01)
+    assert large["cost_seconds"] > small["cost_seconds"]
+
+
+def test_profiler_follows_work_onto_the_analysis_thread():
+    def busy_work():
+        total = 0
+        for i in range(300000):
+            total += i * i
+        return total
+
+    async def scenario():
+        admission = controller()
+        profiler = main.RequestProfiler("test", full=True)
+        profiler.start()
+        try:
+            async with admission.admit(0.1):
+                await admission.run(busy_work)
+        finally:
+            result = profiler.finish()
+        return profiler, result
+
+    profiler, result = asyncio.run(scenario())
+    assert result["total_cpu_ms"] > 5
+    profiler._cprofile.create_stats()
+    assert any(func[2] == "busy_work" for func in profiler._cprofile.stats)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+pytestmark = pytest.mark.skipif(main.duckdb is None, reason="duckdb is not installed")
+
+
+@pytest.fixture
+def backends(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({
+        "gender": rng.choice(["female", "male", "nonbinary"], size=n, p=[0.3, 0.65, 0.05]),
+        "age": rng.integers(18, 90, size=n),
+        "income": np.exp(rng.normal(10, 1, size=n)).round(2),
+        "city": rng.choice(["Paris", "Lyon", None], size=n),
+        "approved": rng.choice(["yes", "no"], size=n),
+    })
+    df.loc[rng.choice(n, 200, replace=False), "income"] = np.nan
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    frame = pd.read_csv(path)
+    duck = main.DuckDBBackend(str(path), "csv")
+    yield main.PandasBackend(frame), duck
+    duck.close()
+
+
+def test_column_types_and_missing_counts_agree(backends):
+    pandas_backend, duck = backends
+    assert duck.row_count() == pandas_backend.row_count() == 5000
+    assert duck.numeric_columns() == pandas_backend.numeric_columns() == ["age", "income"]
+    assert set(duck.categorical_columns()) == set(pandas_backend.categorical_columns())
+    assert duck.missing_counts() == pandas_backend.missing_counts()
+    assert duck.nunique("gender") == pandas_backend.nunique("gender") == 3
+
+
+def test_value_counts_agree(backends):
+    pandas_backend, duck = backends
+    for kwargs in ({}, {"normalize": True}, {"top_n": 2}):
+        expected = pandas_backend.value_counts("gender", **kwargs)
+        actual = duck.value_counts("gender", **kwargs)
+        assert list(actual.index) == list(expected.index)
+        assert np.allclose(actual.to_numpy(), expected.to_numpy())
+    # as_text keeps missing values as their own label, like astype(str)
+    assert duck.value_counts("city", as_text=True).sum() == 5000
+
+
+def test_numeric_summary_outliers_and_histograms_agree(backends):
+    pandas_backend, duck = backends
+    cols = ["age", "income"]
+    expected, actual = pandas_backend.numeric_summary(cols), duck.numeric_summary(cols)
+    for col in cols:
+        for field in ("count", "mean", "std", "skew", "kurtosis", "min", "max"):
+            assert actual[col][field] == pytest.approx(expected[col][field], rel=1e-6), field
+        # approx_quantile is a t-digest estimate
+        spread = expected[col]["max"] - expected[col]["min"]
+        for field in ("q1", "median", "q3"):
+            assert abs(actual[col][field] - expected[col][field]) < 0.02 * spread, field
+
+    outliers = duck.outlier_counts(actual)
+    expected_outliers = pandas_backend.outlier_counts(expected)
+    for col in cols:
+        assert abs(outliers[col] - expected_outliers[col]) <= 0.01 * 5000
+
+    histograms = duck.histograms(actual)
+    expected_histograms = pandas_backend.histograms(expected)
+    for col in cols:
+        assert histograms[col]["bin_edges"] == pytest.approx(expected_histograms[col]["bin_edges"])
+        assert histograms[col]["counts"] == expected_histograms[col]["counts"]
+
+
+def test_detectors_give_the_same_findings(backends):
+    pandas_backend, duck = backends
+    expected = main.detect_demographic_bias(pandas_backend)
+    actual = main.detect_demographic_bias(duck)
+    assert actual["demographic_columns_found"] == expected["demographic_columns_found"]
+    assert actual["score"] == pytest.approx(expected["score"])
+    statistical = main.detect_statistical_bias(duck)
+    assert statistical["skewed_columns"] == main.detect_statistical_bias(pandas_backend)["skewed_columns"]
+
+
+def test_large_files_are_analyzed_out_of_core(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "OUT_OF_CORE_SAMPLE_ROWS", 500)
+    rng = np.random.default_rng(1)
+    path = tmp_path / "large.csv"
+    pd.DataFrame({
+        "gender": rng.choice(["F", "M"], size=3000),
+        "salary": rng.normal(50000, 8000, size=3000).round(),
+        "hired": rng.choice([0, 1], size=3000),
+    }).to_csv(path, index=False)
+
+    result = main.analyze_large_file(str(path), "large.csv", "csv")
+    assert result["analysis_type"] == "out_of_core"
+    assert result["job_id"] is None
+    info = result["fairness_metrics"]["dataset_info"]
+    assert info["rows"] == 3000 and info["compute_backend"] == "duckdb"
+    assert info["sample_rows"] == 500
+    assert result["fairness_metrics"]["group_fairness"]["outcome_column"] == "hired"
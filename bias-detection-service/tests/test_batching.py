@@ -0,0 +1,90 @@
+import io
+import json
+import threading
+import zipfile
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+class FakeAnalyzer:
+    """Stands in for a text-classification pipeline; labels a text by its length."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs, **kwargs):
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        with self._lock:
+            self.calls.append(list(batch))
+        if self.fail_on in batch:
+            raise ValueError("bad input")
+        scored = [{"label": f"len{len(text)}", "score": 1.0} for text in batch]
+        # Like transformers: a single string gives [{...}], a list gives [[{...}], ...]
+        return scored if isinstance(inputs, str) else [[score] for score in scored]
+
+
+def test_batcher_pools_concurrent_submissions():
+    analyzer = FakeAnalyzer()
+    batcher = main.InferenceBatcher("fake", analyzer, max_batch=64, max_wait_s=0.05)
+    start = threading.Barrier(4)
+    results = {}
+
+    def worker(i):
+        texts = ["x" * (i + 1)] * 3 + ["shared"]
+        start.wait()
+        results[i] = batcher.submit(texts)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    for i in range(4):
+        assert [r["label"] for r in results[i]] == [f"len{i + 1}"] * 3 + ["len6"]
+    assert len(analyzer.calls) < 4
+    # Duplicate texts within a batch reach the model once
+    for batch in analyzer.calls:
+        assert len(batch) == len(set(batch))
+
+
+def test_failed_batch_retries_per_text():
+    analyzer = FakeAnalyzer(fail_on="boom")
+    results = main.classify_texts("fake", analyzer, ["ok", "boom", "fine"])
+    assert results[0]["label"] == "len2"
+    assert results[1] is None
+    assert results[2]["label"] == "len4"
+
+
+def test_classify_texts_chunks_without_a_batcher(monkeypatch):
+    monkeypatch.setattr(main, "INFERENCE_BATCH_SIZE", 4)
+    analyzer = FakeAnalyzer()
+    results = main.classify_texts("fake", analyzer, [str(i) for i in range(10)])
+    assert [len(batch) for batch in analyzer.calls] == [4, 4, 2]
+    assert len(results) == 10
+
+
+def test_analyze_batch_streams_one_line_per_archive_member():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(3):
+            rows = "\n".join(f"{n},{'F' if n % 2 else 'M'},{n * 10}" for n in range(40))
+            zf.writestr(f"data/set{i}.csv", "id,gender,income\n" + rows + "\n")
+        zf.writestr("data/empty.csv", "")
+        zf.writestr("__MACOSX/data/._set0.csv", "junk")
+        zf.writestr("notes.md", "not a dataset")
+
+    with TestClient(main.app) as client:
+        response = client.post("/analyze-batch", files={"file": ("batch.zip", archive.getvalue(), "application/zip")})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    items, summary = lines[:-1], lines[-1]["summary"]
+    assert sorted(item["dataset"] for item in items) == ["data/empty.csv", "data/set0.csv", "data/set1.csv", "data/set2.csv"]
+    assert summary["datasets"] == 4 and summary["succeeded"] == 3 and summary["failed"] == 1
+    [failed] = [item for item in items if item["status"] == "error"]
+    assert failed["dataset"] == "data/empty.csv" and failed["status_code"] == 400
@@ -0,0 +1,81 @@
+import pytest
+
+import main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(main.time, "perf_counter", fake)
+    return fake
+
+
+def test_remaining_time_is_split_by_stage_weight(clock):
+    budget = main.AnalysisBudget(1000)
+    total = sum(main.BUDGET_STAGE_WEIGHTS.values())
+    assert budget.allotment("detect.text") == pytest.approx(main.BUDGET_STAGE_WEIGHTS["detect.text"] / total)
+    assert budget.allotment("chart.text_stats") == pytest.approx(main.BUDGET_STAGE_WEIGHTS["chart.text_stats"] / total)
+    # Unweighted stages may use whatever is left
+    clock.now += 0.25
+    assert budget.allotment("detect.demographic") == pytest.approx(0.75)
+
+
+def test_unused_allotment_rolls_over_to_later_stages(clock):
+    budget = main.AnalysisBudget(1000)
+    before = budget.allotment("detect.text")
+    for stage in ("load", "clean.toxicity"):
+        budget.begin(stage)
+        clock.now += 0.005
+        budget.end(stage)
+
+    pending = sum(w for s, w in main.BUDGET_STAGE_WEIGHTS.items() if s not in ("load", "clean.toxicity"))
+    after = budget.allotment("detect.text")
+    assert after == pytest.approx(0.99 * main.BUDGET_STAGE_WEIGHTS["detect.text"] / pending)
+    assert after > before
+    assert budget.report()["stage_ms"] == {"load": 5.0, "clean.toxicity": 5.0}
+
+
+def test_stage_expires_after_overrunning_its_allotment(clock):
+    budget = main.AnalysisBudget(1000)
+    budget.begin("detect.text")
+    # The allotment shrinks as the clock runs, so the stage overruns once
+    # elapsed > 1.5 * share * (1 - elapsed) + 0.05
+    share = main.BUDGET_STAGE_WEIGHTS["detect.text"] / sum(main.BUDGET_STAGE_WEIGHTS.values())
+    overrun = (1.5 * share + 0.05) / (1 + 1.5 * share)
+    clock.now += overrun - 0.005
+    assert not budget.expired("detect.text")
+    clock.now += 0.01
+    assert budget.expired("detect.text")
+    clock.now += 1.0
+    assert budget.expired("load")
+
+
+def test_sample_size_is_capped_by_budget_and_reported_partial(clock):
+    budget = main.AnalysisBudget(1000)
+    token = main._active_budget.set(budget)
+    try:
+        allotment = budget.allotment("detect.text")
+        n = main.budget_sample_size("detect.text", available=5000, default_cap=1000, unit_cost_s=0.001, parts=2)
+        assert n == int(allotment / 0.001 / 2)
+        assert main.budget_sample_size("chart.correlations", 10, 100, 1e-9) == 10
+        main.budget_cut_short("detect.text", 10)
+    finally:
+        main._active_budget.reset(token)
+
+    report = budget.report()
+    assert report["partial"] is True
+    [entry] = report["partial_results"]
+    assert entry["stage"] == "detect.text"
+    assert entry["result"] == "text_bias"
+    assert entry["sampled"] == n - 10 and entry["wanted"] == 1000
+    assert entry["reason"] == "deadline"
+    # Without an active budget the hard-coded cap applies
+    assert main.budget_sample_size("detect.text", 5000, 1000, 0.001) == 1000
@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+OUTLIER_ROWS = [5, 77, 140]
+DUPLICATE_ROWS = [190, 191, 192]
+
+
+def audit_frame() -> pd.DataFrame:
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame({
+        "name": [f"person {i}" for i in range(200)],
+        "income": rng.normal(50000, 5000, 200).round(),
+    })
+    df.loc[OUTLIER_ROWS, "income"] = 10_000_000.0
+    # Exact copies of earlier rows
+    df.loc[DUPLICATE_ROWS] = df.loc[[10, 11, 12]].to_numpy()
+    return df
+
+
+@pytest.fixture(autouse=True)
+def stage_cache(monkeypatch):
+    monkeypatch.setattr(main, "CLEAN_STAGE_CACHE", main.StageCache(64))
+
+
+def run_clean(df):
+    events = []
+    cleaned = main.clean_dataset(df, event_callback=events.append)
+    return cleaned, next(e for e in events if e["stage"] == "pipeline")
+
+
+def test_removals_are_audited_by_source_row_and_reason():
+    df = audit_frame()
+    cleaned, pipeline = run_clean(df)
+    audit = pipeline["audit"]
+    by_reason = audit.groupby("reason")["source_row"].apply(sorted).to_dict()
+    assert by_reason == {"outlier:income": OUTLIER_ROWS, "duplicate": DUPLICATE_ROWS}
+    assert set(audit["stage"]) == {"outliers", "dedupe"}
+    stages = {s["stage"]: s for s in pipeline["stages"]}
+    assert stages["outliers"]["removed_by_reason"] == {"outlier:income": 3}
+
+    # The cleaned frame is exactly the kept rows, shuffled
+    expected = df.drop(index=OUTLIER_ROWS + DUPLICATE_ROWS)
+    assert len(cleaned) == len(expected)
+    pd.testing.assert_frame_equal(
+        cleaned.sort_values("name").reset_index(drop=True),
+        expected.sort_values("name").reset_index(drop=True),
+    )
+
+
+def test_cached_masks_reproduce_output_and_audit():
+    df = audit_frame()
+    first, first_pipeline = run_clean(df)
+    second, second_pipeline = run_clean(df)
+    assert all(s["cached"] for s in second_pipeline["stages"])
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first_pipeline["audit"], second_pipeline["audit"])
+
+
+def test_removed_rows_download():
+    buffer = io.StringIO()
+    audit_frame().to_csv(buffer, index=False)
+    client = TestClient(main.app)
+    response = client.post("/analyze-upload", files={"file": ("people.csv", buffer.getvalue().encode(), "text/csv")})
+    assert response.status_code == 200
+    cleaning = response.json()["fairness_metrics"]["cleaning"]
+    assert cleaning["rows_removed"] == 6
+
+    removed = client.get(cleaning["removed_rows_url"])
+    assert removed.status_code == 200
+    audit = pd.read_csv(io.StringIO(removed.text))
+    assert sorted(audit["source_row"]) == sorted(OUTLIER_ROWS + DUPLICATE_ROWS)
+    assert client.get("/download/not-a-job/removed").status_code in (400, 404)
@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+ROWS = 120
+TOXIC_ROWS = {7, 33, 58, 91}
+
+
+def toxic_frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    comments = [
+        f"comment number {i} is {'badword' if i in TOXIC_ROWS else 'perfectly fine'}" for i in range(ROWS)
+    ]
+    return pd.DataFrame({"comment": comments, "score": rng.normal(50, 5, ROWS)})
+
+
+def fake_toxicity_pipeline(inputs, **kwargs):
+    batch = inputs if isinstance(inputs, list) else [inputs]
+    return [[{"label": "toxic" if "badword" in text else "non-toxic", "score": 0.99}] for text in batch]
+
+
+@pytest.fixture
+def stage_cache(monkeypatch):
+    cache = main.StageCache(64)
+    monkeypatch.setattr(main, "CLEAN_STAGE_CACHE", cache)
+    monkeypatch.setattr(main, "toxicity_analyzer", fake_toxicity_pipeline)
+    return cache
+
+
+def run_clean(df, budget_ms=None):
+    """clean_dataset(df), under an already-expired budget of budget_ms if given; returns (cleaned, stages)."""
+    events = []
+    budget = None
+    if budget_ms is not None:
+        budget = main.AnalysisBudget(budget_ms)
+        budget._token = main._active_budget.set(budget)
+        time.sleep(budget_ms / 1000.0 + 0.01)
+    try:
+        cleaned = main.clean_dataset(df, event_callback=events.append)
+    finally:
+        if budget is not None:
+            budget.close()
+    pipeline = next(e for e in events if e["stage"] == "pipeline")
+    return cleaned, {s["stage"]: s for s in pipeline["stages"]}
+
+
+def test_full_run_removes_toxic_rows(stage_cache):
+    cleaned, stages = run_clean(toxic_frame())
+    assert stages["toxicity"]["rows_removed"] == len(TOXIC_ROWS)
+    assert not cleaned["comment"].str.contains("badword").any()
+
+
+def test_repeat_run_reuses_every_stage(stage_cache):
+    df = toxic_frame()
+    first, _ = run_clean(df)
+    second, stages = run_clean(df)
+    assert all(s["cached"] for s in stages.values())
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_partial_run_does_not_poison_later_full_run(stage_cache):
+    df = toxic_frame()
+    partial, stages = run_clean(df, budget_ms=1)
+    assert stages["toxicity"]["partial"]
+    assert partial["comment"].str.contains("badword").sum() == len(TOXIC_ROWS)
+
+    cleaned, stages = run_clean(df)
+    assert not any(s["cached"] for name, s in stages.items() if name not in ("impute", "rebalance"))
+    assert stages["toxicity"]["rows_removed"] == len(TOXIC_ROWS)
+    assert not cleaned["comment"].str.contains("badword").any()
+    assert len(cleaned) == ROWS - len(TOXIC_ROWS)
+
+
+def test_changed_downstream_param_recomputes_only_downstream(stage_cache):
+    df = toxic_frame()
+    run_clean(df)
+    params = main.resolve_cleaning_params({"outlier_iqr_multiplier": 1.0})
+    events = []
+    main.clean_dataset(df, event_callback=events.append, params=params)
+    stages = {s["stage"]: s for s in next(e for e in events if e["stage"] == "pipeline")["stages"]}
+    assert [n for n, s in stages.items() if s["cached"]] == ["impute", "rebalance", "toxicity"]
+
+
+def test_sampled_toxicity_scan_is_reproducible_across_cache_misses(monkeypatch, stage_cache):
+    # More rows than the 150-text sample, with toxic rows spread through them
+    df = pd.DataFrame({"comment": [
+        f"comment number {i} is {'badword' if i % 9 == 0 else 'perfectly fine'}" for i in range(900)
+    ]})
+    removed = []
+    for _ in range(3):
+        monkeypatch.setattr(main, "CLEAN_STAGE_CACHE", main.StageCache(64))
+        cleaned, stages = run_clean(df)
+        assert not stages["toxicity"]["cached"]
+        removed.append(sorted(set(df["comment"]) - set(cleaned["comment"])))
+    assert removed[0] and removed[0] == removed[1] == removed[2]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def pandas_top_edges(df, top_k):
+    corr = df.corr()
+    pairs = []
+    cols = list(corr.columns)
+    for i, a in enumerate(cols):
+        for b in cols[i + 1:]:
+            if np.isfinite(corr.loc[a, b]):
+                pairs.append((abs(corr.loc[a, b]), a, b, corr.loc[a, b]))
+    pairs.sort(reverse=True)
+    return pairs[:top_k]
+
+
+@pytest.mark.parametrize("missing", [False, True])
+def test_blocked_top_k_matches_pandas(monkeypatch, missing):
+    monkeypatch.setattr(main, "CORRELATION_BLOCK_SIZE", 7)
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(400, 5))
+    # 30 columns: noisy mixtures of 5 latent factors, so there are strong and weak pairs
+    data = base @ rng.normal(size=(5, 30)) + rng.normal(scale=2.0, size=(400, 30))
+    df = pd.DataFrame(data, columns=[f"c{i}" for i in range(30)])
+    df["constant"] = 1.0
+    if missing:
+        df = df.mask(rng.random(df.shape) < 0.1)
+
+    edges = main.compute_correlation_edges(df, top_k=15)
+    expected = pandas_top_edges(df.drop(columns="constant"), 15)
+    assert [{e["source"], e["target"]} for e in edges] == [{a, b} for _, a, b, _ in expected]
+    for edge, (_, _, _, r) in zip(edges, expected):
+        assert edge["weight"] == pytest.approx(r, abs=1e-9)
+        assert edge["method"] == "pearson"
+
+
+def reference_cramers_v(a, b):
+    table = pd.crosstab(a, b).to_numpy(dtype=float)
+    n = table.sum()
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    phi2 = ((table - expected) ** 2 / expected).sum() / n
+    r, k = table.shape
+    phi2_corr = max(0.0, phi2 - (k - 1) * (r - 1) / (n - 1))
+    r_corr = r - (r - 1) ** 2 / (n - 1)
+    k_corr = k - (k - 1) ** 2 / (n - 1)
+    return np.sqrt(phi2_corr / min(k_corr - 1, r_corr - 1))
+
+
+def test_cramers_v_and_correlation_ratio():
+    rng = np.random.default_rng(1)
+    n = 2000
+    gender = rng.choice(["F", "M", "X"], size=n)
+    # A proxy that follows gender 80% of the time, and an unrelated column
+    proxy = np.where(rng.random(n) < 0.8, np.char.add("p", gender), rng.choice(["pF", "pM", "pX"], size=n))
+    noise = rng.choice(["a", "b", "c", "d"], size=n)
+    salary = np.where(gender == "F", 50.0, 60.0) + rng.normal(scale=5.0, size=n)
+    df = pd.DataFrame({"gender": gender, "zip_proxy": proxy, "noise": noise, "salary": salary})
+
+    edges = {(e["source"], e["target"], e["method"]): e for e in main.compute_association_edges(df)}
+    proxy_edge = edges[("gender", "zip_proxy", "cramers_v")]
+    assert proxy_edge["weight"] == pytest.approx(reference_cramers_v(df["gender"], df["zip_proxy"]))
+    assert proxy_edge["weight"] > 0.7 and proxy_edge["protected"]
+    assert edges.get(("gender", "noise", "cramers_v"), {"weight": 0.0})["weight"] < 0.1
+
+    eta = edges[("gender", "salary", "correlation_ratio")]["weight"]
+    means = df.groupby("gender")["salary"].transform("mean")
+    expected_eta = np.sqrt(((means - df["salary"].mean()) ** 2).sum() / ((df["salary"] - df["salary"].mean()) ** 2).sum())
+    assert eta == pytest.approx(expected_eta)
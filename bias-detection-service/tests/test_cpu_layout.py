@@ -0,0 +1,59 @@
+import pytest
+
+import main
+
+LAYOUT_ENV = ("CPU_LIMIT", "ADMISSION_SLOTS", "CPU_PINNING", "TORCH_INTRA_OP_THREADS",
+              "TORCH_INTER_OP_THREADS", "BLAS_THREADS")
+
+
+@pytest.fixture
+def machine(monkeypatch):
+    """A 16-CPU host (8 cores x 2 SMT siblings) with no quota and no layout overrides."""
+    for var in LAYOUT_ENV:
+        monkeypatch.delenv(var, raising=False)
+    topology = {"cpus": list(range(16)), "quota": None}
+    monkeypatch.setattr(main, "_allowed_cpus", lambda: topology["cpus"])
+    monkeypatch.setattr(main, "_cgroup_cpu_quota", lambda: topology["quota"])
+    monkeypatch.setattr(main, "_physical_cores", lambda cpus: [[c, c + 8] for c in cpus if c < 8])
+    return topology
+
+
+def test_threads_fill_the_usable_cpus_without_oversubscribing(machine):
+    layout = main.plan_cpu_layout()
+    assert (layout["usable_cpus"], layout["analysis_slots"]) == (16, 4)
+    assert layout["torch_intra_op_threads"] == layout["blas_threads"] == 4
+    assert layout["analysis_slots"] * layout["torch_intra_op_threads"] <= layout["usable_cpus"]
+    assert not layout["pinning"]
+    # Batch work gets every slot but one
+    assert layout["batch_slots"] == 3
+
+
+def test_cgroup_quota_caps_the_usable_cpus(machine):
+    machine["quota"] = 2.5
+    layout = main.plan_cpu_layout()
+    assert layout["usable_cpus"] == 2 and layout["cgroup_quota_cpus"] == 2.5
+    assert (layout["analysis_slots"], layout["torch_intra_op_threads"]) == (2, 1)
+
+    machine["quota"] = 1.0
+    layout = main.plan_cpu_layout()
+    assert (layout["analysis_slots"], layout["batch_slots"]) == (1, 1)
+
+
+def test_env_overrides_win(machine, monkeypatch):
+    monkeypatch.setenv("CPU_LIMIT", "12")
+    monkeypatch.setenv("ADMISSION_SLOTS", "3")
+    monkeypatch.setenv("BLAS_THREADS", "1")
+    layout = main.plan_cpu_layout()
+    assert (layout["usable_cpus"], layout["analysis_slots"]) == (12, 3)
+    assert (layout["torch_intra_op_threads"], layout["blas_threads"]) == (4, 1)
+
+
+def test_pinning_gives_each_slot_whole_physical_cores(machine, monkeypatch):
+    monkeypatch.setenv("CPU_PINNING", "1")
+    layout = main.plan_cpu_layout()
+    assert layout["pinning"]
+    assert layout["core_sets"] == [[0, 1, 8, 9], [2, 3, 10, 11], [4, 5, 12, 13], [6, 7, 14, 15]]
+
+    # Fewer physical cores than slots: no pinning rather than sharing cores
+    monkeypatch.setenv("ADMISSION_SLOTS", "12")
+    assert main.plan_cpu_layout()["core_sets"] == []
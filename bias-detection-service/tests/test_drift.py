@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def profile(df: pd.DataFrame, bias_score: float = 20.0) -> dict:
+    return main.build_dataset_profile(main.PandasBackend(df), {"bias_score": bias_score, "fairness_metrics": {}})
+
+
+def hiring(rows=20000, seed=0, female_share=0.5, age_shift=0.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "gender": rng.choice(["female", "male"], rows, p=[female_share, 1 - female_share]),
+        "age": rng.normal(40 + age_shift, 10, rows),
+        "score": rng.uniform(0, 1, rows),
+    })
+
+
+def test_population_stability_index():
+    shares = np.array([0.25, 0.25, 0.25, 0.25])
+    assert main.population_stability_index(shares, shares) == 0.0
+    shifted = np.array([0.4, 0.3, 0.2, 0.1])
+    expected = float(np.sum((shifted - shares) * np.log(shifted / shares)))
+    assert main.population_stability_index(shares, shifted) == pytest.approx(expected)
+    # Empty bins are floored rather than making PSI infinite
+    assert np.isfinite(main.population_stability_index(shares, np.array([0.5, 0.5, 0.0, 0.0])))
+
+
+def test_ks_from_digests_matches_exact_statistic():
+    rng = np.random.default_rng(4)
+    a, b = rng.normal(0, 1, 20000), rng.normal(0.3, 1, 20000)
+    da, db = main.TDigest(), main.TDigest()
+    da.update(a)
+    db.update(b)
+    grid = np.sort(np.concatenate([a, b]))
+    exact = np.max(np.abs(np.searchsorted(np.sort(a), grid, side="right") / len(a)
+                          - np.searchsorted(np.sort(b), grid, side="right") / len(b)))
+    statistic, pvalue = main.ks_from_digests(da, db)
+    assert statistic == pytest.approx(exact, abs=0.01)
+    assert pvalue < 1e-6
+    same, pvalue = main.ks_from_digests(da, da)
+    assert same == pytest.approx(0.0, abs=1e-9) and pvalue == 1.0
+
+
+def test_compare_profiles_flags_only_drifted_columns():
+    base, target = profile(hiring(seed=0)), profile(hiring(seed=1, female_share=0.2, age_shift=8), bias_score=35.0)
+    report = main.compare_profiles({"version": "1"}, base, {"version": "2"}, target)
+    assert set(report["drifted_columns"]) == {"gender", "age"}
+    assert report["columns"]["score"]["severity"] == "stable"
+    assert report["columns"]["age"]["ks_pvalue"] < 1e-6
+    assert report["scores"]["bias_score"]["delta"] == pytest.approx(15.0)
+    female = next(row for row in report["representation"]["gender"] if row["group"] == "female")
+    assert female["base_share"] == pytest.approx(0.5, abs=0.02)
+    assert female["target_share"] == pytest.approx(0.2, abs=0.02)
+
+
+def test_identical_data_is_stable_across_backends():
+    df = hiring(rows=5000)
+    backends = [main.PandasBackend(df), main.SketchBackend(df.head(500))]
+    backends[1].update(df)
+    result = {"bias_score": 0.0, "fairness_metrics": {}}
+    pandas_profile, sketch_profile = (main.build_dataset_profile(b, result) for b in backends)
+    report = main.compare_profiles({}, pandas_profile, {}, sketch_profile)
+    assert report["drifted_columns"] == []
+    for col in ("age", "score", "gender"):
+        assert report["columns"][col]["psi"] < 0.01
+
+
+def test_catalog_versions_round_trip(tmp_path):
+    catalog = main.ProfileCatalog(str(tmp_path / "catalog.sqlite3"))
+    first = catalog.record("hiring", None, profile(hiring(seed=0)), {"analysis_type": "comprehensive"})
+    second = catalog.record("hiring", "2024-q2", profile(hiring(seed=1)), {"analysis_type": "comprehensive"})
+    assert (first["version"], second["version"]) == ("1", "2024-q2")
+    meta, latest = catalog.load("hiring")
+    assert meta["version"] == "2024-q2" and latest["rows"] == 20000
+    previous, _ = catalog.load("hiring", before_seq=meta["seq"])
+    assert previous["version"] == "1"
+    assert [v["version"] for v in catalog.versions("hiring")] == ["2024-q2", "1"]
+
+
+def test_uploads_are_catalogued_and_compared(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CATALOG", main.ProfileCatalog(str(tmp_path / "catalog.sqlite3")))
+    client = TestClient(main.app)
+    for version, frame in (("v1", hiring(rows=3000, seed=0)), ("v2", hiring(rows=3000, seed=1, age_shift=8))):
+        response = client.post(f"/analyze-upload?dataset=hiring&version={version}",
+                               files={"file": ("hiring.csv", frame.to_csv(index=False).encode(), "text/csv")})
+        assert response.status_code == 200
+    assert [p["version"] for p in client.get("/catalog?dataset=hiring").json()["profiles"]] == ["v2", "v1"]
+    report = client.get("/compare?dataset=hiring").json()
+    assert (report["base"]["version"], report["target"]["version"]) == ("v1", "v2")
+    assert report["drifted_columns"] == ["age"]
+    assert client.get("/compare?dataset=hiring&target=v1").status_code == 400
+    assert client.get("/catalog/profile?dataset=missing").status_code == 404
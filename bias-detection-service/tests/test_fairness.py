@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def hiring_frame(n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    gender = rng.choice(["female", "male"], size=n)
+    qualified = rng.random(n) < 0.5
+    # Men are hired more often at equal qualification; the model copies the bias
+    hired = np.where(qualified, rng.random(n) < np.where(gender == "male", 0.8, 0.5), rng.random(n) < 0.1)
+    score = np.clip(hired * 0.6 + rng.random(n) * 0.4, 0, 1)
+    return pd.DataFrame({
+        "gender": gender,
+        "age": rng.integers(18, 70, size=n),
+        "hired": np.where(hired, "yes", "no"),
+        "predicted_score": score,
+    })
+
+
+def test_group_rates_match_a_pandas_groupby():
+    df = hiring_frame()
+    result = main.compute_group_fairness(df)
+    assert result["outcome_column"] == "hired"
+    assert result["positive_label"] == "yes"
+    assert result["prediction_column"] == "predicted_score"
+
+    metrics = result["protected_attributes"]["gender"]
+    y = (df["hired"] == "yes").astype(float)
+    pred = (df["predicted_score"] >= 0.5).astype(float)
+    selection = pred.groupby(df["gender"]).mean()
+    tpr = pred[y == 1].groupby(df["gender"][y == 1]).mean()
+    fpr = pred[y == 0].groupby(df["gender"][y == 0]).mean()
+    by_group = {g["group"]: g for g in metrics["groups"]}
+    for group in ("female", "male"):
+        assert by_group[group]["count"] == int((df["gender"] == group).sum())
+        assert by_group[group]["base_rate"] == pytest.approx(y[df["gender"] == group].mean())
+        assert by_group[group]["selection_rate"] == pytest.approx(selection[group])
+        assert by_group[group]["tpr"] == pytest.approx(tpr[group])
+        assert by_group[group]["fpr"] == pytest.approx(fpr[group])
+
+    assert metrics["privileged_group"] == "male" and metrics["unprivileged_group"] == "female"
+    assert metrics["demographic_parity_difference"] == pytest.approx(selection["male"] - selection["female"])
+    assert metrics["disparate_impact_ratio"] == pytest.approx(selection["female"] / selection["male"])
+    assert metrics["equalized_odds_difference"] == pytest.approx(max(abs(tpr["male"] - tpr["female"]), abs(fpr["male"] - fpr["female"])))
+    assert metrics["four_fifths_rule_violated"]
+    assert result["flagged_attributes"] == ["gender"]
+
+
+def test_wide_numeric_attributes_are_banded():
+    metrics = main.compute_group_fairness(hiring_frame())["protected_attributes"]["age"]
+    assert len(metrics["groups"]) == main.FAIRNESS_NUMERIC_BANDS
+    assert sum(g["count"] for g in metrics["groups"]) == 4000
+
+
+def test_outcome_column_selection():
+    df = hiring_frame().drop(columns="predicted_score")
+    assert main.compute_group_fairness(df.rename(columns={"hired": "result"}))["outcome_column"] is None
+    assert main.compute_group_fairness(df, outcome_column="hired")["prediction_column"] is None
+    with pytest.raises(HTTPException) as missing:
+        main.compute_group_fairness(df, outcome_column="nope")
+    assert missing.value.status_code == 400
+    with pytest.raises(HTTPException):
+        main.compute_group_fairness(df, outcome_column="age")
+
+
+def test_small_groups_are_reported_but_not_compared():
+    df = pd.DataFrame({
+        "race": ["a"] * 50 + ["b"] * 50 + ["c"] * 2,
+        "approved": [1] * 25 + [0] * 25 + [1] * 20 + [0] * 30 + [0, 0],
+    })
+    metrics = main.compute_group_fairness(df)["protected_attributes"]["race"]
+    assert [g["group"] for g in metrics["groups"]] == ["a", "b", "c"]
+    assert metrics["demographic_parity_difference"] == pytest.approx(0.1)
+    assert metrics["disparate_impact_ratio"] == pytest.approx(0.8)
+    assert not metrics["four_fifths_rule_violated"]
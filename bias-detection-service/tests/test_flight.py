@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+pa = pytest.importorskip("pyarrow")
+flight = pytest.importorskip("pyarrow.flight")
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Flight analyses are admitted on the event loop, as the app's startup hook sets up
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    previous_loop, main.ADMISSION.loop = main.ADMISSION.loop, loop
+    server = main.BiasFlightServer("grpc://127.0.0.1:0")
+    threading.Thread(target=server.serve, daemon=True).start()
+    connection = flight.connect(f"grpc://127.0.0.1:{server.port}")
+    yield connection
+    connection.close()
+    server.shutdown()
+    main.ADMISSION.loop = previous_loop
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def people_table() -> "pa.Table":
+    rng = np.random.default_rng(5)
+    return pa.Table.from_pandas(pd.DataFrame({
+        "gender": rng.choice(["F", "M"], 300),
+        "income": rng.normal(50000, 5000, 300).round(),
+        "hired": rng.choice([0, 1], 300),
+    }))
+
+
+def command(**options):
+    return flight.FlightDescriptor.for_command(json.dumps(options))
+
+
+def put(client, table, descriptor):
+    writer, metadata = client.do_put(descriptor, table.schema)
+    writer.write_table(table)
+    writer.done_writing()
+    buffer = metadata.read()
+    # Server-side errors are raised when the stream is closed
+    writer.close()
+    return json.loads(buffer.to_pybytes())
+
+
+def test_put_then_get_round_trips_the_cleaned_frame(client):
+    result = put(client, people_table(), command(filename="people.arrow", outcome_column="hired"))
+    assert result["fairness_metrics"]["dataset_info"]["filename"] == "people.arrow"
+    assert result["fairness_metrics"]["group_fairness"]["outcome_column"] == "hired"
+
+    cleaned = client.do_get(flight.Ticket(result["job_id"].encode())).read_all()
+    assert cleaned.column_names == ["gender", "income", "hired"]
+    assert cleaned.num_rows == result["fairness_metrics"]["dataset_info"]["rows"]
+
+
+def test_exchange_sends_result_metadata_then_cleaned_batches(client):
+    writer, reader = client.do_exchange(flight.FlightDescriptor.for_path("hr", "people"))
+    table = people_table()
+    writer.begin(table.schema)
+    writer.write_table(table)
+    writer.done_writing()
+    first = reader.read_chunk()
+    result = json.loads(first.app_metadata.to_pybytes())
+    assert result["fairness_metrics"]["dataset_info"]["filename"] == "hr/people"
+    batches = [first.data] if first.data is not None else []
+    while True:
+        try:
+            batches.append(reader.read_chunk().data)
+        except StopIteration:
+            break
+    assert sum(batch.num_rows for batch in batches if batch is not None) > 0
+    writer.close()
+
+
+def test_errors_surface_as_arrow_exceptions(client):
+    with pytest.raises(pa.ArrowInvalid, match="Unknown options"):
+        put(client, people_table(), command(colour="blue"))
+    with pytest.raises(pa.ArrowInvalid, match="not found"):
+        put(client, people_table(), command(outcome_column="missing"))
+    with pytest.raises(pa.ArrowKeyError):
+        client.do_get(flight.Ticket(b"not-a-job")).read_all()
+
+
+def test_analyses_are_admitted_in_the_requested_lane(client):
+    result = put(client, people_table(), command(filename="batch.arrow", priority="batch"))
+    assert result["admission"]["lane"] == "batch"
+    assert result["admission"]["estimate"]["cost_seconds"] > 0
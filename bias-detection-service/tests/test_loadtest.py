@@ -0,0 +1,76 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import loadtest
+
+
+def result(latency, status=200, error=None):
+    return {"dataset": "d.csv", "bytes": 1_000_000, "status": status, "error": error,
+            "latency_s": latency, "finished_at": 0.0}
+
+
+def test_step_summary_percentiles_errors_and_slo():
+    results = [result(0.1 * i) for i in range(1, 101)]
+    results += [result(5.0, 503, "busy"), result(5.0, None, "ConnectionError: refused")]
+    summary = loadtest.summarize_step(4, results, wall_s=10.0, slo_p95_s=10.0)
+    assert summary["requests"] == 102 and summary["succeeded"] == 100 and summary["errors"] == 2
+    assert summary["latency_s"]["p50"] == pytest.approx(5.05)
+    assert summary["latency_s"]["p95"] == pytest.approx(9.505)
+    assert summary["latency_s"]["max"] == pytest.approx(10.0)
+    assert summary["throughput_rps"] == 10.0 and summary["mb_per_s"] == 10.0
+    assert summary["errors_by_status"] == {"503": 1, "connection": 1}
+    # p95 is within the SLO, but 2% errors is not
+    assert summary["slo_met"] is False
+    assert loadtest.summarize_step(4, results[:100], 10.0, 10.0)["slo_met"] is True
+    assert loadtest.summarize_step(4, results[:100], 10.0, 9.0)["slo_met"] is False
+
+
+def test_step_summary_without_successes():
+    summary = loadtest.summarize_step(1, [result(1.0, 500, "boom")], wall_s=1.0, slo_p95_s=10.0)
+    assert summary["latency_s"]["p95"] is None
+    assert summary["slo_met"] is False
+
+
+def test_workload_mixes_sizes_and_formats():
+    workload = loadtest.build_workload([100, 1000], ["csv", "json"], jobs_csv=0, seed=1)
+    assert [item["name"] for item in workload] == [
+        "synthetic_100.csv", "synthetic_100.json", "synthetic_1000.csv", "synthetic_1000.json",
+    ]
+    assert workload[0]["weight"] > workload[2]["weight"]
+    assert len(json.loads(workload[1]["content"])) == 100
+    assert len(pd.read_csv(io.BytesIO(workload[2]["content"]))) == 1000
+    with pytest.raises(SystemExit):
+        loadtest.build_workload([], ["csv"], jobs_csv=0, seed=1)
+
+
+def test_gauges_are_scraped_from_metrics(monkeypatch):
+    class Response:
+        text = (
+            "# TYPE biasbounty_jobs_in_flight gauge\nbiasbounty_jobs_in_flight 3\n"
+            "biasbounty_process_resident_memory_bytes 1.5e+08\n"
+        )
+    monkeypatch.setattr(loadtest.requests, "get", lambda url, timeout: Response())
+    assert loadtest.scrape_gauges("http://service") == {
+        loadtest.RSS_METRIC: 1.5e8, loadtest.IN_FLIGHT_METRIC: 3.0,
+    }
+
+
+def test_html_report_marks_steps_against_the_slo():
+    steps = [
+        loadtest.summarize_step(1, [result(0.5)] * 10, 5.0, 1.0),
+        loadtest.summarize_step(8, [result(2.0)] * 10, 5.0, 1.0),
+    ]
+    report = {
+        "endpoint": "/analyze-upload", "target": "http://127.0.0.1:1", "models": "disabled",
+        "started_at": "now", "slo_p95_seconds": 1.0, "max_concurrency_within_slo": 1,
+        "peak_throughput_rps": 2.0, "peak_rss_mb": 100.0, "steps": steps,
+        "resources": [{"t": 0.0, "rss_mb": 90.0, "jobs_in_flight": 1}, {"t": 1.0, "rss_mb": 100.0, "jobs_in_flight": 2}],
+        "workload": [{"name": "synthetic_100.csv", "bytes": 5000, "weight": 1.0}],
+    }
+    page = loadtest.render_html(report)
+    assert page.count('<tr class="ok">') == 1 and page.count('<tr class="bad">') == 1
+    assert "highest concurrency within SLO: 1" in page
+    assert page.count("<svg") == 4
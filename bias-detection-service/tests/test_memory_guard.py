@@ -0,0 +1,121 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+MB = 2**20
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Fake process RSS, so the governor's headroom does not depend on the test process."""
+    value = {"bytes": 0}
+    monkeypatch.setattr(main, "get_rss_bytes", lambda: value["bytes"])
+    return value
+
+
+def estimate(peak_mb, raw_mb=0, working_mb=None):
+    working = (peak_mb - 32 - raw_mb if working_mb is None else working_mb) * MB
+    return {"rows": 1000, "raw_bytes": raw_mb * MB, "parse_bytes": 0,
+            "working_bytes": working, "peak_bytes": peak_mb * MB}
+
+
+def test_reservations_share_the_limit(rss):
+    governor = main.MemoryGovernor(200 * MB, 150 * MB)
+    first = governor.reserve(estimate(120))
+    assert first.mode == "full"
+    assert governor.status()["reserved_mb"] == 120
+    # 80MB left: a second 120MB job is refused, but would fit later, so it may retry
+    with pytest.raises(HTTPException) as refused:
+        governor.reserve(estimate(120))
+    assert refused.value.status_code == 507
+    assert "Retry-After" in refused.value.headers
+    first.close()
+    governor.reserve(estimate(120)).close()
+    # Bigger than any single job may be: no point retrying
+    with pytest.raises(HTTPException) as too_big:
+        governor.reserve(estimate(180))
+    assert too_big.value.headers is None
+
+
+def test_csv_jobs_degrade_to_a_row_sample(rss):
+    governor = main.MemoryGovernor(200 * MB, 200 * MB)
+    reservation = governor.reserve(estimate(432, raw_mb=0, working_mb=400), can_sample=True)
+    assert reservation.mode == "sampled"
+    assert reservation.fraction == pytest.approx((200 - 32) / 400)
+    assert reservation.projected <= 200 * MB
+    reservation.close()
+    with pytest.raises(HTTPException):
+        governor.reserve(estimate(32 + 10000, working_mb=10000), can_sample=True)
+
+
+def test_rss_over_the_limit_aborts_the_largest_job(rss):
+    governor = main.MemoryGovernor(300 * MB, 300 * MB)
+    small, large = governor.reserve(estimate(60)), governor.reserve(estimate(150))
+    rss["bytes"] = 310 * MB
+    governor.check(small)
+    assert large.aborted and not small.aborted
+    with pytest.raises(HTTPException) as aborted:
+        governor.check(large)
+    assert aborted.value.status_code == 507
+
+
+def test_memory_error_inside_a_job_becomes_507(rss):
+    governor = main.MemoryGovernor(300 * MB, 300 * MB)
+    with pytest.raises(HTTPException) as aborted:
+        with governor.reserve(estimate(60)):
+            raise MemoryError()
+    assert aborted.value.status_code == 507
+    assert governor.status()["jobs"] == 0
+
+
+def upload_bytes(rows=3000):
+    rng = np.random.default_rng(6)
+    buffer = io.StringIO()
+    pd.DataFrame({
+        "gender": rng.choice(["F", "M"], rows),
+        "income": rng.normal(50000, 5000, rows).round(),
+    }).to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def test_uploads_that_do_not_fit_fall_back_out_of_core_or_507(rss, monkeypatch):
+    monkeypatch.setattr(main, "MEMORY", main.MemoryGovernor(34 * MB, 34 * MB))
+    client = TestClient(main.app)
+    content = upload_bytes()
+    if main.duckdb is not None:
+        response = client.post("/analyze-upload", files={"file": ("people.csv", content, "text/csv")})
+        assert response.status_code == 200
+        assert response.json()["analysis_type"] == "out_of_core"
+        assert response.json()["memory"]["mode"] == "out_of_core"
+    # Plain text has no out-of-core path and cannot be sampled
+    response = client.post("/analyze-upload", files={"file": ("notes.txt", b"x" * (9 * MB), "text/plain")})
+    assert response.status_code == 507
+
+
+def test_in_memory_csv_analysis_runs_on_a_sample(rss, monkeypatch):
+    content = upload_bytes(rows=20000)
+    projection = main.estimate_upload_memory(content[:main.ADMISSION_SNIFF_BYTES], len(content), "text/csv")
+    limit = main.MEMORY_BASE_BYTES + len(content) + projection["working_bytes"] // 2
+    monkeypatch.setattr(main, "MEMORY", main.MemoryGovernor(limit, limit))
+    result = main.analyze_content(content, "people.csv", "text/csv")
+    assert result["analysis_type"] == "sampled"
+    assert 0.3 < result["memory"]["sample_fraction"] < 0.7
+    assert 6000 < result["fairness_metrics"]["dataset_info"]["rows"] < 14000
+
+
+def test_reservation_stays_open_while_the_frame_is_in_use(rss, monkeypatch):
+    governor = main.MemoryGovernor(4096 * MB, 4096 * MB)
+    monkeypatch.setattr(main, "MEMORY", governor)
+    open_jobs = []
+    monkeypatch.setattr(main, "record_profile",
+                        lambda key, backend, result, filename: open_jobs.append(governor.status()["jobs"]))
+    result = main.analyze_content(upload_bytes(), "people.csv", "text/csv")
+    assert open_jobs == [1]
+    assert governor.status()["jobs"] == 0
+    assert result["memory"]["mode"] == "full"
@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_counter_and_gauge_render_per_label_set():
+    registry = main.MetricsRegistry()
+    requests = registry.register(main.Counter("t_requests_total", "Requests.", ("route",)))
+    inflight = registry.register(main.Gauge("t_in_flight", "In flight."))
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    requests.inc(route='/b"x')
+    inflight.inc()
+    inflight.inc()
+    inflight.dec()
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP t_requests_total Requests.", "# TYPE t_requests_total counter"]
+    assert 't_requests_total{route="/a"} 3' in lines
+    assert 't_requests_total{route="/b\\"x"} 1' in lines
+    assert "# TYPE t_in_flight gauge" in lines
+    assert "t_in_flight 1" in lines
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = main.Histogram("t_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="load")
+
+    lines = histogram.render()
+    assert 't_seconds_bucket{stage="load",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{stage="load",le="1"} 3' in lines
+    assert 't_seconds_bucket{stage="load",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{stage="load"} 3.65' in lines
+    assert 't_seconds_count{stage="load"} 4' in lines
+
+
+def test_metrics_endpoint_records_requests_by_route_template():
+    client = TestClient(main.app)
+    assert client.get("/health").status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'biasbounty_http_requests_total{method="GET",route="/health",status="200"}' in response.text
+    assert "biasbounty_process_resident_memory_bytes" in response.text
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+import main
+
+
+def reviews_frame():
+    rng = np.random.default_rng(3)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    texts = [" ".join(rng.choice(vocabulary, size=30)) for _ in range(200)]
+    base = texts[0].split()
+    # Five copies of the first review with one word swapped near the end (~0.85 shingle Jaccard)
+    for i in range(5):
+        texts.append(" ".join(base[:-2] + [f"edit{i}"] + base[-1:]))
+    return pd.DataFrame({
+        "review_id": np.arange(len(texts)),
+        "review": texts,
+        "gender": rng.choice(["F", "M"], size=len(texts)),
+    })
+
+
+def test_paraphrased_rows_form_one_cluster():
+    df = reviews_frame()
+    labels, report = main.find_near_duplicates(df, threshold=0.6)
+    cluster = np.flatnonzero(labels == labels[0])
+    assert set(cluster) == {0, 200, 201, 202, 203, 204}
+    assert report["clusters"] == 1
+    assert report["rows_in_clusters"] == 6 and report["redundant_rows"] == 5
+    assert report["text_columns"] == ["review"]
+    assert sum(report["largest_clusters"][0]["demographic_mix"]["gender"].values()) == 6
+
+
+def test_identifier_columns_do_not_split_duplicates():
+    df = pd.DataFrame({
+        "id": range(60),
+        "city": ["Paris", "Lyon", "Nice"] * 20,
+        "age": [30, 40, 50] * 20,
+    })
+    labels, report = main.find_near_duplicates(df)
+    # Three distinct rows repeated 20 times each: identical rows always share every band
+    assert report["clusters"] == 3 and report["redundant_rows"] == 57
+    assert len(set(labels)) == 3
+
+
+def test_minhash_estimates_jaccard():
+    a = np.arange(0, 1000, dtype=np.uint64)
+    b = np.arange(500, 1500, dtype=np.uint64)
+    tokens = pd.util.hash_array(np.concatenate([a, b]))
+    signatures = main.minhash_signatures(tokens, np.array([0, len(a)]))
+    estimate = (signatures[0] == signatures[1]).mean()
+    assert abs(estimate - 1 / 3) < 0.15
+
+
+def test_connected_components_follow_chains():
+    left = np.array([5, 3, 1, 7])
+    right = np.array([3, 1, 0, 6])
+    labels = main._connected_components(8, left, right)
+    assert labels.tolist() == [0, 0, 2, 0, 4, 0, 6, 6]
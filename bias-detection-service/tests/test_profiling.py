@@ -0,0 +1,105 @@
+import contextvars
+import os
+import threading
+
+import main
+
+
+def test_stage_tree_nests_stages_and_counts_model_calls():
+    profiler = main.RequestProfiler("analyze")
+    profiler.start()
+    try:
+        with main.stage_timer("load"):
+            main.annotate_stage(rows_in=10)
+        with main.stage_timer("text"):
+            with main.stage_timer("sentiment"):
+                main.run_text_model("sentiment", lambda texts: [0] * len(texts), ["a", "b"])
+    finally:
+        result = profiler.finish()
+
+    assert profiler.finish() is result
+    assert main._active_profiler.get() is None
+    tree = result["tree"]
+    assert [child["name"] for child in tree["children"]] == ["load", "text"]
+    assert tree["children"][0]["rows_in"] == 10
+    text = tree["children"][1]
+    assert text["children"][0]["name"] == "sentiment"
+    assert text["children"][0]["model_calls"] == 1
+    assert text["model_calls"] == 1
+    assert result["model_calls"] == {"sentiment": 1}
+    assert result["total_wall_ms"] >= text["wall_ms"]
+
+
+def test_stages_outside_a_profiled_request_are_not_recorded():
+    with main.stage_timer("load"):
+        main.annotate_stage(rows_in=1)
+    assert main._active_profiler.get() is None
+
+
+def test_full_profile_writes_balanced_speedscope_events():
+    profiler = main.RequestProfiler("analyze", full=True)
+    profiler.start()
+    with main.stage_timer("load"):
+        with main.stage_timer("parse"):
+            pass
+    result = profiler.finish(profile_id="00000000-0000-0000-0000-000000000001")
+
+    assert result["artifacts"]["speedscope"] == "/profile/00000000-0000-0000-0000-000000000001?format=speedscope"
+    assert os.path.exists(os.path.join(main.JOBS_DIR, "profile_00000000-0000-0000-0000-000000000001.prof"))
+    events = profiler._speedscope()["profiles"][0]["events"]
+    assert [event["type"] for event in events] == ["O", "O", "O", "C", "C", "C"]
+    assert all(a["at"] <= b["at"] for a, b in zip(events, events[1:]))
+
+
+def test_stages_on_concurrent_threads_nest_under_their_own_parent():
+    profiler = main.RequestProfiler("analyze")
+    profiler.start()
+    barrier = threading.Barrier(2)
+
+    def branch(name):
+        with main.stage_timer(name):
+            barrier.wait()
+            with main.stage_timer(f"{name}.inner"):
+                barrier.wait()
+
+    try:
+        with main.stage_timer("fan_out"):
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(branch, name))
+                       for name in ("a", "b")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            main.annotate_stage(branches=2)
+    finally:
+        result = profiler.finish()
+
+    fan_out = result["tree"]["children"][0]
+    assert fan_out["branches"] == 2
+    branches = {child["name"]: child for child in fan_out["children"]}
+    assert sorted(branches) == ["a", "b"]
+    for name, node in branches.items():
+        assert [child["name"] for child in node["children"]] == [f"{name}.inner"]
+
+
+def test_memory_is_only_reported_for_profiles_that_ran_alone():
+    alone = main.RequestProfiler("alone")
+    alone.start()
+    with main.stage_timer("load"):
+        payload = bytearray(4 << 20)
+    alone_result = alone.finish()
+    del payload
+    assert alone_result["memory_tracked"]
+    assert alone_result["tree"]["children"][0]["peak_alloc_bytes"] >= 4 << 20
+
+    first, second = main.RequestProfiler("first"), main.RequestProfiler("second")
+    other_request = contextvars.copy_context()
+    first.start()
+    other_request.run(second.start)
+    with main.stage_timer("load"):
+        pass
+    results = [first.finish(), other_request.run(second.finish)]
+    for result in results:
+        assert not result["memory_tracked"]
+        assert result["tree"]["peak_alloc_bytes"] is None
+    assert not main.tracemalloc.is_tracing()
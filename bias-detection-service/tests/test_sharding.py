@@ -0,0 +1,86 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def csv_bytes(rows=12000, seed=3) -> bytes:
+    rng = np.random.default_rng(seed)
+    buffer = io.StringIO()
+    pd.DataFrame({
+        "gender": rng.choice(["female", "male"], rows),
+        "age": rng.integers(18, 90, rows),
+        "income": rng.lognormal(10, 0.5, rows).round(2),
+        "hired": rng.integers(0, 2, rows),
+    }).to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def test_split_csv_ranges_cover_whole_lines():
+    content = csv_bytes(rows=1000)
+    header, ranges = main.split_csv_ranges(io.BytesIO(content), len(content), 7)
+    assert header == content[:content.index(b"\n") + 1]
+    assert ranges[0][0] == len(header) and ranges[-1][1] == len(content)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    for start, end in ranges:
+        assert content[start - 1:start] == b"\n" and content[end - 1:end] == b"\n"
+    # More shards than lines: empty ranges are dropped
+    assert len(main.split_csv_ranges(io.BytesIO(content[:60]), 60, 50)[1]) <= 3
+
+
+def test_merged_partials_match_the_whole_file():
+    content = csv_bytes()
+    header, ranges = main.split_csv_ranges(io.BytesIO(content), len(content), 3)
+    schema = main.SketchBackend(main.load_dataset(content[:4096].rsplit(b"\n", 1)[0], "text/csv")).schema()
+    partials = [main.sketch_partial(header + content[start:end], "text/csv", schema, sample_rows=500)
+                for start, end in ranges]
+    merged = main.merge_partials(partials, sample_rows=1000)
+    df = pd.read_csv(io.BytesIO(content))
+    assert merged.row_count() == len(df)
+    summary = merged.numeric_summary(merged.numeric_columns())
+    assert summary["income"]["mean"] == pytest.approx(df["income"].mean(), rel=1e-10)
+    assert merged.value_counts("gender").to_dict() == df["gender"].value_counts().to_dict()
+    # The merged sample is the bottom-k keys across shards, so every shard is represented
+    assert len(merged.sample_df) == 1000
+    assert merged.sample_df["income"].dtype.kind == "f"
+
+    with pytest.raises(ValueError):
+        main.merge_partials([{**partials[0], "version": 99}])
+
+
+def test_analyze_sharded_retries_failed_shards_on_another_worker(monkeypatch):
+    client = TestClient(main.app)
+    calls = []
+
+    def request_partial(worker, filename, payload, schema, sample_rows):
+        calls.append(worker)
+        if worker == "http://down":
+            raise ConnectionError("refused")
+        # What /partial would send back, through its JSON encoding
+        return json.loads(json.dumps(main.sketch_partial(payload, "text/csv", schema, sample_rows)))
+
+    monkeypatch.setattr(main, "request_partial", request_partial)
+    monkeypatch.setattr(main, "SHARD_WORKERS", ["http://up", "http://down"])
+    content = csv_bytes()
+    response = client.post("/analyze-sharded?shards=4&outcome_column=hired",
+                           files={"file": ("people.csv", content, "text/csv")})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["fairness_metrics"]["dataset_info"]["rows"] == 12000
+    assert calls.count("http://down") == 2 and calls.count("http://up") == 4
+
+    monkeypatch.setattr(main, "SHARD_WORKERS", ["http://down"])
+    response = client.post("/analyze-sharded", files={"file": ("people.csv", content, "text/csv")})
+    assert response.status_code == 502
+
+
+def test_partial_rejects_a_bad_schema():
+    response = TestClient(main.app).post(
+        "/partial", files={"file": ("s.csv", b"a,b\n1,2\n", "text/csv")}, data={"schema": '{"columns": []}'}
+    )
+    assert response.status_code == 400
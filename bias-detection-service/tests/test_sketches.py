@@ -0,0 +1,262 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def frame(rows=30000, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    income = rng.lognormal(10, 0.6, rows)
+    income[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "gender": rng.choice(["female", "male", "nonbinary"], rows, p=[0.48, 0.48, 0.04]),
+        "city": rng.zipf(1.6, rows).astype(str),
+        "age": rng.integers(18, 90, rows).astype(float),
+        "income": income,
+    })
+
+
+def chunked(df: pd.DataFrame, chunk_rows: int = 2500) -> main.SketchBackend:
+    backend = main.SketchBackend(df.head(500))
+    for start in range(0, len(df), chunk_rows):
+        backend.update(df.iloc[start:start + chunk_rows])
+    return backend
+
+
+def sharded(df: pd.DataFrame, shards: int = 4, chunk_rows: int = 2500) -> main.SketchBackend:
+    """Sketch row shards separately, round-trip each through its JSON state (as /partial does), then merge."""
+    schema = main.SketchBackend(df.head(500)).schema()
+    merged = None
+    for shard in np.array_split(np.arange(len(df)), shards):
+        backend = main.SketchBackend(df.head(500), schema)
+        for start in range(0, len(shard), chunk_rows):
+            backend.update(df.iloc[shard[start:start + chunk_rows]])
+        backend = main.SketchBackend.from_state(backend.to_state())
+        if merged is None:
+            merged = backend
+        else:
+            merged.merge(backend)
+    return merged
+
+
+def single_pass(df: pd.DataFrame) -> main.SketchBackend:
+    backend = main.SketchBackend(df.head(500))
+    backend.update(df)
+    return backend
+
+
+def test_hyperloglog_estimates_distinct_counts():
+    for n in (100, 5000, 200000):
+        sketch = main.HyperLogLog()
+        values = pd.util.hash_array(np.arange(n).astype(str).astype(object))
+        sketch.update(values)
+        sketch.update(values[: n // 2])  # repeats do not count
+        assert sketch.count() == pytest.approx(n, rel=0.05)
+
+
+def test_running_moments_over_chunks_match_pandas():
+    values = np.random.default_rng(1).gamma(2.0, 3.0, 10001)
+    moments = main.RunningMoments()
+    for chunk in np.array_split(values, 7):
+        moments.update(chunk)
+    series = pd.Series(values)
+    stats = moments.stats()
+    assert moments.n == len(values)
+    assert stats["mean"] == pytest.approx(series.mean(), rel=1e-10)
+    assert stats["std"] == pytest.approx(series.std(), rel=1e-10)
+    assert stats["skew"] == pytest.approx(series.skew(), rel=1e-8)
+    assert stats["kurtosis"] == pytest.approx(series.kurt(), rel=1e-8)
+
+
+def test_tdigest_quantiles_stay_close_to_exact():
+    values = np.random.default_rng(2).normal(100, 15, 40000)
+    digest = main.TDigest()
+    for chunk in np.array_split(values, 8):
+        digest.update(chunk)
+    assert digest.count == len(values)
+    assert (digest.min, digest.max) == (values.min(), values.max())
+    ordered = np.sort(values)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        # Rank error of the estimate, as a share of all values
+        rank = np.searchsorted(ordered, digest.quantile(q)) / len(values)
+        assert abs(rank - q) < 0.005
+    assert digest.cdf([ordered[10000]])[0] == pytest.approx(0.25, abs=0.005)
+    assert len(digest.means) <= digest.compression
+
+
+def test_space_saving_keeps_heavy_hitters_as_upper_bounds():
+    values = pd.Series(np.random.default_rng(3).zipf(1.5, 60000).astype(str))
+    summary = main.SpaceSaving(k=32)
+    for start in range(0, len(values), 10000):
+        summary.update(values.iloc[start:start + 10000])
+    exact = values.value_counts()
+    assert [value for value, _ in summary.top(5)] == list(exact.index[:5])
+    for value, count in summary.counts.items():
+        assert count >= exact[value]
+
+
+def test_sketch_backend_tracks_the_exact_statistics():
+    df = frame()
+    backend = chunked(df)
+    exact = main.PandasBackend(df)
+    assert backend.row_count() == len(df)
+    assert backend.missing_counts() == exact.missing_counts()
+    assert backend.nunique("gender") == 3
+    summary = backend.numeric_summary(backend.numeric_columns())
+    for col in ("age", "income"):
+        values = df[col].dropna()
+        assert summary[col]["count"] == len(values)
+        assert summary[col]["mean"] == pytest.approx(values.mean(), rel=1e-10)
+        assert summary[col]["std"] == pytest.approx(values.std(), rel=1e-10)
+        assert summary[col]["median"] == pytest.approx(values.median(), rel=0.01)
+    assert backend.value_counts("gender").to_dict() == df["gender"].value_counts().to_dict()
+    assert list(backend.value_counts("city").index[:3]) == list(df["city"].value_counts().index[:3])
+    histogram = backend.histograms(summary)["age"]
+    assert sum(histogram["counts"]) == pytest.approx(len(df), abs=10)
+
+
+def test_numeric_demographic_columns_keep_group_counts():
+    rng = np.random.default_rng(9)
+    df = frame(rows=20000)
+    df["race_code"] = rng.choice([1, 2, 3], len(df), p=[0.85, 0.1, 0.05])
+    exact = main.PandasBackend(df)
+    for backend in (chunked(df), sharded(df)):
+        assert backend.value_counts("race_code").to_dict() == df["race_code"].value_counts().to_dict()
+        ages = backend.value_counts("age")
+        assert len(ages) == 64 and all(ages[age] >= (df["age"] == age).sum() for age in ages.index)
+        assert backend.value_counts("income").empty  # not a protected attribute: no top-k kept
+        found = main.detect_demographic_bias(backend)
+        assert found["imbalanced_columns"] == ["race_code"]
+        assert found["score"] == pytest.approx(main.detect_demographic_bias(exact)["score"])
+
+
+def test_hyperloglog_merge_equals_single_pass():
+    values = pd.util.hash_array(np.arange(50000).astype(str).astype(object))
+    whole, left, right = main.HyperLogLog(), main.HyperLogLog(), main.HyperLogLog()
+    whole.update(values)
+    left.update(values[:20000])
+    right.update(values[15000:])  # overlapping shards must not double count
+    left.merge(right)
+    np.testing.assert_array_equal(left.registers, whole.registers)
+    assert left.count() == pytest.approx(50000, rel=0.05)
+
+
+def test_running_moments_merge_matches_pandas():
+    values = np.random.default_rng(1).gamma(2.0, 3.0, 10001)
+    merged = main.RunningMoments()
+    for chunk in np.array_split(values, 7):
+        part = main.RunningMoments()
+        part.update(chunk)
+        merged.merge(part)
+    series = pd.Series(values)
+    stats = merged.stats()
+    assert merged.n == len(values)
+    assert stats["mean"] == pytest.approx(series.mean(), rel=1e-10)
+    assert stats["std"] == pytest.approx(series.std(), rel=1e-10)
+    assert stats["skew"] == pytest.approx(series.skew(), rel=1e-8)
+    assert stats["kurtosis"] == pytest.approx(series.kurt(), rel=1e-8)
+
+
+def test_tdigest_merge_keeps_quantiles_close_to_exact():
+    values = np.random.default_rng(2).normal(100, 15, 40000)
+    whole, merged = main.TDigest(), main.TDigest()
+    whole.update(values)
+    for chunk in np.array_split(values, 8):
+        part = main.TDigest()
+        part.update(chunk)
+        merged.merge(main.TDigest.from_state(part.to_state()))
+    assert merged.count == len(values)
+    assert (merged.min, merged.max) == (values.min(), values.max())
+    ordered = np.sort(values)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        # Rank error of the estimate, as a share of all values
+        for digest in (whole, merged):
+            rank = np.searchsorted(ordered, digest.quantile(q)) / len(values)
+            assert abs(rank - q) < 0.005
+    assert len(merged.means) <= merged.compression
+
+
+def test_space_saving_merge_keeps_heavy_hitters_as_upper_bounds():
+    values = pd.Series(np.random.default_rng(3).zipf(1.5, 60000).astype(str))
+    merged = main.SpaceSaving(k=32)
+    for start in range(0, len(values), 10000):
+        part = main.SpaceSaving(k=32)
+        part.update(values.iloc[start:start + 10000])
+        merged.merge(part)
+    exact = values.value_counts()
+    top = dict(merged.top(5))
+    assert list(top) == list(exact.index[:5])
+    for value, count in merged.counts.items():
+        assert count >= exact[value]
+
+
+def test_sharded_sketch_backend_matches_single_pass():
+    df = frame()
+    merged, whole = sharded(df), single_pass(df)
+    assert merged.row_count() == whole.row_count() == len(df)
+    assert merged.missing_counts() == whole.missing_counts()
+    for col in df.columns:
+        np.testing.assert_array_equal(merged.distinct[col].registers, whole.distinct[col].registers)
+    summary_merged = merged.numeric_summary(merged.numeric_columns())
+    summary_whole = whole.numeric_summary(whole.numeric_columns())
+    for col in ("age", "income"):
+        exact = df[col].dropna()
+        assert summary_merged[col]["count"] == summary_whole[col]["count"] == len(exact)
+        assert summary_merged[col]["mean"] == pytest.approx(exact.mean(), rel=1e-10)
+        assert summary_merged[col]["std"] == pytest.approx(exact.std(), rel=1e-10)
+        assert summary_merged[col]["min"] == exact.min() and summary_merged[col]["max"] == exact.max()
+        assert summary_merged[col]["median"] == pytest.approx(exact.median(), rel=0.01)
+    gender = merged.value_counts("gender")
+    assert gender.to_dict() == df["gender"].value_counts().to_dict()
+    assert list(merged.value_counts("city").index[:3]) == list(df["city"].value_counts().index[:3])
+
+
+def test_merge_rejects_mismatched_schemas():
+    df = frame(rows=1000)
+    left = main.SketchBackend(df)
+    right = main.SketchBackend(df[["gender", "age"]])
+    with pytest.raises(ValueError):
+        left.merge(right)
+
+
+def test_preview_streams_sample_sketch_and_final_phases(monkeypatch):
+    monkeypatch.setattr(main, "PREVIEW_SAMPLE_BYTES", 64 * 1024)
+    monkeypatch.setattr(main, "PREVIEW_CHUNK_ROWS", 5000)
+    buffer = io.StringIO()
+    frame(rows=20000).to_csv(buffer, index=False)
+
+    client = TestClient(main.app)
+    response = client.post("/preview", files={"file": ("big.csv", buffer.getvalue().encode(), "text/csv")})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    phases = [line["phase"] for line in lines]
+    assert phases[0] == "sample" and phases[-1] == "final"
+    assert "sketch" in phases
+    assert lines[0]["approximate"] and lines[0]["rows_sampled"] < 20000
+    last_sketch = [line for line in lines if line["phase"] == "sketch"][-1]
+    assert last_sketch["rows_scanned"] == 20000 and last_sketch["progress"] == 1.0
+    assert lines[-1]["approximate"] is False and "bias_score" in lines[-1]
+
+
+def test_preview_holds_no_analysis_slot_while_a_line_is_sent(monkeypatch):
+    monkeypatch.setattr(main, "PREVIEW_SAMPLE_BYTES", 64 * 1024)
+    monkeypatch.setattr(main, "PREVIEW_REFRESH_S", 0.0)
+    buffer = io.StringIO()
+    frame(rows=20000).to_csv(buffer, index=False)
+
+    async def scenario():
+        seen = []
+        async for line in main.stream_preview(buffer.getvalue().encode(), "big.csv", "text/csv", {}):
+            seen.append((json.loads(line)["phase"], main.ADMISSION.status()["running"]))
+        return seen
+
+    seen = asyncio.run(scenario())
+    assert [phase for phase, _ in seen] == ["sample", "sketch", "sketch", "final"]
+    assert all(running == 0 for _, running in seen)
+
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def lending_frame(n=6000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "gender": rng.choice(["female", "male"], size=n),
+        "race": rng.choice(["a", "b", "c"], size=n),
+        "religion": rng.choice(["x", "y"], size=n),
+    })
+    rate = np.where((df["gender"] == "female") & (df["race"] == "b"), 0.15, 0.6)
+    df["approved"] = (rng.random(n) < rate).astype(int)
+    return df
+
+
+def test_planted_intersection_ranks_first():
+    df = lending_frame()
+    result = main.compute_intersectional_subgroups(df, "approved", max_depth=2)
+    top = result["subgroups"][0]
+    assert top["attributes"] == {"gender": "female", "race": "b"}
+    members = (df["gender"] == "female") & (df["race"] == "b")
+    assert top["count"] == int(members.sum())
+    assert top["outcome_rate"] == pytest.approx(df.loc[members, "approved"].mean())
+    assert top["outcome_rate_gap"] == pytest.approx(df.loc[members, "approved"].mean() - df.loc[~members, "approved"].mean())
+    assert top["z_score"] < -10
+    assert result["score"] == pytest.approx(min(100.0, abs(top["outcome_rate_gap"]) * 200))
+
+
+def test_sparse_counting_matches_dense(monkeypatch):
+    df = lending_frame()
+    dense = main.compute_intersectional_subgroups(df, "approved")
+    monkeypatch.setattr(main, "SUBGROUP_DENSE_CELLS", 1)
+    sparse = main.compute_intersectional_subgroups(df, "approved")
+    assert sparse["subgroups"] == dense["subgroups"]
+    assert sparse["subgroups_scanned"] == dense["subgroups_scanned"]
+
+
+def test_apriori_skips_supersets_of_rare_columns(monkeypatch):
+    df = lending_frame(n=2000)
+    # Every level of "disability" is below min support, so no combination containing it is extended
+    df["disability"] = ["d"] * 10 + ["e"] * 10 + [None] * 1980
+    monkeypatch.setattr(main, "SUBGROUP_MIN_SUPPORT", 0.05)
+    result = main.compute_intersectional_subgroups(df, "approved", max_depth=3)
+    # 4 singles, 3 pairs and 1 triple among gender/race/religion; nothing with disability past depth 1
+    assert result["combinations_scanned"] == 4 + 3 + 1
+    assert all("disability" not in s["attributes"] for s in result["subgroups"])
+
+
+def test_representation_ranking_without_an_outcome():
+    df = lending_frame().drop(columns="approved")
+    # Pushing rows into one intersection leaves its sibling under-represented
+    df.loc[:999, ["gender", "race"]] = ["male", "c"]
+    result = main.compute_intersectional_subgroups(df, max_depth=2)
+    assert result["outcome_column"] is None
+    by_attributes = {tuple(sorted(s["attributes"].items())): s for s in result["subgroups"]}
+    assert result["subgroups"][0]["attributes"] == {"gender": "female", "race": "c"}
+    assert result["subgroups"][0]["representation_ratio"] < 0.8
+    assert by_attributes[(("gender", "male"), ("race", "c"))]["representation_ratio"] > 1.1
+    with pytest.raises(HTTPException):
+        main.compute_intersectional_subgroups(df, max_depth=7)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import main
+
+TEXTS = ["ok", "you idiot", "shut it", "what a lovely day out there today"]
+
+
+@pytest.fixture
+def transformer_calls(monkeypatch):
+    calls = []
+
+    def fake_classify_texts(model_name, analyzer, texts):
+        calls.extend(texts)
+        return [{"label": "toxic", "score": 0.9} for _ in texts]
+
+    monkeypatch.setattr(main, "classify_texts", fake_classify_texts)
+    monkeypatch.setattr(main, "TOXICITY_CASCADE_ENABLED", True)
+    return calls
+
+
+def test_lexicon_matches_whole_words_only():
+    matcher = main.AhoCorasick(["he", "she", "hers", "idiot"])
+    assert sorted(matcher.find("She said HERS, not his")) == ["hers", "she"]
+    assert matcher.find("idiotic ushers") == []
+
+
+def test_untrained_prefilter_escalates_every_text(monkeypatch, transformer_calls):
+    monkeypatch.setattr(main, "TOXICITY_PREFILTER", main.ToxicityPrefilter(main.DEFAULT_TOXICITY_LEXICON))
+    monkeypatch.setattr(main, "TOXICITY_SHORT_TEXT_WORDS", 0)
+    tally = {}
+    results = main.classify_toxicity(TEXTS, tally)
+    assert sorted(transformer_calls) == sorted(TEXTS)
+    assert all(r["label"] == "toxic" for r in results)
+    assert tally == {"uncertain": 3, "lexicon": 1}
+
+
+def test_short_text_clearing_is_opt_in(monkeypatch, transformer_calls):
+    monkeypatch.setattr(main, "TOXICITY_PREFILTER", main.ToxicityPrefilter(main.DEFAULT_TOXICITY_LEXICON))
+    monkeypatch.setattr(main, "TOXICITY_SHORT_TEXT_WORDS", 2)
+    tally = {}
+    results = main.classify_toxicity(TEXTS + ["ok"], tally)
+    # Lexicon hits always escalate; duplicates are screened once
+    assert sorted(transformer_calls) == ["what a lovely day out there today", "you idiot"]
+    assert [r.get("cascade") for r in results] == ["prefilter", None, "prefilter", None, "prefilter"]
+    assert tally == {"benign": 2, "uncertain": 1, "lexicon": 1}
+    assert main.cascade_report(tally)["escalation_rate"] == 0.5
+
+
+def test_trained_prefilter_clears_only_below_its_threshold(monkeypatch, transformer_calls):
+    weights = np.zeros(main.PREFILTER_HASH_DIM, dtype=np.float32)
+    _, features, _ = main.hashed_text_features(["lovely"])
+    weights[features] = -10.0
+    prefilter = main.ToxicityPrefilter(main.DEFAULT_TOXICITY_LEXICON, weights=weights, bias=0.0, benign_below=0.1)
+    monkeypatch.setattr(main, "TOXICITY_PREFILTER", prefilter)
+    results = main.classify_toxicity(TEXTS)
+    assert "what a lovely day out there today" not in transformer_calls
+    assert sorted(transformer_calls) == ["ok", "shut it", "you idiot"]
+    assert results[3]["label"] == "non-toxic" and results[3]["score"] > 0.9
+
+
+def test_disabled_cascade_sends_every_text(monkeypatch, transformer_calls):
+    monkeypatch.setattr(main, "TOXICITY_CASCADE_ENABLED", False)
+    main.classify_toxicity(TEXTS)
+    assert transformer_calls == TEXTS
@@ -0,0 +1,133 @@
+import base64
+import gzip
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def csv_bytes(rows=2000) -> bytes:
+    rng = np.random.default_rng(8)
+    buffer = io.StringIO()
+    pd.DataFrame({
+        "gender": rng.choice(["female", "male"], rows),
+        "age": rng.integers(18, 90, rows),
+        "income": rng.normal(50000, 8000, rows).round(),
+    }).to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "UPLOADS", main.ResumableUploads(str(tmp_path / "uploads"), 10 * 2**20, 3600))
+    return TestClient(main.app)
+
+
+def create(client, length, filename="people.csv"):
+    encoded = base64.b64encode(filename.encode()).decode()
+    response = client.post("/uploads", headers={
+        "Tus-Resumable": "1.0.0", "Upload-Length": str(length), "Upload-Metadata": f"filename {encoded}",
+    })
+    assert response.status_code == 201
+    return response.headers["location"]
+
+
+def patch(client, location, offset, body):
+    return client.patch(location, content=body, headers={
+        "Tus-Resumable": "1.0.0", "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream",
+    })
+
+
+def test_resumable_upload_resumes_from_the_server_offset(client):
+    content = csv_bytes()
+    half = len(content) // 2
+    assert client.options("/uploads").headers["tus-extension"] == main.TUS_EXTENSIONS
+    location = create(client, len(content))
+
+    assert patch(client, location, 0, content[:half]).headers["upload-offset"] == str(half)
+    # A resend of bytes the server already has is refused with the real offset
+    conflict = patch(client, location, 0, content[:half])
+    assert conflict.status_code == 409 and conflict.headers["upload-offset"] == str(half)
+    assert client.post(f"{location}/analyze").status_code == 409
+
+    resumed_at = int(client.head(location).headers["upload-offset"])
+    assert patch(client, location, resumed_at, content[resumed_at:]).status_code == 204
+    response = client.post(f"{location}/analyze")
+    assert response.status_code == 200
+    assert response.json()["fairness_metrics"]["dataset_info"]["rows"] > 0
+
+    assert client.delete(location).status_code == 204
+    assert client.head(location).status_code == 404
+
+
+def test_uploads_reject_overruns_and_expire(client):
+    location = create(client, 10)
+    assert patch(client, location, 0, b"x" * 11).status_code == 413
+    assert client.post("/uploads", headers={"Upload-Length": str(11 * 2**20)}).status_code == 413
+
+    upload_id = location.rsplit("/", 1)[1]
+    meta_path = os.path.join(main.UPLOADS.root, f"{upload_id}.json")
+    with open(meta_path) as f:
+        info = json.load(f)
+    info["created"] -= 7200
+    with open(meta_path, "w") as f:
+        json.dump(info, f)
+    assert client.head(location).status_code == 410
+    assert not os.path.exists(meta_path)
+
+
+def gzip_bytes(content):
+    return gzip.compress(content)
+
+
+def zstd_bytes(content):
+    return main.zstandard.ZstdCompressor().compress(content)
+
+
+def zip_bytes(content, names=("people.csv",)):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in names:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("codec, compress, filename", [
+    ("gzip", gzip_bytes, "people.csv.gz"),
+    ("zstd", zstd_bytes, "people.csv.zst"),
+    ("zip", zip_bytes, "people.zip"),
+])
+def test_compressed_uploads_are_decompressed(client, codec, compress, filename):
+    if codec == "zstd" and main.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    content = csv_bytes()
+    response = client.post("/analyze-upload", files={"file": (filename, compress(content), "application/octet-stream")})
+    assert response.status_code == 200
+    upload = response.json()["upload"]
+    assert upload["compression"] == codec and upload["decompressed_bytes"] == len(content)
+    assert not [name for name in os.listdir(main.JOBS_DIR) if name.startswith("upload_")]
+
+
+@pytest.mark.parametrize("codec, compress", [("gzip", gzip_bytes), ("zstd", zstd_bytes), ("zip", zip_bytes)])
+def test_decompression_stops_at_the_size_limit(client, monkeypatch, codec, compress):
+    if codec == "zstd" and main.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    monkeypatch.setattr(main, "MAX_OUT_OF_CORE_MB", 1)
+    bomb = compress(b"0" * (3 * 2**20))
+    with pytest.raises(main.HTTPException) as refused:
+        main.decompress_to_spool(io.BytesIO(bomb), "bomb.csv.gz", codec)
+    assert refused.value.status_code == 413
+    assert not [name for name in os.listdir(main.JOBS_DIR) if name.startswith("upload_")]
+
+
+def test_zip_must_hold_exactly_one_dataset(client):
+    archive = zip_bytes(csv_bytes(100), names=("a.csv", "b.csv"))
+    response = client.post("/analyze-upload", files={"file": ("two.zip", archive, "application/zip")})
+    assert response.status_code == 400
@@ -0,0 +1,182 @@
+"""
+Offline trainer for the toxicity pre-filter (the first stage of the cascade in
+main.py).
+
+Fits a logistic model over the same hashed word unigram/bigram features the
+service uses, on texts from one or more CSVs. Labels come from a label column
+or, by default, from toxic-bert itself (distillation: the pre-filter learns
+which of *our* texts the transformer would clear). The benign threshold is
+calibrated on a held-out split so that at most --max-miss of the toxic texts
+the lexicon does not already catch would be cleared. Writes an .npz for
+TOXICITY_PREFILTER_PATH.
+
+    # distil toxic-bert on production-like data (loads the transformer)
+    python train_prefilter.py --data jobs/*.csv --out toxicity_prefilter.npz
+
+    # from a labelled corpus, without loading any model
+    python train_prefilter.py --data comments.csv --text-column comment_text --label-column toxic
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# -------- Data --------
+
+def load_texts(paths: list, text_columns: list, label_column: str, max_texts: int, seed: int) -> pd.DataFrame:
+    """Distinct texts (truncated like the service does) with their label column, if any."""
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path, on_bad_lines="skip")
+        columns = text_columns or [
+            c for c in df.columns
+            if c != label_column and (df[c].dtype == object or pd.api.types.is_string_dtype(df[c]))
+        ]
+        for col in columns:
+            if col not in df.columns:
+                continue
+            part = pd.DataFrame({"text": df[col].astype(str).str[:500]})
+            if label_column:
+                part["label"] = df[label_column]
+            frames.append(part[df[col].notna().to_numpy()])
+    if not frames:
+        raise SystemExit("no text columns found in --data")
+    texts = pd.concat(frames, ignore_index=True)
+    texts = texts[texts["text"].str.strip().str.len() >= 3].drop_duplicates("text")
+    if len(texts) > max_texts:
+        texts = texts.sample(max_texts, random_state=seed)
+    return texts.reset_index(drop=True)
+
+def teacher_labels(main, texts: list) -> np.ndarray:
+    """toxic-bert's verdicts (toxic with score > 0.5), as the service would count them."""
+    if main.toxicity_analyzer is None:
+        raise SystemExit("toxic-bert did not load; pass --label-column or fix the model install")
+    labels = np.zeros(len(texts), dtype=np.float64)
+    for start in range(0, len(texts), 256):
+        results = main.classify_texts("toxicity", main.toxicity_analyzer, texts[start:start + 256])
+        for i, res in enumerate(results):
+            labels[start + i] = float(bool(res) and res.get("label", "").lower() == "toxic" and res.get("score", 0) > 0.5)
+        print(f"[TEACHER] {min(start + 256, len(texts))}/{len(texts)} texts labelled")
+    return labels
+
+def column_labels(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(values):
+        return (values.fillna(0).to_numpy(dtype=np.float64) >= 0.5).astype(np.float64)
+    return values.astype(str).str.lower().isin(["1", "true", "yes", "toxic"]).to_numpy(dtype=np.float64)
+
+# -------- Model --------
+
+def fit_logistic(owners: np.ndarray, features: np.ndarray, labels: np.ndarray, dim: int,
+                 epochs: int, learning_rate: float, l2: float):
+    """Class-balanced logistic regression on hashed sparse features, full-batch Adam."""
+    n = len(labels)
+    positives = max(labels.sum(), 1.0)
+    sample_weight = np.where(labels > 0, n / (2 * positives), n / (2 * max(n - positives, 1.0)))
+    weights = np.zeros(dim, dtype=np.float64)
+    bias = 0.0
+    m, v = np.zeros(dim), np.zeros(dim)
+    m_b = v_b = 0.0
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for epoch in range(1, epochs + 1):
+        logits = bias + np.bincount(owners, weights=weights[features], minlength=n)
+        residual = (1.0 / (1.0 + np.exp(-logits)) - labels) * sample_weight / n
+        grad = np.bincount(features, weights=residual[owners], minlength=dim) + l2 * weights
+        grad_b = residual.sum()
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad ** 2
+        m_b = beta1 * m_b + (1 - beta1) * grad_b
+        v_b = beta2 * v_b + (1 - beta2) * grad_b ** 2
+        correction = np.sqrt(1 - beta2 ** epoch) / (1 - beta1 ** epoch)
+        weights -= learning_rate * correction * m / (np.sqrt(v) + eps)
+        bias -= learning_rate * correction * m_b / (np.sqrt(v_b) + eps)
+    return weights.astype(np.float32), float(bias)
+
+def calibrate(proba: np.ndarray, labels: np.ndarray, lexicon_hits: np.ndarray, max_miss: float) -> float:
+    """Largest benign threshold that clears at most max_miss of the toxic texts the lexicon misses."""
+    toxic = np.sort(proba[(labels > 0) & ~lexicon_hits])
+    if len(toxic) == 0:
+        print("[WARNING] No held-out toxic texts outside the lexicon; the pre-filter will clear nothing")
+        return 0.0
+    allowed = int(np.floor(max_miss * len(toxic)))
+    return float(toxic[allowed])
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", nargs="+", required=True, help="CSV files (globs allowed)")
+    parser.add_argument("--text-column", action="append", default=[], help="text column(s) (default: all string columns)")
+    parser.add_argument("--label-column", default="", help="0/1 or toxic/non-toxic column (default: distil toxic-bert)")
+    parser.add_argument("--lexicon", default="", help="file with one lexicon term per line (default: the service's)")
+    parser.add_argument("--max-texts", type=int, default=200000)
+    parser.add_argument("--max-miss", type=float, default=0.01, help="share of non-lexicon toxic texts allowed through")
+    parser.add_argument("--suspicious-above", type=float, default=0.5)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=os.path.join(SERVICE_DIR, "toxicity_prefilter.npz"))
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The service module supplies the featurizer and lexicon; only distillation needs its models
+    if args.label_column:
+        os.environ["DISABLE_TEXT_MODELS"] = "1"
+    sys.path.insert(0, SERVICE_DIR)
+    import main as service
+
+    paths = sorted({p for pattern in args.data for p in glob.glob(pattern)})
+    data = load_texts(paths, args.text_column, args.label_column, args.max_texts, args.seed)
+    texts = data["text"].tolist()
+    print(f"[DATA] {len(texts)} distinct texts from {len(paths)} file(s)")
+    labels = column_labels(data["label"]) if args.label_column else teacher_labels(service, texts)
+    print(f"[DATA] {int(labels.sum())} toxic ({labels.mean():.2%})")
+
+    if args.lexicon:
+        with open(args.lexicon) as f:
+            lexicon = [line.strip() for line in f if line.strip()]
+    else:
+        lexicon = list(service.DEFAULT_TOXICITY_LEXICON)
+    matcher = service.AhoCorasick(lexicon)
+    lexicon_hits = np.array([bool(matcher.find(text)) for text in texts])
+
+    rng = np.random.default_rng(args.seed)
+    holdout = rng.random(len(texts)) < args.holdout
+    train, valid = np.flatnonzero(~holdout), np.flatnonzero(holdout)
+    dim = service.PREFILTER_HASH_DIM
+    owners, features, _ = service.hashed_text_features([texts[i] for i in train], dim)
+    weights, bias = fit_logistic(owners, features, labels[train], dim, args.epochs, args.learning_rate, args.l2)
+
+    prefilter = service.ToxicityPrefilter(lexicon, weights=weights, bias=bias)
+    proba = prefilter.predict([texts[i] for i in valid])
+    benign_below = calibrate(proba, labels[valid], lexicon_hits[valid], args.max_miss)
+    cleared = (proba < benign_below) & ~lexicon_hits[valid]
+    toxic = labels[valid] > 0
+    validation = {
+        "texts": int(len(valid)), "toxic": int(toxic.sum()),
+        "escalation_rate": round(float(1 - cleared.mean()), 4) if len(valid) else None,
+        "toxic_cleared": int((cleared & toxic).sum()),
+    }
+    info = {
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "labels": f"column:{args.label_column}" if args.label_column else "teacher:unitary/toxic-bert",
+        "texts": len(texts), "toxic": int(labels.sum()), "max_miss": args.max_miss, "validation": validation,
+    }
+    np.savez_compressed(
+        args.out, weights=weights, bias=np.float64(bias), benign_below=np.float64(benign_below),
+        suspicious_above=np.float64(args.suspicious_above), lexicon=np.array(lexicon, dtype=str),
+        info=np.array(json.dumps(info)),
+    )
+    print(f"[DONE] benign below p={benign_below:.4f}; held-out escalation rate "
+          f"{validation['escalation_rate']}, toxic cleared {validation['toxic_cleared']}/{validation['toxic']}")
+    print(f"[DONE] Wrote {args.out}; serve it with TOXICITY_PREFILTER_PATH={args.out}")
+
+if __name__ == "__main__":
+    main()